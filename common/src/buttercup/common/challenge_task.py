@@ -4,6 +4,7 @@ from pathlib import Path
 from typing import Dict, Any, Callable
 from os import PathLike
 import contextlib
+import hashlib
 import logging
 import shlex
 import os
@@ -14,7 +15,7 @@ import uuid
 import subprocess
 import re
 from buttercup.common.task_meta import TaskMeta
-from buttercup.common.utils import copyanything, get_diffs
+from buttercup.common.utils import copyanything, get_diffs, link_tree
 from buttercup.common.stack_parsing import get_crash_token
 from typing import Iterator
 import buttercup.common.node_local as node_local
@@ -145,6 +146,7 @@ class ChallengeTask:
     OSS_FUZZ_CONTAINER_ORG: str = field(default_factory=lambda: os.getenv("OSS_FUZZ_CONTAINER_ORG", "gcr.io/oss-fuzz"))
 
     MAX_COMMIT_RETRIES = 3
+    WARM_COPY_PREFIX = "warm-"
 
     WORKDIR_REGEX = re.compile(r"\s*WORKDIR\s*([^\s]+)")
 
@@ -824,6 +826,63 @@ class ChallengeTask:
             finally:
                 pass
 
+    def _get_warm_copy(self) -> Path:
+        """Return the node-local copy of the task directory shared by the views
+        returned by `get_rw_view`, creating it the first time.
+
+        Warm copies live in the scratch directory of the task, so they are
+        removed together with it once the task expires.
+        """
+        key = hashlib.sha256(str(self.task_dir.resolve()).encode()).hexdigest()[:16]
+        warm_dir = Path(node_local.scratch_path()) / self.task_meta.task_id / f"{self.WARM_COPY_PREFIX}{key}"
+        if warm_dir.is_dir():
+            return warm_dir
+
+        warm_dir.parent.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=warm_dir.parent, prefix=f".{warm_dir.name}-"))
+        try:
+            logger.info(f"Creating warm copy of task directory {self.task_dir} in {warm_dir}")
+            copyanything(self.task_dir, tmp_dir, symlinks=True)
+            tmp_dir.rename(warm_dir)
+        except OSError:
+            # Another process created the warm copy first
+            if not warm_dir.is_dir():
+                raise
+        finally:
+            if tmp_dir.exists():
+                self._remove_dir(tmp_dir)
+
+        return warm_dir
+
+    @contextmanager
+    def get_rw_view(self, work_dir: PathLike | None, delete: bool = True) -> Iterator[ChallengeTask]:
+        """Create a writable view of this task, much cheaper than `get_rw_copy`.
+
+        The files of the view are hard links to a warm copy of the task
+        directory, made once per node. Files can be created, replaced or
+        deleted in the view, but existing files must not be modified in place,
+        as that would modify them in every view. Use `get_rw_copy` to build or
+        patch the task.
+
+        Example:
+            with task.get_rw_view(work_dir) as local_task:
+                local_task.reproduce_pov(harness_name, pov)
+        """
+        warm_dir = self._get_warm_copy()
+        work_dir = Path(work_dir) if work_dir else Path(node_local.scratch_path())
+        work_dir = work_dir / self.task_meta.task_id
+        work_dir.mkdir(parents=True, exist_ok=True)
+
+        with create_tmp_dir(self, work_dir, delete, prefix=self.task_dir.name + "-") as tmp_dir:
+            logger.info(f"Linking warm copy {warm_dir} of task directory {self.task_dir} to {tmp_dir}")
+            link_tree(warm_dir, tmp_dir)
+
+            yield ChallengeTask(
+                read_only_task_dir=self.read_only_task_dir,
+                python_path=self.python_path,
+                local_task_dir=tmp_dir,
+            )
+
     def commit(self, suffix: str | None = None) -> None:
         """Commit the local task directory to a stable path.
 
@@ -380,8 +380,10 @@ class StackParser:
     # an ignorable sanitizer output line.
     # Insert the newline char back between them so that the crash info can be
     # preserved for parsing later.
-    stacktrace = re.sub(CONCATENATED_SAN_DEADLYSIGNAL_REGEX,
-                        SPLIT_CONCATENATED_SAN_DEADLYSIGNAL_REGEX, stacktrace)
+    # The regex backtracks on every line, only run it when it can match.
+    if 'Sanitizer:DEADLYSIGNAL' in stacktrace:
+      stacktrace = re.sub(CONCATENATED_SAN_DEADLYSIGNAL_REGEX,
+                          SPLIT_CONCATENATED_SAN_DEADLYSIGNAL_REGEX, stacktrace)
     return stacktrace.splitlines()
 
   def parse(self, stacktrace: str) -> CrashInfo:
@@ -430,7 +432,9 @@ class StackParser:
         self.match_assert(line, state, ASSERT_REGEX)
         self.match_assert(line, state, ASSERT_REGEX_GOOGLE, group=2)
         self.match_assert(line, state, ASSERT_REGEX_GLIBC)
-        self.match_assert(line, state, ASSERT_REGEX_GLIBC_SUFFIXED)
+        # Same as above, this regex is quadratic in the length of the line.
+        if 'assertion ' in line:
+          self.match_assert(line, state, ASSERT_REGEX_GLIBC_SUFFIXED)
         self.match_assert(line, state, RUST_ASSERT_REGEX)
 
       # ASSERT_NOT_REACHED prints a single line error then triggers a crash. We
@@ -891,15 +891,7 @@ class StackFrameSpec(StackFrameStructure):
 
     # Set base to use for address translation.
     frame.base = self.base
-    for name, member in inspect.getmembers(StackFrameSpec):
-      # Pull out only the property fields; we don't care about methods etc.
-      if not isinstance(member, property):
-        continue
-
-      # We've already set the base (which we need to do first); skip.
-      if name == 'base':
-        continue
-
+    for name in STACK_FRAME_SPEC_FIELDS:
       # Populate the stackframe field. Try all provided lookup groups.
       indices = getattr(self, name)
       if not isinstance(indices, list):
@@ -914,6 +906,13 @@ class StackFrameSpec(StackFrameStructure):
     return frame
 
 
+# Property fields of a StackFrameSpec, listed once rather than on every parsed
+# frame. The base is excluded as it is set first.
+STACK_FRAME_SPEC_FIELDS = [
+    name for name, member in inspect.getmembers(StackFrameSpec)
+    if isinstance(member, property) and name != 'base'
+]
+
 # Stackframe format specifications.
 CHROME_STACK_FRAME_SPEC = StackFrameSpec(
     address=3, function_name=4)
@@ -1,5 +1,6 @@
 import logging
-from typing import List
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, cast
 import buttercup.common.node_local as node_local
 from buttercup.common.constants import CORPUS_DIR_NAME, CRASH_DIR_NAME
 import os
@@ -9,20 +10,140 @@ import subprocess
 from pathlib import Path
 from redis import Redis
 from buttercup.common.sets import MergedCorpusSet
+from bson.json_util import dumps, CANONICAL_JSON_OPTIONS
 import tempfile
 
 logger = logging.getLogger(__name__)
 
 
+# Read size used when hashing inputs
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
 def hash_file(fl):
     h = hashlib.new("sha256")
-    bts = fl.read(100)
+    bts = fl.read(HASH_CHUNK_SIZE)
     while bts:
         h.update(bts)
-        bts = fl.read(100)
+        bts = fl.read(HASH_CHUNK_SIZE)
     return h.hexdigest()
 
 
+def link_or_copy(src: str, dst: str) -> bool:
+    """Make `src` available at the content-addressed path `dst`.
+
+    `dst` is left untouched if it already exists, since it necessarily has the
+    same content. Otherwise it is hardlinked to `src` when both are on the same
+    filesystem, and copied if not.
+
+    Returns True if `dst` was created.
+    """
+    if os.path.exists(dst):
+        return False
+
+    try:
+        os.link(src, dst)
+        return True
+    except FileExistsError:
+        # Added concurrently by another process
+        return False
+    except OSError:
+        # Cross-device link, or links not supported by the filesystem
+        pass
+
+    shutil.copy(src, dst)
+    return True
+
+
+def fetch_file(src: str, dst: str) -> bool:
+    """Copy `src` to the content-addressed path `dst`, unless it already exists.
+
+    The file is written to a hidden temporary file first and then renamed, so
+    fuzzers reading the destination directory never see partial inputs.
+
+    Returns True if `dst` was created.
+    """
+    if os.path.exists(dst):
+        return False
+
+    dst_dir, name = os.path.split(dst)
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", dir=dst_dir)
+    try:
+        with os.fdopen(fd, "wb") as out, open(src, "rb") as f:
+            shutil.copyfileobj(f, out, HASH_CHUNK_SIZE)
+        os.rename(tmp, dst)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return True
+
+
+CORPUS_MANIFEST_NAME = "corpus_manifest"
+# Number of manifest entries fetched per round trip
+MANIFEST_PAGE_SIZE = 1000
+# Id and fields of an entry of a Redis stream
+StreamEntry = tuple[bytes, dict[bytes, bytes]]
+
+
+@dataclass
+class ManifestEntry:
+    entry_id: str
+    hash: str
+    size: int
+
+    @property
+    def timestamp_ms(self) -> int:
+        return int(self.entry_id.split("-")[0])
+
+
+class CorpusManifest:
+    """Append-only log of the inputs pushed to the remote corpus of a harness.
+
+    The log is a Redis stream, so the server assigns every entry a
+    monotonically increasing id (which also records when it was added). A
+    peer that remembers the id of the last entry it processed can then fetch
+    only the inputs added since, instead of listing the remote directory.
+    Entries are never removed and the same hash may be recorded more than once.
+    """
+
+    def __init__(self, redis: Redis, task_id: str, harness_name: str):
+        self.redis = redis
+        self.key = dumps([task_id, CORPUS_MANIFEST_NAME, harness_name], json_options=CANONICAL_JSON_OPTIONS)
+
+    def add(self, files: Iterable[tuple[str, int]]) -> None:
+        """Record (hash, size) pairs of inputs that were pushed to the remote corpus."""
+        pipe = self.redis.pipeline(transaction=False)
+        n = 0
+        for file_hash, size in files:
+            pipe.xadd(self.key, {"hash": file_hash, "size": size})
+            n += 1
+        if n > 0:
+            pipe.execute()
+
+    def last_id(self) -> str | None:
+        """Id of the newest entry, None if the manifest is empty."""
+        last = cast(list[StreamEntry], self.redis.xrevrange(self.key, count=1))
+        if not last:
+            return None
+        return last[0][0].decode()
+
+    def entries_since(self, cursor: str = "0") -> Iterator[ManifestEntry]:
+        """Yield the entries added after the entry with id `cursor`, oldest first."""
+        while True:
+            resp = cast(
+                list[tuple[bytes, list[StreamEntry]]], self.redis.xread({self.key: cursor}, count=MANIFEST_PAGE_SIZE)
+            )
+            if not resp:
+                return
+
+            for entry_id, fields in resp[0][1]:
+                cursor = entry_id.decode()
+                yield ManifestEntry(entry_id=cursor, hash=fields[b"hash"].decode(), size=int(fields[b"size"]))
+
+    def hashes(self) -> set[str]:
+        return {entry.hash for entry in self.entries_since()}
+
+
 class InputDir:
     def __init__(self, wdir: str, name: str, copy_corpus_max_size: int | None = None):
         self.path = os.path.join(wdir, name)
@@ -36,13 +157,15 @@ class InputDir:
     def copy_file(self, src_file: str):
         with open(src_file, "rb") as f:
             nm = hash_file(f)
-            dst = os.path.join(self.path, nm)
-            dst_remote = os.path.join(self.remote_path, nm)
-            os.makedirs(self.remote_path, exist_ok=True)
-            # Make the file available both node-local and remote
-            shutil.copy(src_file, dst)
-            shutil.copy(dst, dst_remote)
-            return dst
+        dst = os.path.join(self.path, nm)
+        dst_remote = os.path.join(self.remote_path, nm)
+        os.makedirs(self.remote_path, exist_ok=True)
+        # Make the file available both node-local and remote, inputs that are
+        # already present (same name, same content) are not written again
+        link_or_copy(src_file, dst)
+        if link_or_copy(src_file, dst_remote):
+            self._record_remote([nm])
+        return dst
 
     def copy_corpus(self, src_dir: str) -> list[str]:
         files = []
@@ -116,25 +239,33 @@ class InputDir:
     def hash_new_corpus(self):
         InputDir.hash_corpus(self.path)
 
-    def _do_sync(self, src_path: str, dst_path: str):
+    def _record_remote(self, files: Iterable[str]) -> None:
+        """Called with the names of the inputs that were pushed to the remote corpus."""
+
+    def _do_sync(self, src_path: str, dst_path: str) -> list[str]:
+        """Rsync the hashed inputs of `src_path` to `dst_path`, returns the names of the transferred files."""
         # Pattern to match SHA256 hashes (64 hex chars)
         hash_pattern = "[0-9a-f]" * 64
-        subprocess.call(
+        result = subprocess.run(
             [
                 "rsync",
                 "-a",
                 "--ignore-existing",
+                "--out-format=%n",
                 f"--include={hash_pattern}",
                 "--exclude=*",
                 str(src_path) + "/",
                 str(dst_path) + "/",
-            ]
+            ],
+            stdout=subprocess.PIPE,
+            text=True,
         )
+        return [line for line in result.stdout.splitlines() if self.has_hashed_name(line)]
 
     def sync_to_remote(self):
         self.hash_new_corpus()
         os.makedirs(self.remote_path, exist_ok=True)
-        self._do_sync(self.path, self.remote_path)
+        self._record_remote(self._do_sync(self.path, self.remote_path))
 
     def sync_specific_files_to_remote(self, files):
         """
@@ -167,6 +298,10 @@ class InputDir:
                 ]
             )
 
+        # Inputs that were already remote are recorded again, in case they were pushed by a peer that did not
+        # record them.
+        self._record_remote(files)
+
     def sync_from_remote(self):
         os.makedirs(self.remote_path, exist_ok=True)
         self._do_sync(self.remote_path, self.path)
@@ -213,11 +348,85 @@ class CrashDir:
 
 
 class Corpus(InputDir):
-    def __init__(self, wdir: str, task_id: str, harness_name: str, copy_corpus_max_size: int | None = None):
+    """The corpus of a harness.
+
+    When a Redis connection is given, every input pushed to the remote corpus
+    is recorded in a `CorpusManifest`. Each node then keeps a cursor (the id of
+    the last manifest entry it fetched) next to its local corpus, and
+    `sync_from_remote` only copies the inputs added after it, instead of
+    rsync-ing the whole remote directory. The first sync of a node is always a
+    full rsync, which also picks up inputs that were never recorded. For the
+    same reason, the remote corpus is always listed from the remote directory.
+    """
+
+    def __init__(
+        self,
+        wdir: str,
+        task_id: str,
+        harness_name: str,
+        copy_corpus_max_size: int | None = None,
+        redis: Redis | None = None,
+    ):
         self.task_id = task_id
         self.harness_name = harness_name
         self.corpus_dir = os.path.join(task_id, f"{CORPUS_DIR_NAME}_{harness_name}")
         super().__init__(wdir, self.corpus_dir, copy_corpus_max_size=copy_corpus_max_size)
+        self.manifest = CorpusManifest(redis, task_id, harness_name) if redis is not None else None
+        self.cursor_path = self.path + ".manifest_cursor"
+
+    def _record_remote(self, files: Iterable[str]) -> None:
+        if self.manifest is None:
+            return
+
+        entries = []
+        for file in files:
+            try:
+                entries.append((file, (Path(self.remote_path) / file).stat().st_size))
+            except OSError as e:
+                logger.debug(f"Not recording {file} in the manifest of {self.remote_path}: {e}")
+        self.manifest.add(entries)
+
+    def _read_cursor(self) -> str | None:
+        try:
+            with open(self.cursor_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _write_cursor(self, cursor: str) -> None:
+        # Several bots on the same node can share the local corpus, write the cursor atomically
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.cursor_path))
+        with os.fdopen(fd, "w") as f:
+            f.write(cursor)
+        os.replace(tmp, self.cursor_path)
+
+    def sync_from_remote(self) -> None:
+        if self.manifest is None:
+            super().sync_from_remote()
+            return
+
+        cursor = self._read_cursor()
+        if cursor is None:
+            # Take the cursor before the full sync, so inputs recorded while it runs are fetched next time
+            cursor = self.manifest.last_id() or "0"
+            super().sync_from_remote()
+            self._write_cursor(cursor)
+            return
+
+        fetched = 0
+        last_id = cursor
+        for entry in self.manifest.entries_since(cursor):
+            last_id = entry.entry_id
+            try:
+                if fetch_file(os.path.join(self.remote_path, entry.hash), os.path.join(self.path, entry.hash)):
+                    fetched += 1
+            except FileNotFoundError:
+                logger.debug(f"Input {entry.hash} is not in remote corpus {self.remote_path} anymore")
+
+        if last_id != cursor:
+            self._write_cursor(last_id)
+        if fetched > 0:
+            logger.debug(f"Fetched {fetched} new inputs from remote corpus {self.remote_path}")
 
     def remove_any_merged(self, redis: Redis):
         merged_corpus_set = MergedCorpusSet(redis, self.task_id, self.harness_name)
@@ -4,6 +4,7 @@ from buttercup.common.utils import serve_loop
 from buttercup.common.datastructures.msg_pb2 import WeightedHarness, BuildOutput
 from buttercup.common.datastructures.aliases import BuildType
 from buttercup.common.maps import HarnessWeights, BuildMap
+from buttercup.common.harness_scheduler import HarnessScheduler
 from typing import List
 
 import random
@@ -18,6 +19,9 @@ class TaskLoop(ABC):
         self.timeout = timeout
         self.harness_weights = HarnessWeights(redis)
         self.builds = BuildMap(redis)
+        self.harness_scheduler = HarnessScheduler(redis)
+        # Each kind of task loop keeps track of the harnesses it ran last
+        self.loop_name = type(self).__name__
 
     # Declare a set of builds that must be available before running the task
     def required_builds(self) -> List[BuildType]:
@@ -28,7 +32,7 @@ class TaskLoop(ABC):
         pass
 
     def serve_item(self) -> bool:
-        weighted_items: list[WeightedHarness] = [wh for wh in self.harness_weights.list_harnesses() if wh.weight > 0]
+        weighted_items: list[WeightedHarness] = self.harness_scheduler.get_schedule(self.loop_name)
         if len(weighted_items) <= 0:
             return False
 
@@ -49,6 +53,7 @@ class TaskLoop(ABC):
                 has_all_builds = False
 
         if has_all_builds:
+            self.harness_scheduler.record_run(self.loop_name, chc)
             self.run_task(chc, builds)
             return True
 
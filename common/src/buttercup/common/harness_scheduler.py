@@ -0,0 +1,262 @@
+"""Weights of the harnesses, computed from how much progress each of them is making.
+
+The orchestrator periodically recomputes a schedule from the signals already in Redis (coverage, distinct crashes and
+merged corpus size of each harness) and stores it as a single JSON value. The task loops of the bots fetch it with one
+round trip, and additionally favor the harnesses they have not run for a while.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from dataclasses import dataclass
+
+from redis import Redis
+
+from buttercup.common.datastructures.msg_pb2 import FunctionCoverage, WeightedHarness
+from buttercup.common.maps import CoverageMap, HarnessWeights, harness_key
+from buttercup.common.sets import MergedCorpusSet
+from buttercup.common.stack_parsing import CRASH_COUNTS_MAP_NAME
+
+logger = logging.getLogger(__name__)
+
+HARNESS_SCHEDULE_KEY = "harness_schedule"
+HARNESS_STATS_KEY = "harness_schedule_stats"
+HARNESS_SCHEDULE_UPDATE_KEY = "harness_schedule_update"
+HARNESS_LAST_RUN_PREFIX = "harness_last_run"
+
+# Seconds between two recomputations of the schedule
+SCHEDULE_UPDATE_INTERVAL_SECONDS = 60
+# A schedule that hasn't been recomputed for that long is ignored, in favor of the static weights
+SCHEDULE_MAX_AGE_SECONDS = 15 * 60
+# Smoothing factor of the progress rates, higher values favor the latest interval
+RATE_SMOOTHING = 0.3
+# Relative importance of each progress signal
+COVERAGE_RATE_WEIGHT = 0.5
+CRASH_RATE_WEIGHT = 0.3
+CORPUS_RATE_WEIGHT = 0.2
+# Share of the weight kept by harnesses that stopped making progress, so that they are never starved
+MIN_PROGRESS = 0.1
+# A harness not run by a task loop for that long gets its weight multiplied by 1 + STALENESS_BOOST
+STALE_AFTER_SECONDS = 30 * 60
+STALENESS_BOOST = 1.0
+
+
+@dataclass
+class HarnessStats:
+    """Progress of a harness as of the last schedule computation. Rates are per minute."""
+
+    covered_lines: int
+    crashes: int
+    corpus_size: int
+    updated_at: float
+    coverage_rate: float = 0.0
+    crash_rate: float = 0.0
+    corpus_rate: float = 0.0
+
+    def to_list(self) -> list:
+        return [
+            self.covered_lines,
+            self.crashes,
+            self.corpus_size,
+            self.updated_at,
+            self.coverage_rate,
+            self.crash_rate,
+            self.corpus_rate,
+        ]
+
+    @classmethod
+    def from_list(cls, values: list) -> HarnessStats:
+        return cls(*values)
+
+    def advance(self, covered_lines: int, crashes: int, corpus_size: int, now: float) -> HarnessStats:
+        """Stats of the harness at `now`, with the rates smoothed over the previous ones."""
+        minutes = (now - self.updated_at) / 60
+        if minutes <= 0:
+            return HarnessStats(
+                covered_lines,
+                crashes,
+                corpus_size,
+                self.updated_at,
+                self.coverage_rate,
+                self.crash_rate,
+                self.corpus_rate,
+            )
+
+        def smooth(previous_rate: float, previous: int, current: int) -> float:
+            rate = max(current - previous, 0) / minutes
+            return RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * previous_rate
+
+        return HarnessStats(
+            covered_lines,
+            crashes,
+            corpus_size,
+            now,
+            smooth(self.coverage_rate, self.covered_lines, covered_lines),
+            smooth(self.crash_rate, self.crashes, crashes),
+            smooth(self.corpus_rate, self.corpus_size, corpus_size),
+        )
+
+
+def _progress_scores(stats: dict[str, HarnessStats | None]) -> dict[str, float]:
+    """Progress of each harness between 0 and 1, relative to the harness progressing the fastest on each signal.
+
+    Harnesses without stats yet are given the maximum score, so that they are explored first.
+    """
+    signals = [
+        ("coverage_rate", COVERAGE_RATE_WEIGHT),
+        ("crash_rate", CRASH_RATE_WEIGHT),
+        ("corpus_rate", CORPUS_RATE_WEIGHT),
+    ]
+    known = [s for s in stats.values() if s is not None]
+    max_rates = {name: max((getattr(s, name) for s in known), default=0.0) for name, _ in signals}
+    # Signals on which no harness is progressing don't count
+    signals = [(name, weight) for name, weight in signals if max_rates[name] > 0]
+    total_weight = sum(weight for _, weight in signals)
+
+    scores = {}
+    for key, harness_stats in stats.items():
+        if harness_stats is None:
+            scores[key] = 1.0
+        elif total_weight == 0:
+            scores[key] = 0.0
+        else:
+            score = sum(weight * getattr(harness_stats, name) / max_rates[name] for name, weight in signals)
+            scores[key] = score / total_weight
+    return scores
+
+
+class HarnessScheduler:
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.harness_weights = HarnessWeights(redis)
+
+    def _last_run_key(self, loop_name: str) -> str:
+        return f"{HARNESS_LAST_RUN_PREFIX}:{loop_name}"
+
+    def update(self, now: float | None = None) -> list[WeightedHarness]:
+        """Recompute the weights of all the harnesses and store the schedule."""
+        now = time.time() if now is None else now
+        harnesses = [h for h in self.harness_weights.list_harnesses() if h.weight > 0]
+
+        # Fetch all the signals in a single round trip
+        pipeline = self.redis.pipeline()
+        for h in harnesses:
+            pipeline.hvals(CoverageMap(self.redis, h.harness_name, h.package_name, h.task_id).mp.hash_name)
+            pipeline.scard(MergedCorpusSet(self.redis, h.task_id, h.harness_name).set_name)
+        pipeline.hgetall(CRASH_COUNTS_MAP_NAME)
+        pipeline.get(HARNESS_STATS_KEY)
+        *signals, crash_counts, previous_blob = pipeline.execute()
+
+        previous: dict[str, HarnessStats] = {}
+        if previous_blob is not None:
+            try:
+                previous = {k: HarnessStats.from_list(v) for k, v in json.loads(previous_blob).items()}
+            except (ValueError, TypeError) as e:
+                logger.warning("Ignoring invalid harness stats: %s", e)
+        crashes_by_key = {k.decode("utf-8"): int(v) for k, v in crash_counts.items()}
+
+        stats: dict[str, HarnessStats | None] = {}
+        current: dict[str, HarnessStats] = {}
+        for i, h in enumerate(harnesses):
+            key = harness_key(h.package_name, h.harness_name, h.task_id)
+            coverage_values, corpus_size = signals[2 * i], signals[2 * i + 1]
+            covered_lines = 0
+            for value in coverage_values:
+                function_coverage = FunctionCoverage()
+                function_coverage.ParseFromString(value)
+                covered_lines += function_coverage.covered_lines
+            crashes = crashes_by_key.get(key, 0)
+
+            previous_stats = previous.get(key)
+            if previous_stats is None:
+                current[key] = HarnessStats(covered_lines, crashes, corpus_size, now)
+                stats[key] = None
+            else:
+                current[key] = previous_stats.advance(covered_lines, crashes, corpus_size, now)
+                stats[key] = current[key]
+
+        scores = _progress_scores(stats)
+        schedule = []
+        for h in harnesses:
+            key = harness_key(h.package_name, h.harness_name, h.task_id)
+            weight = h.weight * (MIN_PROGRESS + (1 - MIN_PROGRESS) * scores[key])
+            schedule.append(
+                WeightedHarness(
+                    weight=weight,
+                    package_name=h.package_name,
+                    harness_name=h.harness_name,
+                    task_id=h.task_id,
+                )
+            )
+
+        pipeline = self.redis.pipeline()
+        pipeline.set(
+            HARNESS_SCHEDULE_KEY,
+            json.dumps(
+                {
+                    "updated_at": now,
+                    "harnesses": [[h.package_name, h.harness_name, h.task_id, h.weight] for h in schedule],
+                }
+            ),
+        )
+        pipeline.set(HARNESS_STATS_KEY, json.dumps({k: s.to_list() for k, s in current.items()}))
+        pipeline.execute()
+        logger.debug("Updated the weights of %d harnesses", len(schedule))
+        return schedule
+
+    def maybe_update(self, interval: float = SCHEDULE_UPDATE_INTERVAL_SECONDS) -> bool:
+        """Recompute the schedule if no one did it in the last `interval` seconds.
+
+        Returns:
+            bool: True if the schedule was recomputed, False otherwise
+        """
+        if not self.redis.set(HARNESS_SCHEDULE_UPDATE_KEY, "1", ex=max(int(interval), 1), nx=True):
+            return False
+        self.update()
+        return True
+
+    def get_schedule(self, loop_name: str, now: float | None = None) -> list[WeightedHarness]:
+        """Harnesses with a positive weight, as seen by the task loop `loop_name`.
+
+        Falls back to the static weights when there is no recent schedule.
+        """
+        now = time.time() if now is None else now
+        pipeline = self.redis.pipeline()
+        pipeline.get(HARNESS_SCHEDULE_KEY)
+        pipeline.hgetall(self._last_run_key(loop_name))
+        schedule_blob, last_runs = pipeline.execute()
+
+        harnesses = None
+        if schedule_blob is not None:
+            try:
+                schedule = json.loads(schedule_blob)
+                if now - schedule["updated_at"] <= SCHEDULE_MAX_AGE_SECONDS:
+                    harnesses = [
+                        WeightedHarness(package_name=p, harness_name=n, task_id=t, weight=w)
+                        for p, n, t, w in schedule["harnesses"]
+                    ]
+            except (ValueError, KeyError, TypeError) as e:
+                logger.warning("Ignoring invalid harness schedule: %s", e)
+        if harnesses is None:
+            harnesses = self.harness_weights.list_harnesses()
+
+        last_run_by_key = {k.decode("utf-8"): float(v) for k, v in last_runs.items()}
+        result = []
+        for h in harnesses:
+            if h.weight <= 0:
+                continue
+            last_run = last_run_by_key.get(harness_key(h.package_name, h.harness_name, h.task_id))
+            idle = STALE_AFTER_SECONDS if last_run is None else max(now - last_run, 0)
+            h.weight *= 1 + STALENESS_BOOST * min(idle / STALE_AFTER_SECONDS, 1.0)
+            result.append(h)
+        return result
+
+    def record_run(self, loop_name: str, harness: WeightedHarness, now: float | None = None) -> None:
+        now = time.time() if now is None else now
+        self.redis.hset(
+            self._last_run_key(loop_name),
+            harness_key(harness.package_name, harness.harness_name, harness.task_id),
+            str(now),
+        )
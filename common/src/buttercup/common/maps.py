@@ -1,4 +1,4 @@
-from typing import Generic, TypeVar, Type, Iterator
+from typing import Generic, TypeVar, Type, Iterator, cast
 from buttercup.common.datastructures.msg_pb2 import WeightedHarness, BuildOutput, FunctionCoverage, BuildType
 from redis import Redis
 from bson.json_util import dumps, CANONICAL_JSON_OPTIONS
@@ -16,20 +16,28 @@ class RedisMap(Generic[MsgType]):
         self.hash_name = hash_name
 
     def get(self, key: str) -> MsgType | None:
-        it = self.redis.hget(self.hash_name, key)
+        it = cast(bytes | None, self.redis.hget(self.hash_name, key))
         if it is None:
             return None
 
-        msg = self.msg_builder()
-        msg.ParseFromString(it)
-        return msg
+        return self._parse(it)
 
     def set(self, key: str, value: MsgType) -> None:
         self.redis.hset(self.hash_name, key, value.SerializeToString())
 
+    def _parse(self, value: bytes) -> MsgType:
+        msg: MsgType = self.msg_builder()
+        msg.ParseFromString(value)
+        return msg
+
+    # Fetches the whole hash in a single round trip
+    def items(self) -> list[tuple[str, MsgType]]:
+        values = cast(dict[bytes, bytes], self.redis.hgetall(self.hash_name))
+        return [(key.decode("utf-8"), self._parse(value)) for key, value in values.items()]
+
     def __iter__(self) -> Iterator[MsgType]:
-        for key in self.redis.hkeys(self.hash_name):
-            yield self.get(key)
+        for value in cast(list[bytes], self.redis.hvals(self.hash_name)):
+            yield self._parse(value)
 
 
 HARNESS_WEIGHTS_MAP_NAME = "harness_weights"
@@ -38,6 +46,10 @@ BUILD_SAN_MAP_NAME = "build_san_list"
 COVERAGE_MAP_PREFIX = "coverage_map"
 
 
+def harness_key(package_name: str, harness_name: str, task_id: str) -> str:
+    return dumps([package_name, harness_name, task_id], json_options=CANONICAL_JSON_OPTIONS)
+
+
 # A build map makes it effecient to find for a given task_id + harness a build type
 # we currently only support a single item of a given type
 # add a new type if you want to support different builds
@@ -98,13 +110,7 @@ class HarnessWeights:
         return list(iter(self.mp))
 
     def push_harness(self, harness: WeightedHarness) -> None:
-        key = [
-            harness.package_name,
-            harness.harness_name,
-            harness.task_id,
-        ]
-        key_str = dumps(key, json_options=CANONICAL_JSON_OPTIONS)
-        self.mp.set(key_str, harness)
+        self.mp.set(harness_key(harness.package_name, harness.harness_name, harness.task_id), harness)
 
 
 class CoverageMap:
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import logging
+import threading
+import time
+
+from redis import Redis, ResponseError
+
+from buttercup.common.queues import QueueNames
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (inclusive) of the `times_delivered` buckets, the last bucket
+# collects everything above the last bound.
+REDELIVERY_BUCKETS = (1, 2, 3, 5, 10)
+
+
+def redelivery_bucket(times_delivered: int) -> str:
+    """Return the histogram bucket label for a delivery count."""
+    for bound in REDELIVERY_BUCKETS:
+        if times_delivered <= bound:
+            return str(bound)
+    return f">{REDELIVERY_BUCKETS[-1]}"
+
+
+@dataclass
+class GroupStats:
+    group_name: str
+    consumers: int
+    pending: int
+    lag: int | None
+    oldest_pending_idle_ms: int
+    redeliveries: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class QueueStats:
+    queue_name: str
+    length: int
+    groups: list[GroupStats] = field(default_factory=list)
+
+
+def _str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+@dataclass
+class QueueMetricsSampler:
+    """Sample depth, lag and redelivery stats of the reliable queues.
+
+    All the streams are sampled with (at most) three pipelined round trips,
+    independently of the number of queues and consumer groups: one for
+    EXISTS/XLEN, one for XINFO GROUPS of the existing streams and one for the
+    XPENDING details of every group with pending items.
+    """
+
+    redis: Redis
+    queue_names: list[str] = field(default_factory=lambda: [q.value for q in QueueNames])
+    # Max pending entries inspected per group for the idle time and redelivery
+    # histogram. XINFO GROUPS always reports the exact pending count.
+    max_pending_sample: int = 1000
+
+    def sample(self) -> list[QueueStats]:
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_name in self.queue_names:
+            pipe.exists(queue_name)
+            pipe.xlen(queue_name)
+        results = pipe.execute()
+
+        stats = [
+            QueueStats(queue_name=queue_name, length=results[2 * i + 1])
+            for i, queue_name in enumerate(self.queue_names)
+        ]
+        # XINFO GROUPS fails on streams that were never created
+        existing = [qs for i, qs in enumerate(stats) if results[2 * i]]
+        if not existing:
+            return stats
+
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_stats in existing:
+            pipe.xinfo_groups(queue_stats.queue_name)
+        for queue_stats, groups in zip(existing, pipe.execute(raise_on_error=False)):
+            if isinstance(groups, ResponseError):
+                logger.debug("Failed to get groups of queue %s: %s", queue_stats.queue_name, groups)
+                continue
+
+            queue_stats.groups = [
+                GroupStats(
+                    group_name=_str(group["name"]),
+                    consumers=group.get("consumers", 0),
+                    pending=group.get("pending", 0),
+                    lag=group.get("lag"),
+                    oldest_pending_idle_ms=0,
+                )
+                for group in groups
+            ]
+
+        pending_groups = [(qs, gs) for qs in stats for gs in qs.groups if gs.pending > 0]
+        if not pending_groups:
+            return stats
+
+        pipe = self.redis.pipeline(transaction=False)
+        for queue_stats, group_stats in pending_groups:
+            pipe.xpending_range(
+                queue_stats.queue_name,
+                group_stats.group_name,
+                min="-",
+                max="+",
+                count=self.max_pending_sample,
+            )
+        results = pipe.execute(raise_on_error=False)
+
+        for (queue_stats, group_stats), pending in zip(pending_groups, results):
+            if isinstance(pending, ResponseError):
+                logger.debug(
+                    "Failed to get pending entries of %s/%s: %s",
+                    queue_stats.queue_name,
+                    group_stats.group_name,
+                    pending,
+                )
+                continue
+
+            for entry in pending:
+                group_stats.oldest_pending_idle_ms = max(
+                    group_stats.oldest_pending_idle_ms, entry["time_since_delivered"]
+                )
+                bucket = redelivery_bucket(entry["times_delivered"])
+                group_stats.redeliveries[bucket] = group_stats.redeliveries.get(bucket, 0) + 1
+
+        return stats
+
+
+@dataclass
+class CachedQueueMetricsSampler:
+    """Share one sample between all the metric callbacks of a collection cycle."""
+
+    sampler: QueueMetricsSampler
+    max_age: float = 5.0
+
+    _lock: threading.Lock = field(init=False, default_factory=threading.Lock, repr=False)
+    _stats: list[QueueStats] = field(init=False, default_factory=list, repr=False)
+    _sampled_at: float | None = field(init=False, default=None, repr=False)
+
+    def get(self) -> list[QueueStats]:
+        with self._lock:
+            now = time.monotonic()
+            if self._sampled_at is None or now - self._sampled_at > self.max_age:
+                try:
+                    self._stats = self.sampler.sample()
+                except Exception as e:
+                    logger.warning("Failed to sample queue metrics: %s", e)
+                    self._stats = []
+                self._sampled_at = now
+
+            return self._stats
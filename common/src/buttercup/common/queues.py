@@ -3,6 +3,7 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 from redis import Redis, RedisError
+from redis.asyncio import Redis as AsyncRedis
 from google.protobuf.message import Message
 from buttercup.common.datastructures.msg_pb2 import (
     BuildRequest,
@@ -20,7 +21,7 @@ from buttercup.common.datastructures.msg_pb2 import (
     POVReproduceResponse,
 )
 import logging
-from typing import Type, Generic, TypeVar, Literal, overload
+from typing import Type, Generic, TypeVar, Literal, Sequence, overload
 import uuid
 import os
 from enum import Enum
@@ -84,6 +85,9 @@ class Queue(ABC):
     @abstractmethod
     def pop(self): ...
 
+    @abstractmethod
+    def pop_batch(self, n: int) -> list[Any]: ...
+
     def push(self, _): ...
 
     @abstractmethod
@@ -103,31 +107,47 @@ class SerializationDeserializationQueue(Queue):
         bts = it.SerializeToString()
         self.subq.push(bts)
 
+    def _parse(self, bts: bytes) -> Message:
+        msg = self.msg_builder()
+        msg.ParseFromString(bts)
+        return msg
+
     def pop(self):
         maybe_bts = self.subq.pop()
         if maybe_bts is None:
             return None
 
-        msg = self.msg_builder()
-        msg.ParseFromString(maybe_bts)
-        print("parsing message")
-        return msg
+        return self._parse(maybe_bts)
+
+    def pop_batch(self, n: int) -> list[Message]:
+        return [self._parse(bts) for bts in self.subq.pop_batch(n)]
 
     def __iter__(self):
-        for it in iter(self.subq):
-            msg = self.msg_builder()
-            msg.ParseFromString(it)
-            print(msg, type(msg))
-            yield msg
+        # Messages are parsed one at a time, as the underlying queue yields them
+        return (self._parse(it) for it in iter(self.subq))
 
 
 class QueueIterMixin:
+    # Max number of items fetched by a single LRANGE while iterating
+    ITER_PAGE_SIZE = 500
+
     def __init__(self, qname: str, redis: Redis):
         self.qname = qname
         self.redis = redis
 
     def __iter__(self):
-        return iter(self.redis.lrange(self.qname, 0, -1))
+        """Iterate over the list in bounded LRANGE windows instead of fetching it whole.
+
+        Items pushed or popped while iterating may shift the windows, so an item
+        can be skipped or seen twice; iteration is only meant for inspection.
+        """
+        start = 0
+        while True:
+            page = self.redis.lrange(self.qname, start, start + self.ITER_PAGE_SIZE - 1)
+            yield from page
+            if len(page) < self.ITER_PAGE_SIZE:
+                return
+            start += len(page)
 
 
 class NormalQueue(QueueIterMixin, Queue):
@@ -142,6 +162,10 @@ class NormalQueue(QueueIterMixin, Queue):
     def pop(self):
         return self.redis.rpop(self.qname)
 
+    def pop_batch(self, n: int) -> list[bytes]:
+        """Pop up to `n` of the oldest items with a single RPOP."""
+        return self.redis.rpop(self.qname, n) or []
+
     def __iter__(self):
         return super().__iter__()
 
@@ -203,6 +227,16 @@ class ReliableQueue(Generic[MsgType]):
         bts = item.SerializeToString()
         self.redis.xadd(self.queue_name, {self.INAME: bts})
 
+    def push_many(self, items: Sequence[MsgType]) -> None:
+        """Push several items in a single round trip (pipelined XADDs)."""
+        if len(items) == 0:
+            return
+
+        pipe = self.redis.pipeline(transaction=False)
+        for item in items:
+            pipe.xadd(self.queue_name, {self.INAME: item.SerializeToString()})
+        pipe.execute()
+
     def _ensure_group_name(func):
         def wrapper(self, *args, **kwargs):
             if self.group_name is None:
@@ -211,33 +245,46 @@ class ReliableQueue(Generic[MsgType]):
 
         return wrapper
 
-    @_ensure_group_name
-    def pop(self) -> RQItem[MsgType] | None:
+    def _to_rq_item(self, stream_item: tuple[Any, dict]) -> RQItem[MsgType]:
+        # Extract message ID and data
+        message_id, message_data = stream_item[0], stream_item[1]
+
+        # Create and parse protobuf message
+        msg = self.msg_builder()
+        msg.ParseFromString(message_data[self.INAME])
+
+        return RQItem[MsgType](item_id=message_id, deserialized=msg)
+
+    def _read_group(self, count: int) -> list:
         streams_items = self.redis.xreadgroup(
             self.group_name,
             self.reader_name,
             {self.queue_name: self.last_stream_id},
             block=self.block_time,
-            count=1,
+            count=count,
         )
         # Redis xreadgroup returns a list of [stream_name, [(message_id, {field: value})]]
         if streams_items is None or len(streams_items) == 0:
-            # No message found in the pending/regular queue for this reader.
-            # Try to autoclaim a message
-            res = self.redis.xautoclaim(
-                self.queue_name,
-                self.group_name,
-                self.reader_name,
-                min_idle_time=self.task_timeout_ms,
-                count=1,
-            )
-            if res is None or len(res[1]) == 0:
-                return None
+            return []
+
+        return list(streams_items[0][1])
+
+    def _autoclaim(self, count: int) -> list:
+        res = self.redis.xautoclaim(
+            self.queue_name,
+            self.group_name,
+            self.reader_name,
+            min_idle_time=self.task_timeout_ms,
+            count=count,
+        )
+        if res is None or len(res[1]) == 0:
+            return []
 
-            stream_item = res[1]
-        else:
-            stream_item = streams_items[0][1]
+        return list(res[1])
 
+    @_ensure_group_name
+    def pop(self) -> RQItem[MsgType] | None:
+        stream_item = self._read_group(1)
         if len(stream_item) == 0 and self.last_stream_id != ">":
             # If the queue was created with a last_stream_id that is not `>`, it
             # means the pending items for this reader were desired. In case
@@ -246,20 +293,56 @@ class ReliableQueue(Generic[MsgType]):
             self.last_stream_id = ">"
             return self.pop()
 
-        # Extract message ID and data
-        message_id = stream_item[0][0]
-        message_data = stream_item[0][1]
+        if len(stream_item) == 0:
+            # No message found in the pending/regular queue for this reader.
+            # Try to autoclaim a message
+            stream_item = self._autoclaim(1)
+            if len(stream_item) == 0:
+                return None
 
-        # Create and parse protobuf message
-        msg = self.msg_builder()
-        msg.ParseFromString(message_data[self.INAME])
+        return self._to_rq_item(stream_item[0])
 
-        return RQItem[MsgType](item_id=message_id, deserialized=msg)
+    @_ensure_group_name
+    def pop_batch(self, n: int) -> list[RQItem[MsgType]]:
+        """Pop up to `n` items at once.
+
+        New (or, if `last_stream_id` is not `>`, pending) items are read with a
+        single XREADGROUP, and if fewer than `n` were returned the remainder is
+        filled with a single XAUTOCLAIM of timed out items. Every returned item
+        must be acknowledged with `ack_item`/`ack_batch` once processed.
+        """
+        if n <= 0:
+            raise ValueError("n must be greater than 0")
+
+        stream_items = self._read_group(n)
+        if len(stream_items) == 0 and self.last_stream_id != ">":
+            # Same as in `pop`: no pending items left for this reader, switch
+            # to new messages
+            self.last_stream_id = ">"
+            stream_items = self._read_group(n)
+
+        if len(stream_items) < n:
+            # With a short task timeout, the items just read may already be
+            # eligible for autoclaiming; don't return them twice
+            read_ids = {stream_item[0] for stream_item in stream_items}
+            stream_items.extend(
+                stream_item for stream_item in self._autoclaim(n - len(stream_items)) if stream_item[0] not in read_ids
+            )
+
+        return [self._to_rq_item(stream_item) for stream_item in stream_items]
 
     @_ensure_group_name
     def ack_item(self, item_id: str) -> None:
         self.redis.xack(self.queue_name, self.group_name, item_id)
 
+    @_ensure_group_name
+    def ack_batch(self, item_ids: Sequence[str]) -> None:
+        """Acknowledge several items with a single XACK."""
+        if len(item_ids) == 0:
+            return
+
+        self.redis.xack(self.queue_name, self.group_name, *item_ids)
+
     @_ensure_group_name
     def times_delivered(self, item_id: str) -> int:
         pending = self.redis.xpending_range(self.queue_name, self.group_name, item_id, item_id, count=1)
@@ -273,6 +356,151 @@ class ReliableQueue(Generic[MsgType]):
         self.redis.xclaim(self.queue_name, self.group_name, self.reader_name, min_idle_time, [item_id])
 
 
+@dataclass
+class AsyncReliableQueue(Generic[MsgType]):
+    """
+    Asyncio counterpart of `ReliableQueue`.
+
+    It uses the same stream and consumer group layout, so sync and async
+    producers/consumers can be mixed on the same queue. Since the consumer group
+    cannot be created from the constructor, it is created on the first
+    operation that needs it.
+    """
+
+    redis: AsyncRedis
+    queue_name: str
+    msg_builder: Type[MsgType]
+    group_name: str | None = None
+    task_timeout_ms: int = 180000
+    reader_name: str | None = None
+    last_stream_id: str | None = ">"
+    block_time: int | None = 200
+
+    INAME = b"item"
+
+    _group_created: bool = field(init=False, default=False, repr=False)
+
+    def __post_init__(self) -> None:
+        if self.reader_name is None:
+            self.reader_name = f"rqueue_{str(uuid.uuid4())}"
+
+    async def _ensure_group(self) -> None:
+        if self.group_name is None:
+            raise ValueError("group_name must be set for this operation")
+
+        if self._group_created:
+            return
+
+        try:
+            await self.redis.xgroup_create(self.queue_name, self.group_name, mkstream=True, id="0")
+        except RedisError as e:
+            # Group may already exist
+            if "BUSYGROUP Consumer Group name already exists" not in str(e):
+                # Try again on the next operation
+                logger.exception("Failed to create consumer group %s for queue %s", self.group_name, self.queue_name)
+                return
+
+        self._group_created = True
+
+    def _to_rq_item(self, stream_item: tuple[Any, dict]) -> RQItem[MsgType]:
+        message_id, message_data = stream_item[0], stream_item[1]
+        msg = self.msg_builder()
+        msg.ParseFromString(message_data[self.INAME])
+        return RQItem[MsgType](item_id=message_id, deserialized=msg)
+
+    async def size(self) -> int:
+        return await self.redis.xlen(self.queue_name)
+
+    async def push(self, item: MsgType) -> None:
+        await self.redis.xadd(self.queue_name, {self.INAME: item.SerializeToString()})
+
+    async def push_many(self, items: Sequence[MsgType]) -> None:
+        """Push several items in a single round trip (pipelined XADDs)."""
+        if len(items) == 0:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for item in items:
+                pipe.xadd(self.queue_name, {self.INAME: item.SerializeToString()})
+            await pipe.execute()
+
+    async def _read_group(self, count: int) -> list:
+        streams_items = await self.redis.xreadgroup(
+            self.group_name,
+            self.reader_name,
+            {self.queue_name: self.last_stream_id},
+            block=self.block_time,
+            count=count,
+        )
+        if streams_items is None or len(streams_items) == 0:
+            return []
+
+        return list(streams_items[0][1])
+
+    async def _autoclaim(self, count: int) -> list:
+        res = await self.redis.xautoclaim(
+            self.queue_name,
+            self.group_name,
+            self.reader_name,
+            min_idle_time=self.task_timeout_ms,
+            count=count,
+        )
+        if res is None or len(res[1]) == 0:
+            return []
+
+        return list(res[1])
+
+    async def pop(self) -> RQItem[MsgType] | None:
+        items = await self.pop_batch(1)
+        return items[0] if items else None
+
+    async def pop_batch(self, n: int) -> list[RQItem[MsgType]]:
+        """Pop up to `n` items at once, see `ReliableQueue.pop_batch`."""
+        if n <= 0:
+            raise ValueError("n must be greater than 0")
+
+        await self._ensure_group()
+        stream_items = await self._read_group(n)
+        if len(stream_items) == 0 and self.last_stream_id != ">":
+            # No pending items left for this reader, switch to new messages
+            self.last_stream_id = ">"
+            stream_items = await self._read_group(n)
+
+        if len(stream_items) < n:
+            read_ids = {stream_item[0] for stream_item in stream_items}
+            stream_items.extend(
+                stream_item
+                for stream_item in await self._autoclaim(n - len(stream_items))
+                if stream_item[0] not in read_ids
+            )
+
+        return [self._to_rq_item(stream_item) for stream_item in stream_items]
+
+    async def ack_item(self, item_id: str) -> None:
+        await self._ensure_group()
+        await self.redis.xack(self.queue_name, self.group_name, item_id)
+
+    async def ack_batch(self, item_ids: Sequence[str]) -> None:
+        """Acknowledge several items with a single XACK."""
+        await self._ensure_group()
+        if len(item_ids) == 0:
+            return
+
+        await self.redis.xack(self.queue_name, self.group_name, *item_ids)
+
+    async def times_delivered(self, item_id: str) -> int:
+        await self._ensure_group()
+        pending = await self.redis.xpending_range(self.queue_name, self.group_name, item_id, item_id, count=1)
+        if pending is None or len(pending) == 0:
+            return 0
+
+        return pending[0][TIMES_DELIVERED_FIELD]
+
+    async def claim_item(self, item_id: str, min_idle_time: int = 0) -> None:
+        await self._ensure_group()
+        await self.redis.xclaim(self.queue_name, self.group_name, self.reader_name, min_idle_time, [item_id])
+
+
 @dataclass
 class QueueConfig:
     queue_name: QueueNames
@@ -281,93 +509,95 @@ class QueueConfig:
     group_names: list[GroupNames] = field(default_factory=list)
 
 
+def _default_queue_config() -> dict[QueueNames, QueueConfig]:
+    return {
+        QueueNames.BUILD: QueueConfig(
+            QueueNames.BUILD,
+            BuildRequest,
+            BUILD_TASK_TIMEOUT_MS,
+            [GroupNames.BUILDER_BOT],
+        ),
+        QueueNames.BUILD_OUTPUT: QueueConfig(
+            QueueNames.BUILD_OUTPUT,
+            BuildOutput,
+            BUILD_OUTPUT_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.DOWNLOAD_TASKS: QueueConfig(
+            QueueNames.DOWNLOAD_TASKS,
+            TaskDownload,
+            DOWNLOAD_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.READY_TASKS: QueueConfig(
+            QueueNames.READY_TASKS,
+            TaskReady,
+            READY_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.CRASH: QueueConfig(
+            QueueNames.CRASH,
+            Crash,
+            CRASH_TASK_TIMEOUT_MS,
+            [GroupNames.TRACER_BOT],
+        ),
+        QueueNames.TRACED_VULNERABILITIES: QueueConfig(
+            QueueNames.TRACED_VULNERABILITIES,
+            TracedCrash,
+            TRACED_VULNERABILITIES_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.CONFIRMED_VULNERABILITIES: QueueConfig(
+            QueueNames.CONFIRMED_VULNERABILITIES,
+            ConfirmedVulnerability,
+            CONFIRMED_VULNERABILITIES_TASK_TIMEOUT_MS,
+            [GroupNames.PATCHER],
+        ),
+        QueueNames.DELETE_TASK: QueueConfig(
+            QueueNames.DELETE_TASK,
+            TaskDelete,
+            DELETE_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.PATCHES: QueueConfig(
+            QueueNames.PATCHES,
+            Patch,
+            PATCH_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.INDEX: QueueConfig(
+            QueueNames.INDEX,
+            IndexRequest,
+            INDEX_TASK_TIMEOUT_MS,
+            [GroupNames.INDEX],
+        ),
+        QueueNames.INDEX_OUTPUT: QueueConfig(
+            QueueNames.INDEX_OUTPUT,
+            IndexOutput,
+            INDEX_OUTPUT_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.POV_REPRODUCER_REQUESTS: QueueConfig(
+            QueueNames.POV_REPRODUCER_REQUESTS,
+            POVReproduceRequest,
+            POV_REPRODUCER_REQUESTS_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+        QueueNames.POV_REPRODUCER_RESPONSES: QueueConfig(
+            QueueNames.POV_REPRODUCER_RESPONSES,
+            POVReproduceResponse,
+            POV_REPRODUCER_RESPONSES_TASK_TIMEOUT_MS,
+            [GroupNames.ORCHESTRATOR],
+        ),
+    }
+
+
 @dataclass
 class QueueFactory:
     """Factory for creating common reliable queues"""
 
     redis: Redis
-    _config: dict[QueueNames, QueueConfig] = field(
-        default_factory=lambda: {
-            QueueNames.BUILD: QueueConfig(
-                QueueNames.BUILD,
-                BuildRequest,
-                BUILD_TASK_TIMEOUT_MS,
-                [GroupNames.BUILDER_BOT],
-            ),
-            QueueNames.BUILD_OUTPUT: QueueConfig(
-                QueueNames.BUILD_OUTPUT,
-                BuildOutput,
-                BUILD_OUTPUT_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.DOWNLOAD_TASKS: QueueConfig(
-                QueueNames.DOWNLOAD_TASKS,
-                TaskDownload,
-                DOWNLOAD_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.READY_TASKS: QueueConfig(
-                QueueNames.READY_TASKS,
-                TaskReady,
-                READY_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.CRASH: QueueConfig(
-                QueueNames.CRASH,
-                Crash,
-                CRASH_TASK_TIMEOUT_MS,
-                [GroupNames.TRACER_BOT],
-            ),
-            QueueNames.TRACED_VULNERABILITIES: QueueConfig(
-                QueueNames.TRACED_VULNERABILITIES,
-                TracedCrash,
-                TRACED_VULNERABILITIES_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.CONFIRMED_VULNERABILITIES: QueueConfig(
-                QueueNames.CONFIRMED_VULNERABILITIES,
-                ConfirmedVulnerability,
-                CONFIRMED_VULNERABILITIES_TASK_TIMEOUT_MS,
-                [GroupNames.PATCHER],
-            ),
-            QueueNames.DELETE_TASK: QueueConfig(
-                QueueNames.DELETE_TASK,
-                TaskDelete,
-                DELETE_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.PATCHES: QueueConfig(
-                QueueNames.PATCHES,
-                Patch,
-                PATCH_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.INDEX: QueueConfig(
-                QueueNames.INDEX,
-                IndexRequest,
-                INDEX_TASK_TIMEOUT_MS,
-                [GroupNames.INDEX],
-            ),
-            QueueNames.INDEX_OUTPUT: QueueConfig(
-                QueueNames.INDEX_OUTPUT,
-                IndexOutput,
-                INDEX_OUTPUT_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.POV_REPRODUCER_REQUESTS: QueueConfig(
-                QueueNames.POV_REPRODUCER_REQUESTS,
-                POVReproduceRequest,
-                POV_REPRODUCER_REQUESTS_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-            QueueNames.POV_REPRODUCER_RESPONSES: QueueConfig(
-                QueueNames.POV_REPRODUCER_RESPONSES,
-                POVReproduceResponse,
-                POV_REPRODUCER_RESPONSES_TASK_TIMEOUT_MS,
-                [GroupNames.ORCHESTRATOR],
-            ),
-        }
-    )
+    _config: dict[QueueNames, QueueConfig] = field(default_factory=_default_queue_config)
 
     @overload
     def create(
@@ -437,24 +667,47 @@ class QueueFactory:
     def create(
         self, queue_name: QueueNames, group_name: GroupNames | None = None, **kwargs: Any
     ) -> ReliableQueue[MsgType]:
-        if queue_name not in self._config:
-            raise ValueError(f"Invalid queue name: {queue_name}")
-
-        config = self._config[queue_name]
-        queue_args = {
-            "redis": self.redis,
-            "queue_name": config.queue_name,
-            "msg_builder": config.msg_builder,
-            "task_timeout_ms": config.task_timeout_ms,
-        }
-        if group_name is not None:
-            if group_name not in config.group_names:
-                raise ValueError(f"Invalid group name: {group_name}")
-
-            queue_args["group_name"] = group_name
-
-        queue_args.update(kwargs)
-        return ReliableQueue(**queue_args)
+        return ReliableQueue(**_queue_args(self._config, self.redis, queue_name, group_name, **kwargs))
+
+
+@dataclass
+class AsyncQueueFactory:
+    """Factory for creating common reliable queues backed by redis.asyncio"""
+
+    redis: AsyncRedis
+    _config: dict[QueueNames, QueueConfig] = field(default_factory=_default_queue_config)
+
+    def create(
+        self, queue_name: QueueNames, group_name: GroupNames | None = None, **kwargs: Any
+    ) -> AsyncReliableQueue[MsgType]:
+        return AsyncReliableQueue(**_queue_args(self._config, self.redis, queue_name, group_name, **kwargs))
+
+
+def _queue_args(
+    config: dict[QueueNames, QueueConfig],
+    redis: Redis | AsyncRedis,
+    queue_name: QueueNames,
+    group_name: GroupNames | None,
+    **kwargs: Any,
+) -> dict[str, Any]:
+    if queue_name not in config:
+        raise ValueError(f"Invalid queue name: {queue_name}")
+
+    queue_config = config[queue_name]
+    queue_args = {
+        "redis": redis,
+        "queue_name": queue_config.queue_name,
+        "msg_builder": queue_config.msg_builder,
+        "task_timeout_ms": queue_config.task_timeout_ms,
+    }
+    if group_name is not None:
+        if group_name not in queue_config.group_names:
+            raise ValueError(f"Invalid group name: {group_name}")
+
+        queue_args["group_name"] = group_name
+
+    queue_args.update(kwargs)
+    return queue_args
 
 
 @dataclass
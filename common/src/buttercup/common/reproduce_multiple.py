@@ -21,7 +21,7 @@ class ReproduceMultiple:
             cache = []
             for build in self.build_outputs:
                 task = ChallengeTask(read_only_task_dir=build.task_dir)
-                cpy = stack.enter_context(task.get_rw_copy(self.wdir))
+                cpy = stack.enter_context(task.get_rw_view(self.wdir))
                 cache.append(cpy)
             copied_mult = ReproduceMultiple(self.wdir, self.build_outputs, cache)
             try:
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple, cast
 from pydantic import BaseModel, Field
 from redis import Redis
 
+from buttercup.common.sets import RedisSet
+
 
 class SARIFBroadcastDetail(BaseModel):
     """Model for SARIF broadcast details, matches the model in types.py"""
@@ -18,7 +20,12 @@ class SARIFBroadcastDetail(BaseModel):
 
 
 class SARIFStore:
-    """Store and retrieve SARIF objects in Redis"""
+    """Store and retrieve SARIF objects in Redis
+
+    The SARIFs of each task are decoded once per process: a version counter, incremented whenever the SARIFs of the
+    task change, tells when the decoded ones must be fetched again. The returned SARIFs are shared between the callers
+    and must not be modified.
+    """
 
     def __init__(self, redis: Redis):
         """
@@ -29,6 +36,14 @@ class SARIFStore:
         """
         self.redis = redis
         self.key_prefix = "sarif:"
+        self.version_key_prefix = "sarif_version:"
+        # Tasks having SARIFs, so that they can be listed without scanning the keys
+        self.tasks = RedisSet(redis, "sarif_tasks")
+        # Set once the tasks stored before the registry existed have been added to it
+        self.tasks_registered_key = "sarif_tasks_registered"
+        self._tasks_registered = False
+        # Redis key -> (version, decoded SARIFs)
+        self._cache: Dict[str, Tuple[bytes | None, List[SARIFBroadcastDetail]]] = {}
 
     def _get_key(self, task_id: str) -> str:
         """
@@ -42,19 +57,8 @@ class SARIFStore:
         """
         return f"{self.key_prefix}{task_id.lower()}"
 
-    def _decode_key(self, key) -> str:
-        """
-        Decode a Redis key if it's bytes, otherwise return as is.
-
-        Args:
-            key: Redis key, either bytes or string
-
-        Returns:
-            Decoded key as string
-        """
-        if isinstance(key, bytes):
-            return key.decode("utf-8")
-        return key
+    def _get_version_key(self, task_id: str) -> str:
+        return f"{self.version_key_prefix}{task_id.lower()}"
 
     def store(self, sarif_detail: SARIFBroadcastDetail) -> None:
         """
@@ -71,7 +75,29 @@ class SARIFStore:
         sarif_json = sarif_detail.model_dump_json()
 
         # Add to the list for this task
-        self.redis.rpush(key, sarif_json)
+        with self.redis.pipeline() as pipe:
+            pipe.rpush(key, sarif_json)
+            pipe.incr(self._get_version_key(task_id))
+            pipe.sadd(self.tasks.set_name, task_id.lower())
+            pipe.execute()
+
+    def _register_stored_tasks(self) -> None:
+        """
+        Add the tasks whose SARIFs were stored before the task registry existed to it. The keys are only scanned
+        until one process completed the registration, which is idempotent and can safely run concurrently.
+        """
+        if self._tasks_registered:
+            return
+
+        if not self.redis.exists(self.tasks_registered_key):
+            task_ids = []
+            for key in self.redis.scan_iter(match=f"{self.key_prefix}*"):
+                key = key.decode("utf-8") if isinstance(key, bytes) else key
+                task_ids.append(key[len(self.key_prefix) :])
+            self.tasks.add_many(task_ids)
+            self.redis.set(self.tasks_registered_key, "1")
+
+        self._tasks_registered = True
 
     def get_all(self) -> List[SARIFBroadcastDetail]:
         """
@@ -80,20 +106,16 @@ class SARIFStore:
         Returns:
             List of SARIF broadcast details
         """
-        # Get all SARIF keys in Redis
-        all_keys = self.redis.keys(f"{self.key_prefix}*")
+        self._register_stored_tasks()
+        task_ids = list(self.tasks)
+        # The tasks deleted by other processes are not cached anymore
+        keys = {self._get_key(task_id) for task_id in task_ids}
+        for key in [key for key in self._cache if key not in keys]:
+            del self._cache[key]
 
         result = []
-        for key in all_keys:
-            # Decode the key if it's bytes
-            decoded_key = self._decode_key(key)
-
-            # Get all SARIF objects for this task
-            sarif_list = self.redis.lrange(decoded_key, 0, -1)
-            for sarif_json in sarif_list:
-                # Parse each JSON string into a SARIFBroadcastDetail
-                sarif_detail = SARIFBroadcastDetail.model_validate_json(sarif_json)
-                result.append(sarif_detail)
+        for task_id in task_ids:
+            result.extend(self.get_by_task_id(task_id))
 
         return result
 
@@ -108,14 +130,36 @@ class SARIFStore:
             List of SARIF broadcast details for this task
         """
         key = self._get_key(task_id)
+        version_key = self._get_version_key(task_id)
+        version = cast(bytes | None, self.redis.get(version_key))
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+
+        # The list is read after the version: a concurrent change may be cached under the older version, and is then
+        # only fetched again, but an older list is never cached under a newer version
         sarif_list = self.redis.lrange(key, 0, -1)
-
         result = []
         for sarif_json in sarif_list:
             sarif_detail = SARIFBroadcastDetail.model_validate_json(sarif_json)
             result.append(sarif_detail)
 
-        return result
+        self._cache[key] = (version, result)
+        return list(result)
+
+    def get_versions(self, task_ids: List[str]) -> List[bytes | None]:
+        """
+        Retrieve the version of the SARIFs of some tasks, which changes whenever SARIFs are stored or deleted.
+
+        Args:
+            task_ids: Task IDs
+
+        Returns:
+            Version of each task, None for the tasks that never had SARIFs
+        """
+        if not task_ids:
+            return []
+        return cast(List[bytes | None], self.redis.mget([self._get_version_key(task_id) for task_id in task_ids]))
 
     def delete_by_task_id(self, task_id: str) -> int:
         """
@@ -128,4 +172,10 @@ class SARIFStore:
             Number of removed keys (0 or 1)
         """
         key = self._get_key(task_id)
-        return self.redis.delete(key)
+        self._cache.pop(key, None)
+        with self.redis.pipeline() as pipe:
+            pipe.delete(key)
+            pipe.incr(self._get_version_key(task_id))
+            pipe.srem(self.tasks.set_name, task_id.lower())
+            deleted, _, _ = pipe.execute()
+        return int(deleted)
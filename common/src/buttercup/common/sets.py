@@ -1,10 +1,11 @@
-from typing import Iterator
+from typing import Callable, Iterable, Iterator
 from redis import Redis
-from redis.exceptions import ResponseError
+from redis.client import Pipeline
+from redis.exceptions import ResponseError, WatchError
 from bson.json_util import dumps, CANONICAL_JSON_OPTIONS
 from contextlib import contextmanager
-import random
 import json
+import uuid
 from functools import lru_cache
 
 # Import POVReproduceRequest for the refactored PoVReproduceStatus
@@ -12,6 +13,8 @@ from buttercup.common.datastructures.msg_pb2 import POVReproduceRequest, POVRepr
 
 MERGED_CORPUS_SET_NAME = "merged_corpus_set"
 MERGED_CORPUS_SET_LOCK_NAME = "merged_corpus_set_lock"
+COVERAGE_PROCESSED_SET_NAME = "coverage_processed_set"
+COVERAGE_LOCK_NAME = "coverage_lock"
 
 
 class RedisSet:
@@ -30,6 +33,19 @@ class RedisSet:
     def contains(self, value: str) -> bool:
         return self.redis.sismember(self.set_name, value)
 
+    # Returns the number of values that were not already in the set
+    def add_many(self, values: Iterable[str]) -> int:
+        values = list(values)
+        if not values:
+            return 0
+        return self.redis.sadd(self.set_name, *values)
+
+    # Membership of each value, checked in a single round trip
+    def contains_many(self, values: list[str]) -> list[bool]:
+        if not values:
+            return []
+        return [bool(member) for member in self.redis.smismember(self.set_name, values)]
+
     def __iter__(self) -> Iterator[str]:
         try:
             for member in self.redis.smembers(self.set_name):
@@ -50,6 +66,15 @@ class MergedCorpusSet(RedisSet):
         super().__init__(redis, self.set_name)
 
 
+# The corpus inputs of a harness whose coverage has already been collected.
+# Shared by all the coverage bots, so that each input is only executed once.
+class CoverageProcessedSet(RedisSet):
+    def __init__(self, redis: Redis, task_id: str, harness_name: str):
+        self.redis = redis
+        self.set_name = dumps([task_id, COVERAGE_PROCESSED_SET_NAME, harness_name], json_options=CANONICAL_JSON_OPTIONS)
+        super().__init__(redis, self.set_name)
+
+
 class FailedToAcquireLock(Exception):
     pass
 
@@ -59,18 +84,43 @@ class RedisLock:
         self.redis = redis
         self.key = key
         self.lock_timeout_seconds = lock_timeout_seconds
+        # Identifies this holder of the lock, so that a lock that expired and was acquired by someone else
+        # is neither extended nor released
+        self.token = uuid.uuid4().hex
 
     @contextmanager
     def acquire(self):
-        if not self.redis.set(self.key, "1", ex=self.lock_timeout_seconds, nx=True):
+        if not self.redis.set(self.key, self.token, ex=self.lock_timeout_seconds, nx=True):
             raise FailedToAcquireLock()
         try:
             yield
         finally:
             self._release()
 
+    def _if_owned(self, update: Callable[[Pipeline], object]) -> bool:
+        """Run `update` in a transaction if the lock is still held by us, returns whether it ran."""
+        with self.redis.pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) not in (self.token.encode(), self.token):
+                    return False
+                pipe.multi()
+                update(pipe)
+                pipe.execute()
+                return True
+            except WatchError:
+                # The lock changed hands in the meantime
+                return False
+
+    def extend(self) -> bool:
+        """
+        Reset the expiration of the lock, so that long operations can check that they still hold it before
+        writing their results. Returns False if the lock expired (and may be held by someone else).
+        """
+        return self._if_owned(lambda pipe: pipe.expire(self.key, self.lock_timeout_seconds))
+
     def _release(self):
-        self.redis.delete(self.key)
+        self._if_owned(lambda pipe: pipe.delete(self.key))
 
 
 # We give it roughly a fuzzing cycle to finish up 15 mins
@@ -84,10 +134,23 @@ class MergedCorpusSetLock(RedisLock):
         super().__init__(redis, self.set_name, lock_timeout_seconds)
 
 
+# Coverage runs only execute the new inputs of a corpus, but can still take a while on large corpora
+COVERAGE_LOCK_TIMEOUT_SECONDS = 30 * 60
+
+
+# Serializes the coverage runs of a harness, which update its accumulated profile
+class CoverageLock(RedisLock):
+    def __init__(self, redis: Redis, task_id: str, harness_name: str, lock_timeout_seconds: int = 10):
+        self.redis = redis
+        self.set_name = dumps([task_id, COVERAGE_LOCK_NAME, harness_name], json_options=CANONICAL_JSON_OPTIONS)
+        super().__init__(redis, self.set_name, lock_timeout_seconds)
+
+
 POV_REPRODUCE_PENDING_SET_NAME = "pov_reproduce_pending"
 POV_REPRODUCE_MITIGATED_SET_NAME = "pov_reproduce_mitigated"
 POV_REPRODUCE_NON_MITIGATED_SET_NAME = "pov_reproduce_non_mitigated"
 POV_REPRODUCE_EXPIRED_SET_NAME = "pov_reproduce_non_expired"
+POV_REPRODUCE_LEASE_PREFIX = "pov_reproduce_lease"
 
 
 class PoVReproduceStatus:
@@ -209,22 +272,10 @@ class PoVReproduceStatus:
         moved_count = self.redis.smove(POV_REPRODUCE_PENDING_SET_NAME, POV_REPRODUCE_EXPIRED_SET_NAME, key)
         return moved_count > 0
 
-    def get_one_pending(self) -> POVReproduceRequest | None:
-        """Get one pending POV reproduction request.
-
-        Returns:
-            POVReproduceRequest if one is available, None otherwise
-        """
-        pending_set = self.redis.smembers(POV_REPRODUCE_PENDING_SET_NAME)
-        if len(pending_set) == 0:
-            return None
-        random_entry = random.choice(list(pending_set))
-
-        # Parse the JSON key back to get the fields
-        key_str = random_entry.decode("utf-8")
-        fields = json.loads(key_str)
+    def _parse_key(self, key: bytes | str) -> POVReproduceRequest:
+        """Reconstruct a POVReproduceRequest from a key made by `_make_key`."""
+        fields = json.loads(key.decode("utf-8") if isinstance(key, bytes) else key)
 
-        # Reconstruct the POVReproduceRequest from the fields
         # The order matches _make_key: [task_id, internal_patch_id, pov_path, sanitizer, harness_name]
         request = POVReproduceRequest()
         request.task_id = fields[0]
@@ -233,3 +284,54 @@ class PoVReproduceStatus:
         request.sanitizer = fields[3]
         request.harness_name = fields[4]
         return request
+
+    def _lease_key(self, key: str) -> str:
+        return f"{POV_REPRODUCE_LEASE_PREFIX}:{key}"
+
+    def get_one_pending(self) -> POVReproduceRequest | None:
+        """Get one pending POV reproduction request.
+
+        Returns:
+            POVReproduceRequest if one is available, None otherwise
+        """
+        random_entry = self.redis.srandmember(POV_REPRODUCE_PENDING_SET_NAME)
+        if not isinstance(random_entry, (bytes, str)):
+            return None
+        return self._parse_key(random_entry)
+
+    def claim_pending(self, count: int, lease_seconds: int) -> list[POVReproduceRequest]:
+        """Claim up to `count` random pending requests that no other worker has claimed.
+
+        The requests stay pending until they are marked. A claim is a lease that expires after `lease_seconds`, so that
+        the requests claimed by a worker that died are eventually claimed by another one. Use `release` to give the
+        requests back earlier.
+
+        Args:
+            count: Maximum number of requests to claim
+            lease_seconds: Duration of the claim
+
+        Returns:
+            The claimed requests
+        """
+        if count <= 0:
+            return []
+
+        # Sample more candidates than needed, some of them may be claimed by other workers
+        candidates = self.redis.srandmember(POV_REPRODUCE_PENDING_SET_NAME, 2 * count)
+        if not isinstance(candidates, list) or not candidates:
+            return []
+
+        pipeline = self.redis.pipeline()
+        for candidate in candidates:
+            pipeline.set(self._lease_key(candidate.decode("utf-8")), "1", ex=lease_seconds, nx=True)
+        acquired = [candidate for candidate, ok in zip(candidates, pipeline.execute()) if ok]
+
+        claimed, extra = acquired[:count], acquired[count:]
+        if extra:
+            self.redis.delete(*[self._lease_key(candidate.decode("utf-8")) for candidate in extra])
+        return [self._parse_key(candidate) for candidate in claimed]
+
+    def release(self, requests: list[POVReproduceRequest]) -> None:
+        """Release the claims on requests returned by `claim_pending`."""
+        if requests:
+            self.redis.delete(*[self._lease_key(self._make_key(request)) for request in requests])
@@ -1,12 +1,17 @@
 import re
+from functools import lru_cache
 from buttercup.common.clusterfuzz_parser import StackParser, CrashInfo
 import logging
 from buttercup.common.sets import RedisSet
+from buttercup.common.maps import harness_key
 from redis import Redis
 from bson.json_util import dumps, CANONICAL_JSON_OPTIONS
 
 logger = logging.getLogger(__name__)
 
+# Number of distinct crashes found by each harness, keyed by `harness_key`
+CRASH_COUNTS_MAP_NAME = "crash_counts"
+
 
 class CrashSet:
     def __init__(self, redis: Redis):
@@ -24,16 +29,36 @@ class CrashSet:
         key = dumps(
             [project, harness_name, task_id, sanitizer, crash_data, inst_key], json_options=CANONICAL_JSON_OPTIONS
         )
-        return self.set.add(key)
+        already_present = self.set.add(key)
+        if not already_present:
+            self.redis.hincrby(CRASH_COUNTS_MAP_NAME, harness_key(project, harness_name, task_id), 1)
+        return already_present
+
+    def crash_counts(self) -> dict[str, int]:
+        """Number of distinct crashes of each harness, keyed by `harness_key`."""
+        return {key.decode("utf-8"): int(count) for key, count in self.redis.hgetall(CRASH_COUNTS_MAP_NAME).items()}
+
+
+# Strip ANSI escape codes from stacktrace as parse_stacktrace doesn't like them
+ANSI_ESCAPE_REGEX = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+INST_KEY_REGEX = re.compile(pattern=r"Instrumented\s(?P<fragment>[A-Za-z0-9\.]*)\s")
+# Max number of parsed stacktraces kept in memory
+PARSE_CACHE_SIZE = 1024
+
+# The parser holds no state between two parses, a single one is shared for each value of `symbolized`
+_PARSERS = {
+    symbolized: StackParser(symbolized=symbolized, detect_ooms_and_hangs=True, detect_v8_runtime_errors=False)
+    for symbolized in (False, True)
+}
 
 
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
 def parse_stacktrace(stacktrace: str, symbolized: bool = False) -> CrashInfo:
-    # Strip ANSI escape codes from stacktrace as parse_stacktrace doesn't like them
-    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-    stacktrace = ansi_escape.sub("", stacktrace)
-    parser = StackParser(symbolized=symbolized, detect_ooms_and_hangs=True, detect_v8_runtime_errors=False)
-    prs = parser.parse(stacktrace)
-    return prs
+    """Parse a stacktrace. Each distinct stacktrace is only parsed once, so the returned CrashInfo is shared between the
+    callers and must not be modified."""
+    if "\x1b" in stacktrace:
+        stacktrace = ANSI_ESCAPE_REGEX.sub("", stacktrace)
+    return _PARSERS[symbolized].parse(stacktrace)
 
 
 def get_crash_data(stacktrace: str, symbolized: bool = False) -> str:
@@ -44,8 +69,7 @@ def get_crash_data(stacktrace: str, symbolized: bool = False) -> str:
 
 def get_inst_key(stacktrace: str) -> str:
     # vendored code from afc-finals/example-crs-architecture
-    inst_pattern = re.compile(pattern=r"Instrumented\s(?P<fragment>[A-Za-z0-9\.]*)\s")
-    matches = inst_pattern.findall(stacktrace)
+    matches = INST_KEY_REGEX.findall(stacktrace)
     return "\n".join(sorted(matches)) if matches else ""
 
 
@@ -5,9 +5,13 @@ import uuid
 
 import openlit
 import opentelemetry.attributes
-from opentelemetry import trace
+from opentelemetry import metrics, trace
+from opentelemetry.metrics import CallbackOptions, Observation
 from opentelemetry.trace import Span, Tracer, Status, StatusCode
 from langchain_core.prompt_values import ChatPromptValue
+from redis import Redis
+
+from buttercup.common.queue_metrics import CachedQueueMetricsSampler, QueueMetricsSampler
 
 # Monkey patch the _clean_attribute function to handle ChatPromptValue
 _clean_attribute_orig = opentelemetry.attributes._clean_attribute
@@ -109,3 +113,78 @@ def log_crs_action_ok(
             span.set_attribute(key, value)
 
         span.set_status(Status(StatusCode.OK))
+
+
+def register_queue_metrics(redis: Redis, sample_max_age: float = 5.0) -> CachedQueueMetricsSampler:
+    """Export depth, lag and redelivery metrics of all the reliable queues.
+
+    The metrics are observable gauges, sampled (at most once every
+    `sample_max_age` seconds) when the meter provider set up by
+    `init_telemetry` collects them. Only one service should register them, to
+    avoid exporting the same values from every pod.
+    """
+    cache = CachedQueueMetricsSampler(QueueMetricsSampler(redis), max_age=sample_max_age)
+    meter = metrics.get_meter(__name__)
+
+    def base_attributes(queue_name: str) -> dict[str, str]:
+        return {"queue.name": queue_name, "crs.instance.id": crs_instance_id}
+
+    def length(_options: CallbackOptions) -> list[Observation]:
+        return [Observation(qs.length, base_attributes(qs.queue_name)) for qs in cache.get()]
+
+    def group_observations(attr: str) -> list[Observation]:
+        return [
+            Observation(getattr(gs, attr), {**base_attributes(qs.queue_name), "queue.group": gs.group_name})
+            for qs in cache.get()
+            for gs in qs.groups
+            if getattr(gs, attr) is not None
+        ]
+
+    def redeliveries(_options: CallbackOptions) -> list[Observation]:
+        return [
+            Observation(
+                count,
+                {**base_attributes(qs.queue_name), "queue.group": gs.group_name, "queue.times_delivered": bucket},
+            )
+            for qs in cache.get()
+            for gs in qs.groups
+            for bucket, count in gs.redeliveries.items()
+        ]
+
+    meter.create_observable_gauge(
+        "buttercup.queue.length",
+        callbacks=[length],
+        unit="{message}",
+        description="Number of entries in the queue stream",
+    )
+    meter.create_observable_gauge(
+        "buttercup.queue.lag",
+        callbacks=[lambda _options: group_observations("lag")],
+        unit="{message}",
+        description="Number of entries not yet delivered to the consumer group",
+    )
+    meter.create_observable_gauge(
+        "buttercup.queue.pending",
+        callbacks=[lambda _options: group_observations("pending")],
+        unit="{message}",
+        description="Number of entries delivered but not yet acknowledged",
+    )
+    meter.create_observable_gauge(
+        "buttercup.queue.consumers",
+        callbacks=[lambda _options: group_observations("consumers")],
+        unit="{consumer}",
+        description="Number of consumers in the consumer group",
+    )
+    meter.create_observable_gauge(
+        "buttercup.queue.oldest_pending_idle",
+        callbacks=[lambda _options: group_observations("oldest_pending_idle_ms")],
+        unit="ms",
+        description="Idle time of the oldest pending entry",
+    )
+    meter.create_observable_gauge(
+        "buttercup.queue.redeliveries",
+        callbacks=[redeliveries],
+        unit="{message}",
+        description="Pending entries by number of deliveries",
+    )
+    return cache
@@ -178,9 +178,11 @@ def main():
             print(build)
         logger.info("Done")
     elif isinstance(command, ReadSubmissionsSettings):
-        # Read submissions from Redis using the same key as the Submissions class
-        SUBMISSIONS_KEY = "submissions"
-        raw_submissions = redis.lrange(SUBMISSIONS_KEY, 0, -1)
+        # Read submissions from Redis using the same keys as the Submissions class
+        SUBMISSION_ENTRIES_KEY = "submission_entries"
+        LEGACY_SUBMISSIONS_KEY = "submissions"
+        stored = {int(i): raw for i, raw in redis.hgetall(SUBMISSION_ENTRIES_KEY).items()}
+        raw_submissions = [stored[i] for i in sorted(stored)] or redis.lrange(LEGACY_SUBMISSIONS_KEY, 0, -1)
 
         if not raw_submissions:
             logger.info("No submissions found")
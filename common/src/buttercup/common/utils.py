@@ -1,8 +1,9 @@
+import asyncio
 import shutil
 import errno
 import logging
 import os
-from typing import Any, Callable
+from typing import Any, Awaitable, Callable, Sequence
 from pathlib import Path
 from os import PathLike
 import time
@@ -32,6 +33,22 @@ def copyanything(src: PathLike, dst: PathLike, **kwargs: Any) -> None:
             raise
 
 
+def link_tree(src: PathLike, dst: PathLike) -> None:
+    """Recreate the directory tree of `src` in `dst`, with hard links to the files of `src`.
+
+    Files that can't be linked, e.g. because `dst` is on another filesystem, are copied.
+    """
+
+    def link_or_copy(src_file: str, dst_file: str) -> str:
+        try:
+            os.link(src_file, dst_file)
+        except OSError:
+            shutil.copy2(src_file, dst_file)
+        return dst_file
+
+    shutil.copytree(src, dst, symlinks=True, copy_function=link_or_copy, dirs_exist_ok=True)
+
+
 def get_diffs(path: Path | None) -> list[Path]:
     """Get all diff files in the given path."""
     if path is None:
@@ -75,6 +92,61 @@ def serve_loop(func: Callable[[], bool], sleep_time: float = 1.0, report_time: f
             time.sleep(sleep_time)
 
 
+async def async_serve_loop(
+    funcs: Sequence[Callable[[], Awaitable[bool]]],
+    sleep_time: float = 1.0,
+    report_time: float = 60.0,
+    timers: Sequence[tuple[float, Callable[[], Awaitable[Any]]]] = (),
+) -> None:
+    """Serve several coroutine functions concurrently in the running event loop.
+
+    Each function in `funcs` gets its own loop with the same semantics as
+    `serve_loop`: it is called again immediately if it did some work, otherwise
+    after `sleep_time` seconds. Functions that wait on a blocking Redis read
+    (e.g. `AsyncReliableQueue.pop` with a `block_time`) therefore wake up as soon
+    as an item is available, without the other queues being polled in between.
+    Each `(interval, func)` pair in `timers` is called every `interval` seconds.
+
+    The loop runs until one of the functions raises, in which case every other
+    loop is cancelled and the exception is propagated.
+    """
+    if sleep_time < 0:
+        raise ValueError("sleep_time must be greater than 0")
+
+    if report_time < 0:
+        raise ValueError("report_time must be greater than 0")
+
+    async def serve(func: Callable[[], Awaitable[bool]]) -> None:
+        while True:
+            did_work = await func()
+            if not did_work:
+                await asyncio.sleep(sleep_time)
+
+    async def timer(interval: float, func: Callable[[], Awaitable[Any]]) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await func()
+
+    async def health_check() -> None:
+        start_time = time.time()
+        while True:
+            signal_alive_health_check()
+            if time.time() - start_time > report_time:
+                logger.info("Sleeping, waiting for inputs")
+                start_time = time.time()
+            await asyncio.sleep(1.0)
+
+    tasks = [asyncio.create_task(health_check())]
+    tasks.extend(asyncio.create_task(serve(func)) for func in funcs)
+    tasks.extend(asyncio.create_task(timer(interval, func)) for interval, func in timers)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
 def setup_periodic_zombie_reaper(interval_seconds=5):
     """Set up a background thread that periodically reaps zombie processes."""
 
@@ -3,17 +3,19 @@ import pytest
 
 def pytest_addoption(parser):
     parser.addoption("--runintegration", action="store_true", default=False, help="run integration tests")
+    parser.addoption("--runbenchmark", action="store_true", default=False, help="run benchmarks")
 
 
 def pytest_configure(config):
     config.addinivalue_line("markers", "integration: mark test as an integration test")
+    config.addinivalue_line("markers", "benchmark: mark test as a benchmark")
 
 
 def pytest_collection_modifyitems(config, items):
-    if config.getoption("--runintegration"):
-        # --runintegration given in cli: do not skip integration tests
-        return
     skip_integration = pytest.mark.skip(reason="need --runintegration option to run")
+    skip_benchmark = pytest.mark.skip(reason="need --runbenchmark option to run")
     for item in items:
-        if "integration" in item.keywords:
+        if "integration" in item.keywords and not config.getoption("--runintegration"):
             item.add_marker(skip_integration)
+        if "benchmark" in item.keywords and not config.getoption("--runbenchmark"):
+            item.add_marker(skip_benchmark)
@@ -0,0 +1,192 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from redis import RedisError
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from google.protobuf.struct_pb2 import Struct
+from buttercup.common.queues import (
+    AsyncReliableQueue,
+    AsyncQueueFactory,
+    ReliableQueue,
+    RQItem,
+    QueueNames,
+    GroupNames,
+    BUILD_TASK_TIMEOUT_MS,
+)
+from buttercup.common.datastructures.msg_pb2 import BuildRequest
+from buttercup.common.utils import async_serve_loop
+
+GROUP_NAME = "test_group"
+QUEUE_NAME = "test_async_queue"
+
+
+@pytest.fixture
+def redis_client():
+    res = Redis(host="localhost", port=6379, db=15)
+    yield res
+    res.flushdb()
+
+
+def _make_queue(redis: AsyncRedis, **kwargs) -> AsyncReliableQueue[Struct]:
+    return AsyncReliableQueue[Struct](
+        redis=redis,
+        queue_name=QUEUE_NAME,
+        group_name=GROUP_NAME,
+        task_timeout_ms=1000,
+        msg_builder=Struct,
+        reader_name="test_reader",
+        block_time=None,
+        **kwargs,
+    )
+
+
+def _msg(value: str) -> Struct:
+    msg = Struct()
+    msg.update({"key": value})
+    return msg
+
+
+def test_async_push_pop(redis_client):
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            queue = _make_queue(redis)
+            assert await queue.pop() is None
+
+            await queue.push(_msg("value_0"))
+            await queue.push_many([_msg("value_1"), _msg("value_2")])
+            assert await queue.size() == 3
+
+            item = await queue.pop()
+            assert isinstance(item, RQItem)
+            assert item.deserialized.fields["key"].string_value == "value_0"
+            assert await queue.times_delivered(item.item_id) == 1
+            await queue.ack_item(item.item_id)
+
+            items = await queue.pop_batch(5)
+            assert [it.deserialized.fields["key"].string_value for it in items] == ["value_1", "value_2"]
+            await queue.ack_batch([it.item_id for it in items])
+            assert await queue.pop() is None
+
+    asyncio.run(run())
+
+
+def test_async_interoperates_with_sync_queue(redis_client):
+    sync_queue = ReliableQueue[Struct](
+        redis=redis_client,
+        queue_name=QUEUE_NAME,
+        msg_builder=Struct,
+    )
+    sync_queue.push(_msg("from_sync"))
+
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            queue = _make_queue(redis)
+            item = await queue.pop()
+            assert item is not None
+            assert item.deserialized.fields["key"].string_value == "from_sync"
+            await queue.ack_item(item.item_id)
+
+    asyncio.run(run())
+
+
+def test_async_queue_requires_group(redis_client):
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            queue = AsyncReliableQueue[Struct](redis=redis, queue_name=QUEUE_NAME, msg_builder=Struct)
+            await queue.push(_msg("value"))
+            with pytest.raises(ValueError):
+                await queue.pop()
+
+    asyncio.run(run())
+
+
+def test_async_queue_retries_failed_group_creation(redis_client):
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            queue = _make_queue(redis)
+            with patch.object(redis, "xgroup_create", side_effect=RedisError("connection reset")):
+                await queue._ensure_group()
+            assert not queue._group_created
+
+            await queue._ensure_group()
+            assert queue._group_created
+            await queue.push(_msg("value"))
+            item = await queue.pop()
+            assert item is not None
+
+    asyncio.run(run())
+
+
+def test_async_queue_factory(redis_client):
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            factory = AsyncQueueFactory(redis)
+            queue = factory.create(QueueNames.BUILD, GroupNames.BUILDER_BOT, block_time=None)
+            assert isinstance(queue, AsyncReliableQueue)
+            assert queue.task_timeout_ms == BUILD_TASK_TIMEOUT_MS
+            assert queue.msg_builder == BuildRequest
+
+            await queue.push(BuildRequest(task_id="test_task_id"))
+            item = await queue.pop()
+            assert item is not None
+            assert item.deserialized.task_id == "test_task_id"
+            await queue.ack_item(item.item_id)
+
+            with pytest.raises(ValueError):
+                factory.create(QueueNames.BUILD, GroupNames.ORCHESTRATOR)
+
+    asyncio.run(run())
+
+
+def test_async_serve_loop_multiplexes_queues(redis_client):
+    seen: list[str] = []
+    ticks: list[int] = []
+
+    class Done(Exception):
+        pass
+
+    async def run():
+        async with AsyncRedis(host="localhost", port=6379, db=15) as redis:
+            queue1 = _make_queue(redis)
+            queue2 = AsyncReliableQueue[Struct](
+                redis=redis,
+                queue_name=QUEUE_NAME + "_2",
+                group_name=GROUP_NAME,
+                msg_builder=Struct,
+                block_time=None,
+            )
+            await queue1.push_many([_msg("q1_a"), _msg("q1_b")])
+            await queue2.push(_msg("q2_a"))
+
+            def make_consumer(queue: AsyncReliableQueue[Struct]):
+                async def consume() -> bool:
+                    item = await queue.pop()
+                    if item is None:
+                        return False
+                    seen.append(item.deserialized.fields["key"].string_value)
+                    await queue.ack_item(item.item_id)
+                    if len(seen) == 3:
+                        raise Done()
+                    return True
+
+                return consume
+
+            async def tick() -> None:
+                ticks.append(1)
+
+            await async_serve_loop(
+                [make_consumer(queue1), make_consumer(queue2)],
+                sleep_time=0.01,
+                timers=[(0.001, tick)],
+            )
+
+    with pytest.raises(Done):
+        asyncio.run(run())
+
+    assert sorted(seen) == ["q1_a", "q1_b", "q2_a"]
+
+
+def test_async_serve_loop_invalid_args():
+    with pytest.raises(ValueError):
+        asyncio.run(async_serve_loop([], sleep_time=-1))
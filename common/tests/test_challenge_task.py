@@ -458,6 +458,35 @@ def test_copy_task(challenge_task_readonly: ChallengeTask, mock_subprocess):
     assert not local_task.task_dir.exists()
 
 
+def test_rw_view(challenge_task_readonly: ChallengeTask, tmp_path: Path):
+    """Test creating writable views of a challenge task sharing a warm copy."""
+    scratch = tmp_path / "scratch"
+    with patch("buttercup.common.node_local.scratch_path", return_value=scratch):
+        with challenge_task_readonly.get_rw_view(tmp_path / "work") as view:
+            assert view.task_dir.parent == tmp_path / "work" / "task-id-challenge-task"
+            assert view.read_only_task_dir == challenge_task_readonly.task_dir
+            view_file = view.get_source_path() / "test.txt"
+            assert view_file.read_text() == "mock test content"
+
+            # The files are links to the warm copy, not to the original task directory
+            [warm_dir] = (scratch / "task-id-challenge-task").iterdir()
+            warm_file = warm_dir / "src" / "my-source" / "test.txt"
+            assert view_file.samefile(warm_file)
+            assert not view_file.samefile(challenge_task_readonly.get_source_path() / "test.txt")
+
+            # New files are only visible in the view
+            (view.get_source_path() / "new.txt").write_text("new")
+            assert not (warm_dir / "src" / "my-source" / "new.txt").exists()
+
+        assert not view.task_dir.exists()
+
+        # The warm copy is reused
+        with challenge_task_readonly.get_rw_view(tmp_path / "work") as other_view:
+            assert (other_view.get_source_path() / "test.txt").samefile(warm_file)
+            assert not (other_view.get_source_path() / "new.txt").exists()
+        assert list((scratch / "task-id-challenge-task").iterdir()) == [warm_dir]
+
+
 def test_commit_task(challenge_task_readonly: ChallengeTask, mock_subprocess):
     """Test committing a challenge task."""
     with patch.object(ChallengeTask, "_check_python_path"):
@@ -1,10 +1,12 @@
 import pytest
+import hashlib
 import os
 import shutil
 import tempfile
 from pathlib import Path
 from unittest.mock import patch
-from buttercup.common.corpus import InputDir, Corpus
+from redis import Redis
+from buttercup.common.corpus import InputDir, Corpus, CorpusManifest, hash_file, link_or_copy
 
 
 @pytest.fixture
@@ -225,3 +227,146 @@ def test_input_dir_copy_corpus_all_files_too_large(temp_dir, mock_node_local):
     # Should return empty list
     assert copied_files == []
     assert input_dir.local_corpus_count() == 0
+
+
+def test_hash_file_matches_sha256(temp_dir):
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    file_path = os.path.join(temp_dir, "big_input")
+    with open(file_path, "wb") as f:
+        f.write(data)
+
+    with open(file_path, "rb") as f:
+        assert hash_file(f) == hashlib.sha256(data).hexdigest()
+
+
+def test_copy_file_is_content_addressed(temp_dir, mock_node_local):
+    """Test that copy_file writes each input once and links it when possible."""
+    input_dir = InputDir(temp_dir, "test_corpus")
+    src_file = os.path.join(temp_dir, "input")
+    with open(src_file, "wb") as f:
+        f.write(b"crashing input")
+
+    dst = input_dir.copy_file(src_file)
+    digest = hashlib.sha256(b"crashing input").hexdigest()
+    assert dst == os.path.join(input_dir.path, digest)
+    assert os.path.samefile(src_file, dst)
+    assert os.path.samefile(src_file, os.path.join(input_dir.remote_path, digest))
+
+    # Copying the same content again does not touch the existing files
+    other_src = os.path.join(temp_dir, "input_copy")
+    shutil.copy(src_file, other_src)
+    assert input_dir.copy_file(other_src) == dst
+    assert os.path.samefile(src_file, dst)
+    assert input_dir.local_corpus_count() == 1
+
+
+def test_link_or_copy_falls_back_to_copy(temp_dir):
+    src_file = os.path.join(temp_dir, "input")
+    with open(src_file, "wb") as f:
+        f.write(b"data")
+
+    dst = os.path.join(temp_dir, "dst")
+    with patch("os.link", side_effect=OSError(18, "Invalid cross-device link")):
+        assert link_or_copy(src_file, dst) is True
+
+    assert not os.path.samefile(src_file, dst)
+    with open(dst, "rb") as f:
+        assert f.read() == b"data"
+
+    assert link_or_copy(src_file, dst) is False
+
+
+@pytest.fixture
+def redis_client():
+    res = Redis(host="localhost", port=6379, db=15)
+    yield res
+    res.flushdb()
+
+
+def _write_remote(corpus: Corpus, data: bytes) -> str:
+    os.makedirs(corpus.remote_path, exist_ok=True)
+    digest = hashlib.sha256(data).hexdigest()
+    with open(os.path.join(corpus.remote_path, digest), "wb") as f:
+        f.write(data)
+    return digest
+
+
+def test_corpus_manifest(redis_client):
+    manifest = CorpusManifest(redis_client, "test_task", "test_harness")
+    assert manifest.last_id() is None
+    assert list(manifest.entries_since()) == []
+
+    with patch("buttercup.common.corpus.MANIFEST_PAGE_SIZE", 2):
+        manifest.add([(f"{i:064x}", i) for i in range(5)])
+        entries = list(manifest.entries_since())
+        assert [(e.hash, e.size) for e in entries] == [(f"{i:064x}", i) for i in range(5)]
+        assert entries[-1].entry_id == manifest.last_id()
+        assert entries[0].timestamp_ms > 0
+
+        assert [e.hash for e in manifest.entries_since(entries[2].entry_id)] == [f"{i:064x}" for i in (3, 4)]
+        assert list(manifest.entries_since(manifest.last_id())) == []
+        assert manifest.hashes() == {f"{i:064x}" for i in range(5)}
+
+
+def test_copy_file_records_remote_inputs(temp_dir, mock_node_local, redis_client):
+    corpus = Corpus(temp_dir, "test_task", "test_harness", redis=redis_client)
+    src_file = os.path.join(temp_dir, "input")
+    with open(src_file, "wb") as f:
+        f.write(b"new input")
+
+    corpus.copy_file(src_file)
+    corpus.copy_file(src_file)
+    entries = list(corpus.manifest.entries_since())
+    assert [(e.hash, e.size) for e in entries] == [(hashlib.sha256(b"new input").hexdigest(), 9)]
+    assert corpus.list_remote_corpus() == [os.path.join(corpus.remote_path, entries[0].hash)]
+
+
+def test_list_remote_corpus_with_manifest(temp_dir, mock_node_local, redis_client):
+    corpus = Corpus(temp_dir, "test_task", "test_harness", redis=redis_client)
+    recorded = _write_remote(corpus, b"recorded input")
+    corpus.manifest.add([(recorded, 14)])
+    # Inputs pushed without being recorded are listed too
+    unrecorded = _write_remote(corpus, b"unrecorded input")
+    assert sorted(corpus.list_remote_corpus()) == sorted(
+        os.path.join(corpus.remote_path, h) for h in (recorded, unrecorded)
+    )
+
+
+def test_sync_from_remote_with_manifest(temp_dir, mock_node_local, redis_client):
+    corpus = Corpus(temp_dir, "test_task", "test_harness", redis=redis_client)
+    old = _write_remote(corpus, b"old input")
+    corpus.manifest.add([(old, 9)])
+
+    # The first sync is a full one, and records the position in the manifest
+    with patch.object(InputDir, "sync_from_remote") as full_sync:
+        corpus.sync_from_remote()
+        full_sync.assert_called_once()
+    assert corpus._read_cursor() == corpus.manifest.last_id()
+
+    # Subsequent syncs only fetch the inputs recorded after the cursor
+    new = _write_remote(corpus, b"new input")
+    missing = "f" * 64
+    corpus.manifest.add([(new, 9), (missing, 1)])
+    with patch.object(InputDir, "sync_from_remote") as full_sync:
+        corpus.sync_from_remote()
+        full_sync.assert_not_called()
+
+    assert sorted(os.listdir(corpus.path)) == [new]
+    with open(os.path.join(corpus.path, new), "rb") as f:
+        assert f.read() == b"new input"
+    assert corpus._read_cursor() == corpus.manifest.last_id()
+
+    # Another corpus object on the same node shares the cursor
+    other = Corpus(temp_dir, "test_task", "test_harness", redis=redis_client)
+    with patch("buttercup.common.corpus.fetch_file") as fetch:
+        other.sync_from_remote()
+        fetch.assert_not_called()
+
+
+def test_sync_specific_files_records_remote_inputs(temp_dir, mock_node_local, redis_client):
+    corpus = Corpus(temp_dir, "test_task", "test_harness", redis=redis_client)
+    digest = _write_remote(corpus, b"merged input")
+    with patch("subprocess.call"):
+        corpus.sync_specific_files_to_remote({digest})
+
+    assert corpus.manifest.hashes() == {digest}
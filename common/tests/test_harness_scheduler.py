@@ -0,0 +1,121 @@
+import pytest
+from redis import Redis
+
+from buttercup.common.datastructures.msg_pb2 import FunctionCoverage, WeightedHarness
+from buttercup.common.harness_scheduler import (
+    HARNESS_SCHEDULE_KEY,
+    SCHEDULE_MAX_AGE_SECONDS,
+    STALE_AFTER_SECONDS,
+    HarnessScheduler,
+    HarnessStats,
+)
+from buttercup.common.maps import CoverageMap, HarnessWeights, harness_key
+from buttercup.common.sets import MergedCorpusSet
+from buttercup.common.stack_parsing import CrashSet
+
+
+@pytest.fixture
+def redis_client():
+    res = Redis(host="localhost", port=6379, db=13)
+    yield res
+    res.flushdb()
+
+
+def _push(redis_client: Redis, harness_name: str, weight: float = 1.0) -> WeightedHarness:
+    harness = WeightedHarness(weight=weight, package_name="pkg", harness_name=harness_name, task_id="task")
+    HarnessWeights(redis_client).push_harness(harness)
+    return harness
+
+
+def _set_coverage(redis_client: Redis, harness_name: str, covered_lines: int) -> None:
+    coverage = FunctionCoverage(
+        function_name="f", function_paths=["a.c"], total_lines=1000, covered_lines=covered_lines
+    )
+    CoverageMap(redis_client, harness_name, "pkg", "task").set_function_coverage(coverage)
+
+
+def _weights(harnesses: list[WeightedHarness]) -> dict[str, float]:
+    return {h.harness_name: h.weight for h in harnesses}
+
+
+def test_list_harnesses_single_call(redis_client):
+    _push(redis_client, "a")
+    _push(redis_client, "b", weight=-1.0)
+    harnesses = HarnessWeights(redis_client).list_harnesses()
+    assert _weights(harnesses) == {"a": 1.0, "b": -1.0}
+    [(key, _)] = [item for item in HarnessWeights(redis_client).mp.items() if item[1].harness_name == "a"]
+    assert key == harness_key("pkg", "a", "task")
+
+
+def test_crash_counts(redis_client, monkeypatch):
+    monkeypatch.setattr("buttercup.common.stack_parsing.get_crash_data", lambda stacktrace: stacktrace)
+    monkeypatch.setattr("buttercup.common.stack_parsing.get_inst_key", lambda stacktrace: "")
+    crash_set = CrashSet(redis_client)
+    assert not crash_set.add("pkg", "a", "task", "address", "crash 1")
+    assert crash_set.add("pkg", "a", "task", "address", "crash 1")
+    assert not crash_set.add("pkg", "a", "task", "address", "crash 2")
+    assert crash_set.crash_counts() == {harness_key("pkg", "a", "task"): 2}
+
+
+def test_update_favors_progress(redis_client):
+    scheduler = HarnessScheduler(redis_client)
+    _push(redis_client, "progressing")
+    _push(redis_client, "stalled")
+    _push(redis_client, "stopped", weight=-1.0)
+    _set_coverage(redis_client, "progressing", 10)
+    _set_coverage(redis_client, "stalled", 10)
+
+    # New harnesses are explored first
+    assert _weights(scheduler.update(now=0)) == {"progressing": 1.0, "stalled": 1.0}
+
+    _set_coverage(redis_client, "progressing", 100)
+    MergedCorpusSet(redis_client, "task", "progressing").add_many(["h1", "h2"])
+    weights = _weights(scheduler.update(now=60))
+    assert weights["progressing"] == pytest.approx(1.0)
+    assert weights["stalled"] == pytest.approx(0.1)
+
+    # Without progress the rates decay, but the relative order is kept
+    weights = _weights(scheduler.update(now=120))
+    assert weights["progressing"] == pytest.approx(1.0)
+    assert weights["stalled"] == pytest.approx(0.1)
+
+
+def test_get_schedule(redis_client):
+    scheduler = HarnessScheduler(redis_client)
+    a = _push(redis_client, "a")
+    _push(redis_client, "b")
+    _push(redis_client, "stopped", weight=-1.0)
+
+    # Without a schedule, the static weights are used
+    assert _weights(scheduler.get_schedule("loop", now=0)) == {"a": 2.0, "b": 2.0}
+
+    redis_client.set(HARNESS_SCHEDULE_KEY, '{"updated_at": 0, "harnesses": [["pkg", "a", "task", 0.5]]}')
+    assert _weights(scheduler.get_schedule("loop", now=0)) == {"a": 1.0}
+
+    # Harnesses that just ran are not boosted
+    scheduler.record_run("loop", a, now=0)
+    assert _weights(scheduler.get_schedule("loop", now=0)) == {"a": 0.5}
+    assert _weights(scheduler.get_schedule("loop", now=STALE_AFTER_SECONDS / 2)) == {"a": 0.75}
+    assert _weights(scheduler.get_schedule("other-loop", now=0)) == {"a": 1.0}
+
+    # Outdated schedules are ignored
+    assert _weights(scheduler.get_schedule("other-loop", now=SCHEDULE_MAX_AGE_SECONDS + 1)) == {"a": 2.0, "b": 2.0}
+
+
+def test_maybe_update(redis_client):
+    scheduler = HarnessScheduler(redis_client)
+    _push(redis_client, "a")
+    assert scheduler.maybe_update()
+    assert not scheduler.maybe_update()
+    assert _weights(scheduler.get_schedule("loop")) == {"a": 2.0}
+
+
+def test_stats_advance():
+    stats = HarnessStats(covered_lines=10, crashes=0, corpus_size=5, updated_at=0)
+    advanced = stats.advance(covered_lines=70, crashes=1, corpus_size=5, now=60)
+    assert advanced.coverage_rate == pytest.approx(0.3 * 60)
+    assert advanced.crash_rate == pytest.approx(0.3)
+    assert advanced.corpus_rate == 0
+    assert HarnessStats.from_list(advanced.to_list()) == advanced
+    # Coverage going down, e.g. after a corpus minimization, is not progress
+    assert advanced.advance(covered_lines=0, crashes=1, corpus_size=5, now=120).coverage_rate < advanced.coverage_rate
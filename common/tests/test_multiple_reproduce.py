@@ -44,14 +44,14 @@ def mock_challenge_task():
             ReproduceResult(command_result=CommandResult(success=True, returncode=0, output=b"SUCCESS", error=None)),
         ]
 
-        mock.get_rw_copy.return_value.__enter__.return_value = task_instance
-        task_instance.get_rw_copy.return_value.__enter__.return_value = task_instance
+        mock.get_rw_view.return_value.__enter__.return_value = task_instance
+        task_instance.get_rw_view.return_value.__enter__.return_value = task_instance
         mock.return_value = task_instance
         yield mock
 
 
 def test_mock_challenge_task(mock_challenge_task):
-    with mock_challenge_task.get_rw_copy() as task:
+    with mock_challenge_task.get_rw_view() as task:
         print(task.reproduce_pov.side_effect)
         assert not task.reproduce_pov("a").command_result.success
 
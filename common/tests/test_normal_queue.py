@@ -0,0 +1,103 @@
+import time
+import pytest
+from redis import Redis
+from google.protobuf.struct_pb2 import Struct
+from buttercup.common.queues import NormalQueue, ReliableQueue, SerializationDeserializationQueue
+
+QUEUE_NAME = "test_normal_queue"
+
+
+@pytest.fixture
+def redis_client():
+    res = Redis(host="localhost", port=6379, db=15)
+    yield res
+    res.flushdb()
+
+
+def _msg(i: int) -> Struct:
+    msg = Struct()
+    msg.update({"key": f"value_{i}"})
+    return msg
+
+
+def test_iter_pages(redis_client, monkeypatch):
+    monkeypatch.setattr(NormalQueue, "ITER_PAGE_SIZE", 3)
+    queue = NormalQueue(QUEUE_NAME, redis_client)
+    assert list(queue) == []
+
+    for i in range(7):
+        queue.push(f"item_{i}".encode())
+
+    # Newest items first, like LRANGE 0 -1
+    assert list(queue) == [f"item_{i}".encode() for i in reversed(range(7))]
+
+
+def test_iter_does_not_fetch_eagerly(redis_client, monkeypatch):
+    monkeypatch.setattr(NormalQueue, "ITER_PAGE_SIZE", 2)
+    queue = SerializationDeserializationQueue(NormalQueue(QUEUE_NAME, redis_client), Struct)
+    for i in range(5):
+        queue.push(_msg(i))
+
+    it = iter(queue)
+    assert next(it).fields["key"].string_value == "value_4"
+    assert [msg.fields["key"].string_value for msg in it] == ["value_3", "value_2", "value_1", "value_0"]
+
+
+def test_pop_and_pop_batch(redis_client, capsys):
+    queue = SerializationDeserializationQueue(NormalQueue(QUEUE_NAME, redis_client), Struct)
+    assert queue.pop() is None
+    assert queue.pop_batch(3) == []
+
+    for i in range(5):
+        queue.push(_msg(i))
+
+    assert queue.pop().fields["key"].string_value == "value_0"
+    assert [msg.fields["key"].string_value for msg in queue.pop_batch(3)] == ["value_1", "value_2", "value_3"]
+    assert [msg.fields["key"].string_value for msg in queue.pop_batch(3)] == ["value_4"]
+
+    # Nothing should be written to stdout
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.benchmark
+def test_benchmark_normal_vs_reliable_queue(redis_client):
+    n = 5000
+    batch = 100
+    messages = [_msg(i) for i in range(n)]
+
+    # Both sides push the messages in one round trip, then consume them in batches. Consuming from the reliable
+    # queue includes acknowledging the items, which the normal queue has no equivalent of.
+    normal_queue = SerializationDeserializationQueue(NormalQueue(QUEUE_NAME, redis_client), Struct)
+    start = time.perf_counter()
+    # Pipeline the pushes, as push_many does for the reliable queue
+    pipe = redis_client.pipeline(transaction=False)
+    pipelined_queue = SerializationDeserializationQueue(NormalQueue(QUEUE_NAME, pipe), Struct)
+    for msg in messages:
+        pipelined_queue.push(msg)
+    pipe.execute()
+    popped = 0
+    while items := normal_queue.pop_batch(batch):
+        popped += len(items)
+    normal_time = time.perf_counter() - start
+    assert popped == n
+
+    reliable_queue = ReliableQueue[Struct](
+        redis=redis_client,
+        queue_name=QUEUE_NAME + "_reliable",
+        group_name="test_group",
+        msg_builder=Struct,
+        block_time=None,
+    )
+    start = time.perf_counter()
+    reliable_queue.push_many(messages)
+    popped = 0
+    while items := reliable_queue.pop_batch(batch):
+        reliable_queue.ack_batch([item.item_id for item in items])
+        popped += len(items)
+    reliable_time = time.perf_counter() - start
+    assert popped == n
+
+    print(
+        f"\nNormalQueue: {n / normal_time:.0f} msg/s, "
+        f"ReliableQueue: {n / reliable_time:.0f} msg/s ({n} messages, batches of {batch})"
+    )
@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import patch
+from redis import Redis
+from google.protobuf.struct_pb2 import Struct
+from opentelemetry.sdk.metrics import MeterProvider
+from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+from buttercup.common.queues import ReliableQueue, QueueFactory, QueueNames, GroupNames
+from buttercup.common.datastructures.msg_pb2 import Crash
+from buttercup.common.queue_metrics import (
+    CachedQueueMetricsSampler,
+    QueueMetricsSampler,
+    redelivery_bucket,
+)
+from buttercup.common.telemetry import register_queue_metrics
+
+QUEUE_NAME = "test_metrics_queue"
+GROUP_NAME = "test_group"
+
+
+@pytest.fixture
+def redis_client():
+    res = Redis(host="localhost", port=6379, db=15)
+    yield res
+    res.flushdb()
+
+
+def _push(redis_client: Redis, n: int) -> ReliableQueue[Struct]:
+    queue = ReliableQueue[Struct](
+        redis=redis_client,
+        queue_name=QUEUE_NAME,
+        group_name=GROUP_NAME,
+        msg_builder=Struct,
+        task_timeout_ms=1,
+        block_time=None,
+    )
+    for i in range(n):
+        msg = Struct()
+        msg.update({"key": f"value_{i}"})
+        queue.push(msg)
+    return queue
+
+
+def test_redelivery_bucket():
+    assert redelivery_bucket(1) == "1"
+    assert redelivery_bucket(3) == "3"
+    assert redelivery_bucket(4) == "5"
+    assert redelivery_bucket(10) == "10"
+    assert redelivery_bucket(11) == ">10"
+
+
+def test_sample_missing_streams(redis_client):
+    sampler = QueueMetricsSampler(redis_client)
+    stats = sampler.sample()
+    assert [qs.queue_name for qs in stats] == [q.value for q in QueueNames]
+    assert all(qs.length == 0 and qs.groups == [] for qs in stats)
+
+
+def test_sample_pending_and_redeliveries(redis_client):
+    queue = _push(redis_client, 4)
+    first = queue.pop()
+    second = queue.pop()
+    assert first is not None and second is not None
+    queue.ack_item(second.item_id)
+
+    # Redeliver the first item to another consumer
+    queue.claim_item(first.item_id)
+    queue.reader_name = "other_reader"
+    queue.claim_item(first.item_id)
+
+    sampler = QueueMetricsSampler(redis_client, queue_names=[QUEUE_NAME, "missing_queue"])
+    stats = sampler.sample()
+    assert len(stats) == 2
+    assert stats[0].queue_name == QUEUE_NAME
+    assert stats[0].length == 4
+    assert len(stats[0].groups) == 1
+
+    group = stats[0].groups[0]
+    assert group.group_name == GROUP_NAME
+    assert group.pending == 1
+    assert group.oldest_pending_idle_ms >= 0
+    assert sum(group.redeliveries.values()) == 1
+    assert "1" not in group.redeliveries
+
+    assert stats[1].length == 0
+    assert stats[1].groups == []
+
+
+def test_cached_sampler(redis_client):
+    sampler = QueueMetricsSampler(redis_client, queue_names=[QUEUE_NAME])
+    cache = CachedQueueMetricsSampler(sampler, max_age=60)
+    with patch.object(sampler, "sample", wraps=sampler.sample) as mock_sample:
+        cache.get()
+        cache.get()
+        assert mock_sample.call_count == 1
+
+
+def test_register_queue_metrics(redis_client):
+    queue = QueueFactory(redis_client).create(QueueNames.CRASH, GroupNames.TRACER_BOT, block_time=None)
+    queue.push(Crash(harness_name="test_harness"))
+    assert queue.pop() is not None
+
+    reader = InMemoryMetricReader()
+    provider = MeterProvider(metric_readers=[reader])
+    with patch("buttercup.common.telemetry.metrics.get_meter", provider.get_meter):
+        register_queue_metrics(redis_client)
+
+    data = reader.get_metrics_data()
+    points = {
+        metric.name: list(metric.data.data_points)
+        for rm in data.resource_metrics
+        for sm in rm.scope_metrics
+        for metric in sm.metrics
+    }
+    lengths = {p.attributes["queue.name"]: p.value for p in points["buttercup.queue.length"]}
+    assert lengths[QueueNames.BUILD.value] == 0
+    assert lengths[QueueNames.CRASH.value] == 1
+
+    pending = {
+        (p.attributes["queue.name"], p.attributes["queue.group"]): p.value for p in points["buttercup.queue.pending"]
+    }
+    assert pending[(QueueNames.CRASH.value, GroupNames.TRACER_BOT.value)] == 1
@@ -343,3 +343,67 @@ def test_times_delivered(reliable_queue, redis_client):
     # Should be delivered twice
     times = queue2.times_delivered(msg_id)
     assert times == 2
+
+
+def test_push_many_pop_batch(reliable_queue):
+    messages = []
+    for i in range(5):
+        msg = Struct()
+        msg.update({"key": f"value_{i}"})
+        messages.append(msg)
+
+    reliable_queue.push_many(messages)
+    assert reliable_queue.size() == 5
+
+    items = reliable_queue.pop_batch(3)
+    assert [item.deserialized.fields["key"].string_value for item in items] == ["value_0", "value_1", "value_2"]
+    reliable_queue.ack_batch([item.item_id for item in items])
+
+    items = reliable_queue.pop_batch(10)
+    assert [item.deserialized.fields["key"].string_value for item in items] == ["value_3", "value_4"]
+    reliable_queue.ack_batch([item.item_id for item in items])
+
+    assert reliable_queue.pop_batch(10) == []
+
+
+def test_pop_batch_autoclaim(reliable_queue, redis_client):
+    messages = []
+    for i in range(3):
+        msg = Struct()
+        msg.update({"key": f"value_{i}"})
+        messages.append(msg)
+    reliable_queue.push_many(messages)
+
+    # Take two items without acking them
+    items = reliable_queue.pop_batch(2)
+    assert len(items) == 2
+
+    queue2 = ReliableQueue[Struct](
+        queue_name=QUEUE_NAME,
+        group_name=GROUP_NAME,
+        redis=redis_client,
+        task_timeout_ms=1,
+        msg_builder=Struct,
+        reader_name="test_reader2",
+        block_time=None,
+    )
+    time.sleep(0.1)
+
+    # The remaining new item plus the two timed out ones
+    items = queue2.pop_batch(5)
+    assert sorted(item.deserialized.fields["key"].string_value for item in items) == [
+        "value_0",
+        "value_1",
+        "value_2",
+    ]
+    queue2.ack_batch([item.item_id for item in items])
+    assert queue2.pop_batch(5) == []
+
+
+def test_batch_noops(reliable_queue):
+    reliable_queue.push_many([])
+    assert reliable_queue.size() == 0
+    reliable_queue.ack_batch([])
+
+    with pytest.raises(ValueError):
+        reliable_queue.pop_batch(0)
@@ -14,15 +14,18 @@ def sarif_store(redis_client):
     # Create a SARIFStore instance for testing
     store = SARIFStore(redis_client)
 
+    def cleanup():
+        for key in redis_client.keys(f"{store.key_prefix}*") + redis_client.keys(f"{store.version_key_prefix}*"):
+            redis_client.delete(key)
+        redis_client.delete(store.tasks.set_name, store.tasks_registered_key)
+
     # Clean any existing test data
-    for key in redis_client.keys(f"{store.key_prefix}*"):
-        redis_client.delete(key)
+    cleanup()
 
     yield store
 
     # Clean up after tests
-    for key in redis_client.keys(f"{store.key_prefix}*"):
-        redis_client.delete(key)
+    cleanup()
 
 
 @pytest.fixture
@@ -183,3 +186,67 @@ def test_sarif_store_json_serialization(sarif_store, sample_sarif_detail):
     assert parsed_json["task_id"] == sample_sarif_detail.task_id
     assert parsed_json["metadata"] == sample_sarif_detail.metadata
     assert parsed_json["sarif"] == sample_sarif_detail.sarif
+
+
+def test_sarif_store_decodes_once(sarif_store, sample_sarif_detail, redis_client):
+    """Test that the SARIFs of a task are only decoded again when they change"""
+    sarif_store.store(sample_sarif_detail)
+    first = sarif_store.get_by_task_id(sample_sarif_detail.task_id)
+    second = sarif_store.get_by_task_id(sample_sarif_detail.task_id)
+    assert first == second
+    assert first[0] is second[0]
+
+    # Changes made by another store are seen
+    other_store = SARIFStore(redis_client)
+    other_store.store(sample_sarif_detail.model_copy(update={"sarif_id": "test-sarif-id-2"}))
+    sarifs = sarif_store.get_by_task_id(sample_sarif_detail.task_id)
+    assert [s.sarif_id for s in sarifs] == ["test-sarif-id", "test-sarif-id-2"]
+    assert sarifs[0] is not first[0]
+
+    other_store.delete_by_task_id(sample_sarif_detail.task_id)
+    assert sarif_store.get_by_task_id(sample_sarif_detail.task_id) == []
+    assert sarif_store.get_all() == []
+
+
+def test_sarif_store_get_all_drops_deleted_tasks(sarif_store, sample_sarif_detail, redis_client):
+    """Test that the SARIFs of the tasks deleted by another store are not kept cached"""
+    sarif_store.store(sample_sarif_detail)
+    sarif_store.store(sample_sarif_detail.model_copy(update={"task_id": "other-task"}))
+    assert len(sarif_store.get_all()) == 2
+    assert len(sarif_store._cache) == 2
+
+    assert SARIFStore(redis_client).delete_by_task_id(sample_sarif_detail.task_id) == 1
+    assert [s.task_id for s in sarif_store.get_all()] == ["other-task"]
+    assert list(sarif_store._cache) == [sarif_store._get_key("other-task")]
+
+
+def test_sarif_store_get_all_without_keys(sarif_store, sample_sarif_detail, monkeypatch):
+    """Test that listing the SARIFs doesn't scan the Redis keys once the stored tasks are registered"""
+    sarif_store.store(sample_sarif_detail)
+    assert [s.sarif_id for s in sarif_store.get_all()] == [sample_sarif_detail.sarif_id]
+
+    monkeypatch.setattr(sarif_store.redis, "keys", None)
+    monkeypatch.setattr(sarif_store.redis, "scan_iter", None)
+    assert [s.sarif_id for s in sarif_store.get_all()] == [sample_sarif_detail.sarif_id]
+    assert [s.sarif_id for s in SARIFStore(sarif_store.redis).get_all()] == [sample_sarif_detail.sarif_id]
+
+
+def test_sarif_store_get_all_registers_stored_tasks(sarif_store, sample_sarif_detail, redis_client):
+    """Test that the SARIFs stored before the task registry existed are listed"""
+    redis_client.rpush(sarif_store._get_key("legacy-task"), sample_sarif_detail.model_dump_json())
+    sarif_store.store(sample_sarif_detail)
+
+    assert sorted(s.task_id for s in sarif_store.get_all()) == [sample_sarif_detail.task_id] * 2
+    assert "legacy-task" in set(sarif_store.tasks)
+
+
+def test_sarif_store_versions(sarif_store, sample_sarif_detail):
+    """Test that the version of a task changes with its SARIFs"""
+    task_id = sample_sarif_detail.task_id
+    assert sarif_store.get_versions([task_id, "other-task"]) == [None, None]
+    sarif_store.store(sample_sarif_detail)
+    [version] = sarif_store.get_versions([task_id.upper()])
+    assert version is not None
+    sarif_store.delete_by_task_id(task_id)
+    assert sarif_store.get_versions([task_id]) != [version]
+    assert sarif_store.get_versions([]) == []
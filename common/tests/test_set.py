@@ -1,6 +1,6 @@
 import pytest
 from redis import Redis
-from buttercup.common.sets import RedisSet, PoVReproduceStatus
+from buttercup.common.sets import RedisLock, RedisSet, PoVReproduceStatus
 from buttercup.common.datastructures.msg_pb2 import POVReproduceRequest, POVReproduceResponse
 from unittest.mock import MagicMock
 
@@ -60,6 +60,8 @@ def cleanup_redis(redis_client):
     redis_client.delete("pov_reproduce_mitigated")
     redis_client.delete("pov_reproduce_non_mitigated")
     redis_client.delete("pov_reproduce_non_expired")  # Clean up expired set too
+    for key in redis_client.keys("pov_reproduce_lease:*"):
+        redis_client.delete(key)
 
 
 def test_redis_set_add_and_contains(redis_client):
@@ -127,6 +129,21 @@ def test_redis_set_iteration_and_length(redis_client):
     redis_client.delete("test_set_iter")
 
 
+def test_redis_set_add_many_and_contains_many(redis_client):
+    redis_set = RedisSet(redis_client, "test_set_many")
+
+    assert redis_set.add_many([]) == 0
+    assert redis_set.contains_many([]) == []
+
+    assert redis_set.add_many(["value1", "value2"]) == 2
+    # Only the new value is added
+    assert redis_set.add_many(iter(["value2", "value3"])) == 1
+    assert redis_set.contains_many(["value3", "missing", "value1"]) == [True, False, True]
+
+    # Clean up
+    redis_client.delete("test_set_many")
+
+
 # Tests for PoVReproduceStatus class
 class TestPoVReproduceStatus:
     """Test suite for PoVReproduceStatus class."""
@@ -401,6 +418,35 @@ class TestPoVReproduceStatus:
             assert isinstance(original_result, POVReproduceResponse)
             assert original_result.did_crash is False  # Mitigated
 
+    def test_claim_pending(self, pov_status, sample_params):
+        """Test that claimed requests are not claimed again until released."""
+        requests = []
+        for i in range(5):
+            params = sample_params.copy()
+            params["pov_path"] = f"/path/to/pov{i}.bin"
+            requests.append(_create_request_from_params(params))
+            pov_status.request_status(requests[-1])
+
+        first = pov_status.claim_pending(3, lease_seconds=60)
+        assert len(first) == 3
+        second = pov_status.claim_pending(3, lease_seconds=60)
+        assert {r.pov_path for r in first} | {r.pov_path for r in second} == {r.pov_path for r in requests}
+        assert len(first) + len(second) == 5
+        assert pov_status.claim_pending(3, lease_seconds=60) == []
+
+        # Claimed requests are still pending until they are marked
+        assert pov_status.request_status(first[0]) is None
+        assert pov_status.mark_mitigated(first[0]) is True
+
+        pov_status.release(first)
+        reclaimed = pov_status.claim_pending(5, lease_seconds=60)
+        assert {r.pov_path for r in reclaimed} == {r.pov_path for r in first[1:]}
+
+    def test_claim_pending_empty(self, pov_status):
+        """Test claim_pending when no pending items exist."""
+        assert pov_status.claim_pending(10, lease_seconds=60) == []
+        assert pov_status.claim_pending(0, lease_seconds=60) == []
+
     def test_complete_workflow(self, pov_status, sample_request):
         """Test a complete workflow from request to completion."""
         # Step 1: Initial request should return None (pending)
@@ -895,3 +941,24 @@ class TestPoVReproduceStatusCaching:
         assert isinstance(result3, POVReproduceResponse)
         assert result3.did_crash is False  # Still cached mitigated result
         assert mock_redis.pipeline.call_count == 1  # No new Redis calls
+
+
+def test_redis_lock_extend(redis_client):
+    lock = RedisLock(redis_client, "test_redis_lock", 60)
+    other = RedisLock(redis_client, "test_redis_lock", 60)
+    try:
+        with lock.acquire():
+            redis_client.expire("test_redis_lock", 5)
+            assert lock.extend()
+            assert redis_client.ttl("test_redis_lock") > 5
+            assert not other.extend()
+
+            # The lock expired and was acquired by another holder, which keeps it
+            redis_client.delete("test_redis_lock")
+            with other.acquire():
+                assert not lock.extend()
+                lock._release()
+                assert other.extend()
+        assert not lock.extend()
+    finally:
+        redis_client.delete("test_redis_lock")
@@ -1,5 +1,7 @@
+import time
+
 import pytest
-from buttercup.common.stack_parsing import get_crash_data, get_inst_key
+from buttercup.common.stack_parsing import get_crash_data, get_inst_key, parse_stacktrace
 from pathlib import Path
 
 JAVA_TEST_INST_KEY = "JXPathFuzzer\norg.apache.commons.beanutils.DynaBean\norg.apache.commons.jxpath.CompiledExpression\norg.apache.commons.jxpath.ExpressionContext\norg.apache.commons.jxpath.Function\norg.apache.commons.jxpath.Functions\norg.apache.commons.jxpath.JXPathContext\norg.apache.commons.jxpath.JXPathContextFactory\norg.apache.commons.jxpath.JXPathContextFactoryConfigurationError\norg.apache.commons.jxpath.JXPathException\norg.apache.commons.jxpath.JXPathFunctionNotFoundException\norg.apache.commons.jxpath.JXPathInvalidAccessException\norg.apache.commons.jxpath.JXPathInvalidSyntaxException\norg.apache.commons.jxpath.JXPathNotFoundException\norg.apache.commons.jxpath.JXPathTypeConversionException\norg.apache.commons.jxpath.NodeSet\norg.apache.commons.jxpath.PackageFunctions\norg.apache.commons.jxpath.Pointer\norg.apache.commons.jxpath.Variables\norg.apache.commons.jxpath.ri.Compiler\norg.apache.commons.jxpath.ri.EvalContext\norg.apache.commons.jxpath.ri.InfoSetUtil\norg.apache.commons.jxpath.ri.JXPathContextFactoryReferenceImpl\norg.apache.commons.jxpath.ri.JXPathContextReferenceImpl\norg.apache.commons.jxpath.ri.NamespaceResolver\norg.apache.commons.jxpath.ri.Parser\norg.apache.commons.jxpath.ri.QName\norg.apache.commons.jxpath.ri.axes.AncestorContext\norg.apache.commons.jxpath.ri.axes.AttributeContext\norg.apache.commons.jxpath.ri.axes.ChildContext\norg.apache.commons.jxpath.ri.axes.DescendantContext\norg.apache.commons.jxpath.ri.axes.InitialContext\norg.apache.commons.jxpath.ri.axes.NamespaceContext\norg.apache.commons.jxpath.ri.axes.NodeSetContext\norg.apache.commons.jxpath.ri.axes.ParentContext\norg.apache.commons.jxpath.ri.axes.PrecedingOrFollowingContext\norg.apache.commons.jxpath.ri.axes.PredicateContext\norg.apache.commons.jxpath.ri.axes.RootContext\norg.apache.commons.jxpath.ri.axes.SelfContext\norg.apache.commons.jxpath.ri.axes.UnionContext\norg.apache.commons.jxpath.ri.compiler.Constant\norg.apache.commons.jxpath.ri.compiler.CoreFunction\norg.apache.commons.jxpath.ri.compiler.CoreOperation\norg.apache.commons.jxpath.ri.compiler.CoreOperationGreaterThan\norg.apache.commons.jxpath.ri.compiler.CoreOperationNegate\norg.apache.commons.jxpath.ri.compiler.CoreOperationRelationalExpression\norg.apache.commons.jxpath.ri.compiler.Expression\norg.apache.commons.jxpath.ri.compiler.ExpressionPath\norg.apache.commons.jxpath.ri.compiler.LocationPath\norg.apache.commons.jxpath.ri.compiler.NodeNameTest\norg.apache.commons.jxpath.ri.compiler.NodeTest\norg.apache.commons.jxpath.ri.compiler.NodeTypeTest\norg.apache.commons.jxpath.ri.compiler.Operation\norg.apache.commons.jxpath.ri.compiler.Path\norg.apache.commons.jxpath.ri.compiler.Step\norg.apache.commons.jxpath.ri.compiler.TreeCompiler\norg.apache.commons.jxpath.ri.model.NodeIterator\norg.apache.commons.jxpath.ri.model.NodePointer\norg.apache.commons.jxpath.ri.model.NodePointerFactory\norg.apache.commons.jxpath.ri.model.VariablePointer\norg.apache.commons.jxpath.ri.model.VariablePointerFactory\norg.apache.commons.jxpath.ri.model.beans.BeanPointer\norg.apache.commons.jxpath.ri.model.beans.BeanPointerFactory\norg.apache.commons.jxpath.ri.model.beans.CollectionPointer\norg.apache.commons.jxpath.ri.model.beans.CollectionPointerFactory\norg.apache.commons.jxpath.ri.model.beans.NullPointer\norg.apache.commons.jxpath.ri.model.beans.NullPropertyPointer\norg.apache.commons.jxpath.ri.model.beans.PropertyOwnerPointer\norg.apache.commons.jxpath.ri.model.beans.PropertyPointer\norg.apache.commons.jxpath.ri.model.container.ContainerPointer\norg.apache.commons.jxpath.ri.model.container.ContainerPointerFactory\norg.apache.commons.jxpath.ri.model.dom.DOMNodePointer\norg.apache.commons.jxpath.ri.model.dom.DOMPointerFactory\norg.apache.commons.jxpath.ri.model.dynabeans.DynaBeanPointer\norg.apache.commons.jxpath.ri.model.dynabeans.DynaBeanPointerFactory\norg.apache.commons.jxpath.ri.model.dynamic.DynamicPointer\norg.apache.commons.jxpath.ri.model.dynamic.DynamicPointerFactory\norg.apache.commons.jxpath.ri.model.jdom.JDOMNodePointer\norg.apache.commons.jxpath.ri.model.jdom.JDOMPointerFactory\norg.apache.commons.jxpath.ri.parser.ParseException\norg.apache.commons.jxpath.ri.parser.SimpleCharStream\norg.apache.commons.jxpath.ri.parser.Token\norg.apache.commons.jxpath.ri.parser.TokenMgrError\norg.apache.commons.jxpath.ri.parser.XPathParser\norg.apache.commons.jxpath.ri.parser.XPathParserConstants\norg.apache.commons.jxpath.ri.parser.XPathParserTokenManager\norg.apache.commons.jxpath.util.ClassLoaderUtil\norg.jdom.Comment\norg.jdom.Content\norg.jdom.ContentList\norg.jdom.DocType\norg.jdom.Document\norg.jdom.Element\norg.jdom.IllegalAddException\norg.jdom.Parent\norg.jdom.ProcessingInstruction\norg.w3c.dom.Document\norg.w3c.dom.DocumentType\norg.w3c.dom.Element\norg.w3c.dom.ElementTraversal\norg.w3c.dom.Node\norg.w3c.dom.NodeList\norg.w3c.dom.TypeInfo\norg.w3c.dom.events.DocumentEvent\norg.w3c.dom.events.EventTarget\norg.w3c.dom.ranges.DocumentRange\norg.w3c.dom.traversal.DocumentTraversal\norg.xml.sax.ContentHandler\norg.xml.sax.DTDHandler\norg.xml.sax.EntityResolver\norg.xml.sax.ErrorHandler\norg.xml.sax.InputSource\norg.xml.sax.SAXException\norg.xml.sax.SAXParseException\norg.xml.sax.helpers.DefaultHandler"
@@ -103,3 +105,55 @@ def test_java_instrumentation_key(java_crash_testcase: Path):
     assert inst_key is not None
     assert isinstance(inst_key, str)
     assert inst_key == JAVA_TEST_INST_KEY
+
+
+def test_ubsan_stacktrace():
+    trace = get_tc_file("ubsan").read_text()
+    assert get_crash_data(trace) == "OSS_FUZZ_png_handle_iCCP\nOSS_FUZZ_png_read_info\nlibpng_read_fuzzer.cc\n"
+
+
+def test_parse_stacktrace_cached():
+    stacktrace = """
+    #0 0x7f339b644844 in foo::bar::crash() /src/foo/bar.cc:123:4
+    #1 0x7f339b644900 in main /src/main.cc:45:2
+    """
+    assert parse_stacktrace(stacktrace) is parse_stacktrace(stacktrace)
+    assert parse_stacktrace(stacktrace) is not parse_stacktrace(stacktrace, symbolized=True)
+    # ANSI escape codes are ignored
+    assert parse_stacktrace("\x1b[1m" + stacktrace).crash_state == parse_stacktrace(stacktrace).crash_state
+
+
+def test_assert_and_deadlysignal():
+    assert (
+        get_crash_data(
+            "foo: /src/a/b.c:12: assertion x > 0 failed: value is negative\n"
+            "==1==ERROR: AddressSanitizer: ABRT on unknown address\n"
+            "    #0 0x1 in abort /src/libc.c:1\n"
+        )
+        == "value is negative\n"
+    )
+    # The deadly signal line is split from the frame it is concatenated with
+    stacktrace = (
+        "==1==ERROR: AddressSanitizer: SEGV on unknown address 0x000000000000\n"
+        "    #0 0x1 in foo /src/a.c:1:1\n"
+        "    #1 0x2 in bar /src/a.c:2:1AddressSanitizer:DEADLYSIGNAL\n"
+        "    #2 0x3 in baz /src/a.c:3:1\n"
+    )
+    assert get_crash_data(stacktrace) == "foo\nbar\nbaz\n"
+
+
+@pytest.mark.benchmark
+def test_benchmark_parse_stacktrace():
+    corpus = {name: get_tc_file(name).read_text() for name in ["c", "ubsan", "java"]}
+    for name, trace in corpus.items():
+        parse_stacktrace.cache_clear()
+        start = time.perf_counter()
+        crash_state = parse_stacktrace(trace).crash_state
+        cold = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(1000):
+            assert parse_stacktrace(trace).crash_state == crash_state
+        cached = (time.perf_counter() - start) / 1000
+        print(f"\n{name}: {len(trace)} bytes, first parse {cold * 1000:.2f}ms, cached {cached * 1e6:.2f}us")
+        assert cached < cold
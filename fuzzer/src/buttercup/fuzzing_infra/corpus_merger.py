@@ -1,10 +1,12 @@
 from buttercup.common import node_local
 from buttercup.fuzzing_infra.runner import Runner, Conf, FuzzConfiguration
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
 import os
 from buttercup.common.datastructures.msg_pb2 import BuildType, WeightedHarness
 from buttercup.common.datastructures.aliases import BuildType as BuildTypeHint
-from buttercup.common.corpus import Corpus
+from buttercup.common.corpus import Corpus, link_or_copy
 from buttercup.common.maps import HarnessWeights, BuildMap
 from buttercup.common.utils import serve_loop, setup_periodic_zombie_reaper
 from buttercup.common.logger import setup_package_logger
@@ -15,8 +17,9 @@ from buttercup.common.datastructures.msg_pb2 import BuildOutput
 import logging
 from buttercup.common.challenge_task import ChallengeTask
 from buttercup.fuzzing_infra.settings import FuzzerBotSettings
+from buttercup.fuzzing_infra.merge_features import MergeFeatureCache
 from buttercup.common.sets import MergedCorpusSetLock
-from buttercup.common.constants import ADDRESS_SANITIZER
+from buttercup.common.constants import ADDRESS_SANITIZER, CORPUS_DIR_NAME
 from buttercup.common.sets import FailedToAcquireLock
 from buttercup.common.sets import MERGING_LOCK_TIMEOUT_SECONDS
 from buttercup.common.telemetry import init_telemetry
@@ -24,8 +27,8 @@ from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 from buttercup.common.telemetry import set_crs_attributes, CRSActionCategory
 import datetime
+import hashlib
 import shutil
-from tempfile import TemporaryDirectory
 
 logger = logging.getLogger(__name__)
 
@@ -58,7 +61,7 @@ class FinalCorpus:
             self._push_remotely.clear()
         return n
 
-    def delete_locally(self):
+    def delete_locally(self) -> int:
         """
         Delete the files from local storage.
         """
@@ -81,13 +84,15 @@ class PartitionedCorpus:
     """
 
     corpus: Corpus
-    local_dir: TemporaryDirectory
-    remote_dir: TemporaryDirectory
+    local_dir: str
+    remote_dir: str
     local_only_files: set[str]
     remote_files: set[str]
     max_local_files: int = 500
+    # Remote files that are already in remote_dir and don't need to be copied
+    present_remote_files: set[str] = field(default_factory=set)
 
-    def __post_init__(self):
+    def __post_init__(self) -> None:
         # Shuffle and limit the local_only_files to max_local_files
         local_files_list = list(self.local_only_files)
         random.shuffle(local_files_list)
@@ -109,7 +114,7 @@ class PartitionedCorpus:
         # Also, if files failed to copy, they will be removed from the local_only_files set.
         self.local_only_files = new_local_only_files
 
-        for file in self.remote_files:
+        for file in self.remote_files - self.present_remote_files:
             try:
                 shutil.copy(os.path.join(self.corpus.path, file), os.path.join(self.remote_dir, file))
             except Exception as e:
@@ -150,17 +155,35 @@ class PartitionedCorpus:
 class BaseCorpus:
     """
     Represents the initial corpus state, before any merge operations have been performed.
-    - local_dir: TemporaryDirectory for the local corpus
-    - remote_dir: TemporaryDirectory for the remote corpus
+    - local_dir: path of the directory for the local corpus
+    - remote_dir: path of the directory for the remote corpus
 
     NOTE: Before `partition_corpus` is called, it is required that the `MergedCorpusSetLock` is held.
     Otherwise, we risk adding more corpus to remote storage than is needed from a coverage perspective.
     """
 
     corpus: Corpus
-    local_dir: TemporaryDirectory
-    remote_dir: TemporaryDirectory
+    local_dir: str
+    remote_dir: str
     max_local_files: int = 500
+    # Keep the files already in remote_dir (from a previous merge) instead of copying them again
+    reuse_remote_dir: bool = False
+
+    def _prune_remote_dir(self, remote_files: set[str]) -> set[str]:
+        """
+        Remove the files in remote_dir that are not in the remote corpus (e.g. left over by a merge
+        that failed before pushing its results) and return the remote files that are already present.
+        """
+        present = set()
+        for file in os.listdir(self.remote_dir):
+            if file in remote_files:
+                present.add(file)
+                continue
+            try:
+                os.remove(os.path.join(self.remote_dir, file))
+            except OSError as e:
+                logger.error(f"Error removing stale file {file} from merge directory {self.remote_dir}: {e}")
+        return present
 
     def partition_corpus(self) -> PartitionedCorpus:
         """
@@ -179,6 +202,7 @@ class BaseCorpus:
         remote_files = set([os.path.basename(x) for x in self.corpus.list_remote_corpus() if Corpus.has_hashed_name(x)])
 
         local_only_files = local_files - remote_files
+        present_remote_files = self._prune_remote_dir(remote_files) if self.reuse_remote_dir else set()
 
         return PartitionedCorpus(
             corpus=self.corpus,
@@ -187,12 +211,33 @@ class BaseCorpus:
             local_only_files=local_only_files,
             remote_files=remote_files,
             max_local_files=self.max_local_files,
+            present_remote_files=present_remote_files,
         )
 
 
+def shard_files(files: set[str], n_shards: int) -> list[list[str]]:
+    """
+    Split the files into (at most) n_shards shards of similar size. The split only depends on
+    the file names, so the same set of files is always sharded the same way.
+    """
+    ordered = sorted(files)
+    return [shard for shard in (ordered[i::n_shards] for i in range(n_shards)) if shard]
+
+
+def _merge_shard(conf: Conf, fuzz_conf: FuzzConfiguration, output_dir: str, control_file: str) -> None:
+    # Runs in a worker process, the runner changes the cwd and the environment of the process
+    Runner(conf).merge_corpus(fuzz_conf, output_dir, control_file)
+
+
 class MergerBot:
     def __init__(
-        self, redis: Redis, timeout_seconds: int, python: str, crs_scratch_dir: str, max_local_files: int = 500
+        self,
+        redis: Redis,
+        timeout_seconds: int,
+        python: str,
+        crs_scratch_dir: str,
+        max_local_files: int = 500,
+        merge_shards: int = 1,
     ):
         self.redis = redis
         self.runner = Runner(Conf(timeout_seconds))
@@ -201,14 +246,138 @@ class MergerBot:
         self.harness_weights = HarnessWeights(redis)
         self.builds = BuildMap(redis)
         self.max_local_files = max_local_files
+        self.merge_shards = max(1, merge_shards)
 
     def required_builds(self) -> List[BuildTypeHint]:
         return [BuildType.FUZZER]
 
-    def _run_merge_operation(self, task, build, remote_dir, local_dir, local_only_files, remote_files, corp: Corpus):
+    def _merge_base_dir(self, task: WeightedHarness) -> str:
+        """
+        Node-local directory holding the remote corpus of the harness as of the last merge,
+        it is kept between merges so that only new remote files need to be copied.
+        """
+        path = os.path.join(self.crs_scratch_dir, task.task_id, f"{CORPUS_DIR_NAME}_{task.harness_name}.merge_base")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _feature_cache_path(self, task: WeightedHarness, build: BuildOutput, harness_path: str) -> str:
+        """
+        Path of the merge feature cache of the harness, the features are only valid for the exact harness
+        binary that recorded them, so the path depends on the task, the harness and the identity of the build.
+        """
+        identity = build.task_dir
+        try:
+            st = os.stat(harness_path)
+            identity += f":{st.st_size}:{st.st_mtime_ns}"
+        except OSError as e:
+            logger.debug(f"Could not stat harness {harness_path}, keying the feature cache on the build only: {e}")
+        build_id = hashlib.sha256(identity.encode()).hexdigest()[:16]
+        return os.path.join(
+            self.crs_scratch_dir,
+            task.task_id,
+            f"{CORPUS_DIR_NAME}_{task.harness_name}.merge_features_{build.engine}_{build.sanitizer}_{build_id}",
+        )
+
+    def _merge(
+        self, fuzz_conf: FuzzConfiguration, output_dir: str, control_file: str, features: MergeFeatureCache
+    ) -> None:
+        """
+        Merge fuzz_conf.corpus_dir into output_dir, only executing the files of output_dir whose features are
+        not known yet, and record the features of every executed file.
+        """
+        n_known = features.write_control_file(control_file, output_dir, [fuzz_conf.corpus_dir])
+        logger.debug(f"Reusing the features of {n_known} files of {output_dir}")
+        self.runner.merge_corpus(fuzz_conf, output_dir, control_file)
+        features.update_from_control_file(control_file)
+
+    def _merge_sharded(
+        self,
+        fuzz_conf: FuzzConfiguration,
+        remote_dir: str,
+        local_dir: str,
+        shards: list[list[str]],
+        features: MergeFeatureCache,
+    ) -> None:
+        """
+        Merge each shard of the local files against the remote corpus in a separate process, then merge
+        the files that added coverage in any shard into remote_dir.
+
+        Files that don't add coverage over the remote corpus are discarded by the (parallel) shard merges,
+        the final (sequential) merge only sees the few files that did, and removes the redundant ones
+        among them, so the result does not depend on the order in which the shards complete.
+        """
+        with node_local.scratch_dir() as td:
+            jobs = []
+            remote_names = set(os.listdir(remote_dir))
+            for i, shard in enumerate(shards):
+                shard_dir = os.path.join(td, f"shard-{i}")
+                output_dir = os.path.join(td, f"output-{i}")
+                os.makedirs(shard_dir)
+                os.makedirs(output_dir)
+                for file in shard:
+                    link_or_copy(os.path.join(local_dir, file), os.path.join(shard_dir, file))
+                # Every shard is merged against its own copy of the remote corpus
+                for file in remote_names:
+                    link_or_copy(os.path.join(remote_dir, file), os.path.join(output_dir, file))
+                control_file = os.path.join(td, f"control-{i}")
+                features.write_control_file(control_file, output_dir, [shard_dir])
+                jobs.append(
+                    (
+                        FuzzConfiguration(shard_dir, fuzz_conf.target_path, fuzz_conf.engine, fuzz_conf.sanitizer),
+                        output_dir,
+                        control_file,
+                    )
+                )
+
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=len(jobs), mp_context=ctx) as executor:
+                futures = [executor.submit(_merge_shard, self.runner.conf, *job) for job in jobs]
+                for future in futures:
+                    future.result()
+
+            for _, _, control_file in jobs:
+                features.update_from_control_file(control_file)
+
+            candidates_dir = os.path.join(td, "candidates")
+            os.makedirs(candidates_dir)
+            n_candidates = 0
+            for _, output_dir, _ in jobs:
+                for file in set(os.listdir(output_dir)) - remote_names:
+                    # The merge names the new files after their content, the same input found by several
+                    # shards is only added once
+                    if link_or_copy(os.path.join(output_dir, file), os.path.join(candidates_dir, file)):
+                        n_candidates += 1
+
+            logger.info(f"{n_candidates} files added coverage in {len(shards)} shards of {fuzz_conf.target_path}")
+            if n_candidates == 0:
+                return
+
+            self._merge(
+                FuzzConfiguration(candidates_dir, fuzz_conf.target_path, fuzz_conf.engine, fuzz_conf.sanitizer),
+                remote_dir,
+                os.path.join(td, "control"),
+                features,
+            )
+
+    def _run_merge_operation(
+        self,
+        task: WeightedHarness,
+        build: BuildOutput,
+        remote_dir: str,
+        local_dir: str,
+        local_only_files: set[str],
+        remote_files: set[str],
+        corp: Corpus,
+    ) -> None:
         """
         Run the merge operation to find which local files add coverage.
 
+        When there are more than `max_local_files` local files, they are split in up to `merge_shards`
+        shards that are merged concurrently.
+
+        The coverage features of the remote files are cached between runs (per build), so that libFuzzer
+        only needs to execute the local files and the remote files added since the last merge.
+
         Args:
             task: The WeightedHarness object
             build: The BuildOutput object
@@ -223,7 +392,7 @@ class MergerBot:
         """
         with node_local.scratch_dir() as td:
             tsk = ChallengeTask(read_only_task_dir=build.task_dir, python_path=self.python)
-            with tsk.get_rw_copy(work_dir=td) as local_tsk:
+            with tsk.get_rw_view(work_dir=td) as local_tsk:
                 build_dir = local_tsk.get_build_dir()
 
                 # Run merge from local_dir to remote_dir to find which files add coverage
@@ -254,11 +423,22 @@ class MergerBot:
                         },
                     )
 
-                    # We specify the remote_dir as the target dir as that will cause any `local_dir` files that adds coverage to be moved to remote_dir.
-                    self.runner.merge_corpus(fuzz_conf, remote_dir)
+                    harness_path = str(tsk.get_build_dir() / task.harness_name)
+                    features = MergeFeatureCache(self._feature_cache_path(task, build, harness_path))
+                    n_shards = min(self.merge_shards, -(-len(local_only_files) // self.max_local_files))
+                    if n_shards > 1:
+                        self._merge_sharded(
+                            fuzz_conf, remote_dir, local_dir, shard_files(local_only_files, n_shards), features
+                        )
+                    else:
+                        # We specify the remote_dir as the target dir as that will cause any `local_dir` files that adds coverage to be moved to remote_dir.
+                        self._merge(fuzz_conf, remote_dir, os.path.join(td, "merge_control"), features)
+                    # Files of local_only_files that don't add coverage are deleted after the merge, and forgotten
+                    # by the next one
+                    features.save(remote_files | local_only_files)
                     span.set_status(Status(StatusCode.OK))
 
-    def run_task(self, task: WeightedHarness, builds: list[BuildOutput]):
+    def run_task(self, task: WeightedHarness, builds: list[BuildOutput]) -> bool:
         """
         Strategy:
         Given a task/WeightedHarness, we want to merge the local corpus into the remote corpus if it adds coverage
@@ -266,8 +446,8 @@ class MergerBot:
            - ensure all of the remotely stored corpus files are available locally
            - partition the the local corpus into R and L, where R is the remote corpus and L is the local corpus excluding remote files (L = local_files - remote_files)
            - if L is empty the node is up to date, release the lock and move on to next task.
-           - copy the local corpus into R and L directories respectively
-           - run merger on R and L, moving files from L to R if they add coverage
+           - copy the local corpus into R and L directories respectively (R is kept between runs, only new remote files are copied)
+           - run merger on R and L, moving files from L to R if they add coverage (large L are split in shards merged in parallel)
            - (unfortunately re-hash the files in R to get the original names)
            - push any file in R that was previously not available remotely
            - remove any files only in L from the local corpus (as we know those don't add any coverage)
@@ -281,7 +461,7 @@ class MergerBot:
             build = random.choice(builds)
 
         # Initialize corpus outside of the temporary directory
-        corp = Corpus(self.crs_scratch_dir, task.task_id, task.harness_name)
+        corp = Corpus(self.crs_scratch_dir, task.task_id, task.harness_name, redis=self.redis)
 
         # Hash local corpus files to ensure they are named appropriately
         corp.hash_new_corpus()
@@ -291,10 +471,13 @@ class MergerBot:
             with MergedCorpusSetLock(
                 self.redis, task.task_id, task.harness_name, MERGING_LOCK_TIMEOUT_SECONDS
             ).acquire():
-                # Create scratch directories for remote (R) and local-only (L) corpus parts, and copy files
-                with node_local.scratch_dir() as remote_dir, node_local.scratch_dir() as local_dir:
+                # Create a scratch directory for the local-only (L) corpus part, the remote (R) part is persistent
+                with node_local.scratch_dir() as local_dir:
+                    remote_dir = self._merge_base_dir(task)
                     # Create BaseCorpus and partition it
-                    base_corpus = BaseCorpus(corp, local_dir, remote_dir, self.max_local_files)
+                    base_corpus = BaseCorpus(
+                        corp, local_dir, remote_dir, self.max_local_files * self.merge_shards, reuse_remote_dir=True
+                    )
                     partitioned_corpus = base_corpus.partition_corpus()
 
                     # If L is empty, the node is up to date
@@ -378,11 +561,11 @@ class MergerBot:
 
         return did_work
 
-    def run(self):
+    def run(self) -> None:
         serve_loop(self.serve_item, 10.0)
 
 
-def main():
+def main() -> None:
     args = FuzzerBotSettings()
 
     setup_package_logger("corpus-merger", __name__, args.log_level, args.log_max_line_length)
@@ -393,7 +576,12 @@ def main():
     logger.info(f"Starting merger (crs_scratch_dir: {args.crs_scratch_dir})")
 
     merger = MergerBot(
-        Redis.from_url(args.redis_url), args.timeout, args.python, args.crs_scratch_dir, args.max_local_files
+        Redis.from_url(args.redis_url),
+        args.timeout,
+        args.python,
+        args.crs_scratch_dir,
+        args.max_local_files,
+        args.merge_shards,
     )
     merger.run()
 
@@ -1,7 +1,7 @@
-from functools import lru_cache
 import logging
 import os
 import random
+from pathlib import Path
 from buttercup.common.logger import setup_package_logger
 from buttercup.common.default_task_loop import TaskLoop
 from buttercup.common.datastructures.msg_pb2 import BuildType, WeightedHarness, FunctionCoverage
@@ -10,12 +10,18 @@ from buttercup.common.maps import CoverageMap
 from typing import List
 from redis import Redis
 from buttercup.common.datastructures.msg_pb2 import BuildOutput
-from buttercup.common.corpus import Corpus
+from buttercup.common.corpus import Corpus, link_or_copy
+from buttercup.common.sets import (
+    COVERAGE_LOCK_TIMEOUT_SECONDS,
+    CoverageLock,
+    CoverageProcessedSet,
+    FailedToAcquireLock,
+    RedisLock,
+)
 from buttercup.fuzzing_infra.coverage_runner import CoverageRunner, CoveredFunction
 from buttercup.fuzzing_infra.settings import CoverageBotSettings
 from buttercup.common.challenge_task import ChallengeTask
 from buttercup.common.utils import setup_periodic_zombie_reaper
-import shutil
 import buttercup.common.node_local as node_local
 from contextlib import contextmanager
 from buttercup.common.telemetry import init_telemetry
@@ -26,14 +32,6 @@ from buttercup.common.telemetry import set_crs_attributes, CRSActionCategory
 logger = logging.getLogger(__name__)
 
 
-@lru_cache(maxsize=10)
-def get_processed_coverage(corpus_path: str) -> set[str]:
-    """
-    Get the set of processed coverage files in the corpus.
-    """
-    return set()
-
-
 class CoverageBot(TaskLoop):
     def __init__(
         self,
@@ -45,12 +43,14 @@ class CoverageBot(TaskLoop):
         base_image_url: str,
         llvm_cov_tool: str,
         sample_size: int,
+        llvm_profdata_tool: str = "llvm-profdata",
     ):
         self.wdir = wdir
         self.python = python
         self.allow_pull = allow_pull
         self.base_image_url = base_image_url
         self.llvm_cov_tool = llvm_cov_tool
+        self.llvm_profdata_tool = llvm_profdata_tool
         self.sample_size = sample_size
         logger.info(f"Coverage bot initialized with sample_size: {sample_size}")
         super().__init__(redis, timer_seconds)
@@ -58,35 +58,31 @@ class CoverageBot(TaskLoop):
     def required_builds(self) -> List[BuildTypeHint]:
         return [BuildType.COVERAGE]
 
+    @staticmethod
+    def _accumulated_profdata_path(corpus: Corpus) -> Path:
+        """Shared location of the profile merged from all the processed inputs of the corpus."""
+        return Path(f"{corpus.remote_path}.profdata")
+
     @contextmanager
-    def _sample_corpus(self, corpus: Corpus):
-        """Sample the corpus to the given size and return a temporary directory
-        with symlinks to the sampled input files.
+    def _sample_corpus(self, corpus: Corpus, processed: CoverageProcessedSet):
+        """Sample the not yet processed inputs of the corpus to the given size and return a
+        temporary directory with copies of the sampled input files.
 
         Args:
             corpus: The corpus to sample
+            processed: The inputs of the corpus whose coverage was already collected
 
         Returns:
-            A context manager yielding a temporary directory containing symlinks
-            to the sampled corpus files, or the original corpus path if sample_size is 0.
+            A context manager yielding a temporary directory containing the sampled
+            corpus files, all the non-processed files if sample_size is 0.
         """
         # Get list of input files from corpus
         input_files = os.listdir(corpus.path)
+        input_files = [f for f, done in zip(input_files, processed.contains_many(input_files)) if not done]
+        logger.info(f"Not processed yet: {len(input_files)} files in {corpus.path}")
 
-        already_processed = get_processed_coverage(corpus.path)
-        logger.info(f"Already processed: {len(already_processed)}")
-        input_files = [f for f in input_files if f not in already_processed]
-
-        # If sample_size is 0, use the entire corpus directly without sampling
-        if self.sample_size == 0:
-            logger.info(
-                f"Using entire non-processed corpus ({len(input_files)} files) in {corpus.path} (sample_size=0)"
-            )
-            yield (corpus.path, input_files)
-            return
-
-        # If there are fewer files than sample_size, use all of them
-        if len(input_files) <= self.sample_size:
+        # If sample_size is 0, use the entire non-processed corpus without sampling
+        if self.sample_size == 0 or len(input_files) <= self.sample_size:
             sampled_inputs = input_files
         else:
             sampled_inputs = random.sample(input_files, self.sample_size)
@@ -94,7 +90,6 @@ class CoverageBot(TaskLoop):
         # Create a temporary directory in node_local scratch space
         failed = set()
         with node_local.scratch_dir() as tmp_dir:
-            # Create symlinks to sampled input files
             for input_file in sampled_inputs:
                 src_path = os.path.join(corpus.path, input_file)
                 dst_path = os.path.join(tmp_dir.path, input_file)
@@ -102,7 +97,7 @@ class CoverageBot(TaskLoop):
                     # If the file is not the sha256 hash of the content, it will be renamed to the hash
                     # by another process. This can cause problems with the copying of the file. If there
                     # is some other error, that's very unexpected and we should fail.
-                    shutil.copy2(src_path, dst_path)
+                    link_or_copy(src_path, dst_path)
                 except FileNotFoundError as e:
                     logger.debug(f"Failed to copy {src_path} to {dst_path}: {e}.")
                     failed.add(input_file)
@@ -111,7 +106,7 @@ class CoverageBot(TaskLoop):
 
             yield (tmp_dir.path, remaining_files)
 
-    def run_task(self, task: WeightedHarness, builds: dict[BuildTypeHint, BuildOutput]):
+    def run_task(self, task: WeightedHarness, builds: dict[BuildTypeHint, BuildOutput]) -> None:
         coverage_builds = builds[BuildType.COVERAGE]
         if len(coverage_builds) <= 0:
             logger.error(f"No coverage build found for {task.task_id}")
@@ -121,13 +116,24 @@ class CoverageBot(TaskLoop):
 
         logger.info(f"Coverage build: {coverage_build}")
 
+        # Only one bot at a time collects the coverage of a harness, as each run only executes the inputs
+        # that were not processed yet and merges their profile into the accumulated one
+        lock = CoverageLock(self.redis, task.task_id, task.harness_name, COVERAGE_LOCK_TIMEOUT_SECONDS)
+        try:
+            with lock.acquire():
+                self._run_coverage(task, coverage_build, lock)
+        except FailedToAcquireLock:
+            logger.info(f"Coverage of {task.task_id} | {task.harness_name} is being collected by another bot")
+
+    def _run_coverage(self, task: WeightedHarness, coverage_build: BuildOutput, lock: RedisLock) -> None:
         tsk = ChallengeTask(read_only_task_dir=coverage_build.task_dir)
-        with tsk.get_rw_copy(work_dir=self.wdir) as local_tsk:
-            corpus = Corpus(self.wdir, task.task_id, task.harness_name)
+        with tsk.get_rw_view(work_dir=self.wdir) as local_tsk:
+            corpus = Corpus(self.wdir, task.task_id, task.harness_name, redis=self.redis)
             corpus.sync_from_remote()
+            processed = CoverageProcessedSet(self.redis, task.task_id, task.harness_name)
 
             # Use the sampled corpus for coverage analysis
-            with self._sample_corpus(corpus) as (sampled_corpus_path, remaining_files):
+            with self._sample_corpus(corpus, processed) as (sampled_corpus_path, remaining_files):
                 if len(remaining_files) == 0:
                     logger.info(
                         f"No files to process for {task.harness_name} | {corpus.path} | {local_tsk.project_name}"
@@ -137,7 +143,11 @@ class CoverageBot(TaskLoop):
                 runner = CoverageRunner(
                     local_tsk,
                     self.llvm_cov_tool,
+                    self.llvm_profdata_tool,
                 )
+                # Without an accumulated profile the inputs must be executed again by every run, for the
+                # coverage of the run to include them
+                accumulate = runner.accumulates_coverage()
 
                 # log telemetry
                 tracer = trace.get_tracer(__name__)
@@ -152,7 +162,13 @@ class CoverageBot(TaskLoop):
                             "fuzz.corpus.size": corpus.local_corpus_size(),
                         },
                     )
-                    func_coverage = runner.run(task.harness_name, sampled_corpus_path)
+                    func_coverage = runner.run(
+                        task.harness_name,
+                        sampled_corpus_path,
+                        self._accumulated_profdata_path(corpus) if accumulate else None,
+                        # The lock can expire during a long run, the profile is only updated if we still hold it
+                        lock.extend,
+                    )
 
                     if func_coverage is None:
                         logger.error(
@@ -162,7 +178,9 @@ class CoverageBot(TaskLoop):
                         return
                     span.set_status(Status(StatusCode.OK))
 
-            get_processed_coverage(corpus.path).update(remaining_files)
+            if accumulate:
+                # The profile of the inputs is now part of the accumulated one, they never need to be executed again
+                processed.add_many(remaining_files)
             logger.info(
                 f"Coverage for {task.harness_name} | {corpus.path} | {local_tsk.project_name} | processed {len(func_coverage)} functions"
             )
@@ -182,7 +200,7 @@ class CoverageBot(TaskLoop):
 
     def _submit_function_coverage(
         self, func_coverage: list[CoveredFunction], harness_name: str, package_name: str, task_id: str
-    ):
+    ) -> None:
         """
         Store function coverage in Redis.
 
@@ -233,6 +251,7 @@ def main():
         args.base_image_url,
         args.llvm_cov_tool,
         args.sample_size,
+        args.llvm_profdata_tool,
     )
     fuzzer.run()
 
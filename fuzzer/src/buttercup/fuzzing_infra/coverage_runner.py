@@ -3,13 +3,22 @@ import argparse
 import subprocess
 import json
 import logging
+import os
+import re
+import tempfile
 from dataclasses import dataclass
 from buttercup.common.project_yaml import ProjectYaml, Language
 from bs4 import BeautifulSoup
-from typing import Any
+from pathlib import Path
+from typing import Any, Callable, Iterator, TextIO
 
 logger = logging.getLogger(__name__)
 
+# Characters read at a time when streaming the llvm-cov export
+EXPORT_READ_SIZE = 1024 * 1024
+_FUNCTIONS_ARRAY_RE = re.compile(r'"functions"\s*:\s*\[')
+_NON_WHITESPACE_RE = re.compile(r"\S")
+
 
 @dataclass
 class CoveredFunction:
@@ -19,10 +28,173 @@ class CoveredFunction:
     function_paths: list[str]
 
 
+def _union_length(intervals: list[tuple[int, int]]) -> int:
+    """Number of integers covered by the union of the inclusive intervals."""
+    if not intervals:
+        return 0
+    ordered = sorted(intervals)
+    total = 0
+    current_start, current_end = ordered[0]
+    for start, end in ordered[1:]:
+        if start <= current_end + 1:
+            current_end = max(current_end, end)
+            continue
+        total += current_end - current_start + 1
+        current_start, current_end = start, end
+    return total + current_end - current_start + 1
+
+
+def _function_coverage(function: dict[str, Any]) -> CoveredFunction | None:
+    """Line coverage of a function of the llvm-cov export, None if none of its lines are covered."""
+    if "name" not in function or "regions" not in function:
+        return None
+
+    total_lines = []
+    covered_lines = []
+    for region in function["regions"]:
+        # Region format: [lineStart, colStart, lineEnd, colEnd, executionCount, ...]
+        if len(region) < 5:
+            continue
+
+        # Keep empty ranges (lineEnd < lineStart) out of the union
+        if region[2] < region[0]:
+            continue
+
+        interval = (region[0], region[2])
+        total_lines.append(interval)
+        if region[4] > 0:
+            covered_lines.append(interval)
+
+    covered_line_count = _union_length(covered_lines)
+    if covered_line_count == 0:
+        return None
+
+    return CoveredFunction(
+        function["name"],
+        _union_length(total_lines),
+        covered_line_count,
+        function.get("filenames", []),
+    )
+
+
+def _iter_export_functions(f: TextIO) -> Iterator[dict[str, Any]]:
+    """
+    Yield the function objects of an llvm-cov JSON export, reading it in chunks.
+
+    Only one function object is decoded at a time, the (much larger) per-file data of the export is skipped
+    without being parsed. A `"functions": [` key can only match the functions arrays of the export objects: the
+    file summaries have a `"functions": {` key, and a quote inside a JSON string is always escaped.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(EXPORT_READ_SIZE)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        # Find the next functions array
+        m = _FUNCTIONS_ARRAY_RE.search(buf, pos)
+        if m is None:
+            if eof:
+                return
+            # Keep enough of the buffer for a match spanning two chunks
+            pos = max(pos, len(buf) - 64)
+            fill()
+            continue
+        pos = m.end()
+
+        # Decode the elements of the array one by one
+        while True:
+            # Skip the whitespace before the next element
+            ws = _NON_WHITESPACE_RE.search(buf, pos)
+            pos = ws.start() if ws is not None else len(buf)
+            if pos >= len(buf):
+                if not fill():
+                    raise ValueError("Truncated llvm-cov export")
+                continue
+
+            if buf[pos] == "]":
+                pos += 1
+                break
+            if buf[pos] == ",":
+                pos += 1
+                continue
+
+            try:
+                function, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # The object is incomplete, read more of it
+                if not fill():
+                    raise
+                continue
+
+            pos = end
+            yield function
+
+
 class CoverageRunner:
-    def __init__(self, tool: ChallengeTask, llvm_cov_path: str):
+    def __init__(self, tool: ChallengeTask, llvm_cov_path: str, llvm_profdata_path: str = "llvm-profdata"):
         self.tool = tool
         self.llvm_cov_path = llvm_cov_path
+        self.llvm_profdata_path = llvm_profdata_path
+
+    def _accumulate_profdata(
+        self, profdata_path: Path, accumulated_profdata: Path, can_write: Callable[[], bool] | None = None
+    ) -> bool:
+        """
+        Merge `profdata_path` into `accumulated_profdata`, creating it if it does not exist yet.
+
+        The merged profile is written next to the accumulated one and renamed over it, so readers never see a
+        partially written profile. Callers are expected to serialize the updates of the same profile, the
+        merged profile is discarded if `can_write` returns False once the merge completed (e.g. because
+        the lock serializing the updates expired during the merge).
+        """
+        inputs = [str(profdata_path)]
+        if accumulated_profdata.exists():
+            inputs.append(str(accumulated_profdata))
+
+        accumulated_profdata.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=accumulated_profdata.parent, prefix=f".{accumulated_profdata.name}.")
+        os.close(fd)
+        args = [self.llvm_profdata_path, "merge", "-sparse", *inputs, "-o", tmp]
+        ret = subprocess.run(args)
+        if ret.returncode != 0:
+            logger.error(
+                "Failed to merge %s into %s (return code: %s)", profdata_path, accumulated_profdata, ret.returncode
+            )
+            os.unlink(tmp)
+            return False
+
+        if can_write is not None and not can_write():
+            logger.error("Not updating %s, the profile may have been updated concurrently", accumulated_profdata)
+            os.unlink(tmp)
+            return False
+
+        os.replace(tmp, accumulated_profdata)
+        return True
+
+    @staticmethod
+    def _process_function_coverage_stream(f: TextIO) -> list[CoveredFunction]:
+        """
+        Streaming version of `_process_function_coverage`, for an llvm-cov JSON export read from `f`.
+
+        Peak memory is bounded by the largest function of the export rather than the size of the export.
+        """
+        function_coverage = []
+        for function in _iter_export_functions(f):
+            covered = _function_coverage(function)
+            if covered is not None:
+                function_coverage.append(covered)
+        return function_coverage
 
     @staticmethod
     def _process_function_coverage(coverage_data: dict[str, Any]) -> list[CoveredFunction]:
@@ -45,48 +217,32 @@ class CoverageRunner:
                 continue
 
             for function in export_obj["functions"]:
-                if "name" not in function or "regions" not in function:
-                    continue
-
-                name = function["name"]
-                regions = function["regions"]
-
-                covered_lines = set()
-                total_lines = set()
-
-                for region in regions:
-                    # Region format: [lineStart, colStart, lineEnd, colEnd, executionCount, ...]
-                    if len(region) < 5:
-                        continue
-
-                    line_start = region[0]
-                    line_end = region[2]
-                    execution_count = region[4]
-
-                    for line in range(line_start, line_end + 1):
-                        total_lines.add(line)
-
-                        if execution_count > 0:
-                            covered_lines.add(line)
-
-                total_line_count = len(total_lines)
-                covered_line_count = len(covered_lines)
-                if covered_line_count > 0:
-                    function_coverage.append(
-                        CoveredFunction(
-                            name,
-                            total_line_count,
-                            covered_line_count,
-                            function.get("filenames", []),
-                        )
-                    )
+                covered = _function_coverage(function)
+                if covered is not None:
+                    function_coverage.append(covered)
 
         return function_coverage
 
-    def run(self, harness_name: str, corpus_dir: str) -> list[CoveredFunction] | None:
+    def accumulates_coverage(self) -> bool:
+        """Whether `run` can accumulate the coverage of successive runs, only the C profiles can be merged."""
+        return ProjectYaml(self.tool, self.tool.project_name).unified_language is Language.C
+
+    def run(
+        self,
+        harness_name: str,
+        corpus_dir: str,
+        accumulated_profdata: Path | None = None,
+        can_write: Callable[[], bool] | None = None,
+    ) -> list[CoveredFunction] | None:
+        """
+        Collect the function coverage of the inputs in `corpus_dir`.
+
+        For C projects, if `accumulated_profdata` is set the profile of the run is first merged into it and the
+        coverage of all the inputs accumulated so far is returned. See `_accumulate_profdata` for `can_write`.
+        """
         lang = ProjectYaml(self.tool, self.tool.project_name).unified_language
         if lang == Language.C:
-            ret = self.run_c(harness_name, corpus_dir)
+            ret = self.run_c(harness_name, corpus_dir, accumulated_profdata, can_write)
         elif lang == Language.JAVA:
             ret = self.run_java(harness_name, corpus_dir)
         else:
@@ -132,7 +288,13 @@ class CoverageRunner:
 
         return covered_functions
 
-    def run_c(self, harness_name: str, corpus_dir: str) -> list[CoveredFunction] | None:
+    def run_c(
+        self,
+        harness_name: str,
+        corpus_dir: str,
+        accumulated_profdata: Path | None = None,
+        can_write: Callable[[], bool] | None = None,
+    ) -> list[CoveredFunction] | None:
         ret = self.tool.run_coverage(harness_name, corpus_dir)
         if not ret:
             logger.error(f"Failed to run coverage for {harness_name} | {corpus_dir} | {self.tool.project_name}")
@@ -147,11 +309,18 @@ class CoverageRunner:
             )
             return None
 
-        # convert profdata to json
+        if accumulated_profdata is not None:
+            if not self._accumulate_profdata(profdata_path, accumulated_profdata, can_write):
+                return None
+            profdata_path = accumulated_profdata
+
+        # convert profdata to json, the export is written to a file and parsed incrementally as it can be
+        # hundreds of MB for large projects
         coverage_file = package_path / "dumps" / "coverage.json"
         harness_path = package_path / harness_name
         args = [self.llvm_cov_path, "export", "-format=text", f"--instr-profile={profdata_path}", harness_path]
-        ret = subprocess.run(args, stdout=subprocess.PIPE)
+        with open(coverage_file, "wb") as out:
+            ret = subprocess.run(args, stdout=out)
         if ret.returncode != 0:
             logger.error(
                 "Failed to convert profdata to json for %s | %s | %s | in %s (return code: %s)",
@@ -164,11 +333,21 @@ class CoverageRunner:
             return None
 
         # load the coverage file
-        coverage = ret.stdout.decode("utf-8")
-        coverage = json.loads(coverage)
-        logger.info(f"Coverage for {harness_name} | {corpus_dir} | {self.tool.project_name} | in {len(coverage)}")
+        try:
+            with open(coverage_file, encoding="utf-8") as f:
+                function_coverage = CoverageRunner._process_function_coverage_stream(f)
+        except ValueError as e:
+            logger.error(
+                f"Failed to parse coverage for {harness_name} | {corpus_dir} | {self.tool.project_name} | in {coverage_file}: {e}"
+            )
+            return None
+        finally:
+            coverage_file.unlink(missing_ok=True)
 
-        return CoverageRunner._process_function_coverage(coverage)
+        logger.info(
+            f"Coverage for {harness_name} | {corpus_dir} | {self.tool.project_name} | {len(function_coverage)} covered functions"
+        )
+        return function_coverage
 
 
 def main():
@@ -181,13 +360,15 @@ def main():
     prsr.add_argument("--corpus-dir", required=True)
     prsr.add_argument("--package-name", required=True)
     prsr.add_argument("--llvm-cov-path", default="llvm-cov")
+    prsr.add_argument("--llvm-profdata-path", default="llvm-profdata")
+    prsr.add_argument("--accumulated-profdata", type=Path, default=None)
     prsr.add_argument("--work-dir", required=True)
     args = prsr.parse_args()
 
     tool = ChallengeTask(read_only_task_dir=args.task_dir)
     with tool.get_rw_copy(work_dir=args.work_dir, delete=False) as local_tool:
-        runner = CoverageRunner(local_tool, args.llvm_cov_path)
-        print(runner.run(args.harness_name, args.corpus_dir))
+        runner = CoverageRunner(local_tool, args.llvm_cov_path, args.llvm_profdata_path)
+        print(runner.run(args.harness_name, args.corpus_dir, args.accumulated_profdata))
 
 
 if __name__ == "__main__":
@@ -55,7 +55,7 @@ class FuzzerBot(TaskLoop):
 
             tsk = ChallengeTask(read_only_task_dir=build.task_dir, python_path=self.python)
 
-            with tsk.get_rw_copy(work_dir=td) as local_tsk:
+            with tsk.get_rw_view(work_dir=td) as local_tsk:
                 logger.info(f"Build dir: {local_tsk.get_build_dir()}")
 
                 corp = Corpus(self.crs_scratch_dir, task.task_id, task.harness_name)
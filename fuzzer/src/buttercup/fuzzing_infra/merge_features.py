@@ -0,0 +1,127 @@
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+
+from buttercup.common.corpus import Corpus
+
+logger = logging.getLogger(__name__)
+
+# NOTE: libFuzzer merges can be resumed from a control file with the format:
+#           <number of files>
+#           <number of files in the first (output) corpus>
+#           <path of each file, the files of the first corpus first>
+#           STARTED <file index> <file size>
+#           FT <file index> <features>
+#           COV <file index> <covered PCs>
+#           ...
+#       The STARTED/FT/COV lines record the files that were already executed, in order. When the control file
+#       lists some of the files as executed, libFuzzer only runs the remaining ones and reuses the recorded
+#       features for the others. MergeFeatureCache uses this to avoid executing the remote corpus again on
+#       every merge.
+
+
+@dataclass
+class FileFeatures:
+    size: str
+    # Space-separated, as in the control file
+    features: str
+    coverage: str
+
+
+class MergeFeatureCache:
+    """
+    Coverage features of the inputs of a harness, as recorded by libFuzzer during previous merges with the same
+    build. Inputs are identified by their (hashed) file name.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries = self._load()
+
+    def _load(self) -> dict[str, FileFeatures]:
+        entries = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    name, size, features, coverage = line.rstrip("\n").split("\t")
+                    entries[name] = FileFeatures(size, features, coverage)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Start from scratch, the cache is only an optimization
+            logger.warning(f"Ignoring invalid merge feature cache {self.path}: {e}")
+            entries = {}
+        return entries
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def write_control_file(self, control_file: str, output_dir: str, input_dirs: list[str]) -> int:
+        """
+        Write a control file for merging input_dirs into output_dir, in which the files of output_dir with known
+        features are already executed.
+
+        Returns the number of files that libFuzzer will not need to execute.
+        """
+        output_files = sorted(os.listdir(output_dir))
+        known = [f for f in output_files if f in self._entries]
+        unknown = [f for f in output_files if f not in self._entries]
+        input_paths = [os.path.join(d, f) for d in input_dirs for f in sorted(os.listdir(d))]
+
+        with open(control_file, "w") as f:
+            f.write(f"{len(output_files) + len(input_paths)}\n")
+            f.write(f"{len(output_files)}\n")
+            for name in known + unknown:
+                f.write(f"{os.path.join(output_dir, name)}\n")
+            for path in input_paths:
+                f.write(f"{path}\n")
+            for i, name in enumerate(known):
+                entry = self._entries[name]
+                f.write(f"STARTED {i} {entry.size}\n")
+                f.write(f"FT {i} {entry.features}".rstrip() + "\n")
+                f.write(f"COV {i} {entry.coverage}".rstrip() + "\n")
+
+        return len(known)
+
+    def update_from_control_file(self, control_file: str) -> None:
+        """Record the features of the (hashed) files executed during a merge."""
+        try:
+            with open(control_file) as f:
+                n_files = int(f.readline())
+                f.readline()
+                names = [os.path.basename(f.readline().rstrip("\n")) for _ in range(n_files)]
+
+                started: dict[int, str] = {}
+                features: dict[int, str] = {}
+                coverage: dict[int, str] = {}
+                for line in f:
+                    marker, index, *rest = line.rstrip("\n").split(" ", 2)
+                    value = rest[0] if rest else ""
+                    if marker == "STARTED":
+                        started[int(index)] = value
+                    elif marker == "FT":
+                        features[int(index)] = value
+                    elif marker == "COV":
+                        coverage[int(index)] = value
+        except Exception as e:
+            logger.warning(f"Failed to read merge control file {control_file}: {e}")
+            return
+
+        for idx, size in started.items():
+            # Files without features crashed or timed out
+            if idx not in features or not Corpus.has_hashed_name(names[idx]):
+                continue
+            self._entries[names[idx]] = FileFeatures(size, features[idx], coverage.get(idx, ""))
+
+    def save(self, keep: set[str]) -> None:
+        """Persist the features of the files in `keep`, forgetting all others."""
+        self._entries = {name: entry for name, entry in self._entries.items() if name in keep}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path))
+        with os.fdopen(fd, "w") as f:
+            for name, entry in self._entries.items():
+                f.write(f"{name}\t{entry.size}\t{entry.features}\t{entry.coverage}\n")
+        os.replace(tmp, self.path)
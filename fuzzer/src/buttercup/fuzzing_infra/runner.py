@@ -47,7 +47,13 @@ class Runner:
             logger.debug(f"Fuzzer logs: {results.logs}")
             return results
 
-    def merge_corpus(self, conf: FuzzConfiguration, output_dir: str):
+    def merge_corpus(self, conf: FuzzConfiguration, output_dir: str, control_file: str | None = None):
+        """
+        Merge the inputs of conf.corpus_dir that add coverage into output_dir.
+
+        If control_file is given, it is used as the libFuzzer merge control file: a merge described by an
+        existing control file is resumed, and the file is left with the features of every merged input.
+        """
         logger.info(f"Merging corpus with {conf.engine} | {conf.sanitizer} | {conf.target_path}")
         job_name = f"{conf.engine}_{conf.sanitizer}"
         os.environ["JOB_NAME"] = job_name
@@ -55,9 +61,14 @@ class Runner:
             engine = typing.cast(Engine, get_engine(conf.engine))
             # Temporary directory ignores crashes
             with scratch_dir() as td:
-                engine.minimize_corpus(
-                    conf.target_path, [], [conf.corpus_dir], output_dir, str(td.path), self.conf.timeout
-                )
+                # The libFuzzer engine passes this attribute to the merge (it is only set internally by fuzz())
+                engine._merge_control_file = control_file
+                try:
+                    engine.minimize_corpus(
+                        conf.target_path, [], [conf.corpus_dir], output_dir, str(td.path), self.conf.timeout
+                    )
+                finally:
+                    engine._merge_control_file = None
 
 
 def main():
@@ -1,12 +1,14 @@
 import pytest
 import os
 import tempfile
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 from redis import Redis
 from buttercup.fuzzing_infra.coverage_bot import CoverageBot
 from buttercup.fuzzing_infra.coverage_runner import CoveredFunction
 from buttercup.common.maps import CoverageMap
-from buttercup.common.datastructures.msg_pb2 import FunctionCoverage
+from buttercup.common.sets import CoverageLock, CoverageProcessedSet
+from buttercup.common.datastructures.msg_pb2 import BuildType, FunctionCoverage
 
 
 @pytest.fixture
@@ -56,12 +58,24 @@ def test_sample_corpus_with_zero_sample_size(redis_client):
         # Set the path property on our mock corpus
         mock_corpus.path = corpus_dir
 
-        # Test the _sample_corpus method
-        with bot._sample_corpus(mock_corpus) as result:
-            # Now result is a tuple of (path, files)
-            sampled_path, files = result
-            assert sampled_path == corpus_dir
-            assert len(files) > 0
+        # Some of the files were processed by a previous run
+        processed = CoverageProcessedSet(redis_client, "test_task", "test_harness")
+        processed.add_many(["test_file_0", "test_file_3"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            mock_tmp_dir = MagicMock()
+            mock_tmp_dir.path = tmp_dir
+            with patch("buttercup.common.node_local.scratch_dir") as mock_scratch_dir:
+                mock_scratch_dir.return_value.__enter__.return_value = mock_tmp_dir
+
+                # Test the _sample_corpus method
+                with bot._sample_corpus(mock_corpus, processed) as result:
+                    # Now result is a tuple of (path, files)
+                    sampled_path, files = result
+                    # Only the non-processed files are used
+                    assert sampled_path == tmp_dir
+                    assert sorted(files) == ["test_file_1", "test_file_2", "test_file_4"]
+                    assert sorted(os.listdir(sampled_path)) == sorted(files)
 
 
 def test_sample_corpus_with_positive_sample_size(redis_client):
@@ -101,7 +115,9 @@ def test_sample_corpus_with_positive_sample_size(redis_client):
                 mock_scratch_dir.return_value.__enter__.return_value = mock_tmp_dir
 
                 # Test the _sample_corpus method
-                with bot._sample_corpus(mock_corpus) as result:
+                with bot._sample_corpus(
+                    mock_corpus, CoverageProcessedSet(redis_client, "test_task", "test_harness")
+                ) as result:
                     # Now result is a tuple of (path, files)
                     sampled_path, files = result
                     # Verify the sampled path is not the original corpus path
@@ -150,7 +166,9 @@ def test_sample_corpus_with_fewer_files_than_sample_size(redis_client):
                 mock_scratch_dir.return_value.__enter__.return_value = mock_tmp_dir
 
                 # Test the _sample_corpus method
-                with bot._sample_corpus(mock_corpus) as result:
+                with bot._sample_corpus(
+                    mock_corpus, CoverageProcessedSet(redis_client, "test_task", "test_harness")
+                ) as result:
                     # Now result is a tuple of (path, files)
                     sampled_path, files = result
                     # Verify the sampled path is the temporary directory
@@ -230,6 +248,102 @@ def test_should_update_function_coverage_worse_coverage(redis_client):
     assert result is False
 
 
+def _coverage_task():
+    task = MagicMock()
+    task.task_id = "test_task"
+    task.harness_name = "test_harness"
+    task.package_name = "test_package"
+    return task
+
+
+def test_run_task_skips_harness_locked_by_another_bot(coverage_bot, redis_client):
+    task = _coverage_task()
+    lock = CoverageLock(redis_client, task.task_id, task.harness_name, 60)
+    with lock.acquire():
+        with patch.object(coverage_bot, "_run_coverage") as run_coverage:
+            coverage_bot.run_task(task, {BuildType.COVERAGE: [MagicMock()]})
+            run_coverage.assert_not_called()
+
+    with patch.object(coverage_bot, "_run_coverage") as run_coverage:
+        coverage_bot.run_task(task, {BuildType.COVERAGE: [MagicMock()]})
+        run_coverage.assert_called_once()
+
+
+@pytest.mark.parametrize("func_coverage", [[CoveredFunction("f", 10, 5, ["a.c"])], None])
+def test_run_coverage_marks_processed_files(coverage_bot, redis_client, func_coverage):
+    task = _coverage_task()
+    processed = CoverageProcessedSet(redis_client, task.task_id, task.harness_name)
+    processed.add("old_file")
+
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ["old_file", "new_file"]:
+            with open(os.path.join(corpus_dir, name), "w") as f:
+                f.write(name)
+        corpus = MagicMock()
+        corpus.path = corpus_dir
+        corpus.remote_path = "/remote/corpus"
+        mock_tmp_dir = MagicMock()
+        mock_tmp_dir.path = tmp_dir
+
+        with (
+            patch("buttercup.fuzzing_infra.coverage_bot.ChallengeTask"),
+            patch("buttercup.fuzzing_infra.coverage_bot.Corpus", return_value=corpus),
+            patch("buttercup.fuzzing_infra.coverage_bot.CoverageRunner") as runner_cls,
+            patch("buttercup.common.node_local.scratch_dir") as mock_scratch_dir,
+            patch.object(coverage_bot, "_submit_function_coverage") as submit,
+        ):
+            mock_scratch_dir.return_value.__enter__.return_value = mock_tmp_dir
+            runner_cls.return_value.run.return_value = func_coverage
+            runner_cls.return_value.accumulates_coverage.return_value = True
+            lock = MagicMock()
+            coverage_bot._run_coverage(task, MagicMock(), lock)
+
+            # Only the new file is executed, and merged into the accumulated profile while the lock is held
+            runner_cls.return_value.run.assert_called_once_with(
+                task.harness_name, tmp_dir, Path("/remote/corpus.profdata"), lock.extend
+            )
+
+    if func_coverage is None:
+        assert not processed.contains("new_file")
+        submit.assert_not_called()
+    else:
+        assert processed.contains("new_file")
+        submit.assert_called_once_with(func_coverage, task.harness_name, task.package_name, task.task_id)
+
+
+def test_run_coverage_does_not_mark_files_without_accumulation(coverage_bot, redis_client):
+    """Java coverage is not accumulated, so its inputs must be executed again by the next runs."""
+    task = _coverage_task()
+    processed = CoverageProcessedSet(redis_client, task.task_id, task.harness_name)
+
+    with tempfile.TemporaryDirectory() as corpus_dir, tempfile.TemporaryDirectory() as tmp_dir:
+        with open(os.path.join(corpus_dir, "new_file"), "w") as f:
+            f.write("new_file")
+        corpus = MagicMock()
+        corpus.path = corpus_dir
+        mock_tmp_dir = MagicMock()
+        mock_tmp_dir.path = tmp_dir
+
+        with (
+            patch("buttercup.fuzzing_infra.coverage_bot.ChallengeTask"),
+            patch("buttercup.fuzzing_infra.coverage_bot.Corpus", return_value=corpus),
+            patch("buttercup.fuzzing_infra.coverage_bot.CoverageRunner") as runner_cls,
+            patch("buttercup.common.node_local.scratch_dir") as mock_scratch_dir,
+            patch.object(coverage_bot, "_submit_function_coverage") as submit,
+        ):
+            mock_scratch_dir.return_value.__enter__.return_value = mock_tmp_dir
+            func_coverage = [CoveredFunction("f", 10, 5, ["A.java"])]
+            runner_cls.return_value.run.return_value = func_coverage
+            runner_cls.return_value.accumulates_coverage.return_value = False
+            lock = MagicMock()
+            coverage_bot._run_coverage(task, MagicMock(), lock)
+
+            runner_cls.return_value.run.assert_called_once_with(task.harness_name, tmp_dir, None, lock.extend)
+
+    assert not processed.contains("new_file")
+    submit.assert_called_once_with(func_coverage, task.harness_name, task.package_name, task.task_id)
+
+
 def test_submit_function_coverage(coverage_bot, redis_client):
     # Create test data
     func_coverage = [
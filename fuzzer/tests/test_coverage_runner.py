@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from buttercup.fuzzing_infra.coverage_runner import CoverageRunner, CoveredFunction, _union_length
+
+
+def _export(functions_per_object: list[list[dict]]) -> dict:
+    return {
+        "data": [
+            {
+                "files": [
+                    {
+                        "filename": 'src/"functions":[.c',
+                        "segments": [[1, 1, 3, True, True, False]],
+                        "summary": {"functions": {"count": len(functions), "covered": 1, "percent": 50}},
+                    }
+                ],
+                "functions": functions,
+                "totals": {"functions": {"count": len(functions), "covered": 1, "percent": 50}},
+            }
+            for functions in functions_per_object
+        ],
+        "type": "llvm.coverage.json.export",
+        "version": "2.0.1",
+    }
+
+
+FUNCTIONS = [
+    {
+        "name": "covered",
+        "count": 3,
+        "filenames": ["src/a.c"],
+        "regions": [[10, 1, 20, 2, 3, 0, 0, 0], [12, 1, 14, 2, 0, 0, 0, 0], [30, 1, 31, 2, 0, 0, 0, 0]],
+    },
+    {
+        "name": "not_covered",
+        "count": 0,
+        "filenames": ["src/a.c"],
+        "regions": [[40, 1, 45, 2, 0, 0, 0, 0]],
+    },
+    {"name": "no_regions", "filenames": ["src/a.c"]},
+    {
+        "name": "short_regions",
+        "filenames": ["src/b.c"],
+        "regions": [[1, 1, 2], [5, 1, 5, 10, 1, 0, 0, 0]],
+    },
+]
+
+
+class TestCoverageRunnerParsing(unittest.TestCase):
+    def test_union_length(self):
+        self.assertEqual(_union_length([]), 0)
+        self.assertEqual(_union_length([(1, 1)]), 1)
+        self.assertEqual(_union_length([(10, 20), (12, 14), (30, 31)]), 13)
+        # Adjacent intervals are merged
+        self.assertEqual(_union_length([(1, 2), (3, 4)]), 4)
+
+        rng = random.Random(0)
+        for _ in range(100):
+            intervals = []
+            for _ in range(rng.randint(1, 20)):
+                start = rng.randint(1, 200)
+                intervals.append((start, start + rng.randint(0, 30)))
+            expected = len({line for start, end in intervals for line in range(start, end + 1)})
+            self.assertEqual(_union_length(intervals), expected)
+
+    def test_process_function_coverage(self):
+        result = CoverageRunner._process_function_coverage(_export([FUNCTIONS]))
+        self.assertEqual(
+            result,
+            [
+                CoveredFunction("covered", 13, 11, ["src/a.c"]),
+                CoveredFunction("short_regions", 1, 1, ["src/b.c"]),
+            ],
+        )
+
+    def test_stream_matches_full_parse(self):
+        export = _export([FUNCTIONS, [], FUNCTIONS[:1]])
+        expected = CoverageRunner._process_function_coverage(export)
+        self.assertEqual(len(expected), 3)
+
+        for text in (json.dumps(export, separators=(",", ":")), json.dumps(export, indent=2)):
+            for read_size in (1, 7, 1024 * 1024):
+                with patch("buttercup.fuzzing_infra.coverage_runner.EXPORT_READ_SIZE", read_size):
+                    self.assertEqual(CoverageRunner._process_function_coverage_stream(io.StringIO(text)), expected)
+
+    def test_stream_truncated_export(self):
+        text = json.dumps(_export([FUNCTIONS]))
+        truncated = text[: text.index('"not_covered"')]
+        with self.assertRaises(ValueError):
+            CoverageRunner._process_function_coverage_stream(io.StringIO(truncated))
+
+
+class TestCoverageRunnerAccumulation(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = Path(tmp.name)
+        self.new_profdata = self.tmp / "merged.profdata"
+        self.new_profdata.write_text("new")
+        self.accumulated = self.tmp / "shared" / "corpus.profdata"
+        self.runner = CoverageRunner(MagicMock(), "llvm-cov", "llvm-profdata")
+
+    def _fake_merge(self, returncode: int):
+        calls = []
+
+        def run(args, **kwargs):
+            calls.append(args)
+            inputs = args[3:-2]
+            with open(args[-1], "w") as f:
+                f.write("+".join(Path(p).read_text() for p in inputs))
+            return MagicMock(returncode=returncode)
+
+        return calls, run
+
+    def test_accumulate_profdata(self):
+        calls, run = self._fake_merge(0)
+        with patch("buttercup.fuzzing_infra.coverage_runner.subprocess.run", side_effect=run):
+            self.assertTrue(self.runner._accumulate_profdata(self.new_profdata, self.accumulated))
+            self.assertEqual(self.accumulated.read_text(), "new")
+
+            self.new_profdata.write_text("newer")
+            self.assertTrue(self.runner._accumulate_profdata(self.new_profdata, self.accumulated))
+            self.assertEqual(self.accumulated.read_text(), "newer+new")
+
+        self.assertEqual(calls[1][:3], ["llvm-profdata", "merge", "-sparse"])
+        self.assertEqual(os.listdir(self.accumulated.parent), [self.accumulated.name])
+
+    def test_accumulate_profdata_failure_keeps_profile(self):
+        self.accumulated.parent.mkdir()
+        self.accumulated.write_text("old")
+        _, run = self._fake_merge(1)
+        with patch("buttercup.fuzzing_infra.coverage_runner.subprocess.run", side_effect=run):
+            self.assertFalse(self.runner._accumulate_profdata(self.new_profdata, self.accumulated))
+
+        self.assertEqual(self.accumulated.read_text(), "old")
+        self.assertEqual(os.listdir(self.accumulated.parent), [self.accumulated.name])
+
+    def test_accumulate_profdata_lost_lock_keeps_profile(self):
+        self.accumulated.parent.mkdir()
+        self.accumulated.write_text("old")
+        _, run = self._fake_merge(0)
+        with patch("buttercup.fuzzing_infra.coverage_runner.subprocess.run", side_effect=run):
+            self.assertFalse(
+                self.runner._accumulate_profdata(self.new_profdata, self.accumulated, can_write=lambda: False)
+            )
+
+        self.assertEqual(self.accumulated.read_text(), "old")
+        self.assertEqual(os.listdir(self.accumulated.parent), [self.accumulated.name])
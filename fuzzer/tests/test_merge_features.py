@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from buttercup.fuzzing_infra.merge_features import FileFeatures, MergeFeatureCache
+from buttercup.fuzzing_infra.runner import Conf, FuzzConfiguration, Runner
+
+REMOTE_A = "a" * 64
+REMOTE_B = "b" * 64
+LOCAL_C = "c" * 64
+
+
+class TestMergeFeatureCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.remote_dir = os.path.join(self.tmp, "remote")
+        self.local_dir = os.path.join(self.tmp, "local")
+        for d, files in ((self.remote_dir, [REMOTE_A, REMOTE_B]), (self.local_dir, [LOCAL_C])):
+            os.makedirs(d)
+            for file in files:
+                with open(os.path.join(d, file), "w") as f:
+                    f.write(file)
+        self.cache_path = os.path.join(self.tmp, "features")
+        self.control_file = os.path.join(self.tmp, "control")
+
+    def test_write_control_file_with_known_files(self):
+        cache = MergeFeatureCache(self.cache_path)
+        cache._entries[REMOTE_B] = FileFeatures("64", "10 20", "1")
+
+        self.assertEqual(cache.write_control_file(self.control_file, self.remote_dir, [self.local_dir]), 1)
+
+        with open(self.control_file) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(
+            lines,
+            [
+                "3",
+                "2",
+                # Known files come first, as libFuzzer resumes after the last STARTED file
+                os.path.join(self.remote_dir, REMOTE_B),
+                os.path.join(self.remote_dir, REMOTE_A),
+                os.path.join(self.local_dir, LOCAL_C),
+                "STARTED 0 64",
+                "FT 0 10 20",
+                "COV 0 1",
+            ],
+        )
+
+    def test_write_control_file_without_known_files(self):
+        cache = MergeFeatureCache(self.cache_path)
+        self.assertEqual(cache.write_control_file(self.control_file, self.remote_dir, [self.local_dir]), 0)
+        with open(self.control_file) as f:
+            self.assertEqual(len(f.read().splitlines()), 5)
+
+    def test_update_from_control_file_and_save(self):
+        with open(self.control_file, "w") as f:
+            f.write(
+                "\n".join(
+                    [
+                        "4",
+                        "2",
+                        os.path.join(self.remote_dir, REMOTE_A),
+                        os.path.join(self.remote_dir, REMOTE_B),
+                        os.path.join(self.local_dir, LOCAL_C),
+                        os.path.join(self.local_dir, "crash"),
+                        "STARTED 0 64",
+                        "FT 0 1 2",
+                        "COV 0 7",
+                        "STARTED 1 64",
+                        "FT 1",
+                        "COV 1",
+                        "STARTED 2 64",
+                        "FT 2 3",
+                        "COV 2 8 9",
+                        # The last file crashed
+                        "STARTED 3 5",
+                    ]
+                )
+                + "\n"
+            )
+
+        cache = MergeFeatureCache(self.cache_path)
+        cache.update_from_control_file(self.control_file)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache._entries[REMOTE_A], FileFeatures("64", "1 2", "7"))
+        self.assertEqual(cache._entries[REMOTE_B], FileFeatures("64", "", ""))
+        self.assertEqual(cache._entries[LOCAL_C], FileFeatures("64", "3", "8 9"))
+
+        # Files that did not make it to the remote corpus are forgotten
+        cache.save({REMOTE_A, REMOTE_B})
+        reloaded = MergeFeatureCache(self.cache_path)
+        self.assertEqual(reloaded._entries, {REMOTE_A: cache._entries[REMOTE_A], REMOTE_B: cache._entries[REMOTE_B]})
+
+        # Round trip through a control file
+        reloaded.write_control_file(self.control_file, self.remote_dir, [self.local_dir])
+        other = MergeFeatureCache(os.path.join(self.tmp, "other"))
+        other.update_from_control_file(self.control_file)
+        self.assertEqual(other._entries, reloaded._entries)
+
+    def test_invalid_files_are_ignored(self):
+        with open(self.cache_path, "w") as f:
+            f.write("garbage\n")
+        cache = MergeFeatureCache(self.cache_path)
+        self.assertEqual(len(cache), 0)
+
+        with open(self.control_file, "w") as f:
+            f.write("not a control file\n")
+        cache.update_from_control_file(self.control_file)
+        self.assertEqual(len(cache), 0)
+
+
+class TestRunnerMergeControlFile(unittest.TestCase):
+    @patch("buttercup.fuzzing_infra.runner.scratch_dir")
+    @patch("buttercup.fuzzing_infra.runner.scratch_cwd")
+    @patch("buttercup.fuzzing_infra.runner.patched_temp_dir")
+    @patch("buttercup.fuzzing_infra.runner.get_engine")
+    def test_merge_corpus_uses_control_file(self, get_engine_mock, *_):
+        engine = MagicMock()
+        engine._merge_control_file = None
+        seen = []
+        engine.minimize_corpus.side_effect = lambda *args: seen.append(engine._merge_control_file)
+        get_engine_mock.return_value = engine
+
+        runner = Runner(Conf(10))
+        conf = FuzzConfiguration("/corpus", "/out/harness", "libfuzzer", "address")
+        runner.merge_corpus(conf, "/remote", "/tmp/control")
+
+        self.assertEqual(seen, ["/tmp/control"])
+        self.assertIsNone(engine._merge_control_file)
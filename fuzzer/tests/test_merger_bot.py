@@ -1,8 +1,14 @@
+import os
+import shutil
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock, patch, MagicMock
 from redis import Redis
 
-from buttercup.fuzzing_infra.corpus_merger import MergerBot, BaseCorpus, PartitionedCorpus
+from buttercup.fuzzing_infra.corpus_merger import MergerBot, BaseCorpus, PartitionedCorpus, shard_files
+from buttercup.fuzzing_infra.merge_features import FileFeatures, MergeFeatureCache
+from buttercup.fuzzing_infra.runner import FuzzConfiguration
 from buttercup.common.datastructures.msg_pb2 import WeightedHarness, BuildOutput
 from buttercup.common.sets import FailedToAcquireLock
 from buttercup.common.constants import ADDRESS_SANITIZER
@@ -17,7 +23,9 @@ class TestMergerBot(unittest.TestCase):
 
         # Common test parameters
         self.python = "/usr/bin/python3"
-        self.crs_scratch_dir = "/tmp/test_crs_scratch"
+        self.crs_scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.crs_scratch_dir)
+        self.merge_base_dir = os.path.join(self.crs_scratch_dir, "task123", "buttercup_corpus_test_harness.merge_base")
         self.timer_seconds = 10
         self.timeout_seconds = 30
         self.max_local_files = 500
@@ -59,7 +67,11 @@ class TestMergerBot(unittest.TestCase):
         # Verify behavior
         corpus_instance.hash_new_corpus.assert_called_once()
         base_corpus_mock.assert_called_once_with(
-            corpus_instance, scratch_dir_mock().__enter__(), scratch_dir_mock().__enter__(), self.max_local_files
+            corpus_instance,
+            scratch_dir_mock().__enter__(),
+            self.merge_base_dir,
+            self.max_local_files,
+            reuse_remote_dir=True,
         )
         base_corpus_instance.partition_corpus.assert_called_once()
 
@@ -141,7 +153,9 @@ class TestMergerBot(unittest.TestCase):
         partitioned_corpus_mock.to_final.return_value = final_corpus_mock
 
         # Setup scratch directory
-        scratch_dir_mock.return_value.__enter__.return_value = "/tmp/scratch_dir1"
+        scratch_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, scratch_dir)
+        scratch_dir_mock.return_value.__enter__.return_value = scratch_dir
         scratch_dir_mock2.return_value.__enter__.return_value = "/tmp/scratch_dir2"
 
         # Setup challenge task
@@ -150,7 +164,7 @@ class TestMergerBot(unittest.TestCase):
         build_dir_mock = MagicMock()
         build_dir_mock.__truediv__.return_value = "/path/to/harness"
         local_task_mock.get_build_dir.return_value = build_dir_mock
-        task_instance.get_rw_copy.return_value.__enter__.return_value = local_task_mock
+        task_instance.get_rw_view.return_value.__enter__.return_value = local_task_mock
 
         # Setup test data
         task = WeightedHarness(harness_name="test_harness", package_name="test_package", task_id="task123")
@@ -163,12 +177,17 @@ class TestMergerBot(unittest.TestCase):
         # Verify behavior
         corpus_instance.hash_new_corpus.assert_called_once()
         base_corpus_mock.assert_called_once_with(
-            corpus_instance, scratch_dir_mock().__enter__(), scratch_dir_mock().__enter__(), self.max_local_files
+            corpus_instance,
+            scratch_dir_mock().__enter__(),
+            self.merge_base_dir,
+            self.max_local_files,
+            reuse_remote_dir=True,
         )
         base_corpus_instance.partition_corpus.assert_called_once()
 
-        # Verify runner.merge_corpus was called
+        # Verify runner.merge_corpus was called, with a control file
         self.runner_mock.merge_corpus.assert_called_once()
+        self.assertEqual(self.runner_mock.merge_corpus.call_args.args[2], os.path.join(scratch_dir, "merge_control"))
 
         # Verify FinalCorpus methods were called
         partitioned_corpus_mock.to_final.assert_called_once()
@@ -178,6 +197,86 @@ class TestMergerBot(unittest.TestCase):
         # Should return True as files were merged
         self.assertTrue(result)
 
+    @patch("buttercup.fuzzing_infra.corpus_merger.node_local.scratch_dir")
+    @patch("buttercup.fuzzing_infra.corpus_merger.ProcessPoolExecutor")
+    @patch("buttercup.fuzzing_infra.corpus_merger._merge_shard")
+    def test_merge_sharded(self, merge_shard_mock, executor_mock, scratch_dir_mock):
+        """Shards are merged against the remote corpus, the files they add are merged into it once."""
+        executor_mock.side_effect = lambda max_workers, mp_context: ThreadPoolExecutor(max_workers)
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir)
+        scratch_dir_mock.return_value.__enter__.return_value = work_dir
+
+        remote_dir = os.path.join(self.crs_scratch_dir, "remote")
+        local_dir = os.path.join(self.crs_scratch_dir, "local")
+        os.makedirs(remote_dir)
+        os.makedirs(local_dir)
+        with open(os.path.join(remote_dir, "r" * 64), "w") as f:
+            f.write("remote")
+        local_files = {f"{i:064x}" for i in range(6)}
+        for file in local_files:
+            with open(os.path.join(local_dir, file), "w") as f:
+                f.write(file)
+
+        seen_shards = []
+
+        def merge_shard(conf, fuzz_conf, output_dir, control_file):
+            shard = sorted(os.listdir(fuzz_conf.corpus_dir))
+            seen_shards.append(shard)
+            # The remote corpus is available in every output directory, and its features are reused
+            self.assertIn("r" * 64, os.listdir(output_dir))
+            with open(control_file) as f:
+                self.assertIn("FT 0 1 2 3\n", f.read())
+            # Two shards find the same new input
+            with open(os.path.join(output_dir, "new_input"), "w") as f:
+                f.write("new")
+            if shard[0] == f"{0:064x}":
+                shutil.copy(os.path.join(fuzz_conf.corpus_dir, shard[0]), os.path.join(output_dir, "other_input"))
+
+        merge_shard_mock.side_effect = merge_shard
+
+        features = MergeFeatureCache(os.path.join(self.crs_scratch_dir, "features"))
+        features._entries["r" * 64] = FileFeatures("6", "1 2 3", "")
+
+        fuzz_conf = FuzzConfiguration(local_dir, "/path/to/harness", "libfuzzer", ADDRESS_SANITIZER)
+        self.merger_bot._merge_sharded(fuzz_conf, remote_dir, local_dir, shard_files(local_files, 2), features)
+
+        self.assertEqual(sorted(seen_shards), [sorted(local_files)[0::2], sorted(local_files)[1::2]])
+        self.runner_mock.merge_corpus.assert_called_once()
+        final_conf, output_dir, _control_file = self.runner_mock.merge_corpus.call_args.args
+        self.assertEqual(output_dir, remote_dir)
+        self.assertEqual(final_conf.target_path, "/path/to/harness")
+        self.assertEqual(sorted(os.listdir(final_conf.corpus_dir)), ["new_input", "other_input"])
+
+    def test_feature_cache_path(self):
+        """The feature cache is specific to the task, the harness and the harness binary."""
+        harness_path = os.path.join(self.crs_scratch_dir, "harness")
+        with open(harness_path, "w") as f:
+            f.write("binary")
+        task = WeightedHarness(harness_name="test_harness", package_name="test_package", task_id="task123")
+        other_task = WeightedHarness(harness_name="test_harness", package_name="test_package", task_id="task456")
+        other_harness = WeightedHarness(harness_name="other_harness", package_name="test_package", task_id="task123")
+        build = BuildOutput(sanitizer=ADDRESS_SANITIZER, engine="libfuzzer", task_dir="/path/to/task")
+        other_build = BuildOutput(sanitizer=ADDRESS_SANITIZER, engine="libfuzzer", task_dir="/path/to/other")
+
+        path = self.merger_bot._feature_cache_path(task, build, harness_path)
+        self.assertEqual(path, self.merger_bot._feature_cache_path(task, build, harness_path))
+        self.assertNotEqual(path, self.merger_bot._feature_cache_path(other_task, build, harness_path))
+        self.assertNotEqual(path, self.merger_bot._feature_cache_path(other_harness, build, harness_path))
+        self.assertNotEqual(path, self.merger_bot._feature_cache_path(task, other_build, harness_path))
+
+        # A rebuilt harness does not reuse the features of the previous binary
+        with open(harness_path, "w") as f:
+            f.write("rebuilt binary")
+        self.assertNotEqual(path, self.merger_bot._feature_cache_path(task, build, harness_path))
+
+    def test_shard_files(self):
+        files = {f"{i:064x}" for i in range(5)}
+        shards = shard_files(files, 2)
+        self.assertEqual(shards, [sorted(files)[0::2], sorted(files)[1::2]])
+        self.assertEqual(shard_files(files, 2), shards)
+        self.assertEqual(shard_files({"a"}, 3), [["a"]])
+
     def test_rehash_files(self):
         """
         This test is no longer applicable as the _rehash_files method no longer exists.
@@ -269,6 +368,38 @@ class TestBaseCorpus(unittest.TestCase):
                 # Check result
                 self.assertEqual(result, partitioned_corpus_instance)
 
+    def test_partition_corpus_reuses_remote_dir(self):
+        """Remote files kept from a previous merge are not copied again, leftovers are removed."""
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        corpus_dir, local_dir, remote_dir = (os.path.join(tmp, d) for d in ("corpus", "local", "remote"))
+        for d in (corpus_dir, local_dir, remote_dir):
+            os.makedirs(d)
+
+        kept, new, stale, local = "a" * 64, "b" * 64, "c" * 64, "d" * 64
+        for file in (kept, new, local):
+            with open(os.path.join(corpus_dir, file), "w") as f:
+                f.write(file)
+        for file in (kept, stale):
+            with open(os.path.join(remote_dir, file), "w") as f:
+                f.write(file)
+
+        corpus_instance = MagicMock()
+        corpus_instance.path = corpus_dir
+        corpus_instance.list_local_corpus.return_value = [os.path.join(corpus_dir, f) for f in (kept, new, local)]
+        corpus_instance.list_remote_corpus.return_value = [os.path.join("/remote", f) for f in (kept, new)]
+
+        base_corpus = BaseCorpus(corpus_instance, local_dir, remote_dir, 500, reuse_remote_dir=True)
+        with patch("shutil.copy", wraps=shutil.copy) as copy_mock:
+            partitioned = base_corpus.partition_corpus()
+
+        self.assertEqual(partitioned.local_only_files, {local})
+        self.assertEqual(partitioned.present_remote_files, {kept})
+        self.assertEqual(sorted(os.listdir(remote_dir)), [kept, new])
+        self.assertEqual(os.listdir(local_dir), [local])
+        copied = sorted(os.path.basename(call.args[1]) for call in copy_mock.call_args_list)
+        self.assertEqual(copied, [new, local])
+
 
 class TestPartitionedCorpus(unittest.TestCase):
     @patch("buttercup.fuzzing_infra.corpus_merger.Corpus")
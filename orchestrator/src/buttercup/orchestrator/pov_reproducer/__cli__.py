@@ -13,7 +13,14 @@ def main():
     logger.info(f"Starting POV Reproducer with settings: {settings}")
 
     redis = Redis.from_url(settings.redis_url, decode_responses=False)
-    service = POVReproducer(redis, settings.sleep_time, settings.max_retries)
+    service = POVReproducer(
+        redis,
+        settings.sleep_time,
+        settings.max_retries,
+        batch_size=settings.batch_size,
+        max_workers=settings.max_workers,
+        lease_seconds=settings.lease_seconds,
+    )
     service.serve()
 
 
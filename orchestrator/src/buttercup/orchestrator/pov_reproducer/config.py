@@ -9,6 +9,11 @@ class Settings(BaseSettings):
     log_level: Annotated[str, Field(default="debug", description="Log level")]
     sleep_time: Annotated[float, Field(default=1.0, description="Sleep time between checks in seconds")]
     max_retries: Annotated[int, Field(default=10, description="Maximum number of retries for failed tasks")]
+    batch_size: Annotated[int, Field(default=32, description="Maximum number of POVs claimed per iteration")]
+    max_workers: Annotated[int, Field(default=4, description="Maximum number of POVs reproduced concurrently")]
+    lease_seconds: Annotated[
+        int, Field(default=1800, description="Seconds after which POVs claimed by a dead worker are claimed again")
+    ]
 
     class Config:
         env_prefix = "BUTTERCUP_POV_REPRODUCER_"
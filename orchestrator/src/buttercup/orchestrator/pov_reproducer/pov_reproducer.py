@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextlib
 from dataclasses import dataclass, field
 import logging
 from pathlib import Path
@@ -22,86 +24,127 @@ class POVReproducer:
     redis: Redis
     sleep_time: float = 0.1
     max_retries: int = 10
+    batch_size: int = 32  # Max pending requests claimed per iteration
+    max_workers: int = 4  # Max reproductions running concurrently
+    lease_seconds: int = 30 * 60  # Time after which requests claimed by a dead worker are claimed again
 
     pov_status: PoVReproduceStatus = field(init=False)
     registry: TaskRegistry = field(init=False)
+    builds: BuildMap = field(init=False)
 
     def __post_init__(self) -> None:
         self.pov_status = PoVReproduceStatus(self.redis)
         self.registry = TaskRegistry(self.redis)
+        self.builds = BuildMap(self.redis)
 
-    def serve_item(self) -> bool:
-        entry: Optional[POVReproduceRequest] = self.pov_status.get_one_pending()
-        if entry is None:
-            return False
+    def _reproduce(self, task: ChallengeTask, entry: POVReproduceRequest) -> bool:
+        """Reproduce a POV against a patched build and record the result.
 
+        Returns:
+            bool: True if the result was recorded, False if the reproduction should be retried later
+        """
         task_id: str = entry.task_id
-        internal_patch_id: str = entry.internal_patch_id
         pov_path: str = entry.pov_path
-        sanitizer: str = entry.sanitizer
         harness_name: str = entry.harness_name
 
-        if self.registry.should_stop_processing(task_id):
-            logger.info("Task %s is cancelled or expired, will not reproduce POV.", task_id)
-            was_marked = self.pov_status.mark_expired(entry)
-            if not was_marked:
-                logger.debug(
-                    "Failed to mark POV as expired for task %s - item was not in pending state (another worker might have marked it)",
-                    task_id,
-                )
-            return False
-
         logger.info(f"Reproducing POV for {task_id} | {harness_name} | {pov_path}")
-
-        builds = BuildMap(self.redis)
-        build_output_with_patch: Optional[BuildOutput] = builds.get_build_from_san(
-            task_id,
-            BuildType.PATCH,
-            sanitizer,
-            internal_patch_id,
-        )
-        if build_output_with_patch is None:
+        local_path: Path = node_local.make_locally_available(Path(pov_path))
+        info = task.reproduce_pov(harness_name, local_path)
+        if not info.did_run():
             logger.warning(
-                "No patched build output found for task %s. Will retry later.",
+                f"Reproduce did not run for task %s. Will retry later. Output {info}",
                 task_id,
             )
             return False
 
-        local_path: Path = node_local.make_locally_available(Path(pov_path))
-
-        challenge_task_dir = ChallengeTask(read_only_task_dir=build_output_with_patch.task_dir)
-        with challenge_task_dir.get_rw_copy(work_dir=node_local.scratch_path()) as task:
-            info = task.reproduce_pov(harness_name, local_path)
-            if not info.did_run():
-                logger.warning(
-                    f"Reproduce did not run for task %s. Will retry later. Output {info}",
+        logger.debug(
+            "stdout: %s, stderr: %s for task %s",
+            info.command_result.output,
+            info.command_result.error,
+            task_id,
+        )
+        logger.info(f"POV {pov_path} for task: {task_id} crashed: {info.did_crash()}")
+        if info.did_crash():
+            was_marked = self.pov_status.mark_non_mitigated(entry)
+            if not was_marked:
+                logger.debug(
+                    "Failed to mark POV as non-mitigated for task %s - item was not in pending state (another worker might have marked it)",
+                    task_id,
+                )
+        else:
+            was_marked = self.pov_status.mark_mitigated(entry)
+            if not was_marked:
+                logger.debug(
+                    "Failed to mark POV as mitigated for task %s - item was not in pending state (another worker might have marked it)",
                     task_id,
                 )
-                return False
 
-            logger.debug(
-                "stdout: %s, stderr: %s for task %s",
-                info.command_result.output,
-                info.command_result.error,
-                task_id,
-            )
-            logger.info(f"POV {pov_path} for task: {task_id} crashed: {info.did_crash()}")
-            if info.did_crash():
-                was_marked = self.pov_status.mark_non_mitigated(entry)
-                if not was_marked:
-                    logger.debug(
-                        "Failed to mark POV as non-mitigated for task %s - item was not in pending state (another worker might have marked it)",
-                        task_id,
-                    )
-            else:
-                was_marked = self.pov_status.mark_mitigated(entry)
+        return True
+
+    def _group_by_build(
+        self, entries: list[POVReproduceRequest]
+    ) -> list[tuple[BuildOutput, list[POVReproduceRequest]]]:
+        """Group the requests by the patched build they must be reproduced against, skipping the requests of stopped
+        tasks and of builds that are not available yet."""
+        groups: dict[tuple[str, str, str], list[POVReproduceRequest]] = {}
+        for entry in entries:
+            if self.registry.should_stop_processing(entry.task_id):
+                logger.info("Task %s is cancelled or expired, will not reproduce POV.", entry.task_id)
+                was_marked = self.pov_status.mark_expired(entry)
                 if not was_marked:
                     logger.debug(
-                        "Failed to mark POV as mitigated for task %s - item was not in pending state (another worker might have marked it)",
-                        task_id,
+                        "Failed to mark POV as expired for task %s - item was not in pending state (another worker might have marked it)",
+                        entry.task_id,
                     )
+                continue
+            groups.setdefault((entry.task_id, entry.internal_patch_id, entry.sanitizer), []).append(entry)
 
-        return True
+        result = []
+        for (task_id, internal_patch_id, sanitizer), group in groups.items():
+            build_output_with_patch: Optional[BuildOutput] = self.builds.get_build_from_san(
+                task_id,
+                BuildType.PATCH,
+                sanitizer,
+                internal_patch_id,
+            )
+            if build_output_with_patch is None:
+                logger.warning(
+                    "No patched build output found for task %s. Will retry later.",
+                    task_id,
+                )
+                continue
+            result.append((build_output_with_patch, group))
+        return result
+
+    def serve_item(self) -> bool:
+        entries = self.pov_status.claim_pending(self.batch_size, self.lease_seconds)
+        if not entries:
+            return False
+
+        try:
+            groups = self._group_by_build(entries)
+            if not groups:
+                return False
+
+            # All the POVs of a patched build are reproduced in the same workspace
+            with contextlib.ExitStack() as stack, ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures: list[Future[bool]] = []
+                for build_output_with_patch, group in groups:
+                    challenge_task = ChallengeTask(read_only_task_dir=build_output_with_patch.task_dir)
+                    task = stack.enter_context(challenge_task.get_rw_view(work_dir=node_local.scratch_path()))
+                    futures.extend(executor.submit(self._reproduce, task, entry) for entry in group)
+
+                results = []
+                for future in futures:
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        logger.exception(f"Failed to reproduce POV: {e}")
+                        results.append(False)
+
+            return any(results)
+        finally:
+            self.pov_status.release(entries)
 
     def serve(self) -> None:
         logger.info("Starting POV Reproducer")
@@ -6,7 +6,7 @@ from buttercup.orchestrator.scheduler.config import (
 )
 from buttercup.orchestrator.scheduler.scheduler import Scheduler, Task, BuildOutput
 from buttercup.common.logger import setup_package_logger
-from buttercup.common.telemetry import init_telemetry
+from buttercup.common.telemetry import init_telemetry, register_queue_metrics
 
 from pydantic_settings import get_subcommand
 from redis import Redis
@@ -40,6 +40,8 @@ def main():
     if isinstance(command, ServeCommand):
         init_telemetry("scheduler")
         redis = Redis.from_url(command.redis_url, decode_responses=False)
+        # The scheduler is a singleton, export the queue metrics from here only
+        register_queue_metrics(redis)
         scheduler = Scheduler(
             settings.tasks_storage_dir,
             settings.scratch_dir,
@@ -51,6 +53,7 @@ def main():
             competition_api_cycle_time=command.competition_api_cycle_time,
             patch_submission_retry_limit=command.patch_submission_retry_limit,
             patch_requests_per_vulnerability=command.patch_requests_per_vulnerability,
+            queue_batch_size=command.queue_batch_size,
         )
         scheduler.serve()
     elif isinstance(command, ProcessReadyTaskCommand):
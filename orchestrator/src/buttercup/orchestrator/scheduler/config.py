@@ -23,6 +23,9 @@ class ServeCommand(BaseSettings):
     concurrent_patch_requests_per_task: Annotated[
         int, Field(default=12, description="Number of concurrent patch requests per task")
     ]
+    queue_batch_size: Annotated[
+        int, Field(default=16, description="Max items popped from the vulnerability/patch queues per cycle")
+    ]
 
     class Config:
         nested_model_default_partial_update = True
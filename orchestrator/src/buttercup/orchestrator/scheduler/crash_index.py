@@ -0,0 +1,207 @@
+"""Index of the crash states of the submissions, used to find the submissions similar to a new crash.
+
+Comparing a new crash against every crash of every submission of a task requires parsing all the stored stacktraces
+and running a Levenshtein distance for each pair, which does not scale to thousands of submissions. The index keeps
+the parsed crash states of each task and only compares the new crash against the states that could be similar to it.
+
+`CrashComparer.is_similar(a, b)` can only be true if:
+- a and b are equal, or
+- a and b have at least one line in common (the longest common subsequence must be >= 2), or
+- some line of a is similar enough to the line of b at the same position (the average similarity ratio of the lines
+  must be above the threshold, so at least one of them is).
+
+The index finds the states satisfying any of these conditions, and the exact comparison is then run on those only. The
+decisions are therefore the same as comparing against every stored state.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Iterable, Sequence
+
+from buttercup.common.clusterfuzz_parser.crash_comparer import CrashComparer
+from buttercup.common.datastructures.msg_pb2 import SubmissionEntry
+
+# Max number of comparisons whose result is cached
+COMPARISON_CACHE_SIZE = 1 << 16
+
+
+def levenshtein_distance(string_1: str, string_2: str) -> int:
+    """Levenshtein distance of two strings, using the bit-parallel algorithm of Myers (as formulated by Hyyrö).
+
+    The columns of the distance matrix are encoded as bit vectors, so that each character of `string_2` is processed
+    with a few integer operations instead of a loop over `string_1`.
+    """
+    if not string_1:
+        return len(string_2)
+
+    peq: dict[str, int] = {}
+    for i, c in enumerate(string_1):
+        peq[c] = peq.get(c, 0) | (1 << i)
+
+    mask = (1 << len(string_1)) - 1
+    last = 1 << (len(string_1) - 1)
+    pv, mv, score = mask, 0, len(string_1)
+    for c in string_2:
+        eq = peq.get(c, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | ~(xh | pv)
+        mh = pv & xh
+        if ph & last:
+            score += 1
+        elif mh & last:
+            score -= 1
+        ph = (ph << 1) | 1
+        mh <<= 1
+        pv = (mh | ~(xv | ph)) & mask
+        mv = ph & xv & mask
+    return score
+
+
+def similarity_ratio(string_1: str, string_2: str) -> float:
+    """Same as the similarity ratio of `CrashComparer`."""
+    length_sum = len(string_1) + len(string_2)
+    if length_sum == 0:
+        return 1.0
+    return (length_sum - levenshtein_distance(string_1, string_2)) / length_sum
+
+
+@dataclass
+class _StateIndex:
+    """Crash states of the submissions of a task, for one kind of crash state (crash data or instrumentation key)."""
+
+    entries_by_state: dict[str, set[int]] = field(default_factory=lambda: defaultdict(set))
+    states_by_line: dict[str, set[str]] = field(default_factory=lambda: defaultdict(set))
+    # Line position -> line length -> lines found at that position
+    lines_by_position: list[dict[int, set[str]]] = field(default_factory=list)
+    # (line position, line) -> states having that line at that position
+    states_by_position: dict[tuple[int, str], set[str]] = field(default_factory=lambda: defaultdict(set))
+
+    def add(self, state: str, entry_idx: int) -> None:
+        # Empty states are never similar to anything
+        if not state:
+            return
+        if state not in self.entries_by_state:
+            lines = state.splitlines()
+            for line in lines:
+                self.states_by_line[line].add(state)
+            for position, line in enumerate(lines):
+                if position == len(self.lines_by_position):
+                    self.lines_by_position.append(defaultdict(set))
+                self.lines_by_position[position][len(line)].add(line)
+                self.states_by_position[(position, line)].add(state)
+        self.entries_by_state[state].add(entry_idx)
+
+    def candidates(self, state: str, line_ratio: Callable[[str, str], float]) -> set[str]:
+        """Stored states that could be similar to `state`."""
+        if not state:
+            return set()
+
+        result = {state} if state in self.entries_by_state else set()
+        # States with a fuzzer hash are only compared exactly
+        if "FuzzerHash=" in state:
+            return result
+
+        lines = state.splitlines()
+        for line in set(lines):
+            result.update(self.states_by_line.get(line, ()))
+
+        threshold = CrashComparer.COMPARE_THRESHOLD
+        for position, line in enumerate(lines[: len(self.lines_by_position)]):
+            # The similarity ratio of two lines is at most 2 * min(len) / (len1 + len2), the lengths must be close
+            min_length = len(line) * threshold / (2 - threshold)
+            max_length = len(line) * (2 - threshold) / threshold
+            for length, others in self.lines_by_position[position].items():
+                if not min_length <= length <= max_length:
+                    continue
+                for other in others:
+                    if other != line and line_ratio(line, other) > threshold:
+                        result.update(self.states_by_position[(position, other)])
+        return result
+
+    def entries(self, states: Iterable[str]) -> set[int]:
+        result: set[int] = set()
+        for state in states:
+            result.update(self.entries_by_state[state])
+        return result
+
+
+@dataclass
+class _TaskIndex:
+    crash_data: _StateIndex = field(default_factory=_StateIndex)
+    inst_key: _StateIndex = field(default_factory=_StateIndex)
+
+
+class CrashIndex:
+    """Crash states of the crashes of the submissions, grouped by task.
+
+    The index mirrors the list of submission entries: `sync` indexes the crashes added since the last call, and starts
+    over if the list was replaced.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self._tasks: dict[str, _TaskIndex] = defaultdict(_TaskIndex)
+        # Entry, and (crash data, instrumentation key) of each of its crashes, by entry index
+        self._entries: list[tuple[SubmissionEntry, list[tuple[str, str]]]] = []
+        self._line_ratio = lru_cache(maxsize=COMPARISON_CACHE_SIZE)(similarity_ratio)
+        self._is_similar = lru_cache(maxsize=COMPARISON_CACHE_SIZE)(self._compare)
+
+    @staticmethod
+    def _compare(crash_state_1: str, crash_state_2: str) -> bool:
+        return bool(CrashComparer(crash_state_1, crash_state_2).is_similar())
+
+    def is_similar(self, crash_state_1: str, crash_state_2: str) -> bool:
+        """Cached `CrashComparer(crash_state_1, crash_state_2).is_similar()`."""
+        return self._is_similar(crash_state_1, crash_state_2)
+
+    def sync(
+        self,
+        entries: Sequence[SubmissionEntry],
+        task_id: Callable[[SubmissionEntry], str],
+        tokenize: Callable[[str], tuple[str, str]],
+    ) -> None:
+        """Index the crashes of `entries` that are not indexed yet.
+
+        Args:
+            entries: All the submission entries
+            task_id: Returns the task of an entry
+            tokenize: Returns the crash data and instrumentation key of a stacktrace
+        """
+        if len(entries) < len(self._entries) or any(
+            entries[i] is not e or len(e.crashes) < len(tokens) for i, (e, tokens) in enumerate(self._entries)
+        ):
+            self.reset()
+
+        for i, e in enumerate(entries):
+            if i == len(self._entries):
+                self._entries.append((e, []))
+            tokens = self._entries[i][1]
+            if len(tokens) == len(e.crashes):
+                continue
+
+            task_index = self._tasks[task_id(e)]
+            for crash_with_id in e.crashes[len(tokens) :]:
+                crash_data, inst_key = tokenize(crash_with_id.crash.crash.stacktrace)
+                task_index.crash_data.add(crash_data, i)
+                task_index.inst_key.add(inst_key, i)
+                tokens.append((crash_data, inst_key))
+
+    def crash_tokens(self, entry_idx: int) -> list[tuple[str, str]]:
+        """Crash data and instrumentation key of each crash of an entry, in order."""
+        return self._entries[entry_idx][1]
+
+    def candidates(self, task_id: str, crash_data: str, inst_key: str) -> list[int]:
+        """Indices of the entries of a task that may contain a crash similar to the given one, in order."""
+        task_index = self._tasks.get(task_id)
+        if task_index is None:
+            return []
+
+        result = task_index.crash_data.entries(task_index.crash_data.candidates(crash_data, self._line_ratio))
+        result |= task_index.inst_key.entries(task_index.inst_key.candidates(inst_key, self._line_ratio))
+        return sorted(result)
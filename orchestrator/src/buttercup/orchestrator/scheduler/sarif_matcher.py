@@ -1,8 +1,13 @@
+from __future__ import annotations
+
+import bisect
+import math
+
 from buttercup.common.datastructures.msg_pb2 import TracedCrash
 from buttercup.common.clusterfuzz_parser.slice import StackFrame
 from buttercup.common import stack_parsing
 from buttercup.orchestrator.task_server.models.types import SARIFBroadcastDetail
-from typing import List, Tuple
+from typing import Dict, List, Tuple
 from pathlib import Path
 from dataclasses import dataclass
 import logging
@@ -36,6 +41,95 @@ class SarifMatch:
     matches_lines: bool = False
 
 
+class SarifIndex:
+    """Locations of a SARIF indexed by file name and function name, so that the frames of a crash are matched with a
+    few lookups instead of a walk over all the locations."""
+
+    def __init__(self, sarif_infos: List[SarifInfo]):
+        self.sarif_infos = sarif_infos
+        # File name -> (start line, end line, index in sarif_infos), sorted by start line
+        self._intervals_by_filename: Dict[str, List[Tuple[int, int, int]]] = {}
+        # Function name -> first index in sarif_infos
+        self._first_by_function: Dict[str, int] = {}
+        for idx, info in enumerate(sarif_infos):
+            start, end = info.lines
+            self._intervals_by_filename.setdefault(info.file.name, []).append((start, end, idx))
+            if info.function is not None:
+                self._first_by_function.setdefault(info.function, idx)
+        for intervals in self._intervals_by_filename.values():
+            intervals.sort()
+
+    @classmethod
+    def from_broadcast(cls, sarif_broadcast: SARIFBroadcastDetail) -> SarifIndex:
+        return cls(_sarif_detail(sarif_broadcast))
+
+    def match(self, traced_crash: TracedCrash) -> SarifMatch | None:
+        """Match the SARIF with a traced crash, see `match`."""
+        if not self.sarif_infos:
+            return None
+
+        # Parse the stacktrace
+        stacktrace = stack_parsing.parse_stacktrace(traced_crash.tracer_stacktrace)
+
+        # Check each thread for a match
+        for thread_frame in stacktrace.frames:
+            match = self._match_thread_callstack(thread_frame)
+            if match:
+                return match
+
+        return None
+
+    def _match_thread_callstack(self, frames: List[StackFrame]) -> SarifMatch | None:
+        """
+        Match a thread frame with SARIF information.
+
+        Args:
+            frames: List of stack frames from a thread
+
+        Returns:
+            The match of the first frame matching any SARIF info, None otherwise
+        """
+        if not frames:
+            return None
+
+        for frame in frames:
+            try:
+                frame = _get_frame(frame)
+                if frame is None:
+                    continue
+                match = self.match_frame(frame)
+                if match:
+                    return match
+            except Exception as e:
+                logger.error(f"Error getting frame {frame}: {e}")
+                continue
+
+        return None
+
+    def match_frame(self, frame: Frame) -> SarifMatch | None:
+        """Match a frame with the first SARIF info matching it, see `_match_info`."""
+        # Frames without a function never match
+        if not isinstance(frame.function, str):
+            return None
+
+        candidates = []
+        intervals = self._intervals_by_filename.get(frame.file.name, [])
+        # Intervals starting after the line can't contain it
+        for start, end, idx in intervals[: bisect.bisect_right(intervals, (frame.line, math.inf, math.inf))]:
+            if frame.line <= end:
+                candidates.append(idx)
+        if frame.function in self._first_by_function:
+            candidates.append(self._first_by_function[frame.function])
+        if frame.function.startswith("OSS_FUZZ_"):
+            stripped_function = frame.function.split("OSS_FUZZ_")[1]
+            if stripped_function in self._first_by_function:
+                candidates.append(self._first_by_function[stripped_function])
+
+        if not candidates:
+            return None
+        return _match_info(frame, self.sarif_infos[min(candidates)])
+
+
 def match(sarif_broadcast: SARIFBroadcastDetail, traced_crash: TracedCrash) -> SarifMatch | None:
     """
     Match a SARIF broadcast with a traced crash.
@@ -47,23 +141,7 @@ def match(sarif_broadcast: SARIFBroadcastDetail, traced_crash: TracedCrash) -> S
     Returns:
         A SarifMatch object if a match is found between the SARIF and traced crash, None otherwise
     """
-
-    # Extract SARIF details
-    sarif_infos = _sarif_detail(sarif_broadcast)
-
-    if not sarif_infos:
-        return None
-
-    # Parse the stacktrace
-    stacktrace = stack_parsing.parse_stacktrace(traced_crash.tracer_stacktrace)
-
-    # Check each thread for a match
-    for thread_frame in stacktrace.frames:
-        match = _match_thread_callstack(thread_frame, sarif_infos)
-        if match:
-            return match
-
-    return None
+    return SarifIndex.from_broadcast(sarif_broadcast).match(traced_crash)
 
 
 def _sarif_detail(sarif_broadcast: SARIFBroadcastDetail) -> List[SarifInfo]:
@@ -117,7 +195,8 @@ def _sarif_detail(sarif_broadcast: SARIFBroadcastDetail) -> List[SarifInfo]:
                 region = physical_location.get("region", {})
                 start_line = region.get("startLine")
                 end_line = region.get("endLine")
-                if start_line is None or end_line is None:
+                # Line numbers that can't be compared never match
+                if not isinstance(start_line, int) or not isinstance(end_line, int):
                     continue
 
                 # Extract function name if available
@@ -138,38 +217,6 @@ def _sarif_detail(sarif_broadcast: SARIFBroadcastDetail) -> List[SarifInfo]:
     return sarif_infos
 
 
-def _match_thread_callstack(frames: List[StackFrame], sarif_infos: List[SarifInfo]) -> SarifMatch | None:
-    """
-    Match a thread frame with SARIF information.
-
-    Args:
-        frames: List of stack frames from a thread
-        sarif_infos: List of SARIF information objects
-
-    Returns:
-        True if any frame matches any SARIF info, False otherwise
-    """
-    if not frames:
-        return None
-
-    if not sarif_infos:
-        return None
-
-    for frame in frames:
-        try:
-            frame = _get_frame(frame)
-            if frame is None:
-                continue
-            match = _match_frame(frame, sarif_infos)
-            if match:
-                return match
-        except Exception as e:
-            logger.error(f"Error getting frame {frame}: {e}")
-            continue
-
-    return None
-
-
 def _get_frame(frame: StackFrame) -> Frame | None:
     """
     Get a Frame object from a StackFrame object.
@@ -181,7 +228,7 @@ def _get_frame(frame: StackFrame) -> Frame | None:
     return Frame(file=Path(frame.filename), line=int(frame.fileline), function=frame.function_name)
 
 
-def _match_frame(frame: Frame, sarif_infos: List[SarifInfo]) -> SarifMatch | None:
+def _match_info(frame: Frame, info: SarifInfo) -> SarifMatch | None:
     """
     Match a frame with SARIF information.
 
@@ -192,10 +239,10 @@ def _match_frame(frame: Frame, sarif_infos: List[SarifInfo]) -> SarifMatch | Non
 
     Args:
         frame: Stack frame from the crash
-        sarif_infos: List of SARIF information objects
+        info: SARIF information object
 
     Returns:
-        True if a match is found, False otherwise
+        A SarifMatch object if a match is found, None otherwise
     """
 
     def line_match(frame_line: int | str, info_lines: Tuple[int, int]) -> bool:
@@ -212,28 +259,26 @@ def _match_frame(frame: Frame, sarif_infos: List[SarifInfo]) -> SarifMatch | Non
             return frame_function == info_function
         return False
 
-    for info in sarif_infos:
-        try:
-            matches_lines = line_match(frame.line, info.lines)
-            matches_function = frame.function == info.function
-            matches_filename = frame.file.name == info.file.name
-            matches_full_path = frame.file == info.file
-            stripped_matches_function = stripped_function_match(frame.function, info.function)
-
-            # Either match lines and filename (or full path) or function name
-            location_match = matches_lines and (matches_filename or matches_full_path)
-            if location_match or matches_function or stripped_matches_function:
-                return SarifMatch(
-                    sarif_info=info,
-                    frame=frame,
-                    matches_function=matches_function,
-                    matches_stripped_function=stripped_matches_function,
-                    matches_filename=matches_filename,
-                    matches_full_path=matches_full_path,
-                    matches_lines=matches_lines,
-                )
-        except Exception as e:
-            logger.error(f"Error matching frame {frame} with SARIF info {info}: {e}")
-            continue
+    try:
+        matches_lines = line_match(frame.line, info.lines)
+        matches_function = frame.function == info.function
+        matches_filename = frame.file.name == info.file.name
+        matches_full_path = frame.file == info.file
+        stripped_matches_function = stripped_function_match(frame.function, info.function)
+
+        # Either match lines and filename (or full path) or function name
+        location_match = matches_lines and (matches_filename or matches_full_path)
+        if location_match or matches_function or stripped_matches_function:
+            return SarifMatch(
+                sarif_info=info,
+                frame=frame,
+                matches_function=matches_function,
+                matches_stripped_function=stripped_matches_function,
+                matches_filename=matches_filename,
+                matches_full_path=matches_full_path,
+                matches_lines=matches_lines,
+            )
+    except Exception as e:
+        logger.error(f"Error matching frame {frame} with SARIF info {info}: {e}")
 
     return None
@@ -5,6 +5,7 @@ from typing import Set, Union
 from redis import Redis
 from buttercup.common.queues import ReliableQueue, QueueFactory, RQItem, QueueNames, GroupNames
 from buttercup.common.maps import HarnessWeights, BuildMap
+from buttercup.common.harness_scheduler import HarnessScheduler
 from buttercup.common.challenge_task import ChallengeTask
 from buttercup.common.datastructures.msg_pb2 import (
     TaskReady,
@@ -43,6 +44,7 @@ class Scheduler:
     patch_submission_retry_limit: int = 60
     patch_requests_per_vulnerability: int = 1
     concurrent_patch_requests_per_task: int = 12
+    queue_batch_size: int = 16  # Max items popped from the vulnerability/patch queues per cycle
 
     ready_queue: ReliableQueue | None = field(init=False, default=None)
     build_requests_queue: ReliableQueue | None = field(init=False, default=None)
@@ -50,6 +52,8 @@ class Scheduler:
     index_queue: ReliableQueue | None = field(init=False, default=None)
     index_output_queue: ReliableQueue | None = field(init=False, default=None)
     harness_map: HarnessWeights | None = field(init=False, default=None)
+    harness_scheduler: HarnessScheduler | None = field(init=False, default=None)
+    harness_schedule_dirty: bool = field(init=False, default=False)
     build_map: BuildMap | None = field(init=False, default=None)
     cancellation: Cancellation | None = field(init=False, default=None)
     task_registry: TaskRegistry | None = field(init=False, default=None)
@@ -113,6 +117,7 @@ class Scheduler:
                 QueueNames.INDEX_OUTPUT, GroupNames.ORCHESTRATOR, block_time=None
             )
             self.harness_map = HarnessWeights(self.redis)
+            self.harness_scheduler = HarnessScheduler(self.redis)
             self.build_map = BuildMap(self.redis)
             self.task_registry = TaskRegistry(self.redis)
             self.status_checker = StatusChecker(self.competition_api_cycle_time)
@@ -261,6 +266,8 @@ class Scheduler:
             targets = self.process_build_output(build_output)
             for target in targets:
                 self.harness_map.push_harness(target)
+            if targets:
+                self.harness_schedule_dirty = True
             logger.info(
                 f"Pushed {len(targets)} targets to fuzzer map for {build_output.task_id} | {build_output.engine} | {build_output.sanitizer} | {build_output.task_dir}"
             )
@@ -358,15 +365,39 @@ class Scheduler:
                 )
                 any_updated = True
 
+        if any_updated:
+            self.harness_schedule_dirty = True
         return any_updated
 
+    def update_harness_schedule(self) -> bool:
+        """Recompute the weights used by the fuzzing task loops.
+
+        The schedule is recomputed right away when harnesses were added or stopped, and periodically otherwise to
+        follow the progress of each harness.
+
+        Returns:
+            bool: True if the schedule was recomputed, False otherwise
+        """
+        if self.harness_scheduler is None:
+            return False
+
+        try:
+            if self.harness_schedule_dirty:
+                self.harness_scheduler.update()
+                self.harness_schedule_dirty = False
+                return True
+            return self.harness_scheduler.maybe_update()
+        except Exception as e:
+            logger.error(f"Failed to update the harness schedule: {e}")
+            return False
+
     def competition_api_interactions(self) -> bool:
         """Process vulnerabilities and patches, and check submission statuses.
 
         This method:
-        1. Processes any new vulnerabilities from the traced_vulnerabilities_queue,
+        1. Processes a batch of new vulnerabilities from the traced_vulnerabilities_queue,
            submitting them to the competition API
-        2. Processes any new patches from the patches_queue, recording them for
+        2. Processes a batch of new patches from the patches_queue, recording them for
            later submission once the associated vulnerability is validated
         3. Periodically checks status of submitted vulnerabilities and patches via
            the status_checker, which rate limits API calls
@@ -376,20 +407,30 @@ class Scheduler:
             bool: True if any items were processed from the queues, False otherwise
         """
         collected_item = False
-        vuln_item: RQItem[TracedCrash] | None = self.traced_vulnerabilities_queue.pop()
-        if vuln_item is not None:
-            crash: TracedCrash = vuln_item.deserialized
-            logger.info(f"Recording vulnerability for task {crash.crash.target.task_id}")
-            if self.submissions.submit_vulnerability(crash):
-                self.traced_vulnerabilities_queue.ack_item(vuln_item.item_id)
+        vuln_items: list[RQItem[TracedCrash]] = self.traced_vulnerabilities_queue.pop_batch(self.queue_batch_size)
+        processed_ids: list[str] = []
+        try:
+            for vuln_item in vuln_items:
+                crash: TracedCrash = vuln_item.deserialized
+                logger.info(f"Recording vulnerability for task {crash.crash.target.task_id}")
+                if self.submissions.submit_vulnerability(crash):
+                    processed_ids.append(vuln_item.item_id)
+        finally:
+            if processed_ids:
+                self.traced_vulnerabilities_queue.ack_batch(processed_ids)
                 collected_item = True
 
-        patch_item: RQItem[Patch] | None = self.patches_queue.pop()
-        if patch_item is not None:
-            patch: Patch = patch_item.deserialized
-            logger.info(f"Appending patch for task {patch.task_id}")
-            if self.submissions.record_patch(patch):
-                self.patches_queue.ack_item(patch_item.item_id)
+        patch_items: list[RQItem[Patch]] = self.patches_queue.pop_batch(self.queue_batch_size)
+        processed_ids = []
+        try:
+            for patch_item in patch_items:
+                patch: Patch = patch_item.deserialized
+                logger.info(f"Appending patch for task {patch.task_id}")
+                if self.submissions.record_patch(patch):
+                    processed_ids.append(patch_item.item_id)
+        finally:
+            if processed_ids:
+                self.patches_queue.ack_batch(processed_ids)
                 collected_item = True
 
         def do_check():
@@ -411,6 +452,7 @@ class Scheduler:
             self.serve_build_output,
             self.serve_index_output,
             self.update_expired_task_weights,
+            self.update_harness_schedule,
             self.competition_api_interactions,
         ]
 
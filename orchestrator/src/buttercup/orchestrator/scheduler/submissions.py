@@ -2,9 +2,11 @@ from dataclasses import field, dataclass
 from functools import lru_cache
 import logging
 import base64
+import operator
+import time
 import uuid
 from redis import Redis
-from typing import Callable, Iterator, List, Set, Tuple
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple
 from opentelemetry import trace
 from opentelemetry.trace import Status, StatusCode
 import buttercup.common.node_local as node_local
@@ -30,7 +32,8 @@ from buttercup.common.sarif_store import SARIFStore
 from buttercup.common.task_registry import TaskRegistry
 from buttercup.common.telemetry import set_crs_attributes, CRSActionCategory
 
-from buttercup.orchestrator.scheduler.sarif_matcher import match
+from buttercup.orchestrator.scheduler.sarif_matcher import SarifIndex
+from buttercup.orchestrator.scheduler.crash_index import CrashIndex
 from buttercup.orchestrator.competition_api_client.models.types_architecture import TypesArchitecture
 from buttercup.orchestrator.competition_api_client.models.types_pov_submission import TypesPOVSubmission
 from buttercup.orchestrator.competition_api_client.models.types_patch_submission import TypesPatchSubmission
@@ -45,7 +48,6 @@ from buttercup.orchestrator.competition_api_client.api import PovApi, PatchApi,
 from buttercup.common.challenge_task import ChallengeTask
 from buttercup.common.project_yaml import ProjectYaml
 from buttercup.common.stack_parsing import get_crash_data, get_inst_key
-from buttercup.common.clusterfuzz_parser.crash_comparer import CrashComparer
 
 logger = logging.getLogger(__name__)
 
@@ -124,6 +126,11 @@ def log_entry(
     fn(log_msg)
 
 
+def _crash_tokens(stacktrace: str) -> tuple[str, str]:
+    """Get the crash data and instrumentation key of a stacktrace."""
+    return get_crash_data(stacktrace), get_inst_key(stacktrace)
+
+
 def _advance_patch_idx(e: SubmissionEntry) -> None:
     """Advance the patch index to the next patch."""
     e.patch_idx += 1
@@ -199,6 +206,17 @@ def _get_eligible_povs_for_submission(e: SubmissionEntry) -> list[CrashWithId]:
     ]
 
 
+def _has_patched_builds(e: SubmissionEntry) -> bool:
+    """Whether the builds of the current patch are all available, so that the patch can be checked against PoVs."""
+    patch = _current_patch(e)
+    return bool(patch and patch.patch and patch.build_outputs and all(b.task_dir for b in patch.build_outputs))
+
+
+def _waits_for_sarif(e: SubmissionEntry) -> bool:
+    """Whether a SARIF could be bundled with the entry once one is broadcast for its task."""
+    return bool(_get_first_successful_pov(e)) and not (e.bundles and e.bundles[0].competition_sarif_id)
+
+
 def _find_matching_build_output(patch: SubmissionEntryPatch, build_output: BuildOutput) -> BuildOutput | None:
     """Find the matching build output in the patch."""
     # Found the patch, now locate the placeholder for the build output
@@ -664,7 +682,11 @@ class Submissions:
 
     Processing Cycles
     ----------------
-    The process_cycle() method orchestrates all the state transitions in sequence:
+    The process_cycle() method orchestrates all the state transitions in sequence, for the entries that may progress:
+    - entries marked dirty, because they are new or one of their inputs changed (a new crash, a patch, a patched build,
+      a SARIF broadcast for their task, or a change made in the previous cycle);
+    - entries waiting on external state (the competition API, POV reproductions, a retry), whose timer is due.
+    Entries that are not waiting on anything are not processed until an event marks them dirty.
 
     1. Vulnerability Processing:
        - _submit_patch_requests(): Request patches for newly accepted vulnerabilities
@@ -683,7 +705,8 @@ class Submissions:
        - _resubmit_errored_bundles(): Retry errored bundle submissions
 
     Assumptions:
-    - Submissions are stored in redis but also kept in memory for fast access.
+    - Submissions are stored in redis but also kept in memory for fast access. Their index in memory is also their
+      key in redis, entries are never removed.
     - There is only ever one instance of this class.
 
     This class is mostly concerned with the submission logic and ensuring that state is persisted to Redis.
@@ -691,7 +714,10 @@ class Submissions:
     """
 
     # Redis names
-    SUBMISSIONS = "submissions"
+    SUBMISSIONS = "submissions"  # Legacy list of the entries, moved to SUBMISSION_ENTRIES when loaded
+    SUBMISSION_ENTRIES = "submission_entries"
+    DIRTY_SUBMISSIONS = "dirty_submissions"
+    SUBMISSION_TIMERS = "submission_timers"
     MATCHED_SARIFS = "matched_sarifs"
 
     redis: Redis
@@ -701,17 +727,35 @@ class Submissions:
     patch_submission_retry_limit: int = 60
     patch_requests_per_vulnerability: int = 1
     concurrent_patch_requests_per_task: int = 12
+    poll_interval: float = 10.0  # Seconds before an entry waiting on external state is processed again
+    max_poll_interval: float = 60.0  # The interval doubles while the entry doesn't change, up to this value
     entries: List[SubmissionEntry] = field(init=False)
+    # Indices of the entries to process in the next cycle
+    dirty: Set[int] = field(init=False)
+    # Entries known to the cycle, entries added to `entries` directly are marked dirty
+    tracked_entries: List[SubmissionEntry] = field(init=False)
+    poll_delays: Dict[int, float] = field(default_factory=dict)
+    # Entries woken up by events of their task, by task
+    entries_with_patched_builds: Dict[str, Set[int]] = field(default_factory=dict)
+    entries_waiting_for_sarif: Dict[str, Set[int]] = field(default_factory=dict)
+    sarif_versions: Dict[str, bytes | None] = field(default_factory=dict)
     sarif_store: SARIFStore = field(init=False)
     matched_sarifs: Set[str] = field(default_factory=set)
     build_requests_queue: ReliableQueue[BuildRequest] = field(init=False)
     pov_reproduce_status: PoVReproduceStatus = field(init=False)
+    crash_index: CrashIndex = field(default_factory=CrashIndex)
+    # SARIFs don't change once broadcast, their index is built once
+    sarif_indexes: Dict[str, SarifIndex] = field(default_factory=dict)
 
     def __post_init__(self) -> None:
         logger.info(
             f"Initializing Submissions, patch_submission_retry_limit={self.patch_submission_retry_limit}, patch_requests_per_vulnerability={self.patch_requests_per_vulnerability}, concurrent_patch_requests_per_task={self.concurrent_patch_requests_per_task}"
         )
         self.entries = self._get_stored_submissions()
+        self.dirty = {int(i) for i in self.redis.smembers(self.DIRTY_SUBMISSIONS)}
+        self.tracked_entries = list(self.entries)
+        for i, e in enumerate(self.entries):
+            self._watch(i, e)
         self.sarif_store = SARIFStore(self.redis)
         self.matched_sarifs = self._get_matched_sarifs(self.redis)
         queue_factory = QueueFactory(self.redis)
@@ -728,16 +772,146 @@ class Submissions:
         return set(redis.smembers(self.MATCHED_SARIFS))
 
     def _get_stored_submissions(self) -> List[SubmissionEntry]:
-        """Get all stored submissions from Redis."""
-        return [SubmissionEntry.FromString(raw) for raw in self.redis.lrange(self.SUBMISSIONS, 0, -1)]
+        """Get all stored submissions from Redis, moving them out of the legacy list if needed."""
+        stored = {int(i): raw for i, raw in self.redis.hgetall(self.SUBMISSION_ENTRIES).items()}
+        if not stored:
+            legacy = self.redis.lrange(self.SUBMISSIONS, 0, -1)
+            if legacy:
+                logger.info(f"Moving {len(legacy)} submissions to {self.SUBMISSION_ENTRIES}")
+                stored = dict(enumerate(legacy))
+                with self.redis.pipeline() as pipe:
+                    pipe.hset(self.SUBMISSION_ENTRIES, mapping={str(i): raw for i, raw in stored.items()})
+                    # Nothing is known about their state, they are all processed once
+                    pipe.sadd(self.DIRTY_SUBMISSIONS, *stored)
+                    pipe.delete(self.SUBMISSIONS)
+                    pipe.execute()
+        return [SubmissionEntry.FromString(stored[i]) for i in range(len(stored))]
 
     def _persist(self, redis: Redis, index: int, entry: SubmissionEntry) -> None:
-        """Persist the submissions to Redis."""
-        redis.lset(self.SUBMISSIONS, index, entry.SerializeToString())
+        """Persist the submission to Redis."""
+        redis.hset(self.SUBMISSION_ENTRIES, str(index), entry.SerializeToString())
+
+    def _push(self, index: int, entry: SubmissionEntry) -> bool:
+        """Push a new submission to Redis. Returns False if there already is a submission at that index."""
+        with self.redis.pipeline() as pipe:
+            pipe.hsetnx(self.SUBMISSION_ENTRIES, str(index), entry.SerializeToString())
+            self._mark_dirty(pipe, index)
+            return bool(pipe.execute()[0])
+
+    def _mark_dirty(self, redis: Redis, index: int) -> None:
+        """Mark the submission to be processed in the next cycle."""
+        self.dirty.add(index)
+        redis.sadd(self.DIRTY_SUBMISSIONS, index)
+
+    def _watch(self, index: int, entry: SubmissionEntry) -> None:
+        """Register the submission for the events of its task it must be woken up by."""
+        task_id = _task_id(entry)
+        for watchers, watching in (
+            (self.entries_with_patched_builds, _has_patched_builds(entry)),
+            (self.entries_waiting_for_sarif, _waits_for_sarif(entry)),
+        ):
+            if watching and not entry.stop:
+                watchers.setdefault(task_id, set()).add(index)
+            else:
+                self._unwatch(watchers, task_id, index)
+
+    def _unwatch(self, watchers: Dict[str, Set[int]], task_id: str, index: int) -> None:
+        if index in watchers.get(task_id, ()):
+            watchers[task_id].discard(index)
+            if not watchers[task_id]:
+                del watchers[task_id]
+        if task_id not in self.entries_waiting_for_sarif:
+            self.sarif_versions.pop(task_id, None)
+
+    def _forget(self, redis: Redis, index: int, entry: SubmissionEntry) -> None:
+        """Stop processing a submission that is stopped or whose task is stopped."""
+        self.dirty.discard(index)
+        self.poll_delays.pop(index, None)
+        redis.srem(self.DIRTY_SUBMISSIONS, index)
+        redis.zrem(self.SUBMISSION_TIMERS, index)
+        for watchers in (self.entries_with_patched_builds, self.entries_waiting_for_sarif):
+            self._unwatch(watchers, _task_id(entry), index)
+
+    def _wake_entries_with_patched_builds(self, redis: Redis, task_id: str) -> None:
+        """Wake up the submissions whose patch may mitigate a new crash of the task."""
+        for index in self.entries_with_patched_builds.get(task_id, ()):
+            self._mark_dirty(redis, index)
+
+    def _wake_entries_waiting_for_sarif(self) -> None:
+        """Wake up the submissions waiting for a SARIF of a task whose SARIFs changed since the last check."""
+        task_ids = list(self.entries_waiting_for_sarif)
+        for task_id, version in zip(task_ids, self.sarif_store.get_versions(task_ids)):
+            # Versions not seen yet may have changed after the entries were last processed
+            if task_id not in self.sarif_versions or self.sarif_versions[task_id] != version:
+                self.sarif_versions[task_id] = version
+                self.dirty.update(self.entries_waiting_for_sarif[task_id])
+
+    def _track_new_entries(self) -> None:
+        """Mark dirty the entries that were not added through `submit_vulnerability`, e.g. set in `entries` directly."""
+        if len(self.tracked_entries) == len(self.entries) and all(
+            map(operator.is_, self.tracked_entries, self.entries)
+        ):
+            return
+        for i, e in enumerate(self.entries):
+            if i >= len(self.tracked_entries) or self.tracked_entries[i] is not e:
+                self.dirty.add(i)
+                self._watch(i, e)
+        self.tracked_entries = list(self.entries)
+
+    def _waits_on_external_state(self, e: SubmissionEntry) -> bool:
+        """
+        Whether the submission may progress without any event, e.g. once the competition API evaluated a submission,
+        and must therefore be checked periodically.
+        """
+        # Statuses to fetch from the competition API
+        if _get_pending_pov_submissions(e) or _get_pending_patch_submissions(e):
+            return True
+        if not _get_first_successful_pov(e):
+            # PoVs to submit again after an error
+            return bool(_get_eligible_povs_for_submission(e))
+        # Bundles to delete, or SARIF to confirm, after a failure
+        if len(e.bundles) > 1:
+            return True
+        if (
+            e.bundles
+            and e.bundles[0].competition_sarif_id
+            and e.bundles[0].competition_sarif_id not in self.matched_sarifs
+        ):
+            return True
+
+        patch = _current_patch(e)
+        if patch is None:
+            # Waiting for room for a patch request, or for a patch from another submission to be evaluated
+            return True
+        if not _has_patched_builds(e):
+            # Waiting for the patch, then for its builds, which are both events
+            return False
+        if patch.result != SubmissionResult.PASSED:
+            # Waiting for the PoVs to be reproduced against the patched builds
+            return True
+        # Bundle to submit or update after a failure
+        return not e.bundles or e.bundles[0].competition_patch_id != patch.competition_patch_id
+
+    def _schedule(self, redis: Redis, index: int, entry: SubmissionEntry, changed: bool, waiting: bool) -> None:
+        """Decide when a submission processed in this cycle must be processed again."""
+        self._watch(index, entry)
+        if changed or index in self.dirty:
+            # The changes may let other handlers progress
+            self._mark_dirty(redis, index)
+            self.poll_delays.pop(index, None)
+            redis.zrem(self.SUBMISSION_TIMERS, index)
+            return
 
-    def _push(self, entry: SubmissionEntry) -> int:
-        """Push a submission to Redis."""
-        return self.redis.rpush(self.SUBMISSIONS, entry.SerializeToString())
+        redis.srem(self.DIRTY_SUBMISSIONS, index)
+        if not waiting:
+            self.poll_delays.pop(index, None)
+            redis.zrem(self.SUBMISSION_TIMERS, index)
+            return
+
+        delay = self.poll_delays.get(index)
+        delay = self.poll_interval if delay is None else min(delay * 2, self.max_poll_interval)
+        self.poll_delays[index] = delay
+        redis.zadd(self.SUBMISSION_TIMERS, {str(index): time.time() + delay})
 
     def _enumerate_submissions(self) -> Iterator[tuple[int, SubmissionEntry]]:
         """Enumerate all submissions belonging to active tasks."""
@@ -777,16 +951,20 @@ class Submissions:
         inst_key = get_inst_key(crash.crash.stacktrace)
         task_id = _task_id(crash)
 
-        similar_entries = []
-        for i, e in self._enumerate_task_submissions(task_id):
-            for existing_crash_with_id in e.crashes:
-                submission_crash_data = get_crash_data(existing_crash_with_id.crash.crash.stacktrace)
-                submission_inst_key = get_inst_key(existing_crash_with_id.crash.crash.stacktrace)
+        similar_entries: list[tuple[int, SubmissionEntry]] = []
+        if self.task_registry.should_stop_processing(task_id):
+            return similar_entries
 
-                cf_comparator = CrashComparer(crash_data, submission_crash_data)
-                instkey_comparator = CrashComparer(inst_key, submission_inst_key)
-
-                if cf_comparator.is_similar() or instkey_comparator.is_similar():
+        # Only the submissions with a crash that may be similar are compared
+        self.crash_index.sync(self.entries, _task_id, _crash_tokens)
+        for i in self.crash_index.candidates(task_id, crash_data, inst_key):
+            e = self.entries[i]
+            if e.stop:
+                continue
+            for submission_crash_data, submission_inst_key in self.crash_index.crash_tokens(i):
+                if self.crash_index.is_similar(crash_data, submission_crash_data) or self.crash_index.is_similar(
+                    inst_key, submission_inst_key
+                ):
                     log_entry(
                         e,
                         f"Incoming PoV crash_data: {crash_data}, inst_key: {inst_key}, existing crash_data: {submission_crash_data}, existing inst_key: {submission_inst_key} are duplicates. ",
@@ -887,6 +1065,7 @@ class Submissions:
 
         # Add the updated target entry to pipeline
         self._persist(pipeline, target_index, target_entry)
+        self._mark_dirty(pipeline, target_index)
 
         # Execute all operations atomically
         pipeline.execute()
@@ -919,6 +1098,9 @@ class Submissions:
             logger.debug(f"CrashInfo: {crash}")
             return True
 
+        # Patches of the task may mitigate the new crash
+        self._wake_entries_with_patched_builds(self.redis, _task_id(crash))
+
         # Check if the crash is a variant of an existing submission
         if self._add_to_similar_submission(crash):
             return True
@@ -929,11 +1111,11 @@ class Submissions:
         e.crashes.append(crash_with_id)
 
         # Persist to Redis
-        length = self._push(e)
-        index = length - 1
+        index = len(self.entries)
+        pushed = self._push(index, e)
 
         # If this fails, we have a bug.  Let it crash. Reloading the Submissions object will "fix it".
-        assert index == len(self.entries)
+        assert pushed
 
         # Keep the entries list in sync
         self.entries.append(e)
@@ -1134,7 +1316,10 @@ class Submissions:
 
         bo.task_dir = build_output.task_dir
         # Persist the entry to Redis
-        self._persist(self.redis, i, e)
+        with self.redis.pipeline() as pipe:
+            self._persist(pipe, i, e)
+            self._mark_dirty(pipe, i)
+            pipe.execute()
         log_entry(e, i=i, msg=f"Patched build recorded for patch {patch.internal_patch_id}")
         return True
 
@@ -1423,8 +1608,11 @@ class Submissions:
 
         # Find a SARIF that matches a passed PoV
         for sarif in self._get_available_sarifs_for_matching(_task_id(e)):
+            sarif_index = self.sarif_indexes.get(sarif.sarif_id)
+            if sarif_index is None:
+                sarif_index = self.sarif_indexes[sarif.sarif_id] = SarifIndex.from_broadcast(sarif)
             for crash in e.crashes:
-                match_result = match(sarif, crash.crash)
+                match_result = sarif_index.match(crash.crash)
                 if match_result:
                     log_entry(
                         e,
@@ -1549,7 +1737,10 @@ class Submissions:
         self._reorder_patches_by_completion(e)
 
         # We have a patch now, persist the entry and double check if it will ever be used
-        self._persist(self.redis, i, e)
+        with self.redis.pipeline() as pipe:
+            self._persist(pipe, i, e)
+            self._mark_dirty(pipe, i)
+            pipe.execute()
 
         log_entry(e, i=i, msg="Patch added")
         return True
@@ -1675,9 +1866,19 @@ class Submissions:
 
         return False
 
-    def _merge_entries_by_patch_mitigation(self) -> list[SubmissionEntry]:
-        """Check each PoV in each SubmissionEntry and if they are mitigated by a patch in another SubmissionEntry, merge the two entries."""
-        for i, e in self._enumerate_submissions():
+    def _merge_entries_by_patch_mitigation(self, indices: Iterable[int] | None = None) -> set[int]:
+        """Check each PoV in each SubmissionEntry and if they are mitigated by a patch in another SubmissionEntry, merge the two entries.
+
+        Only the patches of the entries at `indices` are checked, all of them by default. Returns the indices of the
+        entries whose patch is still being checked against some PoVs.
+        """
+        pending: set[int] = set()
+        if indices is None:
+            entries = self._enumerate_submissions()
+        else:
+            # Entries may be stopped by the merges
+            entries = ((i, self.entries[i]) for i in indices if not self.entries[i].stop)
+        for i, e in entries:
             try:
                 task_id = _task_id(e)
 
@@ -1706,6 +1907,8 @@ class Submissions:
                         continue
 
                     pov_reproduce_statuses = self._pov_reproduce_patch_status(current_patch, e2.crashes, task_id)
+                    if any(status is None for status in pov_reproduce_statuses):
+                        pending.add(i)
                     if any(status is not None and not status.did_crash for status in pov_reproduce_statuses):
                         # This patch mitigates at least one PoV from e2, we should merge the entries
                         to_merge.append((j, e2))
@@ -1718,16 +1921,34 @@ class Submissions:
                     self._consolidate_similar_submissions(crash=None, similar_entries=to_merge)
             except Exception as err:
                 logger.error(f"[{i}:{_task_id(e)}] Error merging entries by patch mitigation: {err}")
+                pending.add(i)
+        return pending
 
     def process_cycle(self) -> None:
         """
-        Process all active submissions through their state machine.
+        Process the active submissions that may progress through their state machine.
 
-        Iterates through all entries and executes the appropriate state handler
-        based on each entry's current state. This method is the main driver for
-        the state-based submission workflow.
+        Executes the appropriate state handler based on the current state of each dirty entry and of each entry whose
+        timer is due (see the class documentation). This method is the main driver for the state-based submission
+        workflow, its cost depends on the number of entries that may progress rather than on the number of entries.
         """
-        for i, e in self._enumerate_submissions():
+        self._track_new_entries()
+        self._wake_entries_waiting_for_sarif()
+        due = {int(i) for i in self.redis.zrangebyscore(self.SUBMISSION_TIMERS, "-inf", time.time())}
+        indices = sorted(i for i in self.dirty | due if i < len(self.entries))
+        self.dirty.difference_update(indices)
+
+        processed: list[int] = []
+        changed: set[int] = set()
+        waiting: set[int] = set()
+        for i in indices:
+            e = self.entries[i]
+            if e.stop or self.task_registry.should_stop_processing(_task_id(e)):
+                self._forget(self.redis, i, e)
+                continue
+
+            processed.append(i)
+            before = e.SerializeToString()
             try:
                 needs_persist = False
                 with self.redis.pipeline() as pipe:
@@ -1763,16 +1984,32 @@ class Submissions:
                         self._persist(pipe, i, e)
                         pipe.execute()
 
+                if e.SerializeToString() != before:
+                    changed.add(i)
+                elif self._waits_on_external_state(e):
+                    waiting.add(i)
             except Exception as err:
                 logger.error(f"[{i}:{_task_id(e)}] Error processing submission: {err}")
                 # NOTE: The question is if we should raise at some point. Worst case we are stuck in a error-condition
                 # that can only be fixed by a restart of the scheduler. However, we don't know that. If we raise, we risk
                 # the scheduler only attempting the first vulnerability and the rest of the cycle being skipped. This could
                 # lead to a situation where we don't attempt any submissions. For now, we will just log the error and continue.
+                waiting.add(i)
 
         # As a final phase we will check if active patches fixes vulnerabilities in other SubmissionEntries and for those we will
         # consolidate the SubmissionEntries.
         try:
-            self._merge_entries_by_patch_mitigation()
+            waiting |= self._merge_entries_by_patch_mitigation(processed)
         except Exception as err:
-            logger.error(f"[{i}:{_task_id(e)}] Error merging entries by patch mitigation: {err}")
+            logger.error(f"Error merging entries by patch mitigation: {err}")
+            waiting.update(processed)
+
+        # Decide when each processed entry must be processed again
+        with self.redis.pipeline() as pipe:
+            for i in processed:
+                if self.entries[i].stop:
+                    # Merged into another entry
+                    self._forget(pipe, i, self.entries[i])
+                else:
+                    self._schedule(pipe, i, self.entries[i], i in changed, i in waiting)
+            pipe.execute()
@@ -0,0 +1,16 @@
+import pytest
+
+
+def pytest_addoption(parser):
+    parser.addoption("--runbenchmark", action="store_true", default=False, help="run benchmarks")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: mark test as a benchmark")
+
+
+def pytest_collection_modifyitems(config, items):
+    skip_benchmark = pytest.mark.skip(reason="need --runbenchmark option to run")
+    for item in items:
+        if "benchmark" in item.keywords and not config.getoption("--runbenchmark"):
+            item.add_marker(skip_benchmark)
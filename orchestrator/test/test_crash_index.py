@@ -0,0 +1,198 @@
+import random
+import string
+import time
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+import pytest
+
+from buttercup.common.clusterfuzz_parser.crash_comparer import CrashComparer, _similarity_ratio
+from buttercup.common.datastructures.msg_pb2 import CrashWithId, SubmissionEntry, TracedCrash
+from buttercup.common.stack_parsing import get_crash_data, get_inst_key
+from buttercup.common.task_registry import TaskRegistry
+from buttercup.orchestrator.scheduler.crash_index import CrashIndex, similarity_ratio
+from buttercup.orchestrator.scheduler.submissions import CompetitionAPI, Submissions, _task_id
+
+FUNCTIONS = [
+    "png_read_row",
+    "png_read_rows",
+    "png_do_read",
+    "png_do_write",
+    "read_png",
+    "write_png",
+    "xmlParseChunk",
+    "xmlParseCharRef",
+    "xmlParseAttValue",
+    "a",
+    "ab",
+    "",
+]
+
+
+def _entry(task_id: str, *stacktraces: str) -> SubmissionEntry:
+    entry = SubmissionEntry()
+    for stacktrace in stacktraces:
+        crash = TracedCrash()
+        crash.crash.target.task_id = task_id
+        crash.crash.stacktrace = stacktrace
+        entry.crashes.append(CrashWithId(crash=crash))
+    return entry
+
+
+def _tokens(stacktrace: str) -> tuple[str, str]:
+    # Stacktraces are "<crash data>|<inst key>" in these tests
+    crash_data, inst_key = stacktrace.split("|")
+    return crash_data.replace(",", "\n"), inst_key.replace(",", "\n")
+
+
+def _random_state(rng: random.Random) -> str:
+    state = ",".join(rng.choice(FUNCTIONS) for _ in range(rng.randint(0, 4)))
+    if rng.random() < 0.05:
+        state += ",FuzzerHash=1"
+    return state
+
+
+def _brute_force(entries: list[SubmissionEntry], task_id: str, crash_data: str, inst_key: str) -> list[int]:
+    result = []
+    for i, e in enumerate(entries):
+        if _task_id(e) != task_id:
+            continue
+        for crash in e.crashes:
+            other_crash_data, other_inst_key = _tokens(crash.crash.crash.stacktrace)
+            if (
+                CrashComparer(crash_data, other_crash_data).is_similar()
+                or CrashComparer(inst_key, other_inst_key).is_similar()
+            ):
+                result.append(i)
+                break
+    return result
+
+
+def _indexed(index: CrashIndex, task_id: str, crash_data: str, inst_key: str) -> list[int]:
+    return [
+        i
+        for i in index.candidates(task_id, crash_data, inst_key)
+        if any(
+            index.is_similar(crash_data, other_crash_data) or index.is_similar(inst_key, other_inst_key)
+            for other_crash_data, other_inst_key in index.crash_tokens(i)
+        )
+    ]
+
+
+def test_similarity_ratio():
+    rng = random.Random(0)
+    for _ in range(1000):
+        string_1 = "".join(rng.choices("abc_", k=rng.randint(0, 80)))
+        string_2 = "".join(rng.choices("abc_", k=rng.randint(0, 80)))
+        assert similarity_ratio(string_1, string_2) == _similarity_ratio(string_1, string_2)
+
+
+def test_same_decisions_as_crash_comparer():
+    rng = random.Random(0)
+    entries = [
+        _entry(
+            rng.choice(["task1", "task2"]),
+            *(f"{_random_state(rng)}|{_random_state(rng)}" for _ in range(rng.randint(1, 3))),
+        )
+        for _ in range(300)
+    ]
+    index = CrashIndex()
+    index.sync(entries, _task_id, _tokens)
+
+    for _ in range(300):
+        task_id = rng.choice(["task1", "task2", "task3"])
+        crash_data, inst_key = _tokens(f"{_random_state(rng)}|{_random_state(rng)}")
+        assert _indexed(index, task_id, crash_data, inst_key) == _brute_force(entries, task_id, crash_data, inst_key)
+
+
+def test_sync():
+    tokenize = Mock(side_effect=_tokens)
+    index = CrashIndex()
+    entries = [_entry("task", "a,b|"), _entry("task", "c|")]
+    index.sync(entries, _task_id, tokenize)
+    assert tokenize.call_count == 2
+    assert index.candidates("task", "a\nb", "") == [0]
+
+    # Only new crashes are parsed
+    entries[1].crashes.append(_entry("task", "a,b|").crashes[0])
+    index.sync(entries, _task_id, tokenize)
+    assert tokenize.call_count == 3
+    assert index.candidates("task", "a\nb", "") == [0, 1]
+    assert index.crash_tokens(1) == [("c", ""), ("a\nb", "")]
+
+    # Replacing the entries rebuilds the index
+    index.sync([_entry("task", "c|")], _task_id, tokenize)
+    assert tokenize.call_count == 4
+    assert index.candidates("task", "a\nb", "") == []
+    assert index.candidates("task", "c", "") == [0]
+    assert index.candidates("other-task", "c", "") == []
+
+
+def _asan_stacktrace(frames: list[str]) -> str:
+    lines = [
+        "==1==ERROR: AddressSanitizer: heap-buffer-overflow on address 0x602000000011 at pc 0x1 bp 0x2 sp 0x3",
+        "READ of size 1 at 0x602000000011 thread T0",
+    ]
+    for i, frame in enumerate(frames):
+        lines.append(f"    #{i} 0x4{i:05x} in {frame} /src/project/{frame}.c:{10 + i}:3")
+    lines.append("SUMMARY: AddressSanitizer: heap-buffer-overflow")
+    return "\n".join(lines)
+
+
+@pytest.mark.benchmark
+def test_benchmark_find_similar_entries():
+    rng = random.Random(0)
+    functions = [
+        rng.choice(["png_", "xml", "zip_", ""])
+        + "".join(rng.choices(string.ascii_lowercase + "_", k=rng.randint(6, 24)))
+        for _ in range(2000)
+    ]
+    entries = [
+        _entry("task", _asan_stacktrace(rng.sample(functions, 3) + ["LLVMFuzzerTestOneInput"])) for _ in range(10_000)
+    ]
+    queries = []
+    for _ in range(20):
+        crash = TracedCrash()
+        crash.crash.target.task_id = "task"
+        crash.crash.stacktrace = _asan_stacktrace(rng.sample(functions, 3) + ["LLVMFuzzerTestOneInput"])
+        queries.append(crash)
+
+    task_registry = Mock(spec=TaskRegistry)
+    task_registry.should_stop_processing.return_value = False
+    redis = Mock()
+    redis.hgetall.return_value = {}
+    redis.lrange.return_value = []
+    redis.smembers.return_value = set()
+    with patch("buttercup.orchestrator.scheduler.submissions.QueueFactory"):
+        submissions = Submissions(
+            redis=redis,
+            competition_api=Mock(spec=CompetitionAPI),
+            task_registry=task_registry,
+            tasks_storage_dir=Path("/tmp/tasks_storage"),
+        )
+    submissions.entries = entries
+
+    start = time.perf_counter()
+    submissions.find_similar_entries(queries[0])
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    indexed = [submissions.find_similar_entries(crash) for crash in queries]
+    indexed_time = (time.perf_counter() - start) / len(queries)
+
+    # Previous implementation, parsing and comparing every stored crash
+    crash_data, inst_key = get_crash_data(queries[1].crash.stacktrace), get_inst_key(queries[1].crash.stacktrace)
+    start = time.perf_counter()
+    brute_force = [
+        i
+        for i, e in enumerate(entries)
+        if CrashComparer(crash_data, get_crash_data(e.crashes[0].crash.crash.stacktrace)).is_similar()
+        or CrashComparer(inst_key, get_inst_key(e.crashes[0].crash.crash.stacktrace)).is_similar()
+    ]
+    brute_force_time = time.perf_counter() - start
+
+    assert [i for i, _ in indexed[1]] == brute_force
+    print(
+        f"\n10k entries: index build {build_time:.2f}s, indexed query {indexed_time * 1000:.2f}ms, "
+        f"full scan {brute_force_time:.2f}s"
+    )
+    assert indexed_time < brute_force_time
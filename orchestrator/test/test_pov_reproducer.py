@@ -29,10 +29,18 @@ def mock_task_registry() -> Mock:
 def mock_pov_status() -> Mock:
     """Mock PoVReproduceStatus for testing."""
     pov_status = Mock(spec=PoVReproduceStatus)
-    pov_status.get_one_pending.return_value = None
+    pov_status.claim_pending.return_value = []
     return pov_status
 
 
+@pytest.fixture
+def mock_build_map() -> Mock:
+    """Mock BuildMap for testing."""
+    build_map = Mock(spec=BuildMap)
+    build_map.get_build_from_san.return_value = None
+    return build_map
+
+
 @pytest.fixture
 def mock_node_local():
     """Mock node_local module for testing."""
@@ -43,11 +51,14 @@ def mock_node_local():
 
 
 @pytest.fixture
-def pov_reproducer(mock_redis: Mock, mock_task_registry: Mock, mock_pov_status: Mock) -> POVReproducer:
+def pov_reproducer(
+    mock_redis: Mock, mock_task_registry: Mock, mock_pov_status: Mock, mock_build_map: Mock
+) -> POVReproducer:
     """Create POVReproducer instance with mocked dependencies."""
     with (
         patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.TaskRegistry", return_value=mock_task_registry),
         patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.PoVReproduceStatus", return_value=mock_pov_status),
+        patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap", return_value=mock_build_map),
     ):
         reproducer = POVReproducer(redis=mock_redis, sleep_time=0.01, max_retries=3)
         return reproducer
@@ -65,6 +76,30 @@ def sample_pov_entry() -> POVReproduceRequest:
     return request
 
 
+def _mock_challenge_task(mock_task_class: Mock, did_run: bool = True, did_crash: bool = False) -> Mock:
+    """Make ChallengeTask return tasks whose views reproduce POVs with the given result."""
+    mock_challenge_task = Mock(spec=ChallengeTask)
+    mock_task_class.return_value = mock_challenge_task
+
+    # Mock task reproduction context manager
+    mock_rw_task = Mock()
+    mock_reproduce_result = Mock(spec=ReproduceResult)
+    mock_reproduce_result.did_run.return_value = did_run
+    mock_reproduce_result.did_crash.return_value = did_crash
+    # Add command_result for logging
+    mock_command_result = Mock()
+    mock_command_result.output = "test stdout output"
+    mock_command_result.error = "test stderr output"
+    mock_reproduce_result.command_result = mock_command_result
+    mock_rw_task.reproduce_pov.return_value = mock_reproduce_result
+
+    # Use MagicMock for context manager
+    mock_context_manager = MagicMock()
+    mock_context_manager.__enter__.return_value = mock_rw_task
+    mock_challenge_task.get_rw_view.return_value = mock_context_manager
+    return mock_rw_task
+
+
 class TestPOVReproducer:
     """Test suite for POVReproducer class."""
 
@@ -94,16 +129,16 @@ class TestPOVReproducer:
     # Tests for serve_item method with current implementation
     def test_serve_item_no_pending_entries(self, pov_reproducer):
         """Test serve_item when no pending entries are available."""
-        pov_reproducer.pov_status.get_one_pending.return_value = None
-
         result = pov_reproducer.serve_item()
 
         assert result is False
-        pov_reproducer.pov_status.get_one_pending.assert_called_once()
+        pov_reproducer.pov_status.claim_pending.assert_called_once_with(
+            pov_reproducer.batch_size, pov_reproducer.lease_seconds
+        )
 
     def test_serve_item_task_should_stop(self, pov_reproducer, sample_pov_entry):
         """Test serve_item when task should stop processing (cancelled/expired)."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
         pov_reproducer.registry.should_stop_processing.return_value = True
 
         result = pov_reproducer.serve_item()
@@ -111,75 +146,110 @@ class TestPOVReproducer:
         assert result is False
         pov_reproducer.registry.should_stop_processing.assert_called_once_with(sample_pov_entry.task_id)
         pov_reproducer.pov_status.mark_expired.assert_called_once_with(sample_pov_entry)
+        pov_reproducer.pov_status.release.assert_called_once_with([sample_pov_entry])
 
     def test_serve_item_no_build_output(self, pov_reproducer, sample_pov_entry, mock_node_local):
         """Test serve_item when no build output is available."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
-
-        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap") as mock_build_map_class:
-            mock_build_map = Mock(spec=BuildMap)
-            mock_build_map.get_build_from_san.return_value = None
-            mock_build_map_class.return_value = mock_build_map
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
 
-            result = pov_reproducer.serve_item()
+        result = pov_reproducer.serve_item()
 
-            assert result is False
-            mock_build_map.get_build_from_san.assert_called_once_with(
-                sample_pov_entry.task_id,
-                BuildType.PATCH,
-                sample_pov_entry.sanitizer,
-                sample_pov_entry.internal_patch_id,
-            )
-            # make_locally_available should NOT be called when there's no build output
-            mock_node_local.make_locally_available.assert_not_called()
+        assert result is False
+        pov_reproducer.builds.get_build_from_san.assert_called_once_with(
+            sample_pov_entry.task_id,
+            BuildType.PATCH,
+            sample_pov_entry.sanitizer,
+            sample_pov_entry.internal_patch_id,
+        )
+        # make_locally_available should NOT be called when there's no build output
+        mock_node_local.make_locally_available.assert_not_called()
+        # The request is given back to be retried later
+        pov_reproducer.pov_status.release.assert_called_once_with([sample_pov_entry])
 
     def test_serve_item_reproduce_did_not_run(self, pov_reproducer, sample_pov_entry, mock_node_local):
         """Test serve_item when reproduce_pov did not run."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
 
         # Mock BuildMap to return a valid build output
         mock_build_output = Mock(spec=BuildOutput)
         mock_build_output.task_dir = "/build/output/dir"
+        pov_reproducer.builds.get_build_from_san.return_value = mock_build_output
 
-        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap") as mock_build_map_class:
-            mock_build_map = Mock(spec=BuildMap)
-            mock_build_map.get_build_from_san.return_value = mock_build_output
-            mock_build_map_class.return_value = mock_build_map
+        # Mock ChallengeTask reproduction that didn't run
+        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
+            _mock_challenge_task(mock_task_class, did_run=False)
 
-            # Mock ChallengeTask reproduction that didn't run
-            with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
-                mock_challenge_task = Mock(spec=ChallengeTask)
-                mock_task_class.return_value = mock_challenge_task
+            result = pov_reproducer.serve_item()
 
-                # Mock task reproduction context manager
-                mock_rw_task = Mock()
-                mock_reproduce_result = Mock(spec=ReproduceResult)
-                mock_reproduce_result.did_run.return_value = False  # Reproduction did not run
-                mock_rw_task.reproduce_pov.return_value = mock_reproduce_result
+            assert result is False
+            # Verify no status was marked since reproduction didn't run
+            pov_reproducer.pov_status.mark_mitigated.assert_not_called()
+            pov_reproducer.pov_status.mark_non_mitigated.assert_not_called()
 
-                # Use MagicMock for context manager
-                mock_context_manager = MagicMock()
-                mock_context_manager.__enter__.return_value = mock_rw_task
-                mock_challenge_task.get_rw_copy.return_value = mock_context_manager
+    def test_serve_item_exception_handling(self, pov_reproducer, sample_pov_entry, mock_node_local):
+        """Test serve_item releases the claimed requests when an exception is raised."""
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
+        pov_reproducer.builds.get_build_from_san.side_effect = Exception("BuildMap failed")
+
+        # The exception should propagate since there's no try-catch in the implementation
+        with pytest.raises(Exception, match="BuildMap failed"):
+            pov_reproducer.serve_item()
+        pov_reproducer.pov_status.release.assert_called_once_with([sample_pov_entry])
+
+    def test_serve_item_reproduction_exception(self, pov_reproducer, sample_pov_entry, mock_node_local):
+        """Test a failed reproduction doesn't prevent the others from being recorded."""
+        other_entry = POVReproduceRequest()
+        other_entry.CopyFrom(sample_pov_entry)
+        other_entry.pov_path = "/path/to/other.txt"
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry, other_entry]
 
-                result = pov_reproducer.serve_item()
+        mock_build_output = Mock(spec=BuildOutput)
+        mock_build_output.task_dir = "/build/output/dir"
+        pov_reproducer.builds.get_build_from_san.return_value = mock_build_output
 
-                assert result is False
-                # Verify no status was marked since reproduction didn't run
-                pov_reproducer.pov_status.mark_mitigated.assert_not_called()
-                pov_reproducer.pov_status.mark_non_mitigated.assert_not_called()
+        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
+            mock_rw_task = _mock_challenge_task(mock_task_class, did_crash=True)
+            crash_result = mock_rw_task.reproduce_pov.return_value
 
-    def test_serve_item_exception_handling(self, pov_reproducer, sample_pov_entry, mock_node_local):
-        """Test serve_item handles exceptions gracefully."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
+            def reproduce_pov(harness_name, pov_path):
+                if pov_path == Path(other_entry.pov_path):
+                    raise Exception("docker failed")
+                return crash_result
+
+            mock_rw_task.reproduce_pov.side_effect = reproduce_pov
+            mock_node_local.make_locally_available.side_effect = lambda path: path
 
-        # Mock BuildMap to raise an exception
-        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap") as mock_build_map_class:
-            mock_build_map_class.side_effect = Exception("BuildMap failed")
+            result = pov_reproducer.serve_item()
 
-            # The exception should propagate since there's no try-catch in the implementation
-            with pytest.raises(Exception, match="BuildMap failed"):
-                pov_reproducer.serve_item()
+            assert result is True
+            pov_reproducer.pov_status.mark_non_mitigated.assert_called_once_with(sample_pov_entry)
+
+    def test_serve_item_batch_grouped_by_build(self, pov_reproducer, sample_pov_entry, mock_node_local):
+        """Test the POVs of a batch are reproduced once per patched build workspace."""
+        entries = []
+        for pov_path, internal_patch_id in [("/pov1", "0/0"), ("/pov2", "0/0"), ("/pov3", "0/1")]:
+            entry = POVReproduceRequest()
+            entry.CopyFrom(sample_pov_entry)
+            entry.pov_path = pov_path
+            entry.internal_patch_id = internal_patch_id
+            entries.append(entry)
+        pov_reproducer.pov_status.claim_pending.return_value = entries
+
+        mock_build_output = Mock(spec=BuildOutput)
+        mock_build_output.task_dir = "/build/output/dir"
+        pov_reproducer.builds.get_build_from_san.return_value = mock_build_output
+
+        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
+            mock_rw_task = _mock_challenge_task(mock_task_class, did_crash=False)
+
+            result = pov_reproducer.serve_item()
+
+            assert result is True
+            assert pov_reproducer.builds.get_build_from_san.call_count == 2
+            assert mock_task_class.return_value.get_rw_view.call_count == 2
+            assert mock_rw_task.reproduce_pov.call_count == 3
+            assert pov_reproducer.pov_status.mark_mitigated.call_count == 3
+            pov_reproducer.pov_status.release.assert_called_once_with(entries)
 
     @patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.serve_loop")
     @patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.logger")
@@ -201,82 +271,38 @@ class TestPOVReproducer:
 
     def test_serve_item_successful_reproduction_crashed(self, pov_reproducer, sample_pov_entry, mock_node_local):
         """Test serve_item successful reproduction where POV crashed (not mitigated)."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
 
         # Mock BuildMap to return a valid build output
         mock_build_output = Mock(spec=BuildOutput)
         mock_build_output.task_dir = "/build/output/dir"
+        pov_reproducer.builds.get_build_from_san.return_value = mock_build_output
+
+        # Mock ChallengeTask reproduction
+        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
+            _mock_challenge_task(mock_task_class, did_crash=True)
+
+            result = pov_reproducer.serve_item()
 
-        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap") as mock_build_map_class:
-            mock_build_map = Mock(spec=BuildMap)
-            mock_build_map.get_build_from_san.return_value = mock_build_output
-            mock_build_map_class.return_value = mock_build_map
-
-            # Mock ChallengeTask reproduction
-            with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
-                mock_challenge_task = Mock(spec=ChallengeTask)
-                mock_task_class.return_value = mock_challenge_task
-
-                # Mock task reproduction context manager
-                mock_rw_task = Mock()
-                mock_reproduce_result = Mock(spec=ReproduceResult)
-                mock_reproduce_result.did_run.return_value = True
-                mock_reproduce_result.did_crash.return_value = True  # POV crashed (not mitigated)
-                # Add command_result for logging
-                mock_command_result = Mock()
-                mock_command_result.output = "test stdout output"
-                mock_command_result.error = "test stderr output"
-                mock_reproduce_result.command_result = mock_command_result
-                mock_rw_task.reproduce_pov.return_value = mock_reproduce_result
-
-                # Use MagicMock for context manager
-                mock_context_manager = MagicMock()
-                mock_context_manager.__enter__.return_value = mock_rw_task
-                mock_challenge_task.get_rw_copy.return_value = mock_context_manager
-
-                result = pov_reproducer.serve_item()
-
-                assert result is True
-                # Verify POV was marked as non-mitigated
-                pov_reproducer.pov_status.mark_non_mitigated.assert_called_once_with(sample_pov_entry)
+            assert result is True
+            # Verify POV was marked as non-mitigated
+            pov_reproducer.pov_status.mark_non_mitigated.assert_called_once_with(sample_pov_entry)
 
     def test_serve_item_successful_reproduction_no_crash(self, pov_reproducer, sample_pov_entry, mock_node_local):
         """Test serve_item successful reproduction where POV did not crash (mitigated)."""
-        pov_reproducer.pov_status.get_one_pending.return_value = sample_pov_entry
+        pov_reproducer.pov_status.claim_pending.return_value = [sample_pov_entry]
 
         # Mock BuildMap to return a valid build output
         mock_build_output = Mock(spec=BuildOutput)
         mock_build_output.task_dir = "/build/output/dir"
+        pov_reproducer.builds.get_build_from_san.return_value = mock_build_output
+
+        # Mock ChallengeTask reproduction
+        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
+            _mock_challenge_task(mock_task_class, did_crash=False)
+
+            result = pov_reproducer.serve_item()
 
-        with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.BuildMap") as mock_build_map_class:
-            mock_build_map = Mock(spec=BuildMap)
-            mock_build_map.get_build_from_san.return_value = mock_build_output
-            mock_build_map_class.return_value = mock_build_map
-
-            # Mock ChallengeTask reproduction
-            with patch("buttercup.orchestrator.pov_reproducer.pov_reproducer.ChallengeTask") as mock_task_class:
-                mock_challenge_task = Mock(spec=ChallengeTask)
-                mock_task_class.return_value = mock_challenge_task
-
-                # Mock task reproduction context manager
-                mock_rw_task = Mock()
-                mock_reproduce_result = Mock(spec=ReproduceResult)
-                mock_reproduce_result.did_run.return_value = True
-                mock_reproduce_result.did_crash.return_value = False  # POV did not crash (mitigated)
-                # Add command_result for logging
-                mock_command_result = Mock()
-                mock_command_result.output = "test stdout output"
-                mock_command_result.error = "test stderr output"
-                mock_reproduce_result.command_result = mock_command_result
-                mock_rw_task.reproduce_pov.return_value = mock_reproduce_result
-
-                # Use MagicMock for context manager
-                mock_context_manager = MagicMock()
-                mock_context_manager.__enter__.return_value = mock_rw_task
-                mock_challenge_task.get_rw_copy.return_value = mock_context_manager
-
-                result = pov_reproducer.serve_item()
-
-                assert result is True
-                # Verify POV was marked as mitigated
-                pov_reproducer.pov_status.mark_mitigated.assert_called_once_with(sample_pov_entry)
+            assert result is True
+            # Verify POV was marked as mitigated
+            pov_reproducer.pov_status.mark_mitigated.assert_called_once_with(sample_pov_entry)
@@ -3,11 +3,19 @@
 import os
 import unittest
 import copy
+import random
 from pathlib import Path
 
 from buttercup.common.sarif_store import SARIFBroadcastDetail
 from buttercup.common.datastructures.msg_pb2 import TracedCrash
-from buttercup.orchestrator.scheduler.sarif_matcher import match
+from buttercup.orchestrator.scheduler.sarif_matcher import (
+    Frame,
+    SarifIndex,
+    SarifInfo,
+    _match_info,
+    _sarif_detail,
+    match,
+)
 
 
 class TestSarifMatcher(unittest.TestCase):
@@ -233,6 +241,55 @@ class TestSarifMatcher(unittest.TestCase):
         self.assertTrue(result.matches_full_path)
         self.assertTrue(result.matches_lines)
 
+    def test_index_same_matches_as_linear_scan(self):
+        """Test that the index returns the first SARIF info matching a frame, like a scan over all of them."""
+        rng = random.Random(0)
+        files = [Path("a.c"), Path("/src/a.c"), Path("b.c"), Path("/src/lib/b.c")]
+        functions = [None, "foo", "bar", "OSS_FUZZ_foo"]
+        for _ in range(50):
+            sarif_infos = []
+            for _ in range(rng.randint(0, 20)):
+                start = rng.randint(1, 100)
+                sarif_infos.append(
+                    SarifInfo(
+                        file=rng.choice(files),
+                        lines=(start, start + rng.randint(-5, 30)),
+                        function=rng.choice(functions),
+                        cwe=None,
+                    )
+                )
+            index = SarifIndex(sarif_infos)
+            for _ in range(50):
+                frame = Frame(file=rng.choice(files), line=rng.randint(1, 130), function=rng.choice(functions))
+                expected = next(
+                    (m for m in (_match_info(frame, info) for info in sarif_infos) if m is not None),
+                    None,
+                )
+                self.assertEqual(index.match_frame(frame), expected)
+
+    def test_index_match(self):
+        """Test that a SARIF index can be reused for several crashes."""
+        index = SarifIndex.from_broadcast(self.load_sarif_broadcast())
+        traced_crash = self.load_traced_crash()
+        result = index.match(traced_crash)
+        self.assertIsNotNone(result)
+        self.assertEqual(result.frame.line, 1447)
+
+        traced_crash.tracer_stacktrace = traced_crash.tracer_stacktrace.replace(
+            "/src/libpng/pngrutil.c:1447", "/src/libpng/pngrutil.c:1500"
+        )
+        self.assertIsNone(index.match(traced_crash))
+
+    def test_sarif_detail_skips_invalid_lines(self):
+        """Test that locations whose lines are not integers are not matched."""
+        sarif_broadcast = self.load_sarif_broadcast()
+        region = sarif_broadcast.sarif["runs"][0]["results"][0]["locations"][0]["physicalLocation"]["region"]
+        self.assertEqual(_sarif_detail(sarif_broadcast)[0].lines, (1421, 1447))
+
+        region["startLine"] = "1421"
+        self.assertEqual(_sarif_detail(sarif_broadcast), [])
+        self.assertIsNone(match(sarif_broadcast, self.load_traced_crash()))
+
 
 if __name__ == "__main__":
     unittest.main()
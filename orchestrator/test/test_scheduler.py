@@ -631,8 +631,10 @@ def test_competition_api_interactions(scheduler):
     patch.internal_patch_id = "0"
 
     # Set up queue mocks with items
-    scheduler.traced_vulnerabilities_queue.pop.return_value = RQItem(item_id="vuln-1", deserialized=traced_crash)
-    scheduler.patches_queue.pop.return_value = RQItem(item_id="patch-1", deserialized=patch)
+    scheduler.traced_vulnerabilities_queue.pop_batch.return_value = [
+        RQItem(item_id="vuln-1", deserialized=traced_crash)
+    ]
+    scheduler.patches_queue.pop_batch.return_value = [RQItem(item_id="patch-1", deserialized=patch)]
 
     # Set up submissions to return True for submit_vulnerability and record_patch
     scheduler.submissions.submit_vulnerability.return_value = True
@@ -643,10 +645,10 @@ def test_competition_api_interactions(scheduler):
 
     # Verify interactions
     scheduler.submissions.submit_vulnerability.assert_called_once_with(traced_crash)
-    scheduler.traced_vulnerabilities_queue.ack_item.assert_called_once_with("vuln-1")
+    scheduler.traced_vulnerabilities_queue.ack_batch.assert_called_once_with(["vuln-1"])
 
     scheduler.submissions.record_patch.assert_called_once_with(patch)
-    scheduler.patches_queue.ack_item.assert_called_once_with("patch-1")
+    scheduler.patches_queue.ack_batch.assert_called_once_with(["patch-1"])
 
     scheduler.submissions.process_cycle.assert_called_once()
 
@@ -656,8 +658,8 @@ def test_competition_api_interactions(scheduler):
 def test_competition_api_interactions_no_work(scheduler):
     """Test that competition_api_interactions returns False when no items in queue."""
     # Set up queue mocks with no items
-    scheduler.traced_vulnerabilities_queue.pop.return_value = None
-    scheduler.patches_queue.pop.return_value = None
+    scheduler.traced_vulnerabilities_queue.pop_batch.return_value = []
+    scheduler.patches_queue.pop_batch.return_value = []
 
     # Call the method
     result = scheduler.competition_api_interactions()
@@ -681,8 +683,10 @@ def test_competition_api_interactions_failed_submissions(scheduler):
     patch.internal_patch_id = "0"
 
     # Set up queue mocks with items
-    scheduler.traced_vulnerabilities_queue.pop.return_value = RQItem(item_id="vuln-1", deserialized=traced_crash)
-    scheduler.patches_queue.pop.return_value = RQItem(item_id="patch-1", deserialized=patch)
+    scheduler.traced_vulnerabilities_queue.pop_batch.return_value = [
+        RQItem(item_id="vuln-1", deserialized=traced_crash)
+    ]
+    scheduler.patches_queue.pop_batch.return_value = [RQItem(item_id="patch-1", deserialized=patch)]
 
     # Set up submissions to return False for submit_vulnerability and record_patch
     scheduler.submissions.submit_vulnerability.return_value = False
@@ -693,10 +697,10 @@ def test_competition_api_interactions_failed_submissions(scheduler):
 
     # Verify interactions
     scheduler.submissions.submit_vulnerability.assert_called_once_with(traced_crash)
-    scheduler.traced_vulnerabilities_queue.ack_item.assert_not_called()
+    scheduler.traced_vulnerabilities_queue.ack_batch.assert_not_called()
 
     scheduler.submissions.record_patch.assert_called_once_with(patch)
-    scheduler.patches_queue.ack_item.assert_not_called()
+    scheduler.patches_queue.ack_batch.assert_not_called()
 
     scheduler.submissions.process_cycle.assert_called_once()
 
@@ -1,5 +1,6 @@
 import pytest
 import base64
+import time
 import uuid
 from unittest.mock import Mock, patch, MagicMock
 from pathlib import Path
@@ -283,15 +284,17 @@ def sample_crash():
 @pytest.fixture
 def mock_redis():
     mock = Mock()
-    mock.lrange.return_value = []  # Default empty list for stored submissions
+    mock.hgetall.return_value = {}  # Default empty hash for stored submissions
+    mock.lrange.return_value = []  # Default empty legacy list of submissions
+    mock.zrangebyscore.return_value = []  # No timer is due
+    mock.mget.return_value = []
     mock.smembers.return_value = set()  # Return empty set for smembers calls
-    mock.rpush.return_value = 1  # Return an integer instead of Mock object
 
     # Mock pipeline context manager
     pipeline_mock = Mock()
     pipeline_mock.__enter__ = Mock(return_value=pipeline_mock)
     pipeline_mock.__exit__ = Mock(return_value=None)
-    pipeline_mock.lset = Mock(return_value=True)  # Mock lset on pipeline
+    pipeline_mock.hset = Mock(return_value=True)  # Mock hset on pipeline
     pipeline_mock.execute = Mock(return_value=[True])  # Mock execute
     mock.pipeline.return_value = pipeline_mock
 
@@ -574,14 +577,12 @@ class TestCompetitionAPI:
 # Tests for the Submissions class
 class TestSubmissions:
     def test_submit_vulnerability_successful(self, submissions, mock_competition_api, sample_crash, mock_redis):
-        # Configure mock Redis to return proper values
-        mock_redis.rpush.return_value = 1  # Index of the inserted entry
-
         # Call the method
         result = submissions.submit_vulnerability(sample_crash)
 
-        # Verify Redis interactions - entry should be added
-        mock_redis.rpush.assert_called_once()
+        # Verify Redis interactions - entry should be added and processed in the next cycle
+        mock_redis.pipeline.return_value.hsetnx.assert_called_once()
+        assert submissions.dirty == {0}
 
         # Verify result
         assert result is True
@@ -602,7 +603,6 @@ class TestSubmissions:
 
     def test_submit_vulnerability_failed(self, submissions, mock_competition_api, sample_crash):
         # Configure mock Redis to return proper values
-        submissions.redis.rpush.return_value = 1  # Index of the inserted entry
 
         # Call the method
         result = submissions.submit_vulnerability(sample_crash)
@@ -618,7 +618,6 @@ class TestSubmissions:
 
     def test_submit_vulnerability_errored(self, submissions, mock_competition_api, sample_crash):
         # Configure mock Redis to return proper values
-        submissions.redis.rpush.return_value = 1  # Index of the inserted entry
 
         # Call the method
         result = submissions.submit_vulnerability(sample_crash)
@@ -668,7 +667,7 @@ class TestSubmissions:
         assert submissions.build_requests_queue.push.call_count == 0
 
         # Verify _persist was called
-        submissions.redis.lset.assert_called_once()
+        submissions.redis.pipeline.return_value.hset.assert_called_once()
 
         # Verify patch was updated in entries
         assert len(submissions.entries[0].patches) == 1
@@ -705,7 +704,7 @@ class TestSubmissions:
         assert result is True
 
         # Verify _persist was NOT called since task is stopped
-        submissions.redis.lset.assert_not_called()
+        submissions.redis.pipeline.return_value.hset.assert_not_called()
 
         # Verify patch was NOT updated since task is stopped
         assert len(submissions.entries[0].patches) == 1
@@ -783,9 +782,6 @@ class TestSubmissions:
             ),
         ]
 
-        # Mock Redis rpush to return the correct index for the new submission
-        mock_redis.rpush.return_value = len(submissions.entries) + 1
-
         # Create a new crash that will be similar to all three submissions
         new_crash = TracedCrash()
         new_crash.crash.target.task_id = task_id
@@ -3455,9 +3451,6 @@ class TestSubmissions:
             ),
         ]
 
-        # Mock Redis rpush to return the correct index for the new submission
-        mock_redis.rpush.return_value = len(submissions.entries) + 1
-
         # Create a new crash that will be similar to all existing submissions
         new_crash = TracedCrash()
         new_crash.crash.target.task_id = task_id
@@ -4228,8 +4221,8 @@ class TestRecordPatchedBuild:
         assert submissions.entries[0].patches[0].build_outputs[0].apply_diff is True
 
         # Verify persistence was called
-        submissions.redis.lset.assert_called_once_with(
-            submissions.SUBMISSIONS, 0, submissions.entries[0].SerializeToString()
+        submissions.redis.pipeline.return_value.hset.assert_called_once_with(
+            submissions.SUBMISSION_ENTRIES, "0", submissions.entries[0].SerializeToString()
         )
 
     def test_record_patched_build_multiple_outputs(self, submissions, sample_submission_entry):
@@ -4304,7 +4297,7 @@ class TestRecordPatchedBuild:
         assert build_outputs[1].apply_diff is False
 
         # Verify persistence was called twice
-        assert submissions.redis.lset.call_count == 2
+        assert submissions.redis.pipeline.return_value.hset.call_count == 2
 
     def test_record_patched_build_invalid_patch_idx(self, submissions):
         """Test recording build output with out-of-bounds patch index."""
@@ -4320,7 +4313,7 @@ class TestRecordPatchedBuild:
         assert result is True
 
         # Verify no persistence occurred
-        submissions.redis.lset.assert_not_called()
+        submissions.redis.pipeline.return_value.hset.assert_not_called()
 
     def test_retrieve_build_outputs_from_patch(self, submissions, sample_submission_entry):
         """Test that we can retrieve build outputs from a patch after recording them."""
@@ -4419,7 +4412,7 @@ class TestRecordPatchedBuild:
         assert result is True
 
         # Verify no persistence occurred
-        submissions.redis.lset.assert_not_called()
+        submissions.redis.pipeline.return_value.hset.assert_not_called()
 
     def test_record_patched_build_internal_patch_id_with_extra_slashes(self, submissions):
         """Test recording build output with internal_patch_id containing extra slashes."""
@@ -4435,7 +4428,7 @@ class TestRecordPatchedBuild:
         assert result is True
 
         # Verify no persistence occurred
-        submissions.redis.lset.assert_not_called()
+        submissions.redis.pipeline.return_value.hset.assert_not_called()
 
     def test_record_patched_build_duplicate_filtering(self, submissions, sample_submission_entry):
         """Test that duplicate build outputs are filtered out and not added twice."""
@@ -4484,7 +4477,7 @@ class TestRecordPatchedBuild:
         assert len(submissions.entries[0].patches[0].build_outputs) == 1
 
         # Verify persistence was only called once (for the first addition)
-        assert submissions.redis.lset.call_count == 1
+        assert submissions.redis.pipeline.return_value.hset.call_count == 1
 
     def test_merge_entries_by_patch_mitigation_no_merges(self, submissions):
         """Test _merge_entries_by_patch_mitigation when no merges are needed."""
@@ -5981,3 +5974,192 @@ class TestFailedPOVFiltering:
 
         # Should return False (no patch requested) and log the skip
         assert result is False
+
+
+def _entry_waiting_for_patch(task_id: str, internal_patch_id: str) -> SubmissionEntry:
+    """Entry with a passed PoV whose patch was requested, it only progresses once the patch is recorded."""
+    return (
+        SubmissionEntryBuilder()
+        .crash(task_id=task_id, competition_pov_id=f"pov-{internal_patch_id}", result=SubmissionResult.PASSED)
+        .patch(internal_patch_id=internal_patch_id)
+        .patch_idx(0)
+        .build()
+    )
+
+
+class TestDirtyProcessing:
+    """Tests that process_cycle only processes the entries that may progress."""
+
+    def test_settled_entries_wait_for_events(self, submissions, mock_redis):
+        submissions.entries = [_entry_waiting_for_patch("task-1", "patch-1")]
+
+        with (
+            patch.object(submissions, "_submit_patch_if_good", wraps=submissions._submit_patch_if_good) as handler,
+            patch.object(submissions, "_request_patched_builds_if_needed", return_value=False),
+        ):
+            # New entries are processed once
+            submissions.process_cycle()
+            assert handler.call_count == 1
+            assert submissions.dirty == set()
+            mock_redis.pipeline.return_value.srem.assert_called_with(submissions.DIRTY_SUBMISSIONS, 0)
+
+            # Nothing changed
+            submissions.process_cycle()
+            assert handler.call_count == 1
+
+            # Recording the patch wakes the entry up
+            submissions.record_patch(Patch(internal_patch_id="patch-1", task_id="task-1", patch="patch content"))
+            assert submissions.dirty == {0}
+            submissions.process_cycle()
+            assert handler.call_count == 2
+
+    def test_waiting_entries_are_polled(self, submissions, mock_redis, mock_competition_api):
+        entry = (
+            SubmissionEntryBuilder()
+            .crash(task_id="task-1", competition_pov_id="pov-1", result=SubmissionResult.ACCEPTED)
+            .patch(internal_patch_id="patch-1")
+            .patch_idx(0)
+            .build()
+        )
+        submissions.entries = [entry]
+        mock_competition_api.get_pov_status.return_value = SubmissionResult.ACCEPTED
+        timers = mock_redis.pipeline.return_value.zadd
+
+        submissions.process_cycle()
+        assert mock_competition_api.get_pov_status.call_count == 1
+        assert submissions.poll_delays == {0: submissions.poll_interval}
+        [(name, mapping)] = [c.args for c in timers.call_args_list]
+        assert name == submissions.SUBMISSION_TIMERS
+        assert mapping["0"] == pytest.approx(time.time() + submissions.poll_interval, abs=5)
+
+        # Not polled again before its timer is due
+        submissions.process_cycle()
+        assert mock_competition_api.get_pov_status.call_count == 1
+
+        # Polled less often while nothing changes
+        mock_redis.zrangebyscore.return_value = [b"0"]
+        submissions.process_cycle()
+        assert mock_competition_api.get_pov_status.call_count == 2
+        assert submissions.poll_delays == {0: submissions.poll_interval * 2}
+
+        # Changes make the entry dirty again
+        mock_competition_api.get_pov_status.return_value = SubmissionResult.PASSED
+        submissions.process_cycle()
+        assert entry.crashes[0].result == SubmissionResult.PASSED
+        assert submissions.dirty == {0}
+        assert submissions.poll_delays == {}
+
+    def test_sarif_broadcast_wakes_waiting_entries(self, submissions, mock_redis):
+        submissions.entries = [_entry_waiting_for_patch("task-1", "patch-1")]
+        mock_redis.mget.return_value = [b"1"]
+
+        with patch.object(submissions, "_ensure_sarif_is_bundled", return_value=False) as handler:
+            submissions.process_cycle()
+            submissions.process_cycle()
+            assert handler.call_count == 1
+            assert submissions.entries_waiting_for_sarif == {"task-1": {0}}
+
+            # A SARIF was stored for the task
+            mock_redis.mget.return_value = [b"2"]
+            submissions.process_cycle()
+            assert handler.call_count == 2
+
+    def test_new_crash_wakes_entries_with_patched_builds(self, submissions, sample_crash):
+        task_id = sample_crash.crash.target.task_id
+        submissions.entries = [
+            SubmissionEntryBuilder()
+            .crash(task_id=task_id, competition_pov_id="pov-1", result=SubmissionResult.PASSED, stacktrace="other")
+            .patch(internal_patch_id="patch-1", patch_content="patch", competition_patch_id="patch-1")
+            .build_output(patch_internal_id="patch-1", task_dir="/build", task_id=task_id)
+            .patch_idx(0)
+            .build()
+        ]
+        submissions._track_new_entries()
+        submissions.dirty.clear()
+        assert submissions.entries_with_patched_builds == {task_id: {0}}
+
+        with patch.object(submissions, "find_similar_entries", return_value=[]):
+            submissions.submit_vulnerability(sample_crash)
+        assert submissions.dirty == {0, 1}
+
+    def test_stopped_entries_are_forgotten(self, submissions, mock_redis, mock_task_registry):
+        submissions.entries = [_entry_waiting_for_patch("task-1", "patch-1")]
+        mock_task_registry.should_stop_processing.return_value = True
+
+        with patch.object(submissions, "_submit_patch_if_good") as handler:
+            submissions.process_cycle()
+        handler.assert_not_called()
+        assert submissions.dirty == set()
+        assert submissions.entries_waiting_for_sarif == {}
+        mock_redis.zrem.assert_called_with(submissions.SUBMISSION_TIMERS, 0)
+
+    def test_load_legacy_submissions(self, mock_redis, mock_competition_api, mock_task_registry):
+        entries = [_entry_waiting_for_patch("task-1", f"patch-{i}") for i in range(3)]
+        mock_redis.lrange.return_value = [e.SerializeToString() for e in entries]
+
+        with patch("buttercup.orchestrator.scheduler.submissions.QueueFactory"):
+            submissions = Submissions(
+                redis=mock_redis,
+                competition_api=mock_competition_api,
+                task_registry=mock_task_registry,
+                tasks_storage_dir=Path("/tmp/tasks_storage"),
+            )
+
+        assert submissions.entries == entries
+        pipe = mock_redis.pipeline.return_value
+        pipe.hset.assert_called_once_with(
+            submissions.SUBMISSION_ENTRIES, mapping={str(i): e.SerializeToString() for i, e in enumerate(entries)}
+        )
+        pipe.sadd.assert_called_once_with(submissions.DIRTY_SUBMISSIONS, 0, 1, 2)
+        pipe.delete.assert_called_once_with(submissions.SUBMISSIONS)
+
+    def test_load_submissions(self, mock_redis, mock_competition_api, mock_task_registry):
+        entries = [_entry_waiting_for_patch("task-1", f"patch-{i}") for i in range(3)]
+        mock_redis.hgetall.return_value = {
+            str(i).encode(): e.SerializeToString() for i, e in reversed(list(enumerate(entries)))
+        }
+        mock_redis.smembers.return_value = {b"1"}
+
+        with patch("buttercup.orchestrator.scheduler.submissions.QueueFactory"):
+            submissions = Submissions(
+                redis=mock_redis,
+                competition_api=mock_competition_api,
+                task_registry=mock_task_registry,
+                tasks_storage_dir=Path("/tmp/tasks_storage"),
+            )
+
+        assert submissions.entries == entries
+        assert submissions.dirty == {1}
+        mock_redis.lrange.assert_not_called()
+
+    @pytest.mark.benchmark
+    def test_benchmark_process_cycle(self, submissions, mock_redis):
+        n_entries = 5000
+        submissions.entries = [_entry_waiting_for_patch(f"task-{i % 10}", f"patch-{i}") for i in range(n_entries)]
+        # SARIF versions don't change
+        mock_redis.mget.side_effect = lambda keys: [b"1"] * len(keys)
+
+        with patch.object(submissions, "_request_patched_builds_if_needed", return_value=False):
+            # All the entries are new, this is what every cycle used to cost
+            start = time.perf_counter()
+            submissions.process_cycle()
+            full_time = time.perf_counter() - start
+
+            cycle_times = []
+            for i in range(10):
+                for j in range(10):
+                    submissions.record_patch(
+                        Patch(internal_patch_id=f"patch-{i * 10 + j}", task_id="task", patch="patch content")
+                    )
+                start = time.perf_counter()
+                submissions.process_cycle()
+                cycle_times.append(time.perf_counter() - start)
+
+        # Entries whose patch was recorded (and only those) progressed
+        assert sum(1 for e in submissions.entries if e.patches[0].patch) == 100
+        cycle_time = sum(cycle_times) / len(cycle_times)
+        print(
+            f"\n{n_entries} entries: cycle processing all entries {full_time * 1000:.1f}ms, "
+            f"cycle after 10 events {cycle_time * 1000:.1f}ms"
+        )
+        assert cycle_time < full_time
@@ -1,6 +1,8 @@
+import os
 import re
 from pathlib import Path
-from typing import Set, Dict, Optional, List
+from typing import Set, Optional, List
+from buttercup.program_model.api.include_graph import IncludeGraph, get_include_graph
 from buttercup.program_model.utils.common import Function, TypeDefinition
 from collections import defaultdict
 from buttercup.common.challenge_task import ChallengeTask
@@ -11,25 +13,32 @@ class FuzzyCImportsResolver:
     A resolver for C imports in a source code folder.
     This class can analyze #include statements in files and build dependency trees.
 
+    The includes are looked up in the `IncludeGraph` of the source code folder,
+    which is built once and shared by all the resolvers of the folder.
+
     WARNING: The class resolves imports using very naive file parsing and is best effort, it is not
     sound in nature as it doesn't take into account compile flags and compile commands
     actually run to compile projects.
     """
 
-    def __init__(self, root_dir: Path):
+    def __init__(self, root_dir: Path, include_graph: Optional[IncludeGraph] = None):
         """
         Initialize the resolver with a root source code folder.
 
         Args:
             root_dir: The absolute path to the root folder containing the source code
+            include_graph: The include graph of root_dir, loaded or built when first
+                needed if not provided
         """
         # The source code directory to find imports in. This is typically the task src dir
         self.root_dir = root_dir
-        # Cache of file imports to avoid re-parsing files
-        self.direct_imports_cache: Dict[Path, Set[Path]] = {}
-        self.all_imports_cache: Dict[Path, Set[Path]] = {}
-        # Internal variable used while resolving imports
-        self._tmp_imports: Set[Path] = set()
+        self._include_graph = include_graph
+
+    @property
+    def include_graph(self) -> IncludeGraph:
+        if self._include_graph is None:
+            self._include_graph = get_include_graph(self.root_dir)
+        return self._include_graph
 
     def _normalize_path(self, path: Path | str) -> Path:
         """Normalize a path into an absolute path"""
@@ -39,47 +48,17 @@ class FuzzyCImportsResolver:
         # it is not an absolute path but rather a relative path
         # from the root_dir and thus we remove the /
         if str(path).startswith("/"):
-            if not Path(path).exists():
+            if self.include_graph.get_id(path) is None:
                 path = Path(str(path)[1:])
         # Convert to Path if a string object was supplied
         path = Path(path)
         # If path not absolute, rebase from root_dir
         if not path.is_absolute():
-            path = (self.root_dir / path).resolve()
+            path = Path(os.path.normpath(self.include_graph.root_dir / path))
         return path
 
-    def _find_file_in_codebase(
-        self, import_name: str, origin_file: Path
-    ) -> Optional[Path]:
-        """
-        Find the actual file path for an imported file name.
-        This method handles different include styles:
-        - System includes like <stdio.h> (ignored as external)
-        - Relative includes like "utils/helper.h"
-        - Project includes
-
-        Args:
-            import_name: The name of the import as it appears in the #include statement
-            origin_file: The file that contains the import statement
-
-        Returns:
-            The absolute path to the imported file or None if not found
-        """
-        # Ignore system includes (enclosed in <>)
-        if import_name.startswith("<") and import_name.endswith(">"):
-            return None
-
-        # Remove quotes if present
-        if import_name.startswith('"') and import_name.endswith('"'):
-            import_name = import_name[1:-1]
-
-        # Try relative to the origin file's directory
-        origin_dir = origin_file.parent
-        candidate = (origin_dir / import_name).resolve()
-        if candidate.is_file():
-            return candidate
-
-        return None
+    def _file_id(self, file_path: Path | str) -> Optional[int]:
+        return self.include_graph.get_id(self._normalize_path(file_path))
 
     def get_direct_imports(self, file_path: Path) -> Set[Path]:
         """
@@ -93,46 +72,11 @@ class FuzzyCImportsResolver:
             A list of paths to the imported files if they have been successfully
             found in the code directory
         """
-        file_path = self._normalize_path(file_path)
-
-        # Check if we already have this file's imports in cache
-        if file_path in self.direct_imports_cache:
-            return self.direct_imports_cache[file_path]
-        try:
-            content = file_path.read_text()
-
-            # Find all #include statements using regex
-            # This pattern matches both #include <file> and #include "file"
-            include_pattern = re.compile(r'#include\s+([<"]([^>"]+)[>"])')
-            matches = include_pattern.findall(content)
-
-            # Extract the import names and try to resolve their paths
-            imports = set()
-            for _, import_name in matches:
-                # NOTE(boyan): import_name is the import as present in the source code,
-                # for example "somefile.h" from '#include "somefile.h"'. Sometimes the file
-                # "somefile.h" doesn't exist but is templated and generated by the build toolchain.
-                # Here we add other typical variants of the file name that correspond to
-                # typical patterns found in repositories
-                # NOTE(boyan): the candidate files below are checked in order and we select the
-                # first match.
-            
-                import_files_candidates = [import_name, import_name + ".in"]
-
-                for file_candidate in import_files_candidates:
-                    resolved_path = self._find_file_in_codebase(
-                        file_candidate, file_path
-                    )
-                    if resolved_path:
-                        imports.add(resolved_path)
-                        break
-
-            self.direct_imports_cache[file_path] = imports
-            return imports
-
-        except Exception as e:
-            print(f"Error parsing {file_path}: {e}")
+        file_id = self._file_id(file_path)
+        if file_id is None:
             return set()
+        graph = self.include_graph
+        return {graph.get_path(i) for i in graph.get_includes(file_id)}
 
     def get_all_imports(
         self, file_path: Path, depth: Optional[int] = None
@@ -145,52 +89,35 @@ class FuzzyCImportsResolver:
             depth: Maximum depth to traverse, None for unlimited
 
         Returns:
-            A list of absolute paths to all imported files
-        """
-        file_path = self._normalize_path(file_path)
-        if file_path in self.all_imports_cache:
-            return self.all_imports_cache[file_path]
-        # Reset processing set for new recursive call
-        self._tmp_imports = set()
-        self._get_all_imports_recursive(file_path, depth)
-        self.all_imports_cache[file_path] = self._tmp_imports
-        return self._tmp_imports
-
-    def _get_all_imports_recursive(
-        self, file_path: Path, depth: Optional[int], current_depth: int = 0
-    ) -> None:
+            A list of absolute paths to all imported files, including the file itself
         """
-        Recursive helper for get_all_imports.
-
-        Args:
-            file_path: The absolute path to the file
-            depth: Maximum depth to traverse, None for unlimited
-            current_depth: Current recursion depth
-        """
-        # Check if we've reached the maximum depth
-        if depth is not None and current_depth >= depth:
-            return
-
-        # Detect import loops
-        if file_path in self._tmp_imports:
-            return  # Skip this file to break the loop
-
-        # Mark this file as being done
-        self._tmp_imports.add(file_path)
-        immediate_imports = self.get_direct_imports(file_path)
-
-        # Recursively get imports of imports
-        for import_file in immediate_imports:
-            # Add nested imports. This should return only new imports
-            self._get_all_imports_recursive(import_file, depth, current_depth + 1)
-            # Record actual import of current file
-            self._tmp_imports.add(import_file)
+        file_id = self._file_id(file_path)
+        if file_id is None:
+            if depth is not None and depth <= 0:
+                return set()
+            return {self._normalize_path(file_path)}
+        graph = self.include_graph
+        return {graph.get_path(i) for i in graph.get_closure_ids(file_id, depth)}
 
     def is_file_imported_by(self, imported_file_path: Path, file_path: Path) -> bool:
         """Return True if imported_file_path is imported by file_path (either directly or indirectly through
         nested imports)"""
-        all_imports = self.get_all_imports(self._normalize_path(file_path))
-        return self._normalize_path(imported_file_path) in all_imports
+        file_id = self._file_id(file_path)
+        imported_id = self._file_id(imported_file_path)
+        if file_id is None or imported_id is None:
+            return self._normalize_path(imported_file_path) == self._normalize_path(
+                file_path
+            )
+        return bool(self.include_graph.get_closure(file_id) >> imported_id & 1)
+
+    def _imports_file_named(self, file_path: Path, name: str) -> bool:
+        """Return True if a file named `name` is imported by file_path (either
+        directly or indirectly), whatever its directory."""
+        file_id = self._file_id(file_path)
+        if file_id is None:
+            return self._normalize_path(file_path).name == name
+        graph = self.include_graph
+        return bool(graph.get_closure(file_id) & graph.basename_bits(name))
 
     def filter_callees(
         self, caller_function: Function, callees: list[Function]
@@ -250,10 +177,8 @@ class FuzzyCImportsResolver:
                     # in projects where import dirs are managed with compilation flags
                     if not added:
                         for decl_file in possible_decl_files:
-                            if any(
-                                x
-                                for x in self.get_all_imports(caller_function.file_path)
-                                if str(x).endswith(f"/{Path(decl_file).name}")
+                            if self._imports_file_named(
+                                caller_function.file_path, Path(decl_file).name
                             ):
                                 res.append(callee)
                                 added = True
@@ -0,0 +1,253 @@
+"""Include graph of the C files of a source tree"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterable
+
+from buttercup.program_model.codequery_db import IdentityCache
+
+logger = logging.getLogger(__name__)
+
+INCLUDE_GRAPH_FILE = "include_graph.json"
+# Bump when the resolution of the includes changes
+INCLUDE_GRAPH_VERSION = 1
+
+INCLUDE_RE = re.compile(rb'#include\s+([<"]([^>"]+)[>"])')
+
+
+@dataclass
+class IncludeGraph:
+    """Files of a source tree and the files they include.
+
+    The files are listed once, so includes are resolved with dictionary lookups
+    instead of probing the filesystem. The includes of a file are parsed the
+    first time they are needed, and the transitive closures are memoized as
+    bitsets (Python ints, bit `i` is set if file `i` is included).
+
+    All the methods can be called concurrently.
+    """
+
+    root_dir: Path
+    paths: list[str]
+    """Absolute paths of the files, the index of a file is its id."""
+
+    includes: list[tuple[int, ...] | None]
+    """Ids of the files directly included by each file, None if not parsed yet."""
+
+    ids: dict[str, int] = field(init=False, repr=False)
+    by_basename: dict[str, list[int]] = field(init=False, repr=False)
+    _closures: dict[int, int] = field(init=False, repr=False)
+    _basename_bits: dict[str, int] = field(init=False, repr=False)
+    _lock: threading.RLock = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.ids = {path: i for i, path in enumerate(self.paths)}
+        self.by_basename = {}
+        for i, path in enumerate(self.paths):
+            self.by_basename.setdefault(os.path.basename(path), []).append(i)
+        self._closures = {}
+        self._basename_bits = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, root_dir: Path, parse_patterns: Iterable[str] = ()) -> IncludeGraph:
+        """List the files of `root_dir`, and parse the includes of the files
+        whose name matches one of `parse_patterns` right away."""
+        root_dir = root_dir.resolve()
+        paths: list[str] = []
+        for root, dirnames, filenames in os.walk(root_dir):
+            dirnames[:] = sorted(d for d in dirnames if d != ".git")
+            paths.extend(os.path.join(root, name) for name in sorted(filenames))
+
+        graph = cls(root_dir, paths, [None] * len(paths))
+        patterns = list(parse_patterns)
+        for i, path in enumerate(paths):
+            if any(fnmatchcase(os.path.basename(path), p) for p in patterns):
+                graph.get_includes(i)
+        return graph
+
+    def save(self, path: Path) -> None:
+        """Write the graph to `path` atomically, with paths relative to the root
+        directory."""
+        data = {
+            "version": INCLUDE_GRAPH_VERSION,
+            "paths": [os.path.relpath(p, self.root_dir) for p in self.paths],
+            "includes": self.includes,
+        }
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path, root_dir: Path) -> IncludeGraph | None:
+        """Read a graph written by `save` for the files of `root_dir`, returns
+        None if there is no valid graph at `path`."""
+        root_dir = root_dir.resolve()
+        try:
+            with path.open() as f:
+                data = json.load(f)
+            if data["version"] != INCLUDE_GRAPH_VERSION:
+                return None
+            paths = [os.path.join(root_dir, p) for p in data["paths"]]
+            includes = [None if ids is None else tuple(ids) for ids in data["includes"]]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.debug("Ignoring invalid include graph %s: %s", path, e)
+            return None
+        if len(includes) != len(paths):
+            return None
+        return cls(root_dir, paths, includes)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def get_id(self, path: Path | str) -> int | None:
+        """Id of a file, files outside of the graph are added to it."""
+        path = os.path.normpath(path)
+        file_id = self.ids.get(path)
+        if file_id is not None:
+            return file_id
+        if not os.path.isfile(path):
+            return None
+        with self._lock:
+            file_id = self.ids.get(path)
+            if file_id is None:
+                file_id = len(self.paths)
+                self.paths.append(path)
+                self.includes.append(None)
+                self.by_basename.setdefault(os.path.basename(path), []).append(file_id)
+                self._basename_bits.pop(os.path.basename(path), None)
+                self.ids[path] = file_id
+            return file_id
+
+    def get_path(self, file_id: int) -> Path:
+        return Path(self.paths[file_id])
+
+    def _parse_includes(self, file_id: int) -> tuple[int, ...]:
+        path = self.paths[file_id]
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError as e:
+            logger.debug("Error parsing %s: %s", path, e)
+            return ()
+
+        origin_dir = os.path.dirname(path)
+        includes: dict[int, None] = {}
+        for _, name in INCLUDE_RE.findall(content):
+            import_name = os.fsdecode(name)
+            # NOTE(boyan): Sometimes the included file doesn't exist but is
+            # templated and generated by the build toolchain, the first
+            # existing candidate is selected.
+            for candidate in [import_name, import_name + ".in"]:
+                included = self.get_id(os.path.join(origin_dir, candidate))
+                if included is not None:
+                    includes[included] = None
+                    break
+        return tuple(includes)
+
+    def get_includes(self, file_id: int) -> tuple[int, ...]:
+        """Ids of the files directly included by a file."""
+        includes = self.includes[file_id]
+        if includes is None:
+            includes = self._parse_includes(file_id)
+            with self._lock:
+                self.includes[file_id] = includes
+        return includes
+
+    def get_closure(self, file_id: int) -> int:
+        """Bitset of the files included by a file, directly or not, and of the
+        file itself."""
+        closure = self._closures.get(file_id)
+        if closure is not None:
+            return closure
+
+        closure = 0
+        stack = [file_id]
+        while stack:
+            current = stack.pop()
+            if closure >> current & 1:
+                continue
+            memoized = self._closures.get(current)
+            if memoized is not None:
+                closure |= memoized
+                continue
+            closure |= 1 << current
+            stack.extend(self.get_includes(current))
+
+        with self._lock:
+            self._closures[file_id] = closure
+        return closure
+
+    def get_closure_ids(self, file_id: int, depth: int | None = None) -> list[int]:
+        """Ids of the files included by a file within `depth` levels of
+        includes, and of the file itself."""
+        if depth is None:
+            closure = self.get_closure(file_id)
+            ids = []
+            while closure:
+                lowest = closure & -closure
+                ids.append(lowest.bit_length() - 1)
+                closure ^= lowest
+            return ids
+        if depth <= 0:
+            return []
+
+        seen = {file_id}
+        frontier = [file_id]
+        for _ in range(depth):
+            next_frontier = []
+            for current in frontier:
+                for included in self.get_includes(current):
+                    if included not in seen:
+                        seen.add(included)
+                        next_frontier.append(included)
+            frontier = next_frontier
+        return sorted(seen)
+
+    def basename_bits(self, basename: str) -> int:
+        """Bitset of the files named `basename`."""
+        bits = self._basename_bits.get(basename)
+        if bits is None:
+            bits = 0
+            for file_id in self.by_basename.get(basename, []):
+                bits |= 1 << file_id
+            with self._lock:
+                self._basename_bits[basename] = bits
+        return bits
+
+
+# Maximum number of graphs kept in a process
+MAX_GRAPHS = 8
+
+# Graphs are built once per source tree, keyed on the root directory
+_graphs: IdentityCache[IncludeGraph] = IdentityCache(MAX_GRAPHS)
+
+
+def _load_or_build(root_dir: Path) -> IncludeGraph:
+    graph = IncludeGraph.load(root_dir / INCLUDE_GRAPH_FILE, root_dir)
+    if graph is None:
+        graph = IncludeGraph.build(root_dir)
+    return graph
+
+
+def get_include_graph(root_dir: Path) -> IncludeGraph:
+    """Get the include graph of a source tree, the one stored in it by
+    `IncludeGraph.save` if any."""
+    root_dir = root_dir.resolve()
+    return _graphs.get(root_dir, lambda: _load_or_build(root_dir))
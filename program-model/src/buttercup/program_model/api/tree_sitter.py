@@ -1,10 +1,11 @@
 """TreeSitter based code querying module"""
 
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from functools import lru_cache
 from buttercup.common.challenge_task import ChallengeTask
+from buttercup.program_model.api.tree_sitter_cache import TSParseCache
 from buttercup.program_model.utils.common import (
     Function,
     FunctionBody,
@@ -18,6 +19,12 @@ from typing import Any
 
 logger = logging.getLogger(__name__)
 
+# Conditional preprocessor directives (#if, #ifdef, #ifndef, #else, #elif,
+# #endif), up to the end of the line
+PREPROC_CONDITIONAL_RE = re.compile(
+    rb"^#[ \t\f\v]*(?:if|else|elif|endif)[^\r\n]*", re.MULTILINE
+)
+
 QUERY_STR_C = """
 (
 [
@@ -225,6 +232,10 @@ class CodeTS:
     """Class to extract information about functions in a challenge project using TreeSitter."""
 
     challenge_task: ChallengeTask
+    cache_dir: Path | None = None
+    """Directory of the on-disk parse cache, shared by all the processes using it."""
+
+    parse_cache: TSParseCache | None = field(init=False, default=None)
 
     def __post_init__(self) -> None:
         """Initialize the CodeTS object."""
@@ -248,6 +259,12 @@ class CodeTS:
 
         self.get_functions_in_code = lru_cache(maxsize=1000)(self.get_functions_in_code)  # type: ignore [method-assign]
         self.get_function = lru_cache(maxsize=1000)(self.get_function)  # type: ignore [method-assign]
+        self.get_types_in_code = lru_cache(maxsize=1000)(self.get_types_in_code)  # type: ignore [method-assign]
+
+        if self.cache_dir is not None:
+            self.parse_cache = TSParseCache(
+                self.cache_dir, self.project_yaml.unified_language.value
+            )
 
         try:
             self.query = self.language.query(query_str)
@@ -260,33 +277,35 @@ class CodeTS:
         except Exception:
             raise ValueError("Query string is invalid")
 
-        self.preprocess_keywords = ["ifdef", "ifndef", "if", "else", "elif", "endif"]
-        self.preprocess_regex = [
-            r"^#\s*{kw}\s*".format(kw=kw) for kw in self.preprocess_keywords
-        ]
-
     def get_functions(self, file_path: Path) -> dict[str, Function]:
         """Parse the functions in a file and return a dictionary of function names/body"""
         code = self.challenge_task.task_dir.joinpath(file_path).read_bytes()
         return self.get_functions_in_code(code, file_path)
 
     def _get_code_no_preproc(self, code: bytes) -> bytes:
-        """Remove preprocessor directives from the code"""
-        return (b"\n").join(
-            [
-                x
-                if not any(
-                    re.match(pattern, x.decode()) for pattern in self.preprocess_regex
-                )
-                else b"/" * len(x)
-                for x in code.splitlines()
-            ]
-        )
+        """Remove preprocessor directives from the code.
+
+        The directives are overwritten with `/`, so that the byte offsets and
+        line numbers of the code are kept."""
+        return PREPROC_CONDITIONAL_RE.sub(lambda m: b"/" * len(m[0]), code)
 
     def get_functions_in_code(
         self, code: bytes, file_path: Path
     ) -> dict[str, Function]:
         """Parse the functions in a piece of code and return a dictionary of function names/body"""
+        if self.parse_cache is None:
+            return self._parse_functions_in_code(code, file_path)
+
+        digest = self.parse_cache.digest(code)
+        functions = self.parse_cache.load_functions(digest, file_path)
+        if functions is None:
+            functions = self._parse_functions_in_code(code, file_path)
+            self.parse_cache.store_functions(digest, functions)
+        return functions
+
+    def _parse_functions_in_code(
+        self, code: bytes, file_path: Path
+    ) -> dict[str, Function]:
         if self.project_yaml.unified_language == Language.C:
             code_no_preproc = self._get_code_no_preproc(code)
             tree = self.parser.parse(code_no_preproc)
@@ -374,7 +393,30 @@ class CodeTS:
     ) -> dict[str, TypeDefinition]:
         """Parse the definition of a type in a piece of code."""
         code = self.challenge_task.task_dir.joinpath(file_path).read_bytes()
-
+        types = self.get_types_in_code(code, file_path)
+        if not typename:
+            return dict(types)
+        if fuzzy:
+            return {name: t for name, t in types.items() if typename in name}
+        return {name: t for name, t in types.items() if name == typename}
+
+    def get_types_in_code(
+        self, code: bytes, file_path: Path
+    ) -> dict[str, TypeDefinition]:
+        """Parse all the type definitions in a piece of code."""
+        if self.parse_cache is None:
+            return self._parse_types_in_code(code, file_path)
+
+        digest = self.parse_cache.digest(code)
+        types = self.parse_cache.load_types(digest, file_path)
+        if types is None:
+            types = self._parse_types_in_code(code, file_path)
+            self.parse_cache.store_types(digest, types)
+        return types
+
+    def _parse_types_in_code(
+        self, code: bytes, file_path: Path
+    ) -> dict[str, TypeDefinition]:
         if self.project_yaml.unified_language == Language.C:
             code_no_preproc = self._get_code_no_preproc(code)
             tree = self.parser.parse(code_no_preproc)
@@ -419,10 +461,6 @@ class CodeTS:
             # Where the name is "*j_decompress_ptr" but the actual type name
             # doesn't contain the star.
             name = name.lstrip("*")
-            if typename and not fuzzy and name != typename:
-                continue
-            if typename and fuzzy and typename not in name:
-                continue
 
             # Determine the type based on the node type
             type_def_type = TypeDefinitionType.STRUCT  # default
@@ -0,0 +1,137 @@
+"""On-disk cache of the functions and types parsed by CodeTS"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from buttercup.program_model.utils.common import (
+    Function,
+    FunctionBody,
+    TypeDefinition,
+    TypeDefinitionType,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bump when the tree-sitter queries or the extraction logic change, so that
+# records parsed by an older version are not reused
+CACHE_VERSION = 1
+
+
+@dataclass
+class TSParseCache:
+    """Functions and types extracted from source files, keyed by the hash of the
+    file content.
+
+    The records do not depend on the path of the file, so they can be shared by
+    every process (and every copy of a task) that parses the same content.
+    Each record is written atomically, concurrent writers of the same record
+    write the same data.
+    """
+
+    cache_dir: Path
+    language: str
+
+    @staticmethod
+    def digest(code: bytes) -> str:
+        return hashlib.sha256(code).hexdigest()
+
+    def _record_path(self, kind: str, digest: str) -> Path:
+        return self.cache_dir.joinpath(
+            f"{self.language}-v{CACHE_VERSION}", kind, digest[:2], f"{digest}.json"
+        )
+
+    def _load(self, kind: str, digest: str) -> list[dict[str, Any]] | None:
+        try:
+            with self._record_path(kind, digest).open() as f:
+                records: list[dict[str, Any]] = json.load(f)
+                return records
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.debug("Ignoring invalid parse cache record %s: %s", digest, e)
+            return None
+
+    def _store(self, kind: str, digest: str, records: list[dict[str, Any]]) -> None:
+        path = self._record_path(kind, digest)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(records, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            # The cache is only an optimization
+            logger.debug("Failed to store parse cache record %s: %s", digest, e)
+
+    def load_functions(
+        self, digest: str, file_path: Path
+    ) -> dict[str, Function] | None:
+        records = self._load("functions", digest)
+        if records is None:
+            return None
+        try:
+            return {
+                r["name"]: Function(
+                    r["name"],
+                    file_path,
+                    [
+                        FunctionBody(body, start, end)
+                        for body, start, end in r["bodies"]
+                    ],
+                )
+                for r in records
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            logger.debug("Ignoring invalid parse cache record %s: %s", digest, e)
+            return None
+
+    def store_functions(self, digest: str, functions: dict[str, Function]) -> None:
+        records = [
+            {
+                "name": function.name,
+                "bodies": [[b.body, b.start_line, b.end_line] for b in function.bodies],
+            }
+            for function in functions.values()
+        ]
+        self._store("functions", digest, records)
+
+    def load_types(
+        self, digest: str, file_path: Path
+    ) -> dict[str, TypeDefinition] | None:
+        records = self._load("types", digest)
+        if records is None:
+            return None
+        try:
+            return {
+                r["name"]: TypeDefinition(
+                    name=r["name"],
+                    type=TypeDefinitionType(r["type"]),
+                    definition=r["definition"],
+                    definition_line=r["definition_line"],
+                    file_path=file_path,
+                )
+                for r in records
+            }
+        except (KeyError, TypeError, ValueError) as e:
+            logger.debug("Ignoring invalid parse cache record %s: %s", digest, e)
+            return None
+
+    def store_types(self, digest: str, types: dict[str, TypeDefinition]) -> None:
+        records = [
+            {
+                "name": t.name,
+                "type": t.type.value,
+                "definition": t.definition,
+                "definition_line": t.definition_line,
+            }
+            for t in types.values()
+        ]
+        self._store("types", digest, records)
@@ -0,0 +1,268 @@
+"""Whole-project call graph, materialized when the CodeQuery database is created"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from buttercup.program_model.codequery_db import CodeQueryDB
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BCCG"
+# Bump when the layout of the file changes
+FORMAT_VERSION = 1
+# magic, format version, length of the JSON header
+_HEADER = struct.Struct("<4sII")
+# Arrays of the file, in order
+_ARRAYS = (
+    "file_ids",
+    "start_lines",
+    "end_lines",
+    "callee_offsets",
+    "callee_ids",
+    "caller_offsets",
+    "caller_ids",
+)
+
+
+def _uint32_array(values: Iterable[int] = ()) -> array[int]:
+    a = array("I", values)
+    assert a.itemsize == 4, "array('I') is expected to be 32 bits"
+    return a
+
+
+def _csr(edges: list[tuple[int, int]], n: int) -> tuple[array[int], array[int]]:
+    """Offsets and targets of the adjacency lists of `n` nodes, the targets of
+    node `i` are `targets[offsets[i]:offsets[i + 1]]`."""
+    offsets = _uint32_array([0] * (n + 1))
+    for source, _ in edges:
+        offsets[source + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    targets = _uint32_array(target for _, target in sorted(edges))
+    return offsets, targets
+
+
+@dataclass
+class CallGraph:
+    """Call graph of all the functions defined in a project.
+
+    Functions are identified by their index. The callees and the callers of
+    each function are stored as CSR adjacency arrays, so that the neighbors of a
+    function are a slice of an array.
+
+    Calls are resolved by name: a call to `foo` is an edge to every definition
+    of `foo`, the same superset returned by `CodeQuery.get_callees`.
+    """
+
+    names: list[str]
+    files: list[str]
+    """Distinct file paths, based on the challenge task container structure."""
+
+    file_ids: array[int]
+    start_lines: array[int]
+    end_lines: array[int]
+    callee_offsets: array[int]
+    callee_ids: array[int]
+    caller_offsets: array[int]
+    caller_ids: array[int]
+
+    _ids_by_name: dict[str, list[int]] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._ids_by_name = {}
+        for function_id, name in enumerate(self.names):
+            self._ids_by_name.setdefault(name, []).append(function_id)
+
+    @classmethod
+    def from_db(
+        cls,
+        db: CodeQueryDB,
+        rebase_path: Callable[[Path], Path],
+        get_spans: Callable[[Path], dict[str, list[tuple[int, int]]]] | None = None,
+    ) -> CallGraph:
+        """Build the call graph from the function definitions and calls of a
+        CodeQuery database.
+
+        `get_spans` returns the line spans of the bodies of the functions defined
+        in a file. A function without a span containing its definition line is
+        given a span of that line only.
+        """
+        names: list[str] = []
+        files: list[str] = []
+        file_index: dict[str, int] = {}
+        file_ids = _uint32_array()
+        start_lines = _uint32_array()
+        end_lines = _uint32_array()
+        ids_by_symbol: dict[int, int] = {}
+        spans: dict[str, list[tuple[int, int]]] = {}
+
+        for sym_id, name, file, line in db.function_definitions():
+            if file not in file_index:
+                file_index[file] = len(files)
+                files.append(rebase_path(Path(file)).as_posix())
+                spans = {}
+                if get_spans is not None:
+                    try:
+                        spans = get_spans(Path(file))
+                    except Exception as e:
+                        logger.debug("Failed to get the spans of %s: %s", file, e)
+
+            start_line, end_line = line, line
+            for start, end in spans.get(name, []):
+                if start <= line <= end:
+                    start_line, end_line = start, end
+                    break
+
+            ids_by_symbol[sym_id] = len(names)
+            names.append(name)
+            file_ids.append(file_index[file])
+            start_lines.append(start_line)
+            end_lines.append(end_line)
+
+        ids_by_name: dict[str, list[int]] = {}
+        for function_id, name in enumerate(names):
+            ids_by_name.setdefault(name, []).append(function_id)
+
+        edges: set[tuple[int, int]] = set()
+        for caller_sym_id, called_name in db.function_calls():
+            caller = ids_by_symbol.get(caller_sym_id)
+            if caller is None:
+                continue
+            for callee in ids_by_name.get(called_name, []):
+                edges.add((caller, callee))
+
+        callee_offsets, callee_ids = _csr(list(edges), len(names))
+        caller_offsets, caller_ids = _csr([(b, a) for a, b in edges], len(names))
+        return cls(
+            names,
+            files,
+            file_ids,
+            start_lines,
+            end_lines,
+            callee_offsets,
+            callee_ids,
+            caller_offsets,
+            caller_ids,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.callee_ids)
+
+    def ids(self, name: str) -> list[int]:
+        """Ids of the definitions of the function `name`."""
+        return self._ids_by_name.get(name, [])
+
+    def file(self, function_id: int) -> str:
+        return self.files[self.file_ids[function_id]]
+
+    def span(self, function_id: int) -> tuple[int, int]:
+        """First and last line (1-based) of the function."""
+        return self.start_lines[function_id], self.end_lines[function_id]
+
+    def callees(self, function_id: int) -> array[int]:
+        start, end = self.callee_offsets[function_id : function_id + 2]
+        return self.callee_ids[start:end]
+
+    def callers(self, function_id: int) -> array[int]:
+        start, end = self.caller_offsets[function_id : function_id + 2]
+        return self.caller_ids[start:end]
+
+    def reachable(
+        self,
+        sources: Iterable[int],
+        max_depth: int | None = None,
+        reverse: bool = False,
+    ) -> dict[int, int]:
+        """Functions reachable from `sources` through calls, with the number of
+        calls needed to reach them. The sources are at depth 0.
+
+        If `reverse` is set, the functions that can reach `sources` are returned
+        instead.
+        """
+        offsets, targets = (
+            (self.caller_offsets, self.caller_ids)
+            if reverse
+            else (self.callee_offsets, self.callee_ids)
+        )
+        depths = {source: 0 for source in sources}
+        queue = deque(depths)
+        while queue:
+            function_id = queue.popleft()
+            depth = depths[function_id]
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for i in range(offsets[function_id], offsets[function_id + 1]):
+                target = targets[i]
+                if target not in depths:
+                    depths[target] = depth + 1
+                    queue.append(target)
+        return depths
+
+    def save(self, path: Path) -> None:
+        """Write the call graph to `path` atomically."""
+        header = json.dumps(
+            {
+                "names": self.names,
+                "files": self.files,
+                "lengths": [len(getattr(self, name)) for name in _ARRAYS],
+            }
+        ).encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(header)))
+                f.write(header)
+                for name in _ARRAYS:
+                    values: array[int] = getattr(self, name)
+                    if sys.byteorder == "big":
+                        values = array("I", values)
+                        values.byteswap()
+                    values.tofile(f)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> CallGraph:
+        """Read a call graph written by `save`, raises `ValueError` if the file
+        is not a valid call graph."""
+        data = path.read_bytes()
+        try:
+            magic, version, header_length = _HEADER.unpack_from(data)
+        except struct.error as e:
+            raise ValueError(f"Invalid call graph {path}: {e}")
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Invalid call graph {path}: version {version}")
+
+        offset = _HEADER.size + header_length
+        header = json.loads(data[_HEADER.size : offset])
+        arrays: dict[str, array[int]] = {}
+        for name, length in zip(_ARRAYS, header["lengths"], strict=True):
+            values = _uint32_array()
+            end = offset + 4 * length
+            if end > len(data):
+                raise ValueError(f"Invalid call graph {path}: truncated")
+            values.frombytes(data[offset:end])
+            if sys.byteorder == "big":
+                values.byteswap()
+            arrays[name] = values
+            offset = end
+
+        return cls(header["names"], header["files"], **arrays)
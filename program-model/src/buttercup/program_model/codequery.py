@@ -2,17 +2,22 @@
 
 from __future__ import annotations
 
+import hashlib
 import logging
+import os
 import shutil
 import subprocess
 from dataclasses import dataclass, field
 from pathlib import Path
 from itertools import groupby
-from typing import ClassVar, Optional
-import rapidfuzz
+from typing import ClassVar, Iterable, Optional
 import uuid
 from buttercup.common.challenge_task import ChallengeTask, ChallengeTaskError
 from buttercup.program_model.api.tree_sitter import CodeTS
+from buttercup.program_model.call_graph import CallGraph
+from buttercup.program_model.codequery_db import CodeQueryDB, CodeQueryRow, SearchOption
+from buttercup.program_model.symbol_index import get_symbol_index
+from buttercup.program_model.api.include_graph import INCLUDE_GRAPH_FILE, IncludeGraph
 from buttercup.program_model.api.fuzzy_imports_resolver import (
     FuzzyJavaImportsResolver,
     FuzzyCImportsResolver,
@@ -79,6 +84,34 @@ JAVA_EXTENSIONS = [
 ]
 
 
+def source_fingerprint(challenge: ChallengeTask) -> str:
+    """Hash of the sources a CodeQuery db is built from: the focus repository
+    and the oss-fuzz project of the challenge task.
+
+    Tasks with the same fingerprint copy the same /src out of their container,
+    so their dbs are interchangeable.
+    """
+    h = hashlib.sha256()
+    dirs = [
+        challenge.get_source_path(),
+        challenge.get_oss_fuzz_path() / "projects" / challenge.project_name,
+    ]
+    for i, directory in enumerate(dirs):
+        h.update(f"{i}\0".encode())
+        for root, dirnames, filenames in os.walk(directory):
+            dirnames[:] = sorted(d for d in dirnames if d != ".git")
+            # Symlinked directories are not followed, their target is hashed
+            links = [d for d in dirnames if Path(root, d).is_symlink()]
+            for filename in sorted(filenames + links):
+                path = Path(root, filename)
+                h.update(path.relative_to(directory).as_posix().encode() + b"\0")
+                if path.is_symlink():
+                    h.update(b"l" + os.readlink(path).encode())
+                else:
+                    h.update(b"f" + hashlib.sha256(path.read_bytes()).digest())
+    return h.hexdigest()
+
+
 @dataclass
 class CQSearchResult:
     """Result of the cqsearch command."""
@@ -98,6 +131,18 @@ class CQSearchResult:
             logger.warning("Invalid cqsearch line: %s", line)
             return None
 
+        return cls.from_fields(value, file_str, line, body)
+
+    @classmethod
+    def from_row(cls, row: CodeQueryRow) -> CQSearchResult | None:
+        """Convert a CodeQuery database search result into a CQSearchResult."""
+        return cls.from_fields(row.value, row.file, row.line, row.body)
+
+    @classmethod
+    def from_fields(
+        cls, value: str, file_str: str, line: str | int, body: str
+    ) -> CQSearchResult | None:
+        """Build a CQSearchResult from the fields of a search result."""
         # Rebase the file path from the challenge task base dir.
         # This is needed because the task-dir part might be different from what
         # was originally used to create the db.
@@ -133,16 +178,40 @@ class CodeQuery:
     imports_resolver: Optional[FuzzyCImportsResolver | FuzzyJavaImportsResolver] = (
         field(init=False)
     )
+    base_task_dir: Path | None = field(default=None, kw_only=True)
+    """Task directory of a db built from the sources of this task before its
+    diffs were applied (see `source_fingerprint`). Its /src is reused instead of
+    building the project again."""
+
+    _call_graph: CallGraph | None = field(init=False, default=None, repr=False)
 
     CSCOPE_FILES: ClassVar[str] = "cscope.files"
     CSCOPE_OUT: ClassVar[str] = "cscope.out"
     TAGS: ClassVar[str] = "tags"
     CODEQUERY_DB: ClassVar[str] = "codequery.db"
+    TS_CACHE: ClassVar[str] = "tree_sitter_cache"
+    CALL_GRAPH: ClassVar[str] = "call_graph.bin"
+    # Files created in the container source directory when indexing it
+    INDEX_FILES: ClassVar[tuple[str, ...]] = (
+        CSCOPE_FILES,
+        CSCOPE_OUT,
+        "cscope.in.out",
+        "cscope.po.out",
+        TAGS,
+        CODEQUERY_DB,
+        CALL_GRAPH,
+        INCLUDE_GRAPH_FILE,
+    )
 
     def __post_init__(self) -> None:
         """Initialize the CodeQuery object."""
         self._verify_requirements()
-        self.ts = CodeTS(self.challenge)
+        # Share the functions and types parsed by tree-sitter with the other
+        # users of the db, when it can be written to
+        ts_cache_dir = None
+        if self.challenge.local_task_dir is not None:
+            ts_cache_dir = self.challenge.task_dir.joinpath(self.TS_CACHE)
+        self.ts = CodeTS(self.challenge, cache_dir=ts_cache_dir)
         language = self._get_project_language()
         if language == Language.C:
             self.imports_resolver = FuzzyCImportsResolver(self._get_container_src_dir())
@@ -165,7 +234,7 @@ class CodeQuery:
 
     def _verify_requirements(self) -> None:
         """Verify that the required commands are installed."""
-        required_commands = ["cscope", "ctags", "cqmakedb", "cqsearch"]
+        required_commands = ["cscope", "ctags", "cqmakedb"]
         missing_commands = []
 
         for command in required_commands:
@@ -227,9 +296,85 @@ class CodeQuery:
             ]
             subprocess.run(command, check=True, capture_output=True)
 
+    def _copy_src_from_base(self) -> bool:
+        """Copy the /src directory of the base task and apply the diffs of this
+        task to it. Returns False if the base cannot be used."""
+        if self.base_task_dir is None:
+            return False
+        base_src = self.base_task_dir.joinpath(CONTAINER_SRC_DIR)
+        if not base_src.joinpath(self.CODEQUERY_DB).exists():
+            logger.debug("No CodeQuery DB to reuse in %s", self.base_task_dir)
+            return False
+
+        src_dst = self._get_container_src_dir()
+        try:
+            # The index files are created again from the patched sources
+            shutil.copytree(
+                base_src,
+                src_dst,
+                symlinks=True,
+                ignore=lambda d, _: self.INDEX_FILES if Path(d) == base_src else (),
+            )
+            self._apply_diffs_to_container_src()
+            base_ts_cache = self.base_task_dir.joinpath(self.TS_CACHE)
+            if base_ts_cache.is_dir():
+                shutil.copytree(
+                    base_ts_cache,
+                    self.challenge.task_dir.joinpath(self.TS_CACHE),
+                    dirs_exist_ok=True,
+                )
+        except (OSError, RuntimeError) as e:
+            logger.warning(
+                "Cannot reuse the sources of %s, building the project: %s",
+                self.base_task_dir,
+                e,
+            )
+            shutil.rmtree(src_dst, ignore_errors=True)
+            return False
+
+        logger.info("Reused the sources of %s", self.base_task_dir)
+        return True
+
+    def _apply_diffs_to_container_src(self) -> None:
+        """Apply the diffs of the task to the focus repository in /src."""
+        diffs = self.challenge.get_diffs()
+        if not diffs:
+            return
+
+        # The focus repository is usually the WORKDIR of the project
+        candidates = [self.challenge.workdir_from_dockerfile()]
+        candidates.append(Path("/src", self.challenge.focus))
+        for candidate in dict.fromkeys(candidates):
+            repo_dir = self._get_container_src_dir().joinpath(
+                candidate.relative_to("/")
+            )
+            if not repo_dir.is_dir():
+                continue
+            check = subprocess.run(
+                ["git", "-C", str(repo_dir), "apply", "--check", *map(str, diffs)],
+                capture_output=True,
+            )
+            if check.returncode != 0:
+                continue
+
+            for diff in diffs:
+                try:
+                    subprocess.run(
+                        ["git", "-C", str(repo_dir), "apply", str(diff)],
+                        check=True,
+                        capture_output=True,
+                        timeout=60,
+                    )
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                    raise RuntimeError(f"Failed to apply {diff}: {e}")
+            return
+
+        raise RuntimeError("No directory of /src the diffs apply to")
+
     def _create_codequery_db(self) -> None:
         """Create the codequery database."""
-        self._copy_src_from_container()
+        if not self._copy_src_from_base():
+            self._copy_src_from_container()
 
         with self._get_container_src_dir().joinpath(self.CSCOPE_FILES).open("w") as f:
             project_yaml = ProjectYaml(
@@ -295,26 +440,138 @@ class CodeQuery:
         if not self._get_container_src_dir().joinpath(self.CODEQUERY_DB).exists():
             raise RuntimeError("Failed to create cquery database.")
 
+        # Materialize the call graph, so that it is archived with the db
+        self._call_graph = self._build_call_graph()
+        if project_yaml.unified_language == Language.C:
+            # The includes of all the files are resolved once, for all the
+            # users of the db
+            include_graph = IncludeGraph.build(
+                self._get_container_src_dir(), C_CPP_EXTENSIONS
+            )
+            include_graph.save(
+                self._get_container_src_dir().joinpath(INCLUDE_GRAPH_FILE)
+            )
+
     def __repr__(self) -> str:
         return f"CodeQuery(challenge={self.challenge})"
 
-    def _run_cqsearch(self, *args: str) -> list[CQSearchResult]:
-        """Run the cqsearch command and parse the results."""
-        try:
-            result = subprocess.run(
-                ["cqsearch", *args],
-                cwd=self._get_container_src_dir(),
-                capture_output=True,
-                text=True,
-                check=True,
+    def _to_container_src_path(self, path: Path) -> Path:
+        """Path in the container source directory of a path based on the
+        challenge task container structure (e.g. /src/my-source/my-file.c)."""
+        return self._get_container_src_dir().joinpath(path.relative_to("/"))
+
+    def _get_function_spans(self, file_path: Path) -> dict[str, list[tuple[int, int]]]:
+        file_path = self._to_container_src_path(self._rebase_path(file_path))
+        return {
+            name: [(body.start_line, body.end_line) for body in function.bodies]
+            for name, function in self.ts.get_functions(file_path).items()
+        }
+
+    def _build_call_graph(self) -> CallGraph:
+        """Build the call graph of the project and store it next to the db, if
+        the challenge task can be written to."""
+        graph = CallGraph.from_db(
+            self._get_db(), self._rebase_path, self._get_function_spans
+        )
+        logger.debug(
+            "Built call graph with %d functions and %d calls",
+            len(graph),
+            graph.num_edges,
+        )
+        if self.challenge.local_task_dir is not None:
+            graph.save(self._get_container_src_dir().joinpath(self.CALL_GRAPH))
+        return graph
+
+    def get_call_graph(self) -> CallGraph:
+        """Get the call graph of the project, materialized when the db was
+        created. It is built now for dbs created without one."""
+        if self._call_graph is None:
+            try:
+                self._call_graph = CallGraph.load(
+                    self._get_container_src_dir().joinpath(self.CALL_GRAPH)
+                )
+            except (OSError, ValueError) as e:
+                logger.debug("Building the call graph, cannot load it: %s", e)
+                self._call_graph = self._build_call_graph()
+        return self._call_graph
+
+    def _call_graph_ids(self, graph: CallGraph, function: Function | str) -> list[int]:
+        """Ids of the call graph functions matching `function`. A `Function` is
+        matched by file and body lines, a name by name only."""
+        if isinstance(function, str):
+            return graph.ids(function)
+
+        file = self._rebase_path(function.file_path).as_posix()
+        return [
+            function_id
+            for function_id in graph.ids(function.name)
+            if graph.file(function_id) == file
+            and any(
+                body.start_line <= graph.span(function_id)[1]
+                and graph.span(function_id)[0] <= body.end_line
+                for body in function.bodies
             )
-            output = result.stdout
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Failed to run cqsearch: {e}")
+        ]
 
-        results = [CQSearchResult.from_line(line) for line in output.splitlines()]
+    def _call_graph_function(self, graph: CallGraph, function_id: int) -> Function:
+        """The function of the call graph, with its bodies parsed by tree-sitter
+        if possible."""
+        name = graph.names[function_id]
+        file_path = Path(graph.file(function_id))
+        function = self.ts.get_function(name, self._to_container_src_path(file_path))
+        if function is None:
+            return Function(name=name, file_path=file_path, bodies=[])
+        return Function(name=name, file_path=file_path, bodies=function.bodies)
+
+    def get_reachable_functions(
+        self,
+        function: Function | str,
+        max_depth: int | None = None,
+        reverse: bool = False,
+    ) -> dict[Function, int]:
+        """Get the functions reachable from `function` through calls (e.g. all
+        the functions a harness can call), with the number of calls needed to
+        reach them. `function` itself is at depth 0.
+
+        If `reverse` is set, the functions from which `function` can be reached
+        are returned instead. File paths are based on the challenge task
+        container structure (e.g. /src)."""
+        graph = self.get_call_graph()
+        depths = graph.reachable(
+            self._call_graph_ids(graph, function), max_depth, reverse
+        )
+        functions: dict[Function, int] = {}
+        for function_id, depth in sorted(depths.items(), key=lambda x: x[1]):
+            # Several definitions in a file are bodies of the same function
+            functions.setdefault(self._call_graph_function(graph, function_id), depth)
+        return functions
+
+    def _get_db(self) -> CodeQueryDB:
+        """Get the query engine of the codequery database."""
+        return CodeQueryDB(self._get_container_src_dir().joinpath(self.CODEQUERY_DB))
+
+    @staticmethod
+    def _to_results(rows: list[CodeQueryRow]) -> list[CQSearchResult]:
+        results = [CQSearchResult.from_row(row) for row in rows]
         return [result for result in results if result is not None]
 
+    def _search(
+        self, option: SearchOption, name: str, file_path: Path | None = None
+    ) -> list[CQSearchResult]:
+        """Search the codequery database for the exact `name`, equivalent to
+        `cqsearch -p <option> -t <name> -e -u [-b <file_path>]`."""
+        file_filter = file_path.as_posix() if file_path else None
+        return self._to_results(self._get_db().search(option, name, file_filter))
+
+    def _search_many(
+        self, option: SearchOption, names: Iterable[str], file_path: Path | None = None
+    ) -> dict[str, list[CQSearchResult]]:
+        """Search the codequery database for each of the exact `names`, in a
+        single query."""
+        file_filter = file_path.as_posix() if file_path else None
+        rows = self._get_db().search_many(option, names, file_filter)
+        return {name: self._to_results(r) for name, r in rows.items()}
+
     def _rebase_path(self, path: Path) -> Path:
         if CONTAINER_SRC_DIR not in path.parts:
             return path
@@ -360,23 +617,49 @@ class CodeQuery:
             for tu in type_usages
         ]
 
-    def _get_all_functions(self) -> list[CQSearchResult]:
-        """Get all functions in the codebase."""
-        return [
-            f
-            for f in self._run_cqsearch(
-                "-s", self.CODEQUERY_DB, "-p", "2", "-t", "*", "-u"
-            )
-        ]
+    def _fuzzy_search(
+        self, option: SearchOption, name: str, threshold: float
+    ) -> list[CQSearchResult]:
+        """Get the results of a search option whose name is similar to `name`
+        (`rapidfuzz.fuzz.ratio` greater than `threshold`), sorted in descending
+        order of similarity."""
+        matches = get_symbol_index(self._get_db(), option).extract(name, threshold)
+        results = self._search_many(option, [match for match, _ in matches])
+        return [result for match, _ in matches for result in results[match]]
+
+    def _get_function_results_many(
+        self,
+        function_names: list[str],
+        file_path: Path | None = None,
+        line_number: int | None = None,
+        fuzzy: bool | None = False,
+    ) -> dict[str, list[CQSearchResult]]:
+        """Get the symbols and function definitions matching each of the
+        function names, in the order of the cqsearch -p 1 and -p 2 results."""
+        results: dict[str, list[CQSearchResult]] = {name: [] for name in function_names}
+        for option in [SearchOption.SYMBOL, SearchOption.FUNCTION_OR_MACRO]:
+            # log telemetry
+            tracer = trace.get_tracer(__name__)
+            with tracer.start_as_current_span("get_functions_with_codequery") as span:
+                set_crs_attributes(
+                    span,
+                    crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
+                    crs_action_name="get_functions_with_codequery",
+                    task_metadata=dict(self.challenge.task_meta.metadata),
+                    extra_attributes={
+                        "crs.action.code.file": str(file_path) if file_path else "",
+                        "crs.action.code.lines": line_number if line_number else "",
+                        "crs.action.code.fuzzy": fuzzy if fuzzy else False,
+                        "crs.action.code.function_name": ",".join(function_names),
+                    },
+                )
+                for name, found in self._search_many(
+                    option, function_names, file_path
+                ).items():
+                    results[name].extend(found)
+                span.set_status(Status(StatusCode.OK))
 
-    def _get_all_types(self) -> list[CQSearchResult]:
-        """Get all symbols in the codebase."""
-        return [
-            t
-            for t in self._run_cqsearch(
-                "-s", self.CODEQUERY_DB, "-p", "1", "-t", "*", "-u"
-            )
-        ]
+        return results
 
     def get_functions(
         self,
@@ -401,56 +684,51 @@ class CodeQuery:
                 file_path,
             )
 
-        results: list[CQSearchResult] = []
-        flags = ["1", "2"]
-        for flag in flags:
-            cqsearch_args = [
-                "-s",
-                self.CODEQUERY_DB,
-                "-p",
-                flag,
-                "-t",
-                function_name,
-                "-e",
-                "-u",
-            ]
-            if file_path:
-                cqsearch_args += ["-b", file_path.as_posix()]
-
-            # log telemetry
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span("get_functions_with_codequery") as span:
-                set_crs_attributes(
-                    span,
-                    crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
-                    crs_action_name="get_functions_with_codequery",
-                    task_metadata=dict(self.challenge.task_meta.metadata),
-                    extra_attributes={
-                        "crs.action.code.file": str(file_path) if file_path else "",
-                        "crs.action.code.lines": line_number if line_number else "",
-                        "crs.action.code.fuzzy": fuzzy if fuzzy else False,
-                        "crs.action.code.function_name": function_name,
-                    },
-                )
-                results.extend(self._run_cqsearch(*cqsearch_args))
-                span.set_status(Status(StatusCode.OK))
+        results = self._get_function_results_many(
+            [function_name], file_path, line_number, fuzzy
+        )[function_name]
 
         # Extended fuzzy matching
         if fuzzy and file_path is None:
             # Fuzzy match the function name against all functions in the codebase
-            fuzzy_matches: list[tuple[CQSearchResult, float]] = sorted(
-                [
-                    (f, rapidfuzz.fuzz.ratio(function_name, f.value))
-                    for f in self._get_all_functions()
-                    if f.value
-                    and rapidfuzz.fuzz.ratio(function_name, f.value) > fuzzy_threshold
-                ],
-                key=lambda x: x[1],
-                reverse=True,
+            results.extend(
+                self._fuzzy_search(
+                    SearchOption.FUNCTION_OR_MACRO, function_name, fuzzy_threshold
+                )
             )
-            fuzzy_matches = [f for f, _ in fuzzy_matches]
-            results.extend(fuzzy_matches)
 
+        return self._functions_from_results(
+            function_name, results, file_path, line_number, fuzzy, print_output
+        )
+
+    def get_functions_many(
+        self,
+        function_names: Iterable[str],
+        file_path: Path | None = None,
+    ) -> dict[str, list[Function]]:
+        """Get the definition(s) of each of the functions, like `get_functions`
+        without fuzzy matching, querying the codequery database once for all of
+        them."""
+        function_names = list(dict.fromkeys(function_names))
+        results = self._get_function_results_many(function_names, file_path)
+        return {
+            name: self._functions_from_results(
+                name, results[name], file_path, print_output=False
+            )
+            for name in function_names
+        }
+
+    def _functions_from_results(
+        self,
+        function_name: str,
+        results: list[CQSearchResult],
+        file_path: Path | None = None,
+        line_number: int | None = None,
+        fuzzy: bool | None = False,
+        print_output: bool = True,
+    ) -> list[Function]:
+        """Find the definitions of the functions in the files of the search
+        results."""
         res: set[Function] = set()
         results_by_file = groupby(results, key=lambda x: x.file)
         for file, file_results in results_by_file:
@@ -530,40 +808,37 @@ class CodeQuery:
                 )
             file_path = function.file_path
 
-        results: list[CQSearchResult] = []
-        flags = ["6"]
-        for flag in flags:
-            cqsearch_args = [
-                "-s",
-                self.CODEQUERY_DB,
-                "-p",
-                flag,
-                "-t",
-                function_name,
-                "-e",
-                "-u",
-            ]
-            # NOTE: Querying for callers returns the function definitions of the callers.
-            # We don't add a file path to the cqsearch args because we don't want
-            # to assume all callers of the function will be in the same file as the function.
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span("get_callers_with_codequery") as span:
-                set_crs_attributes(
-                    span,
-                    crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
-                    crs_action_name="get_callers_with_codequery",
-                    task_metadata=dict(self.challenge.task_meta.metadata),
-                    extra_attributes={
-                        "crs.action.code.file": str(file_path) if file_path else "",
-                        "crs.action.code.function_name": function_name,
-                    },
-                )
-                results.extend(self._run_cqsearch(*cqsearch_args))
-                span.set_status(Status(StatusCode.OK))
+        # NOTE: Querying for callers returns the function definitions of the callers.
+        # We don't filter by file path because we don't want to assume all callers
+        # of the function will be in the same file as the function.
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("get_callers_with_codequery") as span:
+            set_crs_attributes(
+                span,
+                crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
+                crs_action_name="get_callers_with_codequery",
+                task_metadata=dict(self.challenge.task_meta.metadata),
+                extra_attributes={
+                    "crs.action.code.file": str(file_path) if file_path else "",
+                    "crs.action.code.function_name": function_name,
+                },
+            )
+            results = self._search(SearchOption.CALLING_FUNCTIONS, function_name)
+            span.set_status(Status(StatusCode.OK))
 
+        # Look up the definitions of all the callers at once, then keep the ones
+        # in the file and at the line of each result
+        caller_results = self._get_function_results_many(
+            list(dict.fromkeys(result.value for result in results))
+        )
         callers: set[Function] = set()
         for result in results:
-            caller = self.get_functions(result.value, result.file, result.line)
+            caller = self._functions_from_results(
+                result.value,
+                [r for r in caller_results[result.value] if r.file == result.file],
+                result.file,
+                result.line,
+            )
             callers.update(caller)
 
         # NOTE: Callers returned are a superset of the actual callers. We cannot
@@ -612,42 +887,27 @@ class CodeQuery:
                 )
             functions.append(function)
 
-        results: list[CQSearchResult] = []
-        flags = ["7"]
-        for flag in flags:
-            cqsearch_args = [
-                "-s",
-                self.CODEQUERY_DB,
-                "-p",
-                flag,
-                "-t",
-                function_name,
-                "-e",
-                "-u",
-            ]
-            # NOTE: Querying for callees returns the file path and line number of where
-            # the callees are called, not the callee function definition. We add a file
-            # path to cqsearch args because (by definition) the callees are called in
-            # the same file as the function.
-            if file_path:
-                cqsearch_args += ["-b", file_path.as_posix()]
-
-            # log telemetry
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span("get_callees_with_codequery") as span:
-                set_crs_attributes(
-                    span,
-                    crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
-                    crs_action_name="get_callees_with_codequery",
-                    task_metadata=dict(self.challenge.task_meta.metadata),
-                    extra_attributes={
-                        "crs.action.code.file": str(file_path) if file_path else "",
-                        "crs.action.code.lines": line_number if line_number else "",
-                        "crs.action.code.function_name": function_name,
-                    },
-                )
-                results.extend(self._run_cqsearch(*cqsearch_args))
-                span.set_status(Status(StatusCode.OK))
+        # NOTE: Querying for callees returns the file path and line number of where
+        # the callees are called, not the callee function definition. We filter by
+        # file path because (by definition) the callees are called in the same file
+        # as the function.
+        tracer = trace.get_tracer(__name__)
+        with tracer.start_as_current_span("get_callees_with_codequery") as span:
+            set_crs_attributes(
+                span,
+                crs_action_category=CRSActionCategory.STATIC_ANALYSIS,
+                crs_action_name="get_callees_with_codequery",
+                task_metadata=dict(self.challenge.task_meta.metadata),
+                extra_attributes={
+                    "crs.action.code.file": str(file_path) if file_path else "",
+                    "crs.action.code.lines": line_number if line_number else "",
+                    "crs.action.code.function_name": function_name,
+                },
+            )
+            results = self._search(
+                SearchOption.CALLED_FUNCTIONS, function_name, file_path
+            )
+            span.set_status(Status(StatusCode.OK))
 
         # Create a dictionary of file path(s) and line ranges to filter callees by.
         callee_filter: dict[Path, list[tuple[int, int]]] = {}
@@ -656,7 +916,7 @@ class CodeQuery:
                 (b.start_line, b.end_line) for b in function.bodies
             ]
 
-        callees: set[Function] = set()
+        callee_names: list[str] = []
         for result in results:
             # NOTE: Each result is the callee function name, and the file path and line number
             # of where the callee function is called.
@@ -674,11 +934,14 @@ class CodeQuery:
             ):
                 continue
 
-            # Now find the function definition of the callee
+            callee_names.append(result.value)
+
+        # Now find the function definitions of the callees, all at once
 
-            # NOTE: We don't add a file path or line number here because we don't
-            # have that information.
-            callee = self.get_functions(result.value)
+        # NOTE: We don't add a file path or line number here because we don't
+        # have that information.
+        callees: set[Function] = set()
+        for callee in self.get_functions_many(callee_names).values():
             callees.update(callee)
 
         # NOTE: Callees returned are a superset of the actual callees. We cannot
@@ -729,21 +992,7 @@ class CodeQuery:
 
         # Look for symbols (option 1) and class/struct (option 3)
         results: list[CQSearchResult] = []
-        flags = ["1", "3"]
-        for flag in flags:
-            cqsearch_args = [
-                "-s",
-                self.CODEQUERY_DB,
-                "-p",
-                flag,
-                "-t",
-                type_name,
-                "-e",
-                "-u",
-            ]
-            if file_path:
-                cqsearch_args += ["-b", file_path.as_posix()]
-
+        for option in [SearchOption.SYMBOL, SearchOption.CLASS_OR_STRUCT]:
             # log telemetry
             tracer = trace.get_tracer(__name__)
             with tracer.start_as_current_span("get_types_with_codequery") as span:
@@ -761,24 +1010,15 @@ class CodeQuery:
                         else "",
                     },
                 )
-                results.extend(self._run_cqsearch(*cqsearch_args))
+                results.extend(self._search(option, type_name, file_path))
                 span.set_status(Status(StatusCode.OK))
 
         # Extended fuzzy matching
         if fuzzy and file_path is None:
-            # Fuzzy match the function name against all functions in the codebase
-            fuzzy_matches: list[tuple[CQSearchResult, float]] = sorted(
-                [
-                    (t, rapidfuzz.fuzz.ratio(type_name, t.value))
-                    for t in self._get_all_types()
-                    if t.value
-                    and rapidfuzz.fuzz.ratio(type_name, t.value) > fuzzy_threshold
-                ],
-                key=lambda x: x[1],
-                reverse=True,
+            # Fuzzy match the type name against all symbols in the codebase
+            results.extend(
+                self._fuzzy_search(SearchOption.SYMBOL, type_name, fuzzy_threshold)
             )
-            fuzzy_matches = [t for t, _ in fuzzy_matches]
-            results.extend(fuzzy_matches)
 
         res: set[TypeDefinition] = set()
         results_by_file = groupby(results, key=lambda x: x.file)
@@ -843,19 +1083,7 @@ class CodeQuery:
         """Get the calls to a type definition. File paths are based on the challenge
         task container structure (e.g. /src)."""
         results: list[CQSearchResult] = []
-        flags = ["1", "8"]
-        for flag in flags:
-            cqsearch_args = [
-                "-s",
-                self.CODEQUERY_DB,
-                "-p",
-                flag,
-                "-t",
-                type_definition.name,
-                "-e",
-                "-u",
-            ]
-
+        for option in [SearchOption.SYMBOL, SearchOption.CALLS_OF_FUNCTION]:
             # log telemetry
             tracer = trace.get_tracer(__name__)
             with tracer.start_as_current_span("get_type_calls_with_codequery") as span:
@@ -865,7 +1093,7 @@ class CodeQuery:
                     crs_action_name="get_type_calls_with_codequery",
                     task_metadata=dict(self.challenge.task_meta.metadata),
                 )
-                results.extend(self._run_cqsearch(*cqsearch_args))
+                results.extend(self._search(option, type_definition.name))
                 span.set_status(Status(StatusCode.OK))
 
         logger.debug("Found %d calls to type %s", len(results), type_definition.name)
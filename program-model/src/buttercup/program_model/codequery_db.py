@@ -0,0 +1,315 @@
+"""In-process queries of a CodeQuery database"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from dataclasses import dataclass
+from enum import IntEnum
+from pathlib import Path
+from typing import Generic, TypeVar
+
+# NOTE: cqmakedb stores the cscope/ctags index in a SQLite database:
+#           filestbl(fileID, filePath)
+#           linestbl(lineID, linenum, fileID, linetext)
+#           symtbl(symID, symName, symType, lineID, fileID)
+#           calltbl(callerID, calledID)
+#       symType is the cscope mark of the symbol, e.g. `$` for a function
+#       definition, `` ` `` for a function call and `#` for a macro definition.
+#       A call is recorded as a `` ` `` symbol at the line of the call, linked
+#       to the definition of the calling function in calltbl.
+#       The queries below are the ones run by `cqsearch -e -u`, without
+#       starting a process for each of them.
+
+FUNCTION_DEFINITION_TYPES = ("$", "#")
+CLASS_OR_STRUCT_TYPES = ("c", "s")
+FUNCTION_CALL_TYPE = "`"
+
+V = TypeVar("V")
+
+
+class SearchOption(IntEnum):
+    """Search options, with the numbering of `cqsearch -p`."""
+
+    SYMBOL = 1
+    FUNCTION_OR_MACRO = 2
+    CLASS_OR_STRUCT = 3
+    CALLING_FUNCTIONS = 6
+    CALLED_FUNCTIONS = 7
+    CALLS_OF_FUNCTION = 8
+
+
+@dataclass(frozen=True)
+class CodeQueryRow:
+    """A result of a CodeQuery database search."""
+
+    name: str
+    """Name the search was done for."""
+
+    value: str
+    """Name of the symbol found."""
+
+    file: str
+    line: int
+    body: str
+
+
+_SELECT = """
+SELECT DISTINCT {key}, s.symName, f.filePath, l.linenum, l.linetext
+FROM {source}
+JOIN linestbl AS l ON l.lineID = s.lineID
+JOIN filestbl AS f ON f.fileID = l.fileID
+"""
+
+# (key column, tables, extra condition) of each search option, the key column
+# is the name the search was done for.
+_QUERIES: dict[SearchOption, tuple[str, str, str]] = {
+    SearchOption.SYMBOL: ("s.symName", "symtbl AS s", ""),
+    SearchOption.FUNCTION_OR_MACRO: (
+        "s.symName",
+        "symtbl AS s",
+        f"s.symType IN {FUNCTION_DEFINITION_TYPES!r}",
+    ),
+    SearchOption.CLASS_OR_STRUCT: (
+        "s.symName",
+        "symtbl AS s",
+        f"s.symType IN {CLASS_OR_STRUCT_TYPES!r}",
+    ),
+    # Definitions of the functions calling the function
+    SearchOption.CALLING_FUNCTIONS: (
+        "k.symName",
+        (
+            "symtbl AS k JOIN calltbl AS c ON c.calledID = k.symID "
+            "JOIN symtbl AS s ON s.symID = c.callerID"
+        ),
+        "",
+    ),
+    # Calls made by the function, at the line of the call
+    SearchOption.CALLED_FUNCTIONS: (
+        "k.symName",
+        (
+            "symtbl AS k JOIN calltbl AS c ON c.callerID = k.symID "
+            "JOIN symtbl AS s ON s.symID = c.calledID"
+        ),
+        "",
+    ),
+    SearchOption.CALLS_OF_FUNCTION: (
+        "s.symName",
+        "symtbl AS s",
+        f"s.symType = '{FUNCTION_CALL_TYPE}'",
+    ),
+}
+
+
+# Function definitions and calls, to build the call graph
+_FUNCTION_DEFINITIONS = """
+SELECT s.symID, s.symName, f.filePath, l.linenum
+FROM symtbl AS s
+JOIN linestbl AS l ON l.lineID = s.lineID
+JOIN filestbl AS f ON f.fileID = l.fileID
+WHERE s.symType = '$'
+ORDER BY f.filePath, l.linenum
+"""
+
+_FUNCTION_CALLS = """
+SELECT DISTINCT c.callerID, k.symName
+FROM calltbl AS c
+JOIN symtbl AS k ON k.symID = c.calledID
+"""
+
+
+def _build_query(option: SearchOption, by_name: bool, by_file: bool) -> str:
+    key, source, condition = _QUERIES[option]
+    conditions = [condition] if condition else []
+    if by_name:
+        conditions.append(f"{key} IN (SELECT value FROM json_each(?))")
+    if by_file:
+        conditions.append("instr(f.filePath, ?) > 0")
+
+    query = _SELECT.format(key=key, source=source)
+    if conditions:
+        query += "WHERE " + " AND ".join(conditions) + "\n"
+    return query + "ORDER BY f.filePath, l.linenum"
+
+
+def db_identity(db_path: Path) -> tuple[str, int, int]:
+    """Identify a database file by its resolved path, inode and modification time."""
+    path = db_path.resolve()
+    st = path.stat()
+    return str(path), st.st_ino, st.st_mtime_ns
+
+
+class IdentityCache(Generic[V]):
+    """Values built once per file (see `db_identity`) and process, shared by all
+    threads.
+
+    Values are keyed on the identity of the file and an extra key, so that a
+    file created again at the same path gets a new value, and the least recently
+    used ones are dropped once there are more than `max_size`.
+    """
+
+    def __init__(
+        self, max_size: int, on_drop: Callable[[V], None] | None = None
+    ) -> None:
+        self.max_size = max_size
+        self.on_drop = on_drop
+        self._values: OrderedDict[tuple[tuple[str, int, int], Hashable], V] = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def values(self) -> list[V]:
+        with self._lock:
+            return list(self._values.values())
+
+    def _drop(self, value: V) -> None:
+        if self.on_drop is not None:
+            self.on_drop(value)
+
+    def get(self, path: Path, build: Callable[[], V], extra: Hashable = None) -> V:
+        """Get the value of a file, built with `build` if it is not cached."""
+        identity = db_identity(path)
+        key = (identity, extra)
+        with self._lock:
+            if key in self._values:
+                value = self._values[key]
+            else:
+                value = build()
+                self._values[key] = value
+                # The older versions of the file are not used anymore
+                for stale in [
+                    k
+                    for k in self._values
+                    if k[0][0] == identity[0] and k[0] != identity
+                ]:
+                    self._drop(self._values.pop(stale))
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_size:
+                self._drop(self._values.popitem(last=False)[1])
+            return value
+
+    def clear(self) -> None:
+        with self._lock:
+            for value in self._values.values():
+                self._drop(value)
+            self._values.clear()
+
+
+def _close(connection: tuple[int, sqlite3.Connection]) -> None:
+    pid, conn = connection
+    # Connections inherited from the parent process are left alone
+    if pid == os.getpid():
+        conn.close()
+
+
+# Maximum number of databases with an open connection in a process
+MAX_CONNECTIONS = 16
+
+# One read-only connection per database and process. sqlite3 caches the
+# prepared statements of each connection.
+_connections: IdentityCache[tuple[int, sqlite3.Connection]] = IdentityCache(
+    MAX_CONNECTIONS, on_drop=_close
+)
+
+
+def _connect(db_path: Path) -> tuple[int, sqlite3.Connection]:
+    conn = sqlite3.connect(
+        f"{db_path.resolve().as_uri()}?mode=ro",
+        uri=True,
+        check_same_thread=False,
+    )
+    return os.getpid(), conn
+
+
+def _get_connection(db_path: Path) -> sqlite3.Connection:
+    # Connections cannot be used across a fork
+    pid = os.getpid()
+    return _connections.get(db_path, lambda: _connect(db_path), pid)[1]
+
+
+def close_connections() -> None:
+    """Close the connections opened by this process."""
+    _connections.clear()
+
+
+@dataclass
+class CodeQueryDB:
+    """Read-only query engine of a CodeQuery database."""
+
+    db_path: Path
+
+    def _execute(self, query: str, params: tuple[str, ...]) -> list[CodeQueryRow]:
+        try:
+            rows = _get_connection(self.db_path).execute(query, params).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            raise RuntimeError(f"Failed to query {self.db_path}: {e}")
+        return [CodeQueryRow(*row) for row in rows]
+
+    def search_many(
+        self,
+        option: SearchOption,
+        names: Iterable[str],
+        file_filter: str | None = None,
+    ) -> dict[str, list[CodeQueryRow]]:
+        """Search for the exact `names` with a single query.
+
+        If `file_filter` is set, only results in files whose path contains it
+        are returned. Results are sorted by file and line.
+        """
+        names = list(dict.fromkeys(names))
+        results: dict[str, list[CodeQueryRow]] = {name: [] for name in names}
+        if not names:
+            return results
+
+        # The names are passed as a JSON array, so that the statement is the same
+        # whatever the number of names
+        params: tuple[str, ...] = (json.dumps(names),)
+        if file_filter:
+            params += (file_filter,)
+        query = _build_query(option, by_name=True, by_file=bool(file_filter))
+        for row in self._execute(query, params):
+            results[row.name].append(row)
+        return results
+
+    def search(
+        self,
+        option: SearchOption,
+        name: str,
+        file_filter: str | None = None,
+    ) -> list[CodeQueryRow]:
+        """Search for the exact `name`, see `search_many`."""
+        return self.search_many(option, [name], file_filter)[name]
+
+    def search_names(self, option: SearchOption) -> list[str]:
+        """The distinct names of the symbols found by a search option."""
+        _, source, condition = _QUERIES[option]
+        query = f"SELECT DISTINCT s.symName FROM {source}"
+        if condition:
+            query += f" WHERE {condition}"
+        return [name for (name,) in self._fetchall(query)]
+
+    def search_all(self, option: SearchOption) -> list[CodeQueryRow]:
+        """All the results of a search option, regardless of their name."""
+        return self._execute(_build_query(option, by_name=False, by_file=False), ())
+
+    def _fetchall(self, query: str) -> list[tuple]:
+        try:
+            return _get_connection(self.db_path).execute(query).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            raise RuntimeError(f"Failed to query {self.db_path}: {e}")
+
+    def function_definitions(self) -> list[tuple[int, str, str, int]]:
+        """(symID, name, file, line) of every function definition."""
+        return self._fetchall(_FUNCTION_DEFINITIONS)
+
+    def function_calls(self) -> list[tuple[int, str]]:
+        """(symID of the calling function definition, called name) of every
+        call."""
+        return self._fetchall(_FUNCTION_CALLS)
@@ -1,18 +1,37 @@
 import urllib.parse
 import logging
+import mmap
+import sqlite3
+import tempfile
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Generator, Dict, Set
+from itertools import groupby
+from pathlib import Path
+from typing import Callable, Generator, Dict, Iterable, Iterator, Set, TypeVar
 from buttercup.program_model.data.kythe.proto.storage_pb2 import Entry, VName
-from buttercup.program_model.utils.varint import decode_stream
-from multiprocessing import Pool
+from buttercup.program_model.utils.varint import decode_buffer, decode_stream
+import multiprocessing
+from multiprocessing.pool import AsyncResult
 from abc import ABC, abstractmethod
-from typing import Any, List, TextIO
+from typing import Any, TextIO
 from io import BytesIO
 
 logger = logging.getLogger(__name__)
 
 ENTRY_CHUNK_SIZE = 50
+# Bytes of entries parsed by a worker at once, when reading an entries file
+ENTRY_RANGE_SIZE = 1 << 20
+# Chunks of entries being parsed or waiting to be stored, at most
+MAX_PENDING_CHUNKS = 64
+# Characters of the edges scratch file copied to the GraphML file at once
+EDGES_COPY_SIZE = 1 << 20
+# The workers are spawned, forking while other threads of the indexer are
+# running (and possibly holding locks) could deadlock them
+POOL_CONTEXT = multiprocessing.get_context("spawn")
+
+T = TypeVar("T")
+R = TypeVar("R")
 
 
 def encode_value(value: bytes) -> str:
@@ -155,25 +174,29 @@ class GraphWriter:
             },
         )
 
+    def _add_node(self, nodes: dict[str, Node], nd: VName) -> Node:
+        """Add a node to the nodes of a chunk, if not there already."""
+        uri = str(KytheURI.from_vname(nd))
+        node = nodes.get(uri)
+        if node is None:
+            node = self.convert_node(nd)
+            node.properties["task_id"] = encode_value(self.task_id.encode("utf-8"))
+            nodes[uri] = node
+        return node
+
     def entry_to_graphml(
         self,
         entry: Entry,
         node_props: list[str],
         edge_props: list[str],
         edges: list[Edge],
-        nodes: list[Node],
+        nodes: dict[str, Node],
     ) -> None:
-        source_node = self.convert_node(entry.source)
-        nodes.append(source_node)
-        source_node.properties["task_id"] = encode_value(self.task_id.encode("utf-8"))
+        source_node = self._add_node(nodes, entry.source)
         key = entry.fact_name
         value = encode_value(entry.fact_value)
         if self.is_edge(entry):
-            target_node = self.convert_node(entry.target)
-            nodes.append(target_node)
-            target_node.properties["task_id"] = encode_value(
-                self.task_id.encode("utf-8")
-            )
+            target_node = self._add_node(nodes, entry.target)
             edge_id = str(uuid.uuid4())
             edge = Edge(
                 id=edge_id,
@@ -186,13 +209,28 @@ class GraphWriter:
         else:
             source_node.properties[key] = value
             node_props.append(key)
-            nodes.append(source_node)
+
+    def write_range(self, entries_range: tuple[Path, int, int]) -> WriteResult:
+        """Parse the entries stored between two offsets of an entries file."""
+        path, start, end = entries_range
+        with open(path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+
+        entries: list[bytes] = []
+        offset = 0
+        with memoryview(data) as view:
+            while offset < len(view):
+                size, offset = decode_buffer(view, offset)
+                entries.append(bytes(view[offset : offset + size]))
+                offset += size
+        return self.write_entry(entries)
 
     def write_entry(self, entries: list[bytes]) -> WriteResult:
         node_props: list[str] = list()
         edge_props: list[str] = list()
         edges: list[Edge] = list()
-        nodes: list[Node] = list()
+        nodes: dict[str, Node] = dict()
 
         for bts in entries:
             try:
@@ -205,55 +243,160 @@ class GraphWriter:
             self.entry_to_graphml(ent, node_props, edge_props, edges, nodes)
 
         return WriteResult(
-            nodes=nodes,
+            nodes=list(nodes.values()),
             edges=edges,
             node_props=node_props,
             edge_props=edge_props,
         )
 
 
+def bounded_imap(
+    pool: Any, func: Callable[[T], R], iterable: Iterable[T], max_pending: int
+) -> Generator[R, None, None]:
+    """Like `Pool.imap`, but with at most `max_pending` items being processed
+    or waiting to be consumed, so that the results don't pile up in memory."""
+    pending: deque[AsyncResult] = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+class NodeStore:
+    """Properties of the nodes of the graph, merged in an on-disk table.
+
+    Kythe emits the facts of a node in many entries, all over the stream. The
+    primary key of the table dedups the nodes, so that memory does not grow with
+    the size of the project.
+    """
+
+    def __init__(self, db_path: Path):
+        self.conn = sqlite3.connect(db_path)
+        # The store is a scratch file, it does not need to survive a crash
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS props "
+            "(node TEXT, key TEXT, value TEXT, PRIMARY KEY (node, key)) "
+            "WITHOUT ROWID"
+        )
+
+    def add(self, nodes: list[Node]) -> None:
+        """Add nodes, the last value of a property wins."""
+        self.conn.executemany(
+            "INSERT INTO props VALUES (?, ?, ?) "
+            "ON CONFLICT (node, key) DO UPDATE SET value = excluded.value",
+            (
+                (node.id, key, value)
+                for node in nodes
+                for key, value in node.properties.items()
+            ),
+        )
+
+    def __iter__(self) -> Iterator[Node]:
+        rows = self.conn.execute("SELECT node, key, value FROM props ORDER BY node")
+        for node_id, props in groupby(rows, key=lambda row: row[0]):
+            yield Node(id=node_id, properties={key: value for _, key, value in props})
+
+    def close(self) -> None:
+        self.conn.close()
+
+
 @dataclass(repr=False)
 class GraphStorage:
     """Class to interact between Kythe and an output file."""
 
-    def __init__(self, task_id: str):
+    def __init__(self, task_id: str, work_dir: Path | None = None):
         self.task_id: str = task_id
+        self.work_dir: Path | None = work_dir
+        """Directory of the scratch files used while converting the entries."""
         self.node_properties: Set[str] = set(
             ["corpus", "language", "path", "root", "signature", "task_id"]
         )
         self.edge_properties: Set[str] = set(["labelE", "task_id"])
 
+    def process_file(self, path: Path, outfile: TextIO) -> None:
+        """Process a file of Kythe entries and output them to a GraphML file.
+
+        The file is memory-mapped to split it in ranges of entries, which are
+        parsed by the workers, so it is never read in memory at once."""
+        fw = GraphWriter(self.task_id)
+        if path.stat().st_size == 0:
+            self.write_results(iter([]), outfile)
+            return
+
+        with (
+            open(path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+            POOL_CONTEXT.Pool() as p,
+        ):
+            ranges = (
+                (path, start, end)
+                for start, end in self.entry_ranges(mm, ENTRY_RANGE_SIZE)
+            )
+            self.write_results(
+                bounded_imap(p, fw.write_range, ranges, MAX_PENDING_CHUNKS),
+                outfile,
+            )
+
     def process_stream(self, fl: BytesIO, outfile: TextIO) -> None:
         """Process a stream of Kythe entries and output them to a GraphML file."""
-
-        try:
-            fw = GraphWriter(self.task_id)
-            with Pool() as p:
-                nodes: dict[str, Node] = dict()
-                edges: list[Edge] = list()
-
-                for res in p.imap_unordered(
+        fw = GraphWriter(self.task_id)
+        with POOL_CONTEXT.Pool() as p:
+            self.write_results(
+                bounded_imap(
+                    p,
                     fw.write_entry,
                     chunk_data(self.iterate_over_entries(fl), ENTRY_CHUNK_SIZE),
-                    chunksize=3,
-                ):
-                    for node_props in res.node_props:
-                        self.node_properties.add(node_props)
-                    for edge_props in res.edge_props:
-                        self.edge_properties.add(edge_props)
-                    for node in res.nodes:
-                        if node.id in nodes:
-                            nodes[node.id].properties.update(node.properties)
-                        else:
-                            nodes[node.id] = node
-                    for edge in res.edges:
-                        edges.append(edge)
-            self.to_graphml(outfile, nodes, edges)
+                    MAX_PENDING_CHUNKS,
+                ),
+                outfile,
+            )
+
+    def write_results(self, results: Iterator[WriteResult], outfile: TextIO) -> None:
+        """Write the nodes and the edges parsed by the workers to a GraphML file.
 
+        Edges are written to a scratch file as they come, and nodes are merged in
+        a `NodeStore`, only the property names are kept in memory.
+        """
+        try:
+            with tempfile.TemporaryDirectory(dir=self.work_dir) as td:
+                nodes = NodeStore(Path(td) / "nodes.db")
+                try:
+                    with open(Path(td) / "edges.xml", "w+", encoding="utf-8") as edges:
+                        for res in results:
+                            self.node_properties.update(res.node_props)
+                            self.edge_properties.update(res.edge_props)
+                            nodes.add(res.nodes)
+                            # Both ends of an edge are nodes of the same chunk
+                            for edge in res.edges:
+                                edges.write(edge.to_graphml())
+
+                        edges.seek(0)
+                        self.to_graphml(outfile, nodes, edges)
+                finally:
+                    nodes.close()
         except Exception as e:
             logger.error("Exception occurred: %s", e)
             raise e
 
+    def entry_ranges(
+        self, buf: mmap.mmap, max_size: int
+    ) -> Generator[tuple[int, int], None, None]:
+        """Split a buffer of delimited entries in ranges of whole entries, of
+        about `max_size` bytes."""
+        start = offset = 0
+        while offset < len(buf):
+            size, offset = decode_buffer(buf, offset)
+            offset = min(offset + size, len(buf))
+            if offset - start >= max_size:
+                yield start, offset
+                start = offset
+        if offset > start:
+            yield start, offset
+
     def iterate_over_entries(self, fl: BytesIO) -> Generator[bytes, None, None]:
         """Iterate over entries in the stream."""
 
@@ -295,9 +438,7 @@ class GraphStorage:
                 break
             yield self.parse_entry(bts)
 
-    def to_graphml(
-        self, outfile: TextIO, nodes: Dict[str, Node], edges: List[Edge]
-    ) -> None:
+    def to_graphml(self, outfile: TextIO, nodes: Iterable[Node], edges: TextIO) -> None:
         """Convert graph to a GraphML file.
         From: https://tinkerpop.apache.org/docs/3.7.3/dev/io/
         """
@@ -320,15 +461,13 @@ class GraphStorage:
             )
 
         # Output node contents
-        id_set = set()
-        for id_name, node in nodes.items():
-            id_set.add(id_name)
+        for node in nodes:
             outfile.write(node.to_graphml())
 
-        # Output edge contents
-        for edge in edges:
-            if edge.source_id in id_set and edge.target_id in id_set:
-                outfile.write(edge.to_graphml())
+        # Output edge contents, copied in chunks of text as the GraphML file is
+        # a text stream
+        while chunk := edges.read(EDGES_COPY_SIZE):
+            outfile.write(chunk)
 
         outfile.write("</graph>")
         outfile.write("</graphml>")
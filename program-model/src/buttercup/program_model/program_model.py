@@ -2,6 +2,7 @@ import logging
 import os
 import stat
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 from dataclasses import dataclass, field
 from buttercup.common.queues import (
@@ -13,7 +14,7 @@ from buttercup.common.queues import (
 from buttercup.program_model.indexer import Indexer, IndexConf
 from buttercup.program_model.kythe import KytheTool, KytheConf
 from buttercup.program_model.graph import GraphStorage
-from buttercup.program_model.codequery import CodeQueryPersistent
+from buttercup.program_model.codequery import CodeQueryPersistent, source_fingerprint
 from buttercup.common.datastructures.msg_pb2 import IndexRequest, IndexOutput
 from buttercup.common.challenge_task import ChallengeTask
 from buttercup.common.task_registry import TaskRegistry
@@ -25,7 +26,6 @@ from redis import Redis
 import subprocess
 import tempfile
 import buttercup.common.node_local as node_local
-from io import BytesIO
 from buttercup.common.telemetry import set_crs_attributes, CRSActionCategory
 
 logger = logging.getLogger(__name__)
@@ -100,10 +100,9 @@ class ProgramModel:
     ) -> Path:
         """Store the program into a graphml file. Returns path to the graphml file."""
         graphml_file = Path(td) / f"kythe_output_graphml_{output_id}.xml"
-        with open(graphml_file, "w") as fw, open(bin_file, "rb") as fr:
-            gs = GraphStorage(task_id=task_id)
-            buf = BytesIO(fr.read())
-            gs.process_stream(buf, fw)
+        with open(graphml_file, "w") as fw:
+            gs = GraphStorage(task_id=task_id, work_dir=Path(td))
+            gs.process_file(bin_file, fw)
         return graphml_file
 
     def load_graphml(self, graphml_file: Path) -> None:
@@ -193,10 +192,9 @@ class ProgramModel:
                 # Store the program into a graphml file
                 try:
                     graphml_file = Path(td) / f"kythe_output_graphml_{output_id}.xml"
-                    with open(graphml_file, "w") as fw, open(bin_file, "rb") as fr:
-                        gs = GraphStorage(task_id=args.task_id)
-                        buf = BytesIO(fr.read())
-                        gs.process_stream(buf, fw)
+                    with open(graphml_file, "w") as fw:
+                        gs = GraphStorage(task_id=args.task_id, work_dir=Path(td))
+                        gs.process_file(bin_file, fw)
                         logger.debug(
                             f"Successfully stored program {args.task_id} in graphml file: {graphml_file}"
                         )
@@ -222,6 +220,32 @@ class ProgramModel:
 
         return True
 
+    def _cqdb_base_path(self, fingerprint: str) -> Path:
+        if self.wdir is None:
+            raise ValueError("Work directory is not initialized")
+        return self.wdir / "cqdb_bases" / fingerprint
+
+    def find_cqdb_base(self, fingerprint: str) -> Path | None:
+        """Find a cqdb built from the sources with the given fingerprint."""
+        try:
+            base = Path(self._cqdb_base_path(fingerprint).read_text())
+        except FileNotFoundError:
+            return None
+        # The task directory might have been cleaned up since
+        if not base.is_dir():
+            return None
+        return base
+
+    def register_cqdb_base(self, fingerprint: str, cqdb_dir: Path) -> None:
+        """Register a cqdb to be reused by the tasks with the same sources."""
+        path = self._cqdb_base_path(fingerprint)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            "w", dir=path.parent, prefix=f".{fingerprint}.", delete=False
+        ) as f:
+            f.write(str(cqdb_dir))
+        os.replace(f.name, path)
+
     def process_task_codequery(self, args: IndexRequest) -> bool:
         """Process a single task for indexing a program"""
         try:
@@ -232,15 +256,23 @@ class ProgramModel:
                 read_only_task_dir=args.task_dir,
                 python_path=self.python,
             )
+            if self.wdir is None:
+                raise ValueError("Work directory is not initialized")
+
+            # A db of the sources of the task before its diffs is reused, only
+            # the diffs need to be applied to it
+            fingerprint = source_fingerprint(challenge)
+            base = self.find_cqdb_base(fingerprint)
+            if base is not None:
+                logger.info(f"Reusing cqdb {base} for task {args.task_id}")
+
             with challenge.get_rw_copy(work_dir=self.wdir) as local_challenge:
                 # Apply the diff if it exists
                 logger.debug(f"Applying diff for {args.task_id}")
-                if not local_challenge.apply_patch_diff():
+                has_diffs = local_challenge.apply_patch_diff()
+                if not has_diffs:
                     logger.debug(f"No diffs for {args.task_id}")
 
-                if self.wdir is None:
-                    raise ValueError("Work directory is not initialized")
-
                 # log telemetry
                 tracer = trace.get_tracer(__name__)
                 with tracer.start_as_current_span("index_task_with_codequery") as span:
@@ -250,11 +282,16 @@ class ProgramModel:
                         crs_action_name="index_task_with_codequery",
                         task_metadata=dict(challenge.task_meta.metadata),
                     )
-                    cqp = CodeQueryPersistent(local_challenge, work_dir=self.wdir)
+                    cqp = CodeQueryPersistent(
+                        local_challenge, work_dir=self.wdir, base_task_dir=base
+                    )
                     logger.info(
                         f"Successfully processed task {args.package_name}/{args.task_id}/{args.task_dir} with codequery"
                     )
                     span.set_status(Status(StatusCode.OK))
+                # Only a db of the unpatched sources can be a base for other tasks
+                if not has_diffs:
+                    self.register_cqdb_base(fingerprint, cqp.challenge.task_dir)
                 # Push it to the remote storage
                 node_local.dir_to_remote_archive(cqp.challenge.task_dir)
             return True
@@ -268,11 +305,14 @@ class ProgramModel:
         logger.info(
             f"Processing task {args.package_name}/{args.task_id}/{args.task_dir}"
         )
-        rv_code_query: bool = self.process_task_codequery(args)
-        rv_kythe: bool = False
-        if self.graphdb_enabled:
-            rv_kythe = self.process_task_kythe(args)
-        return rv_code_query or rv_kythe
+        if not self.graphdb_enabled:
+            return self.process_task_codequery(args)
+
+        # The indexers work on their own copy of the task, run them concurrently
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            rv_code_query = executor.submit(self.process_task_codequery, args)
+            rv_kythe = executor.submit(self.process_task_kythe, args)
+            return rv_code_query.result() or rv_kythe.result()
 
     def serve_item(self) -> bool:
         if self.task_queue is None:
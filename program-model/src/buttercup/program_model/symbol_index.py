@@ -0,0 +1,80 @@
+"""Fuzzy name index of the symbols of a CodeQuery database"""
+
+from __future__ import annotations
+
+import bisect
+from dataclasses import dataclass, field
+
+from rapidfuzz import fuzz, process
+
+from buttercup.program_model.codequery_db import (
+    CodeQueryDB,
+    IdentityCache,
+    SearchOption,
+)
+
+
+@dataclass
+class SymbolIndex:
+    """Distinct symbol names, sorted by length, for fuzzy lookups.
+
+    `fuzz.ratio` is the normalized Indel similarity, at most
+    `200 * min(len(a), len(b)) / (len(a) + len(b))`. Names whose length is too
+    different from the query to reach the threshold are skipped without being
+    scored, all the others are scored in a single `process.extract` call.
+    """
+
+    names: list[str]
+    lengths: list[int] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.names = sorted({name for name in self.names if name}, key=len)
+        self.lengths = [len(name) for name in self.names]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _candidates(self, query: str, threshold: float) -> list[str]:
+        """Names that can have a ratio greater than `threshold` with `query`."""
+        if threshold <= 0:
+            return self.names
+        if threshold >= 100:
+            return []
+
+        # ratio > t  <=>  len(name) in (len(query) * t / (200 - t), len(query) * (200 - t) / t)
+        min_length = len(query) * threshold / (200 - threshold)
+        max_length = len(query) * (200 - threshold) / threshold
+        start = bisect.bisect_right(self.lengths, min_length)
+        end = bisect.bisect_left(self.lengths, max_length)
+        return self.names[start:end]
+
+    def extract(self, query: str, threshold: float) -> list[tuple[str, float]]:
+        """Names with a `fuzz.ratio` greater than `threshold` with `query`,
+        sorted in descending order of similarity."""
+        candidates = self._candidates(query, threshold)
+        if not candidates:
+            return []
+
+        matches = process.extract(
+            query,
+            candidates,
+            scorer=fuzz.ratio,
+            score_cutoff=max(threshold, 0),
+            limit=None,
+        )
+        # score_cutoff is inclusive
+        return [(name, score) for name, score, _ in matches if score > threshold]
+
+
+# Maximum number of indexes kept in a process
+MAX_INDEXES = 32
+
+# Indexes are built once per database and search option
+_indexes: IdentityCache[SymbolIndex] = IdentityCache(MAX_INDEXES)
+
+
+def get_symbol_index(db: CodeQueryDB, option: SearchOption) -> SymbolIndex:
+    """Get the index of the names of the symbols found by a search option."""
+    return _indexes.get(
+        db.db_path, lambda: SymbolIndex(db.search_names(option)), option
+    )
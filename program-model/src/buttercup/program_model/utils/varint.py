@@ -3,10 +3,14 @@ varint from https://github.com/fmoo/python-varint/blob/master/varint.py
 """
 
 from io import BytesIO
+from mmap import mmap
+from typing import Union
 
 
 import sys
 
+Buffer = Union[bytes, bytearray, memoryview, mmap]
+
 if sys.version > "3":
 
     def _byte(b: int) -> bytes:
@@ -45,6 +49,27 @@ def decode_stream(stream: BytesIO) -> int:
     return result
 
 
+def decode_buffer(buf: Buffer, offset: int = 0) -> tuple[int, int]:
+    """Read a varint from `buf` at `offset`, without copying it
+
+    Returns the varint and the offset of the byte following it, raises EOFError
+    if the buffer ends while reading bytes.
+    """
+    shift = 0
+    result = 0
+    while True:
+        if offset >= len(buf):
+            raise EOFError("Unexpected EOF while reading bytes")
+        i = buf[offset]
+        offset += 1
+        result |= (i & 0x7F) << shift
+        shift += 7
+        if not (i & 0x80):
+            break
+
+    return result, offset
+
+
 def decode_bytes(buf: bytes) -> int:
     """Read a varint from from `buf` bytes"""
     return decode_stream(BytesIO(buf))
@@ -0,0 +1,121 @@
+"""Call graph testing"""
+
+import random
+from pathlib import Path
+
+import pytest
+
+from buttercup.program_model.call_graph import CallGraph, _csr, _uint32_array
+from buttercup.program_model.codequery_db import CodeQueryDB
+
+from .test_codequery_db import codequery_db  # noqa: F401
+
+
+def _rebase_path(path: Path) -> Path:
+    return Path("/", *path.parts[path.parts.index("container_src_dir") + 1 :])
+
+
+def _names(graph: CallGraph, ids) -> list[str]:
+    return sorted(graph.names[i] for i in ids)
+
+
+def _single_id(graph: CallGraph, name: str) -> int:
+    [function_id] = graph.ids(name)
+    return function_id
+
+
+def test_from_db(codequery_db: CodeQueryDB):  # noqa: F811
+    graph = CallGraph.from_db(codequery_db, _rebase_path)
+    assert sorted(graph.names) == ["compute", "helper", "main"]
+    assert graph.num_edges == 2
+
+    main = _single_id(graph, "main")
+    helper = _single_id(graph, "helper")
+    compute = _single_id(graph, "compute")
+    assert graph.file(main) == "/src/my-source/main.c"
+    assert graph.file(compute) == "/src/my-source/helper.c"
+    # No spans, the functions are only known by their definition line
+    assert graph.span(compute) == (8, 8)
+
+    assert _names(graph, graph.callees(main)) == ["helper"]
+    assert _names(graph, graph.callees(helper)) == ["compute"]
+    assert _names(graph, graph.callees(compute)) == []
+    assert _names(graph, graph.callers(compute)) == ["helper"]
+    assert _names(graph, graph.callers(main)) == []
+    assert graph.ids("MAX") == []
+
+
+def test_from_db_spans(codequery_db: CodeQueryDB):  # noqa: F811
+    spans = {
+        "helper.c": {"helper": [(1, 5)], "compute": [(2, 3), (7, 12)]},
+        "main.c": {},
+    }
+    graph = CallGraph.from_db(codequery_db, _rebase_path, lambda path: spans[path.name])
+    assert graph.span(_single_id(graph, "helper")) == (1, 5)
+    assert graph.span(_single_id(graph, "compute")) == (7, 12)
+    assert graph.span(_single_id(graph, "main")) == (1, 1)
+
+
+def test_reachable(codequery_db: CodeQueryDB):  # noqa: F811
+    graph = CallGraph.from_db(codequery_db, _rebase_path)
+    main = _single_id(graph, "main")
+    compute = _single_id(graph, "compute")
+
+    depths = graph.reachable([main])
+    assert {graph.names[i]: d for i, d in depths.items()} == {
+        "main": 0,
+        "helper": 1,
+        "compute": 2,
+    }
+    assert _names(graph, graph.reachable([main], max_depth=1)) == ["helper", "main"]
+    assert _names(graph, graph.reachable([compute], reverse=True)) == [
+        "compute",
+        "helper",
+        "main",
+    ]
+    assert graph.reachable([]) == {}
+
+
+def _random_graph(rng: random.Random, n: int, m: int) -> CallGraph:
+    edges = {(rng.randrange(n), rng.randrange(n)) for _ in range(m)}
+    callee_offsets, callee_ids = _csr(list(edges), n)
+    caller_offsets, caller_ids = _csr([(b, a) for a, b in edges], n)
+    return CallGraph(
+        [f"f{i % (n // 2)}" for i in range(n)],
+        ["/src/a.c", "/src/b.c"],
+        _uint32_array(i % 2 for i in range(n)),
+        _uint32_array(range(1, n + 1)),
+        _uint32_array(range(2, n + 2)),
+        callee_offsets,
+        callee_ids,
+        caller_offsets,
+        caller_ids,
+    )
+
+
+def test_csr_matches_edges():
+    rng = random.Random(0)
+    n = 200
+    edges = {(rng.randrange(n), rng.randrange(n)) for _ in range(1000)}
+    offsets, targets = _csr(list(edges), n)
+    for i in range(n):
+        assert list(targets[offsets[i] : offsets[i + 1]]) == sorted(
+            b for a, b in edges if a == i
+        )
+
+
+def test_save_load(tmp_path: Path):
+    graph = _random_graph(random.Random(1), 100, 400)
+    path = tmp_path / "graph" / "call_graph.bin"
+    graph.save(path)
+    loaded = CallGraph.load(path)
+    assert loaded == graph
+    assert loaded.ids("f3") == graph.ids("f3") == [3, 53]
+    assert list(tmp_path.joinpath("graph").iterdir()) == [path]
+
+    path.write_bytes(path.read_bytes()[:-4])
+    with pytest.raises(ValueError):
+        CallGraph.load(path)
+    path.write_bytes(b"not a call graph")
+    with pytest.raises(ValueError):
+        CallGraph.load(path)
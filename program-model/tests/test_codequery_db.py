@@ -0,0 +1,192 @@
+"""CodeQuery database engine testing"""
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from buttercup.program_model import codequery_db as codequery_db_module
+from buttercup.program_model.codequery_db import (
+    CodeQueryDB,
+    CodeQueryRow,
+    SearchOption,
+    close_connections,
+)
+
+SRC = "/tmp/task/container_src_dir/src/my-source"
+
+# (symID, symName, symType, linenum, file)
+SYMBOLS = [
+    (1, "main", "$", 1, "main.c"),
+    (2, "helper", "`", 3, "main.c"),
+    (3, "helper", "$", 1, "helper.c"),
+    (4, "MAX", "#", 1, "helper.h"),
+    (5, "compute", "`", 4, "helper.c"),
+    (6, "compute", "$", 8, "helper.c"),
+    (7, "my_struct", "s", 3, "helper.h"),
+    (8, "helper", "`", 5, "main.c"),
+]
+# (callerID, calledID)
+CALLS = [(1, 2), (1, 8), (3, 5)]
+
+
+@pytest.fixture
+def codequery_db(tmp_path: Path) -> CodeQueryDB:
+    db_path = tmp_path / "codequery.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript(
+        """
+        CREATE TABLE filestbl (fileID INTEGER PRIMARY KEY, filePath TEXT);
+        CREATE TABLE linestbl (
+            lineID INTEGER PRIMARY KEY, linenum INTEGER, fileID INTEGER, linetext TEXT
+        );
+        CREATE TABLE symtbl (
+            symID INTEGER PRIMARY KEY, symName TEXT, symType TEXT,
+            lineID INTEGER, fileID INTEGER
+        );
+        CREATE TABLE calltbl (callerID INTEGER, calledID INTEGER);
+        """
+    )
+    files = sorted({file for *_, file in SYMBOLS})
+    for file_id, file in enumerate(files):
+        conn.execute("INSERT INTO filestbl VALUES (?, ?)", (file_id, f"{SRC}/{file}"))
+    for sym_id, name, sym_type, line, file in SYMBOLS:
+        file_id = files.index(file)
+        conn.execute(
+            "INSERT INTO linestbl VALUES (?, ?, ?, ?)",
+            (sym_id, line, file_id, f"line {line} of {file}"),
+        )
+        conn.execute(
+            "INSERT INTO symtbl VALUES (?, ?, ?, ?, ?)",
+            (sym_id, name, sym_type, sym_id, file_id),
+        )
+    conn.executemany("INSERT INTO calltbl VALUES (?, ?)", CALLS)
+    conn.commit()
+    conn.close()
+
+    yield CodeQueryDB(db_path)
+    close_connections()
+
+
+def _locations(rows: list[CodeQueryRow]) -> list[tuple[str, str, int]]:
+    return [(row.value, Path(row.file).name, row.line) for row in rows]
+
+
+def test_search_functions(codequery_db: CodeQueryDB):
+    rows = codequery_db.search(SearchOption.FUNCTION_OR_MACRO, "helper")
+    assert rows == [
+        CodeQueryRow("helper", "helper", f"{SRC}/helper.c", 1, "line 1 of helper.c")
+    ]
+    assert _locations(codequery_db.search(SearchOption.FUNCTION_OR_MACRO, "MAX")) == [
+        ("MAX", "helper.h", 1)
+    ]
+    # Exact, case-sensitive matches only
+    assert codequery_db.search(SearchOption.FUNCTION_OR_MACRO, "help") == []
+    assert codequery_db.search(SearchOption.FUNCTION_OR_MACRO, "HELPER") == []
+
+
+def test_search_symbols_with_file_filter(codequery_db: CodeQueryDB):
+    assert _locations(codequery_db.search(SearchOption.SYMBOL, "helper")) == [
+        ("helper", "helper.c", 1),
+        ("helper", "main.c", 3),
+        ("helper", "main.c", 5),
+    ]
+    assert _locations(
+        codequery_db.search(SearchOption.SYMBOL, "helper", "my-source/main.c")
+    ) == [("helper", "main.c", 3), ("helper", "main.c", 5)]
+
+
+def test_search_calls(codequery_db: CodeQueryDB):
+    # Definitions of the callers, once per caller
+    assert _locations(
+        codequery_db.search(SearchOption.CALLING_FUNCTIONS, "helper")
+    ) == [("main", "main.c", 1)]
+    # Calls made by the function, at the line of the call
+    assert _locations(codequery_db.search(SearchOption.CALLED_FUNCTIONS, "main")) == [
+        ("helper", "main.c", 3),
+        ("helper", "main.c", 5),
+    ]
+    assert _locations(
+        codequery_db.search(SearchOption.CALLS_OF_FUNCTION, "compute")
+    ) == [("compute", "helper.c", 4)]
+    assert _locations(
+        codequery_db.search(SearchOption.CLASS_OR_STRUCT, "my_struct")
+    ) == [("my_struct", "helper.h", 3)]
+
+
+def test_search_many(codequery_db: CodeQueryDB):
+    results = codequery_db.search_many(
+        SearchOption.CALLED_FUNCTIONS, ["main", "helper", "missing", "main"]
+    )
+    assert list(results) == ["main", "helper", "missing"]
+    assert results["main"] == codequery_db.search(SearchOption.CALLED_FUNCTIONS, "main")
+    assert _locations(results["helper"]) == [("compute", "helper.c", 4)]
+    assert results["missing"] == []
+    assert codequery_db.search_many(SearchOption.SYMBOL, []) == {}
+
+
+def test_search_all(codequery_db: CodeQueryDB):
+    assert _locations(codequery_db.search_all(SearchOption.FUNCTION_OR_MACRO)) == [
+        ("helper", "helper.c", 1),
+        ("compute", "helper.c", 8),
+        ("MAX", "helper.h", 1),
+        ("main", "main.c", 1),
+    ]
+
+
+def _count_functions(db: CodeQueryDB) -> int:
+    return len(db.search_all(SearchOption.FUNCTION_OR_MACRO))
+
+
+def test_connection_is_read_only_and_reopened_after_fork(codequery_db: CodeQueryDB):
+    # Open the connection in this process first
+    assert _count_functions(codequery_db) == 4
+
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(1) as pool:
+        assert pool.apply(_count_functions, (codequery_db,)) == 4
+
+    with pytest.raises(RuntimeError):
+        codequery_db._execute("DELETE FROM symtbl", ())
+    assert _count_functions(codequery_db) == 4
+
+
+def test_connection_follows_recreated_database(codequery_db: CodeQueryDB):
+    assert _count_functions(codequery_db) == 4
+    old_conn = codequery_db_module._get_connection(codequery_db.db_path)
+
+    # Create the database again at the same path, without one of the functions
+    new_path = codequery_db.db_path.with_name("new.db")
+    shutil.copy(codequery_db.db_path, new_path)
+    with closing(sqlite3.connect(new_path)) as conn:
+        conn.execute("DELETE FROM symtbl WHERE symName = 'MAX'")
+        conn.commit()
+    os.replace(new_path, codequery_db.db_path)
+
+    assert _count_functions(codequery_db) == 3
+    # The connection to the old database is closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        old_conn.execute("SELECT 1")
+    assert len(codequery_db_module._connections) == 1
+
+
+def test_connections_are_bounded(
+    codequery_db: CodeQueryDB, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(codequery_db_module._connections, "max_size", 2)
+    dbs = [codequery_db]
+    for i in range(2):
+        path = codequery_db.db_path.with_name(f"copy-{i}.db")
+        shutil.copy(codequery_db.db_path, path)
+        dbs.append(CodeQueryDB(path))
+
+    conns = [codequery_db_module._get_connection(db.db_path) for db in dbs]
+    assert len(codequery_db_module._connections) == 2
+    # The least recently used connection is closed
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[0].execute("SELECT 1")
+    assert all(_count_functions(db) == 4 for db in dbs)
@@ -0,0 +1,132 @@
+"""Kythe entries to GraphML conversion testing"""
+
+import mmap
+from io import BytesIO, StringIO
+from pathlib import Path
+from xml.dom import minidom
+
+import pytest
+
+from buttercup.program_model.data.kythe.proto.storage_pb2 import Entry
+from buttercup.program_model.graph import GraphStorage, encode_value
+from buttercup.program_model.utils.varint import encode
+
+
+def _entry(
+    source: str, fact: str = "", value: bytes = b"", edge: str = "", target: str = ""
+) -> bytes:
+    entry = Entry()
+    entry.source.signature = source
+    entry.source.language = "c"
+    entry.fact_name = fact
+    entry.fact_value = value
+    if edge:
+        entry.edge_kind = edge
+        entry.target.signature = target
+        entry.target.language = "c"
+    data = entry.SerializeToString()
+    return encode(len(data)) + data
+
+
+ENTRIES = b"".join(
+    [
+        _entry("main", "/kythe/node/kind", b"function"),
+        _entry("main", edge="/kythe/edge/ref/call", target="helper"),
+        _entry("helper", "/kythe/node/kind", b"function"),
+        _entry("file", "/kythe/text", b"int main() {}"),
+        _entry("main", "/kythe/complete", b"definition"),
+        _entry("main", edge="/kythe/edge/childof", target="file"),
+        _entry("main", "/kythe/node/kind", b"function"),
+    ]
+)
+
+
+def _parse(graphml: str) -> tuple[dict[str, dict[str, str]], list[tuple[str, ...]]]:
+    doc = minidom.parseString(graphml)
+    keys = {key.getAttribute("id") for key in doc.getElementsByTagName("key")}
+    nodes = {}
+    for node in doc.getElementsByTagName("node"):
+        props = {
+            data.getAttribute("key"): data.firstChild.data if data.firstChild else ""
+            for data in node.getElementsByTagName("data")
+        }
+        assert set(props) <= keys
+        assert node.getAttribute("id") not in nodes
+        nodes[node.getAttribute("id")] = props
+    edges = []
+    for edge in doc.getElementsByTagName("edge"):
+        props = {
+            data.getAttribute("key"): data.firstChild.data
+            for data in edge.getElementsByTagName("data")
+        }
+        assert set(props) <= keys
+        edges.append(
+            (edge.getAttribute("source"), edge.getAttribute("target"), props["labelE"])
+        )
+    return nodes, sorted(edges)
+
+
+def _check(graphml: str) -> None:
+    nodes, edges = _parse(graphml)
+    assert len(nodes) == 3
+    by_signature = {
+        bytes.fromhex(props["signature"]).decode(): props for props in nodes.values()
+    }
+    assert set(by_signature) == {"main", "helper", "file"}
+    main = by_signature["main"]
+    assert main["/kythe/node/kind"] == encode_value(b"function")
+    assert main["/kythe/complete"] == encode_value(b"definition")
+    assert main["task_id"] == encode_value(b"task")
+    assert by_signature["file"]["/kythe/text"] == encode_value(b"int main() {}")
+    assert "/kythe/node/kind" not in by_signature["file"]
+
+    ids = {
+        bytes.fromhex(props["signature"]).decode(): node_id
+        for node_id, props in nodes.items()
+    }
+    assert edges == sorted(
+        [
+            (ids["main"], ids["helper"], "/kythe/edge/ref/call"),
+            (ids["main"], ids["file"], "/kythe/edge/childof"),
+        ]
+    )
+
+
+def test_process_stream():
+    out = StringIO()
+    GraphStorage("task").process_stream(BytesIO(ENTRIES), out)
+    _check(out.getvalue())
+
+
+@pytest.mark.parametrize("range_size", [1, 50, 1 << 20])
+def test_process_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, range_size: int):
+    monkeypatch.setattr("buttercup.program_model.graph.ENTRY_RANGE_SIZE", range_size)
+    entries = tmp_path / "entries.bin"
+    entries.write_bytes(ENTRIES)
+    out = StringIO()
+    GraphStorage("task", work_dir=tmp_path).process_file(entries, out)
+    _check(out.getvalue())
+    # The scratch files are removed
+    assert list(tmp_path.iterdir()) == [entries]
+
+
+def test_process_empty_file(tmp_path: Path):
+    entries = tmp_path / "entries.bin"
+    entries.touch()
+    out = StringIO()
+    GraphStorage("task").process_file(entries, out)
+    assert _parse(out.getvalue()) == ({}, [])
+
+
+def test_entry_ranges(tmp_path: Path):
+    entries = tmp_path / "entries.bin"
+    entries.write_bytes(ENTRIES)
+    with (
+        open(entries, "rb") as f,
+        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm,
+    ):
+        ranges = list(GraphStorage("task").entry_ranges(mm, 60))
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(ENTRIES)
+    assert all(end == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert len(ranges) > 1
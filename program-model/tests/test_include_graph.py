@@ -0,0 +1,168 @@
+"""Include graph testing"""
+
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from buttercup.program_model.api import include_graph
+from buttercup.program_model.api.fuzzy_imports_resolver import FuzzyCImportsResolver
+from buttercup.program_model.api.include_graph import (
+    INCLUDE_GRAPH_FILE,
+    IncludeGraph,
+    get_include_graph,
+)
+from buttercup.program_model.codequery_db import IdentityCache
+from buttercup.program_model.utils.common import Function
+
+FILES = {
+    "src/main.c": '#include <stdio.h>\n#include "util.h"\n#include "config.h"\n',
+    "src/util.h": '#include "types.h"\n#include "../include/api.h"\n',
+    "src/types.h": '#include "util.h"\n',
+    "src/config.h.in": "#define VERSION 1\n",
+    "src/other.c": '#include "api.h"\n',
+    "include/api.h": "int api(void);\n",
+    "lib/api.h": "int api(void);\n",
+    "lib/api.c": '#include "api.h"\nint api(void) { return 0; }\n',
+}
+
+
+@pytest.fixture
+def source_dir(tmp_path: Path) -> Path:
+    root = tmp_path.resolve() / "container_src_dir"
+    for name, content in FILES.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return root
+
+
+def _names(graph: IncludeGraph, ids) -> set[str]:
+    return {graph.get_path(i).relative_to(graph.root_dir).as_posix() for i in ids}
+
+
+def test_includes(source_dir: Path):
+    graph = IncludeGraph.build(source_dir)
+    main = graph.get_id(source_dir / "src/main.c")
+    assert _names(graph, graph.get_includes(main)) == {
+        "src/util.h",
+        "src/config.h.in",
+    }
+    # Include cycles are followed once
+    assert _names(graph, graph.get_closure_ids(main)) == {
+        "src/main.c",
+        "src/util.h",
+        "src/types.h",
+        "src/config.h.in",
+        "include/api.h",
+    }
+    assert _names(graph, graph.get_closure_ids(main, depth=1)) == {
+        "src/main.c",
+        "src/util.h",
+        "src/config.h.in",
+    }
+    assert graph.get_closure_ids(main, depth=0) == []
+    # The closure of an included file is reused
+    types = graph.get_id(source_dir / "src/types.h")
+    assert graph.get_closure(types) & graph.get_closure(main) == graph.get_closure(
+        types
+    )
+    assert graph.get_id(source_dir / "src/missing.h") is None
+
+
+def test_basename_bits(source_dir: Path):
+    graph = IncludeGraph.build(source_dir)
+    main = graph.get_id(source_dir / "src/main.c")
+    other = graph.get_id(source_dir / "src/other.c")
+    assert graph.get_closure(main) & graph.basename_bits("api.h")
+    assert not graph.get_closure(other) & graph.basename_bits("api.h")
+    assert graph.basename_bits("missing.h") == 0
+
+
+def test_save_load(source_dir: Path, tmp_path: Path):
+    graph = IncludeGraph.build(source_dir, ["*.c", "*.h"])
+    assert graph.includes[graph.ids[str(source_dir / "src/main.c")]] is not None
+    assert graph.includes[graph.ids[str(source_dir / "src/config.h.in")]] is None
+    graph.save(source_dir / INCLUDE_GRAPH_FILE)
+
+    # The graph can be moved with the source tree
+    moved = tmp_path / "moved"
+    shutil.move(source_dir, moved)
+    loaded = IncludeGraph.load(moved / INCLUDE_GRAPH_FILE, moved)
+    assert loaded is not None
+    assert loaded.includes == graph.includes
+    main = loaded.get_id(moved / "src/main.c")
+    assert "include/api.h" in _names(loaded, loaded.get_closure_ids(main))
+
+    (moved / INCLUDE_GRAPH_FILE).write_text("{}")
+    assert IncludeGraph.load(moved / INCLUDE_GRAPH_FILE, moved) is None
+    assert IncludeGraph.load(moved / "missing.json", moved) is None
+
+
+def test_get_include_graph(source_dir: Path):
+    graph = get_include_graph(source_dir)
+    assert get_include_graph(source_dir) is graph
+
+    # A tree created again at the same path gets a new graph
+    shutil.rmtree(source_dir)
+    (source_dir / "src").mkdir(parents=True)
+    (source_dir / "src/main.c").write_text('#include "new.h"\n')
+    (source_dir / "src/new.h").write_text("")
+    new_graph = get_include_graph(source_dir)
+    assert new_graph is not graph
+    main = new_graph.get_id(source_dir / "src/main.c")
+    assert _names(new_graph, new_graph.get_closure_ids(main)) == {
+        "src/main.c",
+        "src/new.h",
+    }
+    assert all(g is not graph for g in include_graph._graphs.values())
+
+
+def test_include_graphs_are_bounded(
+    tmp_path: Path, source_dir: Path, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(include_graph, "_graphs", IdentityCache(2))
+    roots = [source_dir]
+    for i in range(2):
+        roots.append(tmp_path / f"copy-{i}")
+        shutil.copytree(source_dir, roots[-1])
+    graphs = [get_include_graph(root) for root in roots]
+
+    # The least recently used graph is dropped
+    assert len(include_graph._graphs) == 2
+    assert get_include_graph(roots[2]) is graphs[2]
+    assert get_include_graph(roots[0]) is not graphs[0]
+
+
+def test_concurrent_queries(source_dir: Path):
+    graph = IncludeGraph.build(source_dir)
+    paths = [source_dir / name for name in FILES] * 20
+    with ThreadPoolExecutor(8) as executor:
+        closures = list(
+            executor.map(lambda p: graph.get_closure(graph.get_id(p)), paths)
+        )
+    expected = IncludeGraph.build(source_dir)
+    assert closures == [expected.get_closure(expected.get_id(p)) for p in paths]
+
+
+def test_resolver(source_dir: Path):
+    resolver = FuzzyCImportsResolver(source_dir)
+    assert resolver.get_direct_imports(source_dir / "src/util.h") == {
+        source_dir / "src/types.h",
+        source_dir / "include/api.h",
+    }
+    # Paths rebased by CodeQuery are relative to the root directory
+    assert resolver.is_file_imported_by("/include/api.h", "/src/main.c")
+    assert resolver.is_file_imported_by("src/main.c", "src/main.c")
+    assert not resolver.is_file_imported_by("lib/api.h", "src/main.c")
+    assert len(resolver.get_all_imports("/src/main.c")) == 5
+    assert resolver.get_all_imports("src/missing.c") == {source_dir / "src/missing.c"}
+
+    # lib/api.c is the definition included by main.c through its header name
+    callees = [
+        Function("api", Path("/lib/api.c"), []),
+        Function("api", Path("/src/other.c"), []),
+    ]
+    caller = Function("main", Path("/src/main.c"), [])
+    assert resolver.filter_callees(caller, callees) == callees[:1]
@@ -1,6 +1,10 @@
+import threading
+
 import pytest
 from unittest.mock import patch, MagicMock, Mock
+from pathlib import Path
 from redis import Redis
+from buttercup.program_model.codequery import CodeQuery, source_fingerprint
 from buttercup.program_model.program_model import ProgramModel
 from buttercup.common.datastructures.msg_pb2 import IndexRequest
 from buttercup.common.task_registry import TaskRegistry
@@ -86,3 +90,192 @@ def test_serve_item_process_normal_task(program_model):
         program_model.process_task.assert_called_once_with(mock_request)
         program_model.task_queue.ack_item.assert_called_once_with(mock_item.item_id)
         program_model.output_queue.push.assert_called_once()
+
+
+def test_cqdb_base_registry(program_model, tmp_path):
+    program_model.wdir = tmp_path
+    cqdb_dir = tmp_path / "task-id" / "task-id.cqdb"
+    assert program_model.find_cqdb_base("abc") is None
+
+    program_model.register_cqdb_base("abc", cqdb_dir)
+    # The cqdb was cleaned up
+    assert program_model.find_cqdb_base("abc") is None
+
+    cqdb_dir.mkdir(parents=True)
+    assert program_model.find_cqdb_base("abc") == cqdb_dir
+    assert program_model.find_cqdb_base("def") is None
+
+
+def test_process_task_runs_indexers_concurrently(program_model):
+    started = threading.Barrier(2, timeout=5)
+
+    def index(args):
+        # Both indexers must be running to get through the barrier
+        started.wait()
+        return args.task_id == "kythe-ok"
+
+    with (
+        patch.object(program_model, "process_task_codequery", side_effect=index),
+        patch.object(program_model, "process_task_kythe", side_effect=index),
+    ):
+        assert not program_model.process_task(IndexRequest(task_id="failed"))
+        assert program_model.process_task(IndexRequest(task_id="kythe-ok"))
+
+
+def test_process_task_without_graphdb(program_model):
+    program_model.graphdb_enabled = False
+    with (
+        patch.object(program_model, "process_task_codequery", return_value=True),
+        patch.object(program_model, "process_task_kythe") as kythe,
+    ):
+        assert program_model.process_task(IndexRequest(task_id="task"))
+        kythe.assert_not_called()
+
+
+def test_source_fingerprint(tmp_path):
+    source = tmp_path / "src" / "my-source"
+    project = tmp_path / "fuzz-tooling" / "projects" / "my-project"
+    for directory in [source / ".git", source / "lib", project]:
+        directory.mkdir(parents=True)
+    (source / "main.c").write_text("int main() {}")
+    (source / "lib" / "lib.c").write_text("int lib() {}")
+    (source / ".git" / "HEAD").write_text("ref: refs/heads/main")
+    (project / "build.sh").write_text("make")
+
+    challenge = Mock()
+    challenge.get_source_path.return_value = source
+    challenge.get_oss_fuzz_path.return_value = tmp_path / "fuzz-tooling"
+    challenge.project_name = "my-project"
+
+    fingerprint = source_fingerprint(challenge)
+    # Git metadata is ignored
+    (source / ".git" / "HEAD").write_text("ref: refs/heads/other")
+    assert source_fingerprint(challenge) == fingerprint
+
+    (source / "lib" / "lib.c").write_text("int lib() { return 1; }")
+    patched = source_fingerprint(challenge)
+    assert patched != fingerprint
+    (project / "build.sh").write_text("make -j")
+    assert source_fingerprint(challenge) not in (fingerprint, patched)
+
+    # Symlinked directories are hashed by their target, not followed
+    patched = source_fingerprint(challenge)
+    (source / "link").symlink_to("lib")
+    assert source_fingerprint(challenge) != patched
+    linked = source_fingerprint(challenge)
+    (source / "link").unlink()
+    (source / "link").symlink_to(".git")
+    assert source_fingerprint(challenge) not in (patched, linked)
+
+
+@pytest.mark.parametrize("has_diffs", [False, True])
+def test_process_task_codequery_without_base(program_model, tmp_path, has_diffs):
+    program_model.wdir = tmp_path
+    module = "buttercup.program_model.program_model"
+    with (
+        patch(f"{module}.ChallengeTask") as challenge_task,
+        patch(f"{module}.source_fingerprint", return_value="abc") as fingerprint,
+        patch(f"{module}.CodeQueryPersistent") as cqp,
+        patch(f"{module}.node_local"),
+        patch(f"{module}.set_crs_attributes"),
+        patch.object(program_model, "register_cqdb_base") as register,
+    ):
+        challenge = challenge_task.return_value
+        local_challenge = challenge.get_rw_copy.return_value.__enter__.return_value
+        local_challenge.apply_patch_diff.return_value = has_diffs
+
+        assert program_model.process_task_codequery(IndexRequest(task_id="task"))
+
+    # The sources are hashed once, and the db is built from scratch
+    fingerprint.assert_called_once_with(challenge)
+    cqp.assert_called_once_with(local_challenge, work_dir=tmp_path, base_task_dir=None)
+    # Only the db of unpatched sources can be reused
+    if has_diffs:
+        register.assert_not_called()
+    else:
+        register.assert_called_once_with("abc", cqp.return_value.challenge.task_dir)
+
+
+DIFF = """\
+--- a/main.c
++++ b/main.c
+@@ -1 +1 @@
+-int main() {}
++int main() { return 1; }
+"""
+
+
+@pytest.fixture
+def base_task_dir(tmp_path: Path) -> Path:
+    """Task directory of a db of the unpatched sources."""
+    base = tmp_path / "base"
+    src = base / "container_src_dir"
+    (src / "src" / "my-source").mkdir(parents=True)
+    (src / "src" / "my-source" / "main.c").write_text("int main() {}\n")
+    for name in [CodeQuery.CODEQUERY_DB, CodeQuery.CSCOPE_OUT]:
+        (src / name).write_text("index")
+    (base / CodeQuery.TS_CACHE).mkdir()
+    (base / CodeQuery.TS_CACHE / "main.c").write_text("cache")
+    return base
+
+
+def _codequery(tmp_path: Path, base_task_dir: Path | None, diff: str) -> CodeQuery:
+    challenge = Mock()
+    challenge.task_dir = tmp_path / "task"
+    challenge.focus = "my-source"
+    challenge.workdir_from_dockerfile.return_value = Path("/src/other")
+    (tmp_path / "diff").mkdir(exist_ok=True)
+    (tmp_path / "diff" / "patch.diff").write_text(diff)
+    challenge.get_diffs.return_value = [tmp_path / "diff" / "patch.diff"]
+    with patch.object(CodeQuery, "__post_init__"):
+        return CodeQuery(challenge, base_task_dir=base_task_dir)
+
+
+def test_copy_src_from_base(tmp_path, base_task_dir):
+    cq = _codequery(tmp_path, base_task_dir, DIFF)
+    assert cq._copy_src_from_base()
+
+    src = cq._get_container_src_dir()
+    # The diffs are applied to the focus repository, not to the base
+    assert (
+        src / "src" / "my-source" / "main.c"
+    ).read_text() == "int main() { return 1; }\n"
+    base_main = base_task_dir / "container_src_dir" / "src" / "my-source" / "main.c"
+    assert base_main.read_text() == "int main() {}\n"
+    # The index files are built again, the tree-sitter cache is reused
+    assert not (src / CodeQuery.CODEQUERY_DB).exists()
+    assert not (src / CodeQuery.CSCOPE_OUT).exists()
+    assert (cq.challenge.task_dir / CodeQuery.TS_CACHE / "main.c").exists()
+
+
+def test_copy_src_from_base_fallback(tmp_path, base_task_dir):
+    assert not _codequery(tmp_path, None, DIFF)._copy_src_from_base()
+
+    # The diffs do not apply to the sources of the base
+    cq = _codequery(tmp_path, base_task_dir, DIFF.replace("int main() {}", "int x;"))
+    with pytest.raises(RuntimeError):
+        cq._apply_diffs_to_container_src()
+    assert not cq._copy_src_from_base()
+    assert not cq._get_container_src_dir().exists()
+
+    # The base has no db
+    (base_task_dir / "container_src_dir" / CodeQuery.CODEQUERY_DB).unlink()
+    assert not _codequery(tmp_path, base_task_dir, DIFF)._copy_src_from_base()
+
+
+def test_apply_diffs_to_container_src(tmp_path):
+    cq = _codequery(tmp_path, None, DIFF)
+    repo = cq._get_container_src_dir() / "src" / "my-source"
+    repo.mkdir(parents=True)
+    (repo / "main.c").write_text("int main() {}\n")
+    # The WORKDIR of the project is tried first
+    (cq._get_container_src_dir() / "src" / "other").mkdir()
+    cq._apply_diffs_to_container_src()
+    assert (repo / "main.c").read_text() == "int main() { return 1; }\n"
+
+    # Applying a diff again fails
+    with pytest.raises(RuntimeError):
+        cq._apply_diffs_to_container_src()
+
+    cq.challenge.get_diffs.return_value = []
+    cq._apply_diffs_to_container_src()
@@ -0,0 +1,109 @@
+"""Fuzzy symbol index testing"""
+
+import os
+import random
+import shutil
+import sqlite3
+import string
+from contextlib import closing
+
+import pytest
+from rapidfuzz import fuzz
+
+from buttercup.program_model import symbol_index
+
+from buttercup.program_model.codequery_db import (
+    CodeQueryDB,
+    IdentityCache,
+    SearchOption,
+)
+from buttercup.program_model.symbol_index import SymbolIndex, get_symbol_index
+
+from .test_codequery_db import codequery_db  # noqa: F401
+
+
+def _brute_force(names: list[str], query: str, threshold: float) -> set[str]:
+    return {name for name in names if name and fuzz.ratio(query, name) > threshold}
+
+
+def test_extract_matches_brute_force():
+    rng = random.Random(0)
+    alphabet = string.ascii_lowercase[:6] + "_"
+    names = [
+        "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 24)))
+        for _ in range(2000)
+    ]
+    index = SymbolIndex(names)
+    assert len(index) == len(set(names) - {""})
+
+    for _ in range(50):
+        query = rng.choice(names)[: rng.randint(1, 24)] or "a"
+        for threshold in (0, 50, 75, 80, 95, 100):
+            matches = index.extract(query, threshold)
+            assert {name for name, _ in matches} == _brute_force(
+                names, query, threshold
+            )
+            scores = [score for _, score in matches]
+            assert scores == sorted(scores, reverse=True)
+
+
+def test_extract_ordering():
+    index = SymbolIndex(["png_read_chunk", "png_read_chunk_header", "unrelated"])
+    assert [name for name, _ in index.extract("png_read_chunk_headr", 80)] == [
+        "png_read_chunk_header",
+        "png_read_chunk",
+    ]
+    assert index.extract("png_read_chunk_header", 100) == []
+
+
+def test_get_symbol_index(codequery_db: CodeQueryDB):  # noqa: F811
+    functions = get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO)
+    assert sorted(functions.names) == ["MAX", "compute", "helper", "main"]
+    # Built once per database and search option
+    assert get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO) is functions
+
+    symbols = get_symbol_index(codequery_db, SearchOption.SYMBOL)
+    assert "my_struct" in symbols.names
+    assert [name for name, _ in symbols.extract("my_structs", 80)] == ["my_struct"]
+
+
+def test_symbol_index_follows_recreated_database(
+    codequery_db: CodeQueryDB,  # noqa: F811
+):
+    functions = get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO)
+
+    # Create the database again at the same path, without one of the functions
+    new_path = codequery_db.db_path.with_name("new.db")
+    shutil.copy(codequery_db.db_path, new_path)
+    with closing(sqlite3.connect(new_path)) as conn:
+        conn.execute("DELETE FROM symtbl WHERE symName = 'MAX'")
+        conn.commit()
+    os.replace(new_path, codequery_db.db_path)
+
+    new_functions = get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO)
+    assert new_functions is not functions
+    assert sorted(new_functions.names) == ["compute", "helper", "main"]
+    assert all(index is not functions for index in symbol_index._indexes.values())
+
+
+def test_symbol_indexes_are_bounded(
+    codequery_db: CodeQueryDB,  # noqa: F811
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(symbol_index, "_indexes", IdentityCache(2))
+    functions = get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO)
+    symbols = get_symbol_index(codequery_db, SearchOption.SYMBOL)
+    get_symbol_index(codequery_db, SearchOption.CLASS_OR_STRUCT)
+
+    # The least recently used index is dropped
+    assert len(symbol_index._indexes) == 2
+    assert get_symbol_index(codequery_db, SearchOption.SYMBOL) is symbols
+    assert (
+        get_symbol_index(codequery_db, SearchOption.FUNCTION_OR_MACRO) is not functions
+    )
+
+
+def test_extract_negative_threshold():
+    index = SymbolIndex(["a", "bb", "ccc"])
+    assert {name for name, _ in index.extract("zz", -10)} == {"a", "bb", "ccc"}
+    assert index.extract("zz", 0) == []
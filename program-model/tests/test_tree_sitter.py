@@ -4,6 +4,7 @@ from buttercup.common.task_meta import TaskMeta
 from buttercup.program_model.api.tree_sitter import CodeTS, TypeDefinitionType
 from pathlib import Path
 from dataclasses import dataclass
+from unittest.mock import patch
 
 
 @dataclass(frozen=True)
@@ -234,6 +235,59 @@ def test_get_type_definition_types(challenge_task_readonly: ChallengeTask):
     assert "#define ANOTHER_TYPE struct my_struct" in type_def.definition
 
 
+def test_get_code_no_preproc(challenge_task_readonly: ChallengeTask):
+    """Test that conditional directives are blanked without moving the code."""
+    code_ts = CodeTS(challenge_task_readonly)
+    lines = [
+        (b"#ifdef TEST\r", True),
+        (b"int a;", False),
+        (b"  # if not at the start of the line", False),
+        (b"# endif /* \xff */", True),
+        (b"#include <stdio.h>", False),
+        (b"#define X 1", False),
+        (b"#else", True),
+    ]
+    code = b"\n".join(line for line, _ in lines)
+    expected = b"\n".join(
+        b"/" * len(line.rstrip(b"\r")) + b"\r" * line.endswith(b"\r")
+        if blanked
+        else line
+        for line, blanked in lines
+    )
+    assert code_ts._get_code_no_preproc(code) == expected
+
+
+def test_parse_cache(challenge_task_readonly: ChallengeTask, tmp_path: Path):
+    """Test that parsed functions and types are shared through the cache."""
+    cache_dir = tmp_path / "ts_cache"
+    file_path = Path("src/example_project/test2.c")
+    code_ts = CodeTS(challenge_task_readonly, cache_dir=cache_dir)
+    functions = code_ts.get_functions(file_path)
+    types = code_ts.parse_types_in_code(Path("src/example_project/test.c"))
+    assert "add" in functions
+    assert "MY_TYPE" in types
+
+    # A new instance reuses the records, without parsing the files again
+    other_ts = CodeTS(challenge_task_readonly, cache_dir=cache_dir)
+    with (
+        patch.object(other_ts, "_parse_functions_in_code") as parse_functions,
+        patch.object(other_ts, "_parse_types_in_code") as parse_types,
+    ):
+        assert other_ts.get_functions(file_path) == functions
+        assert other_ts.parse_types_in_code(Path("src/example_project/test.c")) == types
+        assert other_ts.parse_types_in_code(
+            Path("src/example_project/test.c"), "MY_TYPE"
+        ) == {"MY_TYPE": types["MY_TYPE"]}
+        parse_functions.assert_not_called()
+        parse_types.assert_not_called()
+
+    # Records are keyed by content, the path is the one of the requested file
+    code = challenge_task_readonly.task_dir.joinpath(file_path).read_bytes()
+    copy = other_ts.get_functions_in_code(code, Path("copy.c"))
+    assert copy["add"].file_path == Path("copy.c")
+    assert copy["add"].bodies == functions["add"].bodies
+
+
 @pytest.mark.parametrize(
     "function_name,file_path,function_info",
     [
@@ -146,6 +146,7 @@ class SeedGenBot(TaskLoop):
                 task.task_id,
                 task.harness_name,
                 copy_corpus_max_size=self.max_corpus_seed_size,
+                redis=self.redis,
             )
             override_task = os.getenv("BUTTERCUP_SEED_GEN_TEST_TASK")
             if override_task: